@@ -0,0 +1,81 @@
+"""
+Keyset (cursor) pagination
+
+OFFSET pagination makes Postgres read and discard every skipped row, so deep
+pages get slower as the table grows, and rows inserted between requests shift
+later pages. Keyset pagination instead remembers the sort key of the last row
+returned and asks for rows strictly after it:
+
+    WHERE (activity_timestamp, id) < ($ts, $id)
+    ORDER BY activity_timestamp DESC, id DESC
+
+The position is handed to clients as an opaque cursor in the X-Next-Cursor
+response header and passed back as the `cursor` query parameter. The legacy
+`skip` parameter still works and is applied after the cursor condition.
+"""
+
+import base64
+import binascii
+from datetime import date, datetime, timezone
+from typing import Any, List, Optional, Tuple, Union
+
+import orjson
+from fastapi import HTTPException, Response
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Ids are bound as bigint; anything outside this range would fail in Postgres instead of as a bad cursor
+MAX_CURSOR_ID = 2**63 - 1
+
+
+def encode_cursor(sort_key: str, value: Union[datetime, date], row_id: int) -> str:
+    """Encode the sort position of a row as an opaque URL-safe cursor."""
+    payload = orjson.dumps({"k": sort_key, "v": value.isoformat(), "id": row_id})
+    return base64.urlsafe_b64encode(payload).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor: str, sort_key: str) -> Tuple[Union[datetime, date], int]:
+    """
+    Decode a cursor produced by encode_cursor for the given sort key.
+
+    The value comes back as the type it was encoded from: a datetime (with its
+    UTC offset, if any) or a date.
+
+    Raises:
+        HTTPException: 400 if the cursor is malformed or belongs to another listing
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = orjson.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if payload.get("k") != sort_key:
+            raise ValueError(f"cursor is for '{payload.get('k')}', expected '{sort_key}'")
+        value, row_id = payload["v"], payload["id"]
+        if not isinstance(value, str):
+            raise ValueError("cursor value is not a string")
+        if isinstance(row_id, bool) or not isinstance(row_id, int) or not 0 <= row_id <= MAX_CURSOR_ID:
+            raise ValueError(f"cursor id {row_id!r} is not a valid row id")
+        after = date.fromisoformat(value) if len(value) == 10 else datetime.fromisoformat(value)
+        if isinstance(after, datetime) and after.tzinfo is not None:
+            after.astimezone(timezone.utc)  # timestamptz parameters are sent as UTC; fail here, not in the query
+        return after, row_id
+    except (ValueError, KeyError, TypeError, AttributeError, OverflowError, binascii.Error, orjson.JSONDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid pagination cursor: {str(e)}")
+
+
+def keyset_condition(column: str, id_column: str, first_param: int) -> str:
+    """SQL condition selecting rows after the cursor for a DESC, DESC ordering."""
+    return f"({column}, {id_column}) < (${first_param}, ${first_param + 1})"
+
+
+def set_next_cursor(response: Response, rows: List[Any], sort_key: str, limit: int, id_key: str = "id") -> Optional[str]:
+    """
+    Add the X-Next-Cursor header when the page is full.
+
+    A page shorter than `limit` is the last one, so no cursor is sent.
+    """
+    if not rows or len(rows) < limit:
+        return None
+    last = rows[-1]
+    cursor = encode_cursor(sort_key, last[sort_key], last[id_key])
+    response.headers[NEXT_CURSOR_HEADER] = cursor
+    return cursor
@@ -0,0 +1,116 @@
+"""
+JSON response pipeline
+
+FastAPI renders every response through jsonable_encoder followed by the stdlib
+json module. On our large product and activity lists that walk dominates the
+request time, so the app uses orjson instead:
+
+* FastJSONResponse is the default response class. orjson serializes date,
+  datetime, UUID and numpy values natively; Decimal and anything else orjson
+  does not know (asyncpg Records, Pydantic models, sets) go through
+  _default.
+* FastJSONRoute skips jsonable_encoder altogether when an endpoint without a
+  response_model returns a plain dict or list. When the endpoint declares a
+  response_model, the result is still validated against it, then dumped in
+  Python mode and rendered by orjson. FastAPI would dump in JSON mode, which
+  runs the models' json_encoders lambdas per value; they encode date, datetime
+  and Decimal the same way orjson and _default do, at about twice the cost.
+"""
+
+import copy
+import asyncio
+import functools
+from decimal import Decimal
+from typing import Any, Callable
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import ResponseValidationError
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(obj: Any) -> Any:
+    """Fallback for types orjson cannot serialize natively."""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    return jsonable_encoder(obj)
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize content to JSON bytes using the same rules as API responses."""
+    return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class FastJSONRoute(APIRoute):
+    """
+    APIRoute that sends plain dict/list results straight to FastJSONResponse.
+
+    Results of routes with a response_model are validated against it first, and
+    the response_model_include/exclude options are applied as FastAPI would.
+    Routes whose endpoint takes a Response parameter are left alone (headers set
+    on it would otherwise be dropped). The route's status_code is preserved.
+    """
+
+    def get_route_handler(self) -> Callable:
+        if self.dependant.response_param_name:
+            return super().get_route_handler()
+
+        original_dependant = self.dependant
+        self.dependant = copy.copy(original_dependant)
+        self.dependant.call = self._wrap_endpoint(original_dependant.call)
+        try:
+            return super().get_route_handler()
+        finally:
+            self.dependant = original_dependant
+
+    def _serialize(self, result: Any) -> Any:
+        """Validate a result against the response_model and dump it for orjson."""
+        field = self.response_field
+        value, errors = field.validate(result, {}, loc=("response",))
+        if errors:
+            raise ResponseValidationError(errors=errors, body=result)
+        return field.serialize(
+            value,
+            mode="python",
+            include=self.response_model_include,
+            exclude=self.response_model_exclude,
+            by_alias=self.response_model_by_alias,
+            exclude_unset=self.response_model_exclude_unset,
+            exclude_defaults=self.response_model_exclude_defaults,
+            exclude_none=self.response_model_exclude_none,
+        )
+
+    def _wrap_endpoint(self, call: Callable) -> Callable:
+        status_code = self.status_code
+        has_model = self.response_field is not None
+
+        def to_response(result: Any) -> Any:
+            if type(result) is dict or type(result) is list:
+                content = self._serialize(result) if has_model else result
+                if status_code is not None:
+                    return FastJSONResponse(content, status_code=status_code)
+                return FastJSONResponse(content)
+            return result
+
+        if asyncio.iscoroutinefunction(call):
+            @functools.wraps(call)
+            async def endpoint(*args, **kwargs):
+                return to_response(await call(*args, **kwargs))
+        else:
+            @functools.wraps(call)
+            def endpoint(*args, **kwargs):
+                return to_response(call(*args, **kwargs))
+
+        return endpoint
@@ -0,0 +1,149 @@
+"""
+Route classes with database time budgets
+
+Every router picks a route class that bounds how long its requests may hold a
+pooled connection:
+
+* CRUDRoute      - everyday reads and writes; uses the pool's default statement_timeout
+* AnalyticsRoute - dashboards, historical IRR, revenue and search
+* BatchRoute     - bulk imports, full recalculations and system/admin endpoints
+
+Each class carries a statement_timeout, applied by get_db / get_read_db when
+the connection is acquired, and a request deadline. When the deadline passes
+the handler is cancelled and the client gets a 504; when the client
+disconnects first the handler is cancelled without a response. Cancelling the
+handler cancels the query it is waiting on (asyncpg sends a cancel request to
+the server), so the connection goes back to the pool instead of finishing
+work nobody will read.
+
+Deadline, disconnect and statement-timeout counts per route are reported under
+"timeouts" in /api/system/query-stats.
+"""
+
+import os
+import asyncio
+import logging
+from typing import Callable, NamedTuple
+
+import asyncpg
+from fastapi import HTTPException, Request, Response
+
+from app.api.responses import FastJSONRoute
+from app.db.database import DEFAULT_STATEMENT_TIMEOUT_MS, statement_timeout_ms
+from app.db.query_stats import get_query_stats_collector
+
+logger = logging.getLogger(__name__)
+
+
+class RouteBudget(NamedTuple):
+    kind: str
+    statement_timeout_ms: int
+    deadline_seconds: float
+
+
+CRUD_BUDGET = RouteBudget(
+    "crud",
+    DEFAULT_STATEMENT_TIMEOUT_MS,
+    float(os.getenv("CRUD_REQUEST_DEADLINE_SECONDS", "30")),
+)
+ANALYTICS_BUDGET = RouteBudget(
+    "analytics",
+    int(os.getenv("ANALYTICS_STATEMENT_TIMEOUT_MS", "60000")),
+    float(os.getenv("ANALYTICS_REQUEST_DEADLINE_SECONDS", "90")),
+)
+BATCH_BUDGET = RouteBudget(
+    "batch",
+    int(os.getenv("BATCH_STATEMENT_TIMEOUT_MS", "300000")),
+    float(os.getenv("BATCH_REQUEST_DEADLINE_SECONDS", "600")),
+)
+
+# Status logged for requests abandoned by the client (nginx convention); never reaches the client
+CLIENT_CLOSED_REQUEST = 499
+
+
+async def _wait_for_disconnect(request: Request) -> None:
+    """Return once the client has gone away. Only call after the request body has been read."""
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+class GuardedRoute(FastJSONRoute):
+    """FastJSONRoute that enforces its class's RouteBudget on every request."""
+
+    budget: RouteBudget = CRUD_BUDGET
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        budget = self.budget
+        path = self.path
+
+        async def guarded_handler(request: Request) -> Response:
+            route = f"{request.method} {path}"
+
+            # Read the body up front so the disconnect watcher owns receive() from here on
+            await request.body()
+
+            token = statement_timeout_ms.set(budget.statement_timeout_ms)
+            try:
+                handler_task = asyncio.ensure_future(handler(request))
+            finally:
+                statement_timeout_ms.reset(token)
+            disconnect_task = asyncio.ensure_future(_wait_for_disconnect(request))
+
+            try:
+                done, _ = await asyncio.wait(
+                    {handler_task, disconnect_task},
+                    timeout=budget.deadline_seconds,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if handler_task in done:
+                    try:
+                        return handler_task.result()
+                    except asyncpg.exceptions.QueryCanceledError as e:
+                        # Already counted by TimedConnection; handlers that don't catch it get a 504, not a 500
+                        if "statement timeout" not in str(e):
+                            raise
+                        logger.error(f"❌ {route} hit the {budget.kind} statement timeout of {budget.statement_timeout_ms}ms")
+                        raise HTTPException(
+                            status_code=504,
+                            detail=f"Database query exceeded the {budget.statement_timeout_ms}ms limit for {budget.kind} requests",
+                        )
+
+                handler_task.cancel()
+                try:
+                    await handler_task
+                except (asyncio.CancelledError, Exception):
+                    pass
+
+                if disconnect_task in done:
+                    get_query_stats_collector().record_timeout(route, "client_disconnect")
+                    logger.warning(f"⚠️ Client disconnected, cancelled {route}")
+                    return Response(status_code=CLIENT_CLOSED_REQUEST)
+
+                get_query_stats_collector().record_timeout(route, "deadline")
+                logger.error(f"❌ {route} exceeded its {budget.kind} deadline of {budget.deadline_seconds:g}s and was cancelled")
+                raise HTTPException(
+                    status_code=504,
+                    detail=f"Request exceeded the {budget.deadline_seconds:g}s time limit for {budget.kind} requests",
+                )
+            except asyncio.CancelledError:
+                handler_task.cancel()
+                raise
+            finally:
+                disconnect_task.cancel()
+
+        return guarded_handler
+
+
+class CRUDRoute(GuardedRoute):
+    budget = CRUD_BUDGET
+
+
+class AnalyticsRoute(GuardedRoute):
+    budget = ANALYTICS_BUDGET
+
+
+class BatchRoute(GuardedRoute):
+    budget = BATCH_BUDGET
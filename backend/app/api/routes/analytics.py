@@ -1,4 +1,5 @@
 from fastapi import APIRouter, HTTPException, Depends, Query
+from app.api.route_classes import AnalyticsRoute
 from typing import Dict, List, Optional, Literal
 from collections import defaultdict
 from datetime import datetime, date, timedelta
@@ -9,8 +10,11 @@ import asyncio
 import numpy as np
 import time
 
-from app.db.database import get_db
+from app.db.database import get_db, get_read_db
 from app.api.routes.portfolio_funds import calculate_excel_style_irr
+from app.utils.data_versions import CLIENTS, PRODUCTS, get_data_version, safe_to_cache
+from app.services.risk_engine import get_risk_snapshot
+from app.services.revenue_service import load_revenue_snapshot
 
 # Global cache for company IRR to prevent expensive recalculations
 _company_irr_cache = {
@@ -19,11 +23,19 @@ _company_irr_cache = {
     'cache_duration': 86400  # 24 hours cache (was 5 minutes)
 }
 
+# Relationship x product type matrix, valid while the client/product data version is unchanged
+_product_client_counts_cache = {
+    'value': None,
+    'version': None,
+    'timestamp': None,
+    'cache_duration': 3600  # backstop for changes made outside the API
+}
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-router = APIRouter()
+router = APIRouter(route_class=AnalyticsRoute)
 
 def serialize_datetime(dt):
     """Helper function to serialize datetime objects to ISO format strings"""
@@ -34,7 +46,7 @@ def serialize_datetime(dt):
 @router.get("/analytics/fund_distribution")
 async def get_fund_distribution(
     limit: int = Query(100000, ge=1, le=100000, description="Maximum number of funds to return"),
-    db = Depends(get_db)
+    db = Depends(get_read_db)
 ):
     """
     What it does: Returns the distribution of funds based on their current market value from latest valuations.
@@ -141,7 +153,7 @@ async def get_fund_distribution(
 @router.get("/analytics/provider_distribution")
 async def get_provider_distribution(
     limit: int = Query(100000, ge=1, le=100000, description="Maximum number of providers to return"),
-    db = Depends(get_db)
+    db = Depends(get_read_db)
 ):
     """
     What it does: Returns the distribution of providers based on the total current market value (FUM) they manage.
@@ -271,7 +283,7 @@ async def get_provider_distribution(
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 @router.get("/analytics/dashboard_stats")
-async def get_dashboard_stats(db = Depends(get_db)):
+async def get_dashboard_stats(db = Depends(get_read_db)):
     """
     Return dashboard statistics including company-wide IRR calculated from client IRRs.
     Total FUM is calculated from latest market valuations (preferred) with fallback to amount_invested.
@@ -336,14 +348,119 @@ async def get_dashboard_stats(db = Depends(get_db)):
         logger.error(f"Error getting dashboard stats: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
+# Latest IRR per portfolio fund, and the amount_invested weight of every fund that has one.
+# Funds without an IRR or with no amount invested carry a NULL weight and drop out of the sums.
+_PERFORMANCE_BASE_CTE = """
+    WITH latest_irr AS (
+        SELECT DISTINCT ON (fund_id) fund_id, irr_result
+        FROM portfolio_fund_irr_values
+        ORDER BY fund_id, date DESC
+    ),
+    fund_weights AS (
+        SELECT
+            pf.id,
+            pf.portfolio_id,
+            pf.available_funds_id,
+            li.irr_result,
+            CASE WHEN li.irr_result IS NOT NULL AND pf.amount_invested <> 0 THEN pf.amount_invested END AS weight
+        FROM portfolio_funds pf
+        LEFT JOIN latest_irr li ON li.fund_id = pf.id
+    )
+"""
+
+# One aggregation per entity type: FUM-weighted IRR and FUM (sum of amount_invested)
+_PERFORMANCE_ENTITY_QUERIES = {
+    "funds": """
+        SELECT af.id, af.fund_name AS name, 'fund' AS type,
+               SUM(fw.irr_result * fw.weight) / SUM(fw.weight) AS irr,
+               SUM(fw.weight) AS fum,
+               NULL::date AS start_date, NULL::text AS advisor
+        FROM fund_weights fw
+        JOIN available_funds af ON af.id = fw.available_funds_id
+        GROUP BY af.id
+        HAVING SUM(fw.weight) > 0
+    """,
+    "portfolios": """
+        SELECT p.id, p.portfolio_name AS name, 'portfolio' AS type,
+               SUM(fw.irr_result * fw.weight) / SUM(fw.weight) AS irr,
+               SUM(fw.weight) AS fum,
+               p.start_date, NULL::text AS advisor
+        FROM fund_weights fw
+        JOIN portfolios p ON p.id = fw.portfolio_id
+        GROUP BY p.id
+        HAVING SUM(fw.weight) > 0
+    """,
+    "products": """
+        SELECT cp.id,
+               COALESCE(cp.product_name, COALESCE(cg.name, 'Unknown Client') || '''s product') AS name,
+               'product' AS type,
+               SUM(fw.irr_result * fw.weight) / SUM(fw.weight) AS irr,
+               SUM(fw.weight) AS fum,
+               cp.start_date, NULL::text AS advisor
+        FROM fund_weights fw
+        JOIN client_products cp ON cp.portfolio_id = fw.portfolio_id
+        LEFT JOIN client_groups cg ON cg.id = cp.client_id
+        GROUP BY cp.id, cg.name
+        HAVING SUM(fw.weight) > 0
+    """,
+    "clients": """
+        SELECT cg.id, cg.name, 'client' AS type,
+               SUM(fw.irr_result * fw.weight) / SUM(fw.weight) AS irr,
+               SUM(fw.weight) AS fum,
+               MIN(cp.start_date) AS start_date, cg.advisor
+        FROM fund_weights fw
+        JOIN client_products cp ON cp.portfolio_id = fw.portfolio_id
+        JOIN client_groups cg ON cg.id = cp.client_id
+        GROUP BY cg.id
+        HAVING SUM(fw.weight) > 0
+    """,
+    "providers": """
+        SELECT ap.id, ap.name, 'provider' AS type,
+               SUM(fw.irr_result * fw.weight) / SUM(fw.weight) AS irr,
+               SUM(fw.weight) AS fum,
+               MIN(cp.start_date) AS start_date, NULL::text AS advisor
+        FROM fund_weights fw
+        JOIN client_products cp ON cp.portfolio_id = fw.portfolio_id
+        JOIN available_providers ap ON ap.id = cp.provider_id
+        GROUP BY ap.id
+        HAVING SUM(fw.weight) > 0
+    """,
+}
+
+# Entity types combined into the overview ranking
+_PERFORMANCE_OVERVIEW_TYPES = ("funds", "portfolios", "products", "clients")
+
+def _performance_data_query(entity_type: str, sort_order: str) -> str:
+    """Build the ranked performance query for one entity type, or for all overview types."""
+    if entity_type == "overview":
+        entities = " UNION ALL ".join(f"({_PERFORMANCE_ENTITY_QUERIES[t]})" for t in _PERFORMANCE_OVERVIEW_TYPES)
+    else:
+        entities = _PERFORMANCE_ENTITY_QUERIES[entity_type]
+    direction = "DESC" if sort_order == "highest" else "ASC"
+    return f"""
+        {_PERFORMANCE_BASE_CTE}
+        SELECT * FROM ({entities}) ranked
+        ORDER BY irr {direction}, type, id
+        LIMIT $1
+    """
+
 @router.get("/analytics/performance_data")
 async def get_performance_data(
     date_range: Literal["all-time", "ytd", "12m", "3y", "5y"] = "all-time",
     entity_type: Literal["overview", "clients", "products", "portfolios", "funds", "products", "providers"] = "overview",
     sort_order: Literal["highest", "lowest"] = "highest",
     limit: int = Query(100000, ge=1, le=100000),
-    db = Depends(get_db)
+    db = Depends(get_read_db)
 ):
+    """
+    What it does: Ranks funds, portfolios, products, clients or providers by FUM-weighted IRR.
+    Why it's needed: Feeds the performance tables on the analytics page.
+    How it works:
+        1. Company IRR comes from calculate_company_irr and company FUM from latest valuations
+        2. One SQL aggregation per entity type weights each portfolio fund's latest IRR by its amount_invested
+        3. Sorting and the limit are applied in SQL; Python only renames columns
+    Expected output: {"companyFUM", "companyIRR", "performanceData": [{id, name, type, irr, fum, startDate}]}
+    """
     try:
         response = {
             "companyFUM": 0,
@@ -356,615 +473,28 @@ async def get_performance_data(
         response["companyIRR"] = company_irr
         
         # Calculate total FUM using latest valuations (consistent with dashboard_stats)
-        latest_valuations_result = await db.fetch("SELECT valuation FROM latest_portfolio_fund_valuations")
-        if latest_valuations_result:
-            response["companyFUM"] = sum(dict(val)["valuation"] or 0 for val in latest_valuations_result)
+        latest_fum = await db.fetchrow("SELECT COUNT(*) AS valuations, COALESCE(SUM(valuation), 0) AS fum FROM latest_portfolio_fund_valuations")
+        if latest_fum["valuations"]:
+            response["companyFUM"] = latest_fum["fum"]
         else:
             # Fallback to amount_invested if no valuations exist
-            fum_result = await db.fetch("SELECT amount_invested FROM portfolio_funds")
-            if fum_result:
-                response["companyFUM"] = sum(dict(pf)["amount_invested"] or 0 for pf in fum_result)
-                logger.warning(f"Performance data: No valuations found, using amount_invested fallback: {response['companyFUM']}")
-            else:
-                response["companyFUM"] = 0
-
-        if entity_type == "funds":
-            # Get funds with their latest IRR values and total FUM - OPTIMIZED BULK QUERIES
-            funds_result = await db.fetch("SELECT * FROM available_funds")
-            
-            if funds_result:
-                # Extract fund IDs for bulk queries
-                fund_ids = [dict(fund)["id"] for fund in funds_result]
-                
-                # Bulk fetch all portfolio_funds for all funds
-                portfolio_funds_result = await db.fetch("""
-                    SELECT id, amount_invested, available_funds_id 
-                    FROM portfolio_funds 
-                    WHERE available_funds_id = ANY($1::int[])
-                """, fund_ids)
-                
-                # Extract portfolio fund IDs for bulk IRR query
-                pf_ids = [dict(pf)["id"] for pf in portfolio_funds_result]
-                
-                # Bulk fetch latest IRR values for all portfolio funds
-                irr_values_result = await db.fetch("""
-                    SELECT DISTINCT ON (fund_id) fund_id, irr_result
-                    FROM portfolio_fund_irr_values 
-                    WHERE fund_id = ANY($1::int[])
-                    ORDER BY fund_id, date DESC
-                """, pf_ids) if pf_ids else []
-                
-                # Create lookup maps for efficient processing
-                pf_by_fund_id = {}
-                for pf_record in portfolio_funds_result:
-                    pf = dict(pf_record)
-                    fund_id = pf["available_funds_id"]
-                    if fund_id not in pf_by_fund_id:
-                        pf_by_fund_id[fund_id] = []
-                    pf_by_fund_id[fund_id].append(pf)
-                
-                irr_by_pf_id = {}
-                for irr_record in irr_values_result:
-                    irr = dict(irr_record)
-                    irr_by_pf_id[irr["fund_id"]] = irr["irr_result"]
-                
-                # Process each fund with bulk data
-                for fund_record in funds_result:
-                    fund = dict(fund_record)
-                    fund_id = fund["id"]
-                
-                total_fum = 0
-                weighted_irr = 0
-                total_weight = 0
-                
-                    # Get portfolio funds for this fund
-                portfolio_funds = pf_by_fund_id.get(fund_id, [])
-                    
-                for pf in portfolio_funds:
-                    pf_id = pf["id"]
-                    amount_invested = pf["amount_invested"]
-                        
-                    # Get latest IRR value for this portfolio fund
-                    if pf_id in irr_by_pf_id and amount_invested:
-                        irr_value = irr_by_pf_id[pf_id]
-                        total_fum += amount_invested
-                        weighted_irr += (irr_value * amount_invested)
-                        total_weight += amount_invested
-                
-                if total_weight > 0:
-                    response["performanceData"].append({
-                        "id": fund["id"],
-                        "name": fund["fund_name"],
-                        "type": "fund",
-                        "irr": weighted_irr / total_weight,
-                        "fum": total_fum,
-                        "startDate": None
-                    })
-            
-            # Sort by IRR
-            response["performanceData"].sort(
-                key=lambda x: x["irr"],
-                reverse=(sort_order == "highest")
-            )
-            response["performanceData"] = response["performanceData"][:limit]
-        
-        elif entity_type == "portfolios":
-            # Get portfolios with their latest IRR values and total FUM - OPTIMIZED BULK QUERIES
-            portfolios_result = await db.fetch("SELECT * FROM portfolios")
-            
-            if portfolios_result:
-                # Extract portfolio IDs for bulk queries
-                portfolio_ids = [dict(portfolio)["id"] for portfolio in portfolios_result]
-                
-                # Bulk fetch all portfolio_funds for all portfolios
-                portfolio_funds_result = await db.fetch("""
-                    SELECT id, amount_invested, portfolio_id 
-                    FROM portfolio_funds 
-                    WHERE portfolio_id = ANY($1::int[])
-                """, portfolio_ids)
-                
-                # Extract portfolio fund IDs for bulk IRR query
-                pf_ids = [dict(pf)["id"] for pf in portfolio_funds_result]
-                
-                # Bulk fetch latest IRR values for all portfolio funds
-                irr_values_result = await db.fetch("""
-                    SELECT DISTINCT ON (fund_id) fund_id, irr_result
-                    FROM portfolio_fund_irr_values 
-                    WHERE fund_id = ANY($1::int[])
-                    ORDER BY fund_id, date DESC
-                """, pf_ids) if pf_ids else []
-                
-                # Create lookup maps for efficient processing
-                pf_by_portfolio_id = {}
-                for pf_record in portfolio_funds_result:
-                    pf = dict(pf_record)
-                    portfolio_id = pf["portfolio_id"]
-                    if portfolio_id not in pf_by_portfolio_id:
-                        pf_by_portfolio_id[portfolio_id] = []
-                    pf_by_portfolio_id[portfolio_id].append(pf)
-                
-                irr_by_pf_id = {}
-                for irr_record in irr_values_result:
-                    irr = dict(irr_record)
-                    irr_by_pf_id[irr["fund_id"]] = irr["irr_result"]
-                
-                # Process each portfolio with bulk data
-                for portfolio_record in portfolios_result:
-                    portfolio = dict(portfolio_record)
-                    portfolio_id = portfolio["id"]
-                
-                total_fum = 0
-                weighted_irr = 0
-                total_weight = 0
-                
-                # Get portfolio funds for this portfolio
-                portfolio_funds = pf_by_portfolio_id.get(portfolio_id, [])
-                    
-                for pf in portfolio_funds:
-                    pf_id = pf["id"]
-                    amount_invested = pf["amount_invested"]
-                        
-                    # Get latest IRR value for this portfolio fund
-                    if pf_id in irr_by_pf_id and amount_invested:
-                        irr_value = irr_by_pf_id[pf_id]
-                        total_fum += amount_invested
-                        weighted_irr += (irr_value * amount_invested)
-                        total_weight += amount_invested
-                
-                if total_weight > 0:
-                    response["performanceData"].append({
-                        "id": portfolio["id"],
-                        "name": portfolio["portfolio_name"],
-                        "type": "portfolio",
-                        "irr": weighted_irr / total_weight,
-                        "fum": total_fum,
-                        "startDate": portfolio["start_date"]
-                    })
-            
-            # Sort by IRR
-            response["performanceData"].sort(
-                key=lambda x: x["irr"],
-                reverse=(sort_order == "highest")
-            )
-            response["performanceData"] = response["performanceData"][:limit]
-
-        elif entity_type == "products":
-            # Get products with their latest IRR values and total FUM - OPTIMIZED BULK QUERIES
-            products_result = await db.fetch("SELECT * FROM client_products")
-            
-            if products_result:
-                # Extract portfolio IDs and client IDs for bulk queries
-                portfolio_ids = [dict(product)["portfolio_id"] for product in products_result if dict(product)["portfolio_id"]]
-                client_ids = [dict(product)["client_id"] for product in products_result if dict(product)["client_id"]]
-                portfolio_ids = list(set(portfolio_ids))  # Remove duplicates
-                client_ids = list(set(client_ids))  # Remove duplicates
-                
-                # Bulk fetch all portfolio_funds for all portfolios
-                portfolio_funds_result = await db.fetch("""
-                    SELECT id, amount_invested, portfolio_id 
-                    FROM portfolio_funds 
-                    WHERE portfolio_id = ANY($1::int[])
-                """, portfolio_ids) if portfolio_ids else []
-                
-                # Extract portfolio fund IDs for bulk IRR query
-                pf_ids = [dict(pf)["id"] for pf in portfolio_funds_result]
-                
-                # Bulk fetch latest IRR values and client names
-                irr_values_result = await db.fetch("""
-                    SELECT DISTINCT ON (fund_id) fund_id, irr_result
-                    FROM portfolio_fund_irr_values 
-                    WHERE fund_id = ANY($1::int[])
-                    ORDER BY fund_id, date DESC
-                """, pf_ids) if pf_ids else []
-                
-                client_names_result = await db.fetch("""
-                    SELECT id, name FROM client_groups WHERE id = ANY($1::int[])
-                """, client_ids) if client_ids else []
-                
-                # Create lookup maps for efficient processing
-                pf_by_portfolio_id = {}
-                for pf_record in portfolio_funds_result:
-                    pf = dict(pf_record)
-                    portfolio_id = pf["portfolio_id"]
-                    if portfolio_id not in pf_by_portfolio_id:
-                        pf_by_portfolio_id[portfolio_id] = []
-                    pf_by_portfolio_id[portfolio_id].append(pf)
-                
-                irr_by_pf_id = {}
-                for irr_record in irr_values_result:
-                    irr = dict(irr_record)
-                    irr_by_pf_id[irr["fund_id"]] = irr["irr_result"]
-                
-                client_names_by_id = {}
-                for client_record in client_names_result:
-                    client = dict(client_record)
-                    client_names_by_id[client["id"]] = client["name"]
-                
-                # Process each product with bulk data
-                for product_record in products_result:
-                    product = dict(product_record)
-                    portfolio_id = product["portfolio_id"]
-                    
-                    if portfolio_id:
-                        total_fum = 0
-                        weighted_irr = 0
-                        total_weight = 0
-                    
-                        # Get portfolio funds for this portfolio
-                        portfolio_funds = pf_by_portfolio_id.get(portfolio_id, [])
-                        
-                        for pf in portfolio_funds:
-                            pf_id = pf["id"]
-                            amount_invested = pf["amount_invested"]
-                            
-                            # Get latest IRR value for this portfolio fund
-                            if pf_id in irr_by_pf_id and amount_invested:
-                                irr_value = irr_by_pf_id[pf_id]
-                                total_fum += amount_invested
-                                weighted_irr += (irr_value * amount_invested)
-                                total_weight += amount_invested
-                
-                    if total_weight > 0:
-                        # Get client name for product
-                        client_name = client_names_by_id.get(product["client_id"], "Unknown Client")
-                        
-                        response["performanceData"].append({
-                            "id": product["id"],
-                            "name": product["product_name"] or f"{client_name}'s product",
-                            "type": "product",
-                            "irr": weighted_irr / total_weight,
-                            "fum": total_fum,
-                            "startDate": product["start_date"]
-                        })
-            
-            # Sort by IRR
-            response["performanceData"].sort(
-                key=lambda x: x["irr"],
-                reverse=(sort_order == "highest")
-            )
-            response["performanceData"] = response["performanceData"][:limit]
+            response["companyFUM"] = await db.fetchval("SELECT COALESCE(SUM(amount_invested), 0) FROM portfolio_funds")
+            logger.warning(f"Performance data: No valuations found, using amount_invested fallback: {response['companyFUM']}")
 
-        elif entity_type == "clients":
-            # Get clients with their latest IRR values and total FUM - OPTIMIZED BULK QUERIES
-            clients_result = await db.fetch("SELECT * FROM client_groups")
-            
-            if clients_result:
-                # Extract client IDs for bulk queries
-                client_ids = [dict(client)["id"] for client in clients_result]
-                
-                # Bulk fetch all products for all clients
-                products_result = await db.fetch("""
-                    SELECT * FROM client_products 
-                    WHERE client_id = ANY($1::int[]) AND portfolio_id IS NOT NULL
-                """, client_ids)
-                
-                # Extract portfolio IDs for bulk queries
-                portfolio_ids = [dict(product)["portfolio_id"] for product in products_result]
-                portfolio_ids = list(set(portfolio_ids))  # Remove duplicates
-                
-                # Bulk fetch all portfolio_funds for all portfolios
-                portfolio_funds_result = await db.fetch("""
-                    SELECT id, amount_invested, portfolio_id 
-                    FROM portfolio_funds 
-                    WHERE portfolio_id = ANY($1::int[])
-                """, portfolio_ids) if portfolio_ids else []
-                
-                # Extract portfolio fund IDs for bulk IRR query
-                pf_ids = [dict(pf)["id"] for pf in portfolio_funds_result]
-                
-                # Bulk fetch latest IRR values for all portfolio funds
-                irr_values_result = await db.fetch("""
-                    SELECT DISTINCT ON (fund_id) fund_id, irr_result
-                    FROM portfolio_fund_irr_values 
-                    WHERE fund_id = ANY($1::int[])
-                    ORDER BY fund_id, date DESC
-                """, pf_ids) if pf_ids else []
-                
-                # Create lookup maps for efficient processing
-                products_by_client_id = {}
-                for product_record in products_result:
-                    product = dict(product_record)
-                    client_id = product["client_id"]
-                    if client_id not in products_by_client_id:
-                        products_by_client_id[client_id] = []
-                    products_by_client_id[client_id].append(product)
-                
-                pf_by_portfolio_id = {}
-                for pf_record in portfolio_funds_result:
-                    pf = dict(pf_record)
-                    portfolio_id = pf["portfolio_id"]
-                    if portfolio_id not in pf_by_portfolio_id:
-                        pf_by_portfolio_id[portfolio_id] = []
-                    pf_by_portfolio_id[portfolio_id].append(pf)
-                
-                irr_by_pf_id = {}
-                for irr_record in irr_values_result:
-                    irr = dict(irr_record)
-                    irr_by_pf_id[irr["fund_id"]] = irr["irr_result"]
-                
-                # Process each client with bulk data
-                for client_record in clients_result:
-                    client = dict(client_record)
-                    client_id = client["id"]
-                
-                    total_fum = 0
-                    weighted_irr = 0
-                    total_weight = 0
-                    earliest_start_date = None
-                
-                    # Get products for this client from the bulk data
-                    client_products = [p for p in products_result if dict(p)["client_id"] == client_id]
-                    
-                    for product_record in client_products:
-                        product = dict(product_record)
-                        portfolio_id = product["portfolio_id"]
-                        
-                        if portfolio_id:
-                            # Get portfolio funds for this portfolio
-                            portfolio_funds = pf_by_portfolio_id.get(portfolio_id, [])
-                            
-                            for pf in portfolio_funds:
-                                pf_id = pf["id"]
-                                amount_invested = pf["amount_invested"]
-                                
-                                # Get latest IRR value for this portfolio fund
-                                if pf_id in irr_by_pf_id and amount_invested:
-                                    irr_value = irr_by_pf_id[pf_id]
-                                    total_fum += amount_invested
-                                    weighted_irr += (irr_value * amount_invested)
-                                    total_weight += amount_invested
-                                
-                                if not earliest_start_date or (product["start_date"] and product["start_date"] < earliest_start_date):
-                                    earliest_start_date = product["start_date"]
-                
-                if total_weight > 0:
-                    client_name = client["name"]
-                    response["performanceData"].append({
-                        "id": client["id"],
-                        "name": client_name,
-                        "type": "client",
-                        "irr": weighted_irr / total_weight,
-                        "fum": total_fum,
-                        "startDate": earliest_start_date,
-                        "advisor": client["advisor"]
-                    })
-            
-            # Sort by IRR
-            response["performanceData"].sort(
-                key=lambda x: x["irr"],
-                reverse=(sort_order == "highest")
-            )
-            response["performanceData"] = response["performanceData"][:limit]
+        rows = await db.fetch(_performance_data_query(entity_type, sort_order), limit)
 
-        elif entity_type == "overview":
-            # 🚀 MASSIVELY OPTIMIZED: Get top performers across all entity types
-            # Converts N*M*P*Q queries (potentially thousands) to 5 bulk queries
-            all_performers = []
-            
-            # Step 1: Bulk fetch all entities (4 queries instead of individual loops)
-            funds_result = await db.fetch("SELECT * FROM available_funds")
-            portfolios_result = await db.fetch("SELECT * FROM portfolios")  
-            products_result = await db.fetch("""
-                SELECT cp.*, cg.name as client_name 
-                FROM client_products cp 
-                JOIN client_groups cg ON cp.client_id = cg.id
-                WHERE cp.portfolio_id IS NOT NULL
-            """)
-            clients_result = await db.fetch("SELECT * FROM client_groups")
-            
-            # Step 2: Get all unique portfolio IDs from all entities
-            all_portfolio_ids = set()
-            
-            # Collect portfolio IDs from portfolios directly
-            for portfolio_record in portfolios_result:
-                all_portfolio_ids.add(portfolio_record["id"])
-            
-            # Collect portfolio IDs from products
-            for product_record in products_result:
-                if product_record["portfolio_id"]:
-                    all_portfolio_ids.add(product_record["portfolio_id"])
-            
-            all_portfolio_ids = list(all_portfolio_ids)
-            
-            if not all_portfolio_ids:
-                response["performanceData"] = []
-                return response
-            
-            # Step 3: Bulk fetch all portfolio funds for all portfolios (1 query instead of N)
-            portfolio_funds_result = await db.fetch("""
-                SELECT id, portfolio_id, available_funds_id, amount_invested 
-                FROM portfolio_funds 
-                WHERE portfolio_id = ANY($1::int[]) OR available_funds_id = ANY($2::int[])
-            """, all_portfolio_ids, [fund["id"] for fund in funds_result])
-            
-            # Step 4: Bulk fetch all IRR values for all portfolio funds (1 query instead of N*M)
-            all_pf_ids = [pf["id"] for pf in portfolio_funds_result]
-            if all_pf_ids:
-                # Get latest IRR for each portfolio fund
-                latest_irr_result = await db.fetch("""
-                    SELECT DISTINCT ON (fund_id) fund_id, irr_result
-                    FROM portfolio_fund_irr_values 
-                    WHERE fund_id = ANY($1::int[])
-                    ORDER BY fund_id, date DESC
-                """, all_pf_ids)
-            else:
-                latest_irr_result = []
-            
-            # Step 5: Create efficient lookup maps
-            pf_by_portfolio_id = {}
-            pf_by_fund_id = {}
-            for pf_record in portfolio_funds_result:
-                pf = dict(pf_record)
-                # Map by portfolio_id
-                if pf["portfolio_id"]:
-                    if pf["portfolio_id"] not in pf_by_portfolio_id:
-                        pf_by_portfolio_id[pf["portfolio_id"]] = []
-                    pf_by_portfolio_id[pf["portfolio_id"]].append(pf)
-                # Map by available_funds_id
-                if pf["available_funds_id"]:
-                    if pf["available_funds_id"] not in pf_by_fund_id:
-                        pf_by_fund_id[pf["available_funds_id"]] = []
-                    pf_by_fund_id[pf["available_funds_id"]].append(pf)
-            
-            irr_by_pf_id = {}
-            for irr_record in latest_irr_result:
-                irr = dict(irr_record)
-                irr_by_pf_id[irr["fund_id"]] = irr["irr_result"]
-            
-            # Step 6: Process funds with bulk data
-            for fund_record in funds_result:
-                fund = dict(fund_record)
-                fund_id = fund["id"]
-                
-                total_fum = 0
-                weighted_irr = 0
-                total_weight = 0
-                
-                # Get portfolio funds for this fund
-                portfolio_funds = pf_by_fund_id.get(fund_id, [])
-                
-                for pf in portfolio_funds:
-                    pf_id = pf["id"]
-                    amount_invested = pf["amount_invested"]
-                    
-                    # Get latest IRR value for this portfolio fund
-                    if pf_id in irr_by_pf_id and amount_invested:
-                        irr_value = irr_by_pf_id[pf_id]
-                        total_fum += amount_invested
-                        weighted_irr += (irr_value * amount_invested)
-                        total_weight += amount_invested
-                
-                if total_weight > 0:
-                    all_performers.append({
-                        "id": fund["id"],
-                        "name": fund["fund_name"],
-                        "type": "fund",
-                        "irr": weighted_irr / total_weight,
-                        "fum": total_fum,
-                        "startDate": None
-                    })
-            
-            # Step 7: Process portfolios with bulk data
-            for portfolio_record in portfolios_result:
-                portfolio = dict(portfolio_record)
-                portfolio_id = portfolio["id"]
-                
-                total_fum = 0
-                weighted_irr = 0
-                total_weight = 0
-                
-                # Get portfolio funds for this portfolio
-                portfolio_funds = pf_by_portfolio_id.get(portfolio_id, [])
-                
-                for pf in portfolio_funds:
-                    pf_id = pf["id"]
-                    amount_invested = pf["amount_invested"]
-                    
-                    # Get latest IRR value for this portfolio fund
-                    if pf_id in irr_by_pf_id and amount_invested:
-                        irr_value = irr_by_pf_id[pf_id]
-                        total_fum += amount_invested
-                        weighted_irr += (irr_value * amount_invested)
-                        total_weight += amount_invested
-                
-                if total_weight > 0:
-                    all_performers.append({
-                        "id": portfolio["id"],
-                        "name": portfolio["portfolio_name"],
-                        "type": "portfolio",
-                        "irr": weighted_irr / total_weight,
-                        "fum": total_fum,
-                        "startDate": portfolio["start_date"]
-                    })
-            
-            # Step 8: Process products with bulk data (includes client names from JOIN)
-            for product_record in products_result:
-                product = dict(product_record)
-                portfolio_id = product["portfolio_id"]
-                
-                if portfolio_id:
-                    total_fum = 0
-                    weighted_irr = 0
-                    total_weight = 0
-                    
-                    # Get portfolio funds for this portfolio
-                    portfolio_funds = pf_by_portfolio_id.get(portfolio_id, [])
-                    
-                    for pf in portfolio_funds:
-                        pf_id = pf["id"]
-                        amount_invested = pf["amount_invested"]
-                        
-                        # Get latest IRR value for this portfolio fund
-                        if pf_id in irr_by_pf_id and amount_invested:
-                            irr_value = irr_by_pf_id[pf_id]
-                            total_fum += amount_invested
-                            weighted_irr += (irr_value * amount_invested)
-                            total_weight += amount_invested
-                
-                    if total_weight > 0:
-                        client_name = product.get("client_name", "Unknown Client")
-                        
-                        all_performers.append({
-                            "id": product["id"],
-                            "name": product["product_name"] or f"{client_name}'s product",
-                            "type": "product",
-                            "irr": weighted_irr / total_weight,
-                            "fum": total_fum,
-                            "startDate": product["start_date"]
-                        })
-            
-            # Step 9: Process clients with bulk data
-            for client_record in clients_result:
-                client = dict(client_record)
-                client_id = client["id"]
-                
-                total_fum = 0
-                weighted_irr = 0
-                total_weight = 0
-                earliest_start_date = None
-                
-                # Get products for this client from the bulk data
-                client_products = [p for p in products_result if dict(p)["client_id"] == client_id]
-                
-                for product_record in client_products:
-                    product = dict(product_record)
-                    portfolio_id = product["portfolio_id"]
-                    
-                    if portfolio_id:
-                        # Get portfolio funds for this portfolio
-                        portfolio_funds = pf_by_portfolio_id.get(portfolio_id, [])
-                        
-                        for pf in portfolio_funds:
-                            pf_id = pf["id"]
-                            amount_invested = pf["amount_invested"]
-                            
-                            # Get latest IRR value for this portfolio fund
-                            if pf_id in irr_by_pf_id and amount_invested:
-                                irr_value = irr_by_pf_id[pf_id]
-                                total_fum += amount_invested
-                                weighted_irr += (irr_value * amount_invested)
-                                total_weight += amount_invested
-                                
-                                if not earliest_start_date or (product["start_date"] and product["start_date"] < earliest_start_date):
-                                    earliest_start_date = product["start_date"]
-                
-                if total_weight > 0:
-                    all_performers.append({
-                        "id": client["id"],
-                        "name": client["name"],
-                        "type": "client",
-                        "irr": weighted_irr / total_weight,
-                        "fum": total_fum,
-                        "startDate": earliest_start_date,
-                        "advisor": client["advisor"]
-                    })
-            
-            # Sort all performers by IRR
-            all_performers.sort(
-                key=lambda x: x["irr"],
-                reverse=(sort_order == "highest")
-            )
-            response["performanceData"] = all_performers[:limit]
+        for row in rows:
+            entry = {
+                "id": row["id"],
+                "name": row["name"],
+                "type": row["type"],
+                "irr": row["irr"],
+                "fum": row["fum"],
+                "startDate": row["start_date"]
+            }
+            if row["type"] == "client":
+                entry["advisor"] = row["advisor"]
+            response["performanceData"].append(entry)
 
         return response
         
@@ -973,7 +503,7 @@ async def get_performance_data(
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @router.get("/analytics/product_client_counts")
-async def get_product_client_counts(db = Depends(get_db)):
+async def get_product_client_counts(db = Depends(get_read_db)):
     """
     Counts the number of clients by relationship type and product type.
     Returns a matrix of relationship types vs product types with counts.
@@ -987,63 +517,72 @@ async def get_product_client_counts(db = Depends(get_db)):
             {"relationship": "Parent", "counts": {"Product A": 1, "Product B": 4}}
         ]
     }
+
+    The matrix comes from a single GROUP BY over a full join of clients and products, so
+    relationships without products and product types without related clients still appear
+    with zero counts. The result is cached until a client or product write changes the
+    data version (see app/utils/data_versions.py), or for at most cache_duration seconds.
+    Results read from the replica right after such a write are not cached (safe_to_cache).
     """
+    global _product_client_counts_cache
     try:
-        # Get all product types from client_products
-        products_result = await db.fetch("SELECT DISTINCT product_type FROM client_products WHERE product_type IS NOT NULL")
-        
-        if not products_result:
-            return {
+        version = get_data_version(CLIENTS, PRODUCTS)
+        cacheable = safe_to_cache(CLIENTS, PRODUCTS)
+        current_time = time.time()
+        if (_product_client_counts_cache['value'] is not None and
+            _product_client_counts_cache['version'] == version and
+            (current_time - _product_client_counts_cache['timestamp']) < _product_client_counts_cache['cache_duration']):
+            return _product_client_counts_cache['value']
+
+        rows = await db.fetch("""
+            WITH clients AS (
+                SELECT id, relationship FROM client_groups WHERE relationship IS NOT NULL
+            ),
+            products AS (
+                SELECT client_id, product_type FROM client_products WHERE product_type IS NOT NULL
+            )
+            SELECT c.relationship, p.product_type,
+                   COUNT(*) FILTER (WHERE c.id IS NOT NULL AND p.client_id IS NOT NULL) AS product_count
+            FROM clients c
+            FULL JOIN products p ON p.client_id = c.id
+            GROUP BY c.relationship, p.product_type
+        """)
+
+        relationships = sorted({row["relationship"] for row in rows if row["relationship"] is not None})
+        product_types = sorted({row["product_type"] for row in rows if row["product_type"] is not None})
+
+        if not relationships or not product_types:
+            result = {
                 "relationships": [],
                 "products": [],
                 "data": []
             }
-        
-        # Extract unique product types
-        product_types = [dict(product)["product_type"] for product in products_result]
-        
-        # Get all clients and their relationship types
-        clients_result = await db.fetch("SELECT id, relationship FROM client_groups WHERE relationship IS NOT NULL")
-        
-        if not clients_result:
-            return {
-                "relationships": [],
-                "products": [],
-                "data": []
+        else:
+            counts_by_relationship = {relationship: dict.fromkeys(product_types, 0) for relationship in relationships}
+            for row in rows:
+                if row["relationship"] is not None and row["product_type"] is not None:
+                    counts_by_relationship[row["relationship"]][row["product_type"]] = row["product_count"]
+
+            result = {
+                "relationships": relationships,
+                "products": product_types,
+                "data": [
+                    {"relationship": relationship, "counts": counts}
+                    for relationship, counts in counts_by_relationship.items()
+                ]
             }
-        
-        # Get all client-product associations
-        client_products_result = await db.fetch("SELECT client_id, product_type FROM client_products WHERE product_type IS NOT NULL")
-        
-        # Build the response
-        relationships = list(set(dict(client)["relationship"] for client in clients_result))
-        
-        data = []
-        for relationship in relationships:
-            counts = {product_type: 0 for product_type in product_types}
-            for client_record in clients_result:
-                client = dict(client_record)
-                if client["relationship"] == relationship:
-                    for cp_record in client_products_result:
-                        cp = dict(cp_record)
-                        if cp["client_id"] == client["id"] and cp["product_type"] in product_types:
-                            counts[cp["product_type"]] += 1
-            data.append({
-                "relationship": relationship,
-                "counts": counts
-            })
-        
-        return {
-            "relationships": relationships,
-            "products": product_types,
-            "data": data
-        }
+
+        if cacheable:
+            _product_client_counts_cache['value'] = result
+            _product_client_counts_cache['version'] = version
+            _product_client_counts_cache['timestamp'] = current_time
+        return result
     except Exception as e:
         logger.error(f"Error calculating product client counts: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @router.get("/analytics/portfolio/{portfolio_id}/performance")
-async def get_portfolio_performance(portfolio_id: int, db = Depends(get_db)):
+async def get_portfolio_performance(portfolio_id: int, db = Depends(get_read_db)):
     """
     Get performance metrics for a portfolio including IRR and other key metrics.
     """
@@ -1074,7 +613,7 @@ async def get_portfolio_performance(portfolio_id: int, db = Depends(get_db)):
         investment_by_fund_id = {}
         for inv_record in investment_result:
             inv = dict(inv_record)
-            investment_by_fund_id[inv["portfolio_fund_id"]] = float(inv["total_investment"] or 0)
+            investment_by_fund_id[inv["portfolio_fund_id"]] = inv["total_investment"] or 0.0
             
         total_investment = 0.0
         current_value = 0.0
@@ -1088,7 +627,7 @@ async def get_portfolio_performance(portfolio_id: int, db = Depends(get_db)):
             investment = investment_by_fund_id.get(fund_id, 0.0)
             
             # Get current value from the fund record
-            fund_current_value = float(fund.get("market_value") or 0.0)
+            fund_current_value = fund.get("market_value") or 0.0
             
             total_investment += investment
             current_value += fund_current_value
@@ -1176,6 +715,7 @@ async def calculate_company_irr(db):
         irr_result = await calculate_multiple_portfolio_funds_irr(
             portfolio_fund_ids=all_portfolio_fund_ids,
             irr_date=None,  # Use latest valuation date
+            store_result=False,  # Display-only; may run on the read replica
             db=db
         )
         
@@ -1200,12 +740,12 @@ async def calculate_company_irr(db):
             # Get total current valuations
             latest_valuations_response = await db.fetch("SELECT valuation FROM latest_portfolio_fund_valuations")
             
-            total_current_value = sum(float(dict(v)['valuation'] or 0) for v in latest_valuations_response)
+            total_current_value = sum(v['valuation'] or 0.0 for v in latest_valuations_response)
             
             # Get total amount invested
             portfolio_funds_response = await db.fetch("SELECT amount_invested FROM portfolio_funds WHERE status = 'active'")
             
-            total_invested = sum(float(dict(pf)['amount_invested'] or 0) for pf in portfolio_funds_response)
+            total_invested = sum(pf['amount_invested'] or 0.0 for pf in portfolio_funds_response)
             
             if total_invested > 0:
                 # Simple ROI calculation as fallback
@@ -1226,7 +766,7 @@ async def calculate_company_irr(db):
             return 0.0
 
 @router.get("/analytics/company/irr")
-async def get_company_irr_endpoint(db = Depends(get_db)):
+async def get_company_irr_endpoint(db = Depends(get_read_db)):
     """
     Calculate the company-wide IRR based on all portfolio funds across all active portfolios.
     This endpoint wraps the optimized calculate_company_irr function.
@@ -1425,141 +965,20 @@ async def calculate_product_irr(product_id: int, db = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Error calculating product IRR: {str(e)}")
 
 @router.get("/analytics/client_risks")
-async def get_client_risks(db = Depends(get_db)):
+async def get_client_risks(db = Depends(get_read_db)):
     """
     Calculate and return the weighted average risk for each client based on their investments.
     The risk is calculated as:
     1. Portfolio level: Weighted average of fund risks based on amount_invested
     2. product level: Weighted average of portfolio risks based on total investment
     3. Client level: Weighted average of product risks based on total investment
+
+    Computed by the shared risk engine (app/services/risk_engine.py) from a cached
+    snapshot that is reloaded when client, product, fund or valuation data changes.
     """
     try:
-        # MASSIVE OPTIMIZATION: Convert N*M*P*Q queries to 4 bulk queries
-        
-        # Step 1: Get all active clients
-        clients_result = await db.fetch("SELECT * FROM client_groups WHERE status = 'active'")
-        
-        if not clients_result:
-            return []
-        
-        # Step 2: Bulk fetch all client products for all clients
-        client_ids = [dict(client)["id"] for client in clients_result]
-        products_result = await db.fetch("""
-            SELECT * FROM client_products 
-            WHERE client_id = ANY($1::int[]) AND status = 'active' AND portfolio_id IS NOT NULL
-        """, client_ids)
-        
-        # Step 3: Bulk fetch all portfolio funds for all portfolios
-        portfolio_ids = [dict(product)["portfolio_id"] for product in products_result]
-        portfolio_ids = list(set(portfolio_ids))  # Remove duplicates
-        
-        portfolio_funds_result = await db.fetch("""
-            SELECT available_funds_id, amount_invested, portfolio_id
-            FROM portfolio_funds 
-            WHERE portfolio_id = ANY($1::int[])
-        """, portfolio_ids) if portfolio_ids else []
-        
-        # Step 4: Bulk fetch all fund risk factors
-        fund_ids = [dict(pf)["available_funds_id"] for pf in portfolio_funds_result]
-        fund_ids = list(set(fund_ids))  # Remove duplicates
-        
-        funds_result = await db.fetch("""
-            SELECT id, risk_factor FROM available_funds 
-            WHERE id = ANY($1::int[]) AND risk_factor IS NOT NULL
-        """, fund_ids) if fund_ids else []
-        
-        # Step 5: Create efficient lookup maps
-        products_by_client_id = {}
-        for product_record in products_result:
-            product = dict(product_record)
-            client_id = product["client_id"]
-            if client_id not in products_by_client_id:
-                products_by_client_id[client_id] = []
-            products_by_client_id[client_id].append(product)
-        
-        pf_by_portfolio_id = {}
-        for pf_record in portfolio_funds_result:
-            pf = dict(pf_record)
-            portfolio_id = pf["portfolio_id"]
-            if portfolio_id not in pf_by_portfolio_id:
-                pf_by_portfolio_id[portfolio_id] = []
-            pf_by_portfolio_id[portfolio_id].append(pf)
-        
-        risk_by_fund_id = {}
-        for fund_record in funds_result:
-            fund = dict(fund_record)
-            risk_by_fund_id[fund["id"]] = fund["risk_factor"]
-        
-        # Step 6: Process each client with bulk data
-        client_risks = []
-        
-        for client_record in clients_result:
-            try:
-                client = dict(client_record)
-                client_id = client["id"]
-                
-                # Get products for this client
-                products = products_by_client_id.get(client_id, [])
-                
-                if not products:
-                    continue
-                
-                total_client_investment = 0
-                weighted_risk_sum = 0
-                
-                for product in products:
-                    portfolio_id = product["portfolio_id"]
-                    
-                    if not portfolio_id:
-                        continue
-                    
-                    product_investment = 0
-                    product_risk_sum = 0
-                    
-                    # Get portfolio funds for this portfolio
-                    portfolio_funds = pf_by_portfolio_id.get(portfolio_id, [])
-                    
-                    portfolio_investment = 0
-                    portfolio_risk_sum = 0
-                    
-                    for pf in portfolio_funds:
-                        fund_id = pf["available_funds_id"]
-                        amount_invested = pf["amount_invested"] or 0
-                        
-                        # Get risk factor from lookup
-                        risk_factor = risk_by_fund_id.get(fund_id)
-                        
-                        if risk_factor is None:
-                            continue
-                        
-                        portfolio_investment += amount_invested
-                        portfolio_risk_sum += risk_factor * amount_invested
-                    
-                    if portfolio_investment > 0:
-                        portfolio_risk = portfolio_risk_sum / portfolio_investment
-                        product_investment += portfolio_investment
-                        product_risk_sum += portfolio_risk * portfolio_investment
-                
-                    if product_investment > 0:
-                        product_risk = product_risk_sum / product_investment
-                        total_client_investment += product_investment
-                        weighted_risk_sum += product_risk * product_investment
-                
-                if total_client_investment > 0:
-                    client_risk = weighted_risk_sum / total_client_investment
-                    client_name = client["name"]
-                    client_risks.append({
-                        "client_id": client["id"],
-                        "client_name": client_name,
-                        "risk_score": round(client_risk, 2),
-                        "total_investment": total_client_investment
-                    })
-            
-            except Exception as e:
-                logger.error(f"Error processing client {client['id']}: {str(e)}")
-                continue
-        
-        return client_risks
+        snapshot = await get_risk_snapshot(db)
+        return snapshot.client_risks()
         
     except Exception as e:
         logger.error(f"Error calculating client risks: {str(e)}")
@@ -1649,7 +1068,7 @@ async def get_portfolio_irr(portfolio_id: int, db = Depends(get_db)):
 @router.get("/analytics/portfolio_template_distribution")
 async def get_portfolio_template_distribution(
     limit: int = Query(100000, ge=1, le=100000, description="Maximum number of portfolio templates to return"),
-    db = Depends(get_db)
+    db = Depends(get_read_db)
 ):
     """
     What it does: Returns the distribution of portfolio templates based on the total current market value (FUM) they manage.
@@ -1815,7 +1234,7 @@ async def get_dashboard_all_data(
     fund_limit: int = Query(100000, ge=1, le=100000, description="Maximum number of funds to return"),
     provider_limit: int = Query(100000, ge=1, le=100000, description="Maximum number of providers to return"),
     template_limit: int = Query(100000, ge=1, le=100000, description="Maximum number of templates to return"),
-    db = Depends(get_db)
+    db = Depends(get_read_db)
 ):
     """
     OPTIMIZED: Get ALL dashboard data in a single request with bulk queries.
@@ -2047,156 +1466,20 @@ async def get_dashboard_all_data(
 @router.get("/analytics/risk_differences")
 async def get_products_risk_differences(
     limit: int = Query(100000, ge=1, le=100000, description="Number of products to return"),
-    db = Depends(get_db)
+    db = Depends(get_read_db)
 ):
     """
     Get products with the biggest difference between target risk and actual risk.
     
     Target risk: weighted average risk of portfolio_funds against their target_weighting
     Actual risk: weighted average risk of portfolio_funds against their latest valuations
+
+    Computed by the shared risk engine (app/services/risk_engine.py); the sorted list is
+    cached with its snapshot, so only the limit is applied per request.
     """
     try:
-        # MASSIVE OPTIMIZATION: Convert N*M*P*Q queries to 5 bulk queries
-        
-        # Step 1: Get all active client products with portfolios and client names
-        products_with_clients_result = await db.fetch("""
-            SELECT cp.id, cp.product_name, cp.client_id, cp.portfolio_id, cg.name as client_name
-            FROM client_products cp
-            JOIN client_groups cg ON cp.client_id = cg.id
-            WHERE cp.status = 'active' AND cp.portfolio_id IS NOT NULL
-        """)
-        
-        if not products_with_clients_result:
-            return []
-        
-        # Step 2: Bulk fetch all portfolio funds for all products
-        portfolio_ids = [dict(product)["portfolio_id"] for product in products_with_clients_result]
-        portfolio_funds_result = await db.fetch("""
-            SELECT id, available_funds_id, target_weighting, amount_invested, portfolio_id
-            FROM portfolio_funds 
-            WHERE portfolio_id = ANY($1::int[]) AND status = 'active'
-        """, portfolio_ids)
-        
-        # Step 3: Bulk fetch all fund risk factors and names
-        fund_ids = [dict(pf)["available_funds_id"] for pf in portfolio_funds_result]
-        fund_ids = list(set(fund_ids))  # Remove duplicates
-        
-        funds_result = await db.fetch("""
-            SELECT id, risk_factor, fund_name 
-            FROM available_funds 
-            WHERE id = ANY($1::int[]) AND risk_factor IS NOT NULL
-        """, fund_ids) if fund_ids else []
-        
-        # Step 4: Bulk fetch latest valuations for all portfolio funds
-        pf_ids = [dict(pf)["id"] for pf in portfolio_funds_result]
-        valuations_result = await db.fetch("""
-            SELECT DISTINCT ON (portfolio_fund_id) portfolio_fund_id, valuation
-            FROM portfolio_fund_valuations 
-            WHERE portfolio_fund_id = ANY($1::int[])
-            ORDER BY portfolio_fund_id, valuation_date DESC
-        """, pf_ids) if pf_ids else []
-        
-        # Step 5: Create efficient lookup maps
-        pf_by_portfolio_id = {}
-        for pf_record in portfolio_funds_result:
-            pf = dict(pf_record)
-            portfolio_id = pf["portfolio_id"]
-            if portfolio_id not in pf_by_portfolio_id:
-                pf_by_portfolio_id[portfolio_id] = []
-            pf_by_portfolio_id[portfolio_id].append(pf)
-        
-        funds_by_id = {}
-        for fund_record in funds_result:
-            fund = dict(fund_record)
-            funds_by_id[fund["id"]] = fund
-        
-        valuations_by_pf_id = {}
-        for val_record in valuations_result:
-            val = dict(val_record)
-            valuations_by_pf_id[val["portfolio_fund_id"]] = val["valuation"]
-        
-        # Step 6: Process each product with bulk data
-        risk_differences = []
-        
-        for product_record in products_with_clients_result:
-            product = dict(product_record)
-            product_id = product["id"]
-            portfolio_id = product["portfolio_id"]
-            
-            # Get portfolio funds for this product
-            portfolio_funds = pf_by_portfolio_id.get(portfolio_id, [])
-            
-            if not portfolio_funds:
-                continue
-            
-            # Build fund data with bulk lookup
-            fund_data = {}
-            for pf in portfolio_funds:
-                fund_id = pf["available_funds_id"]
-                pf_id = pf["id"]
-                
-                # Get fund info from lookup
-                if fund_id not in funds_by_id:
-                    continue
-                
-                fund_info = funds_by_id[fund_id]
-                
-                fund_data[pf_id] = {
-                    "risk_factor": fund_info["risk_factor"],
-                    "fund_name": fund_info["fund_name"],
-                    "target_weighting": float(pf["target_weighting"] or 0),
-                    "amount_invested": float(pf["amount_invested"] or 0),
-                    "latest_valuation": float(valuations_by_pf_id.get(pf_id, 0)) if pf_id in valuations_by_pf_id else None
-                }
-            
-            if not fund_data:
-                continue
-            
-            # Calculate target risk (weighted by target_weighting)
-            target_risk = None
-            total_target_weight = sum(fund["target_weighting"] for fund in fund_data.values())
-            
-            if total_target_weight > 0:
-                weighted_target_risk = sum(
-                    fund["risk_factor"] * fund["target_weighting"] 
-                    for fund in fund_data.values()
-                )
-                target_risk = weighted_target_risk / total_target_weight
-            
-            # Calculate actual risk (weighted by latest valuations)
-            actual_risk = None
-            funds_with_valuations = {k: v for k, v in fund_data.items() if v["latest_valuation"] is not None}
-            total_valuation = sum(fund["latest_valuation"] for fund in funds_with_valuations.values())
-            
-            if total_valuation > 0 and funds_with_valuations:
-                weighted_actual_risk = sum(
-                    fund["risk_factor"] * fund["latest_valuation"] 
-                    for fund in funds_with_valuations.values()
-                )
-                actual_risk = weighted_actual_risk / total_valuation
-            
-            # Calculate risk difference
-            if target_risk is not None and actual_risk is not None:
-                risk_difference = abs(actual_risk - target_risk)
-                
-                # Get client name from bulk query
-                client_name = product.get("client_name", "Unknown")
-                
-                risk_differences.append({
-                    "product_id": product_id,
-                    "product_name": product["product_name"],
-                    "client_name": client_name,
-                    "target_risk": round(target_risk, 2),
-                    "actual_risk": round(actual_risk, 2),
-                    "risk_difference": round(risk_difference, 2),
-                    "fund_count": len(fund_data),
-                    "funds_with_valuations": len(funds_with_valuations)
-                })
-        
-        # Sort by risk difference (descending) and limit results
-        risk_differences.sort(key=lambda x: x["risk_difference"], reverse=True)
-        
-        return risk_differences[:limit]
+        snapshot = await get_risk_snapshot(db)
+        return snapshot.risk_differences()[:limit]
         
     except Exception as e:
         logger.error(f"Error calculating risk differences: {str(e)}")
@@ -2233,7 +1516,7 @@ async def get_ultra_fast_dashboard(
     fund_limit: int = Query(100000, ge=1, le=100000),
     provider_limit: int = Query(100000, ge=1, le=100000), 
     template_limit: int = Query(100000, ge=1, le=100000),
-    db = Depends(get_db)
+    db = Depends(get_read_db)
 ):
     """
     ULTRA-FAST Analytics Dashboard: Uses pre-computed views instead of real-time IRR calculations.
@@ -2296,7 +1579,7 @@ async def get_ultra_fast_dashboard(
         if funds_result and total_fum > 0:
             for fund_record in funds_result:
                 fund = dict(fund_record)
-                amount = float(fund["amount"] or 0)
+                amount = fund["amount"] or 0.0
                 funds.append({
                     "id": fund["id"],
                     "name": fund["name"],
@@ -2308,7 +1591,7 @@ async def get_ultra_fast_dashboard(
         if providers_result and total_fum > 0:
             for provider_record in providers_result:
                 provider = dict(provider_record)
-                amount = float(provider["amount"] or 0)
+                amount = provider["amount"] or 0.0
                 providers.append({
                     "id": provider["id"],
                     "name": provider["name"],
@@ -2327,22 +1610,11 @@ async def get_ultra_fast_dashboard(
                     "percentage": 0
                 })
         
-        # 5. Get revenue data (using existing company_revenue_analytics view)
+        # 5. Get revenue data (shared RevenueSnapshot, same figures as /revenue/company)
         try:
-            revenue_result = await db.fetch("SELECT * FROM company_revenue_analytics")
-            if revenue_result:
-                revenue_data = dict(revenue_result[0])
-                logger.info(f"✅ Revenue data loaded: £{revenue_data.get('total_annual_revenue', 0):,.2f}")
-            else:
-                logger.warning("⚠️ No revenue data found in company_revenue_analytics view")
-                # Fallback: provide basic revenue structure
-                revenue_data = {
-                    "total_annual_revenue": 0,
-                    "active_products": 0,
-                    "revenue_generating_products": 0,
-                    "avg_revenue_per_product": 0,
-                    "active_providers": 0
-                }
+            revenue_snapshot = await load_revenue_snapshot(db, "cp.status = 'active'")
+            revenue_data = revenue_snapshot.company_totals()
+            logger.info(f"✅ Revenue data loaded: £{revenue_data['total_annual_revenue']:,.2f}")
         except Exception as revenue_error:
             logger.warning(f"⚠️ Revenue data not available: {revenue_error}")
             # Fallback: provide basic revenue structure
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, HTTPException, Depends, Response, Cookie, Request, Header
+from app.api.route_classes import CRUDRoute
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from datetime import datetime, timedelta
 from typing import Optional, List
@@ -20,7 +21,7 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Create API router and security scheme
-router = APIRouter()
+router = APIRouter(route_class=CRUDRoute)
 security = HTTPBearer()
 
 @router.post("/auth/signup")
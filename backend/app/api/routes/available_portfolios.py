@@ -1,4 +1,5 @@
 from fastapi import APIRouter, HTTPException, Depends, Request
+from app.api.route_classes import CRUDRoute
 from typing import List, Optional, Dict, Any, Union
 from datetime import date, datetime
 from app.db.database import get_db
@@ -94,7 +95,7 @@ class PortfolioTemplateUpdate(BaseModel):
     name: Optional[str] = None
     created_at: Optional[datetime] = None
 
-router = APIRouter(prefix="/available_portfolios")
+router = APIRouter(prefix="/available_portfolios", route_class=CRUDRoute)
 
 @router.get("", response_model=List[AvailablePortfolio])
 async def get_available_portfolios(db = Depends(get_db)):
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, HTTPException, Depends, Query
+from app.api.route_classes import CRUDRoute
 from typing import List, Optional
 import logging
 
@@ -9,7 +10,7 @@ from app.db.database import get_db
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-router = APIRouter()
+router = APIRouter(route_class=CRUDRoute)
 
 # Define a constant for all available colors at the top of the file after imports
 DEFAULT_COLORS = [
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, Path, status, Response
+from app.api.route_classes import CRUDRoute
 from typing import List, Dict, Any
 from pydantic import BaseModel
 import logging
@@ -9,7 +10,7 @@ class ClientGroupProductOwnerCreate(BaseModel):
     client_group_id: int
     product_owner_id: int
 
-router = APIRouter()
+router = APIRouter(route_class=CRUDRoute)
 logger = logging.getLogger(__name__)
 
 @router.get("/client_group_product_owners", response_model=List[Dict[str, Any]])
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, HTTPException, Depends, Query
+from app.api.route_classes import CRUDRoute
 from typing import List, Optional
 import logging
 from datetime import datetime
@@ -19,7 +20,7 @@ from app.utils.product_owner_utils import get_product_owner_display_name
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-router = APIRouter()
+router = APIRouter(route_class=CRUDRoute)
 
 def safe_float(value, default=None):
     """
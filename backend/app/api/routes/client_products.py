@@ -1,18 +1,193 @@
-from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from app.api.route_classes import CRUDRoute
 from typing import List, Optional
 import logging
 from datetime import date, datetime
 
-from app.models.client_product import Clientproduct, ClientproductCreate, ClientproductUpdate, ProductRevenueCalculation
+from app.models.client_product import (
+    Clientproduct, ClientproductCreate, ClientproductUpdate, ProductRevenueCalculation,
+    ProductRevenueBatchRequest, ProductRevenueBatchResponse, ProductRevenueTotals
+)
 from app.db.database import get_db
+from app.api.streaming import get_db_unless_streaming, stream_param, stream_query
+from app.api.pagination import decode_cursor, keyset_condition, set_next_cursor
 from app.api.routes.portfolio_funds import calculate_excel_style_irr, calculate_multiple_portfolio_funds_irr
 from app.utils.product_owner_utils import get_product_owner_display_name
+from app.services.revenue_service import load_product_revenue
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-router = APIRouter()
+router = APIRouter(route_class=CRUDRoute)
+
+FEE_FIELDS = ('fixed_fee_direct', 'fixed_fee_facilitated', 'percentage_fee_facilitated')
+
+def _fee_text(value: Optional[float]) -> Optional[str]:
+    """Fee columns are text; bind the fee from the request model as its string form."""
+    return str(value) if value is not None else None
+
+async def _enhance_products_with_owners(db, products: List[dict]) -> List[dict]:
+    """
+    Adds portfolio IRR, IRR date and product owner data to rows from products_list_view.
+    Used for both the list response and each chunk of the streamed response.
+    """
+    # Extract product IDs and portfolio IDs for additional data
+    product_ids = [p.get("id") for p in products]  # Fix: Database view returns 'id', not 'product_id'
+    portfolio_ids = [p.get("portfolio_id") for p in products if p.get("portfolio_id") is not None]
+
+    # Get IRR data for portfolios
+    portfolio_irr_map = {}
+    irr_dates_map = {}
+    if portfolio_ids:
+        try:
+            # Get latest portfolio IRR for all portfolios
+            portfolio_irr_result = await db.fetch("SELECT portfolio_id, irr_result FROM latest_portfolio_irr_values WHERE portfolio_id = ANY($1::int[])", portfolio_ids)
+            portfolio_irr_map = {item.get("portfolio_id"): item.get("irr_result") for item in [dict(record) for record in portfolio_irr_result] if portfolio_irr_result}
+
+            # Get IRR dates efficiently
+            all_portfolio_funds_result = await db.fetch("SELECT id, portfolio_id FROM portfolio_funds WHERE portfolio_id = ANY($1::int[])", portfolio_ids)
+
+            if all_portfolio_funds_result:
+                portfolio_to_funds = {}
+                all_fund_ids = []
+                for pf_record in all_portfolio_funds_result:
+                    pf = dict(pf_record)
+                    portfolio_id = pf.get("portfolio_id")
+                    fund_id = pf.get("id")
+                    if portfolio_id not in portfolio_to_funds:
+                        portfolio_to_funds[portfolio_id] = []
+                    portfolio_to_funds[portfolio_id].append(fund_id)
+                    all_fund_ids.append(fund_id)
+
+                if all_fund_ids:
+                    irr_dates_result = await db.fetch("SELECT fund_id, date FROM latest_portfolio_fund_irr_values WHERE fund_id = ANY($1::int[])", all_fund_ids)
+                    if irr_dates_result:
+                        fund_to_irr_date = {dict(item).get("fund_id"): dict(item).get("date") for item in irr_dates_result if dict(item).get("date")}
+
+                        for portfolio_id, fund_ids in portfolio_to_funds.items():
+                            portfolio_irr_dates = [fund_to_irr_date.get(fund_id) for fund_id in fund_ids if fund_to_irr_date.get(fund_id)]
+                            if portfolio_irr_dates:
+                                portfolio_irr_dates.sort(reverse=True)
+                                irr_dates_map[portfolio_id] = portfolio_irr_dates[0]
+
+        except Exception as e:
+            logger.warning(f"Error fetching IRR data: {str(e)}")
+
+    # Get product owners efficiently
+    product_owner_associations = {}
+    product_owners_map = {}
+
+    try:
+        # Get all product_owner_products associations
+        pop_result = await db.fetch("SELECT * FROM product_owner_products WHERE product_id = ANY($1::int[])", product_ids)
+        if pop_result:
+            for assoc_record in pop_result:
+                assoc = dict(assoc_record)
+                product_id = assoc.get("product_id")
+                if product_id not in product_owner_associations:
+                    product_owner_associations[product_id] = []
+                product_owner_associations[product_id].append(assoc.get("product_owner_id"))
+
+        # Get all product owner details
+        product_owner_ids = []
+        for owners in product_owner_associations.values():
+            product_owner_ids.extend(owners)
+
+        if product_owner_ids:
+            owners_result = await db.fetch("SELECT id, firstname, surname, known_as, status, created_at FROM product_owners WHERE id = ANY($1::int[])", list(set(product_owner_ids)))
+            if owners_result:
+                product_owners_map = {dict(owner).get("id"): dict(owner) for owner in owners_result}
+
+    except Exception as e:
+        logger.error(f"Error fetching product owners: {str(e)}")
+
+    # Enhance the response data
+    enhanced_products = []
+
+    for product in products:
+        # Fix: The database view returns 'id', not 'product_id'
+        product_id = product.get("id")  # Changed from "product_id" to "id"
+        portfolio_id = product.get("portfolio_id")
+
+        # Map the view fields to the expected frontend format
+        enhanced_product = {
+            "id": product_id,
+            "client_id": product.get("client_id"),
+            "client_name": product.get("client_name"),
+            "product_name": product.get("product_name"),
+            "status": product.get("status"),
+            "start_date": product.get("start_date"),
+            "end_date": product.get("end_date"),
+            "provider_id": product.get("provider_id"),
+            "provider_name": product.get("provider_name"),
+            "provider_theme_color": product.get("provider_color"),  # Fixed: database view uses 'provider_color'
+            "theme_color": product.get("provider_color"),  # Add for StandardTable compatibility
+            "product_type": product.get("product_type"),
+            "plan_number": product.get("plan_number"),
+            "portfolio_id": portfolio_id,
+            "portfolio_name": product.get("portfolio_name"),
+            "total_value": product.get("total_value", 0),
+            "template_generation_id": product.get("effective_template_generation_id"),
+            "portfolio_type_display": product.get("portfolio_type_display"),
+            "template_info": {
+                "id": product.get("effective_template_generation_id"),
+                "generation_name": product.get("generation_name"),
+                "name": product.get("template_name"),
+                "description": product.get("template_description")
+            } if product.get("effective_template_generation_id") else None,
+            "generation_name": product.get("generation_name"),
+            "weighted_risk": product.get("template_weighted_risk"),
+        }
+
+        # Add IRR data
+        if portfolio_id and portfolio_id in portfolio_irr_map:
+            enhanced_product["irr"] = portfolio_irr_map[portfolio_id]
+        else:
+            enhanced_product["irr"] = "-"
+
+        if portfolio_id and portfolio_id in irr_dates_map:
+            enhanced_product["irr_date"] = irr_dates_map[portfolio_id]
+        else:
+            enhanced_product["irr_date"] = None
+
+        # Add product owners
+        product_owners = []
+        product_owner_names = []  # Collect all owner names for report compatibility
+        if product_id in product_owner_associations:
+            owner_ids = product_owner_associations[product_id]
+            for owner_id in owner_ids:
+                if owner_id in product_owners_map:
+                    owner = product_owners_map[owner_id]
+                    # Create display name from firstname and surname, falling back to known_as
+                    display_name = f"{owner.get('firstname', '')} {owner.get('surname', '')}".strip()
+                    if not display_name and owner.get('known_as'):
+                        display_name = owner['known_as']
+
+                    enhanced_owner = {
+                        **owner,
+                        "name": display_name  # Add computed name field for frontend compatibility
+                    }
+                    product_owners.append(enhanced_owner)
+
+                    # Use consistent product owner display logic
+                    owner_name = get_product_owner_display_name(owner)
+
+                    product_owner_names.append(owner_name)
+
+        # Set product_owner_name based on number of owners
+        if len(product_owner_names) > 1:
+            product_owner_name = ", ".join(product_owner_names)  # Multiple owners comma-separated
+        elif len(product_owner_names) == 1:
+            product_owner_name = product_owner_names[0]  # Single owner
+        else:
+            product_owner_name = "Unknown"  # No owners
+
+        enhanced_product["product_owners"] = product_owners
+        enhanced_product["product_owner_name"] = product_owner_name or "Unknown"  # Add this for report compatibility
+        enhanced_products.append(enhanced_product)
+
+    return enhanced_products
 
 @router.get("/client_products_with_owners", response_model=List[dict])
 async def get_client_products_with_owners(
@@ -22,7 +197,8 @@ async def get_client_products_with_owners(
     provider_id: Optional[int] = None,
     status: Optional[str] = None,
     portfolio_type: Optional[str] = None,
-    db = Depends(get_db)
+    stream: Optional[str] = Depends(stream_param),
+    db = Depends(get_db_unless_streaming)
 ):
     """
     What it does: Retrieves a paginated list of client products with their owners using the optimized products_list_view.
@@ -33,6 +209,7 @@ async def get_client_products_with_owners(
         3. Fetches product owners efficiently
         4. Returns complete product list with portfolio type information
     Expected output: A JSON array of client product objects with portfolio type and all related data
+        With stream=ndjson or stream=json the rows are streamed from a server-side cursor in chunks
     """
     try:
         # Get the client products with pagination
@@ -75,166 +252,16 @@ async def get_client_products_with_owners(
         base_query += f" LIMIT ${param_count}"
         params.append(limit)
         
+        if stream:
+            return stream_query(base_query, params, stream, transform=_enhance_products_with_owners, label="client_products_with_owners")
+
         result = await db.fetch(base_query, *params)
         products = [dict(record) for record in result]
         
         if not products:
             return []
         
-        # Extract product IDs and portfolio IDs for additional data
-        product_ids = [p.get("id") for p in products]  # Fix: Database view returns 'id', not 'product_id'
-        portfolio_ids = [p.get("portfolio_id") for p in products if p.get("portfolio_id") is not None]
-        
-        # Get IRR data for portfolios
-        portfolio_irr_map = {}
-        irr_dates_map = {}
-        if portfolio_ids:
-            try:
-                # Get latest portfolio IRR for all portfolios
-                portfolio_irr_result = await db.fetch("SELECT portfolio_id, irr_result FROM latest_portfolio_irr_values WHERE portfolio_id = ANY($1::int[])", portfolio_ids)
-                portfolio_irr_map = {item.get("portfolio_id"): item.get("irr_result") for item in [dict(record) for record in portfolio_irr_result] if portfolio_irr_result}
-                
-                # Get IRR dates efficiently
-                all_portfolio_funds_result = await db.fetch("SELECT id, portfolio_id FROM portfolio_funds WHERE portfolio_id = ANY($1::int[])", portfolio_ids)
-                
-                if all_portfolio_funds_result:
-                    portfolio_to_funds = {}
-                    all_fund_ids = []
-                    for pf_record in all_portfolio_funds_result:
-                        pf = dict(pf_record)
-                        portfolio_id = pf.get("portfolio_id")
-                        fund_id = pf.get("id")
-                        if portfolio_id not in portfolio_to_funds:
-                            portfolio_to_funds[portfolio_id] = []
-                        portfolio_to_funds[portfolio_id].append(fund_id)
-                        all_fund_ids.append(fund_id)
-                    
-                    if all_fund_ids:
-                        irr_dates_result = await db.fetch("SELECT fund_id, date FROM latest_portfolio_fund_irr_values WHERE fund_id = ANY($1::int[])", all_fund_ids)
-                        if irr_dates_result:
-                            fund_to_irr_date = {dict(item).get("fund_id"): dict(item).get("date") for item in irr_dates_result if dict(item).get("date")}
-                                        
-                            for portfolio_id, fund_ids in portfolio_to_funds.items():
-                                portfolio_irr_dates = [fund_to_irr_date.get(fund_id) for fund_id in fund_ids if fund_to_irr_date.get(fund_id)]
-                                if portfolio_irr_dates:
-                                    portfolio_irr_dates.sort(reverse=True)
-                                    irr_dates_map[portfolio_id] = portfolio_irr_dates[0]
-                                    
-            except Exception as e:
-                logger.warning(f"Error fetching IRR data: {str(e)}")
-        
-        # Get product owners efficiently
-        product_owner_associations = {}
-        product_owners_map = {}
-        
-        try:
-            # Get all product_owner_products associations
-            pop_result = await db.fetch("SELECT * FROM product_owner_products WHERE product_id = ANY($1::int[])", product_ids)
-            if pop_result:
-                for assoc_record in pop_result:
-                    assoc = dict(assoc_record)
-                    product_id = assoc.get("product_id")
-                    if product_id not in product_owner_associations:
-                        product_owner_associations[product_id] = []
-                    product_owner_associations[product_id].append(assoc.get("product_owner_id"))
-            
-            # Get all product owner details
-            product_owner_ids = []
-            for owners in product_owner_associations.values():
-                product_owner_ids.extend(owners)
-            
-            if product_owner_ids:
-                owners_result = await db.fetch("SELECT id, firstname, surname, known_as, status, created_at FROM product_owners WHERE id = ANY($1::int[])", list(set(product_owner_ids)))
-                if owners_result:
-                    product_owners_map = {dict(owner).get("id"): dict(owner) for owner in owners_result}
-                    
-        except Exception as e:
-            logger.error(f"Error fetching product owners: {str(e)}")
-        
-        # Enhance the response data
-        enhanced_products = []
-        
-        for product in products:
-            # Fix: The database view returns 'id', not 'product_id'
-            product_id = product.get("id")  # Changed from "product_id" to "id"
-            portfolio_id = product.get("portfolio_id")
-            
-            # Map the view fields to the expected frontend format
-            enhanced_product = {
-                "id": product_id,
-                "client_id": product.get("client_id"),
-                "client_name": product.get("client_name"),
-                "product_name": product.get("product_name"),
-                "status": product.get("status"),
-                "start_date": product.get("start_date"),
-                "end_date": product.get("end_date"),
-                "provider_id": product.get("provider_id"),
-                "provider_name": product.get("provider_name"),
-                "provider_theme_color": product.get("provider_color"),  # Fixed: database view uses 'provider_color'
-                "theme_color": product.get("provider_color"),  # Add for StandardTable compatibility
-                "product_type": product.get("product_type"),
-                "plan_number": product.get("plan_number"),
-                "portfolio_id": portfolio_id,
-                "portfolio_name": product.get("portfolio_name"),
-                "total_value": product.get("total_value", 0),
-                "template_generation_id": product.get("effective_template_generation_id"),
-                "portfolio_type_display": product.get("portfolio_type_display"),
-                "template_info": {
-                    "id": product.get("effective_template_generation_id"),
-                    "generation_name": product.get("generation_name"),
-                    "name": product.get("template_name"),
-                    "description": product.get("template_description")
-                } if product.get("effective_template_generation_id") else None,
-                "generation_name": product.get("generation_name"),
-                "weighted_risk": product.get("template_weighted_risk"),
-            }
-            
-            # Add IRR data
-            if portfolio_id and portfolio_id in portfolio_irr_map:
-                enhanced_product["irr"] = portfolio_irr_map[portfolio_id]
-            else:
-                enhanced_product["irr"] = "-"
-                
-            if portfolio_id and portfolio_id in irr_dates_map:
-                enhanced_product["irr_date"] = irr_dates_map[portfolio_id]
-            else:
-                enhanced_product["irr_date"] = None
-            
-            # Add product owners
-            product_owners = []
-            product_owner_names = []  # Collect all owner names for report compatibility
-            if product_id in product_owner_associations:
-                owner_ids = product_owner_associations[product_id]
-                for owner_id in owner_ids:
-                    if owner_id in product_owners_map:
-                        owner = product_owners_map[owner_id]
-                        # Create display name from firstname and surname, falling back to known_as
-                        display_name = f"{owner.get('firstname', '')} {owner.get('surname', '')}".strip()
-                        if not display_name and owner.get('known_as'):
-                            display_name = owner['known_as']
-                        
-                        enhanced_owner = {
-                            **owner,
-                            "name": display_name  # Add computed name field for frontend compatibility
-                        }
-                        product_owners.append(enhanced_owner)
-                        
-                        # Use consistent product owner display logic
-                        owner_name = get_product_owner_display_name(owner)
-                        
-                        product_owner_names.append(owner_name)
-            
-            # Set product_owner_name based on number of owners
-            if len(product_owner_names) > 1:
-                product_owner_name = ", ".join(product_owner_names)  # Multiple owners comma-separated
-            elif len(product_owner_names) == 1:
-                product_owner_name = product_owner_names[0]  # Single owner
-            else:
-                product_owner_name = "Unknown"  # No owners
-            
-            enhanced_product["product_owners"] = product_owners
-            enhanced_product["product_owner_name"] = product_owner_name or "Unknown"  # Add this for report compatibility
-            enhanced_products.append(enhanced_product)
+        enhanced_products = await _enhance_products_with_owners(db, products)
         
         logger.info(f"Retrieved {len(enhanced_products)} client products using optimized products_list_view")
         return enhanced_products
@@ -243,6 +270,101 @@ async def get_client_products_with_owners(
         logger.error(f"Error fetching client products with optimized view: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+async def _build_products_display(db, products: List[dict]) -> List[dict]:
+    """
+    Shapes products_display rows for the Products page and attaches their product owners.
+    Used for both the list response and each chunk of the streamed response.
+    """
+    # Extract product IDs for product owners
+    product_ids = [p.get("product_id") for p in products if p.get("product_id") is not None]  # Use product_id alias and filter out nulls
+
+    # Get product owners efficiently (same pattern as existing endpoint)
+    product_owner_associations = {}
+    product_owners_map = {}
+
+    try:
+        # Get all product_owner_products associations
+        pop_result = await db.fetch("SELECT * FROM product_owner_products WHERE product_id = ANY($1::int[])", product_ids)
+        if pop_result:
+            for assoc_record in pop_result:
+                assoc = dict(assoc_record)
+                product_id = assoc.get("product_id")
+                if product_id not in product_owner_associations:
+                    product_owner_associations[product_id] = []
+                product_owner_associations[product_id].append(assoc.get("product_owner_id"))
+
+        # Get all product owner details
+        product_owner_ids = []
+        for owners in product_owner_associations.values():
+            product_owner_ids.extend(owners)
+
+        if product_owner_ids:
+            owners_result = await db.fetch("SELECT id, firstname, surname, known_as, status FROM product_owners WHERE id = ANY($1::int[])", list(set(product_owner_ids)))
+            if owners_result:
+                product_owners_map = {owner.get("id"): dict(owner) for owner in owners_result}
+
+    except Exception as e:
+        logger.error(f"Error fetching product owners: {str(e)}")
+
+    # Build the optimized response (only essential fields)
+    enhanced_products = []
+
+    for product in products:
+        product_id = product.get("product_id")  # Use product_id alias from query
+
+        # Create minimal response structure for Products page
+        # irr and total_value are already floats (pool NUMERIC codec)
+        enhanced_product = {
+            "product_id": product_id,
+            "product_name": product.get("product_name"),
+            "product_type": product.get("product_type"),
+            "plan_number": product.get("plan_number"),
+            "status": product.get("status"),
+            "client_id": product.get("client_id"),
+            "client_name": product.get("client_name"),
+            "provider_id": product.get("provider_id"),
+            "provider_name": product.get("provider_name"),
+            "provider_theme_color": product.get("provider_theme_color"),
+            "theme_color": product.get("provider_theme_color"),  # Add for StandardTable compatibility
+            "portfolio_id": product.get("portfolio_id"),
+            "total_value": product.get("total_value") or 0.0,
+            "irr": product.get("irr"),
+            "irr_date": product.get("irr_date"),
+            "portfolio_type_display": product.get("portfolio_type_display")
+        }
+
+        # Add product owners with computed names
+        product_owners = []
+        product_owner_name = None
+        if product_id in product_owner_associations:
+            owner_ids = product_owner_associations[product_id]
+            owner_names = []
+            for owner_id in owner_ids:
+                if owner_id in product_owners_map:
+                    owner = product_owners_map[owner_id]
+                    # Create display name from firstname and surname, falling back to known_as
+                    display_name = f"{owner.get('firstname', '')} {owner.get('surname', '')}".strip()
+                    if not display_name and owner.get('known_as'):
+                        display_name = owner['known_as']
+
+                    enhanced_owner = {
+                        **owner,
+                        "name": display_name
+                    }
+                    product_owners.append(enhanced_owner)
+                    owner_names.append(display_name)
+
+            # Create combined owner name string for display
+            if owner_names:
+                product_owner_name = ", ".join(owner_names)
+
+        enhanced_product["product_owners"] = product_owners
+        enhanced_product["product_owner_name"] = product_owner_name
+
+        enhanced_products.append(enhanced_product)
+
+    return enhanced_products
+
 @router.get("/products_display", response_model=List[dict])
 async def get_products_display(
     skip: int = Query(0, ge=0, description="Number of records to skip for pagination"),
@@ -251,7 +373,8 @@ async def get_products_display(
     provider_id: Optional[int] = None,
     status: Optional[str] = None,
     portfolio_type: Optional[str] = None,
-    db = Depends(get_db)
+    stream: Optional[str] = Depends(stream_param),
+    db = Depends(get_db_unless_streaming)
 ):
     """
     OPTIMIZED ENDPOINT FOR PRODUCTS PAGE
@@ -263,14 +386,16 @@ async def get_products_display(
         3. Efficiently handles product owners with bulk queries
         4. Returns minimal data structure for fast frontend rendering
     Expected output: A JSON array of product objects with only essential display data
+        With stream=ndjson or stream=json the rows are streamed from a server-side cursor in chunks
     """
     try:
-        # TEMP DEBUG: Test basic client_products table first
-        basic_result = await db.fetchrow("SELECT id, product_name, status, client_id FROM client_products LIMIT 1")
-        if basic_result:
-            logger.info(f"DEBUG - Basic client_products result: {dict(basic_result)}")
-        else:
-            logger.warning("DEBUG - No results from client_products table!")
+        # TEMP DEBUG: Test basic client_products table first (no request connection when streaming)
+        if db is not None:
+            basic_result = await db.fetchrow("SELECT id, product_name, status, client_id FROM client_products LIMIT 1")
+            if basic_result:
+                logger.info(f"DEBUG - Basic client_products result: {dict(basic_result)}")
+            else:
+                logger.warning("DEBUG - No results from client_products table!")
         
         # Use direct query with proper value and IRR calculations (bypassing problematic view)
         base_query = """
@@ -357,6 +482,9 @@ async def get_products_display(
         base_query += f" LIMIT ${param_count}"
         params.append(limit)
         
+        if stream:
+            return stream_query(base_query, params, stream, transform=_build_products_display, label="products_display")
+
         # Get the products with pagination
         result = await db.fetch(base_query, *params)
         products = [dict(record) for record in result]
@@ -366,111 +494,7 @@ async def get_products_display(
         if not products:
             return []
         
-        # Extract product IDs for product owners
-        product_ids = [p.get("product_id") for p in products if p.get("product_id") is not None]  # Use product_id alias and filter out nulls
-        
-        # Get product owners efficiently (same pattern as existing endpoint)
-        product_owner_associations = {}
-        product_owners_map = {}
-        
-        try:
-            # Get all product_owner_products associations
-            pop_result = await db.fetch("SELECT * FROM product_owner_products WHERE product_id = ANY($1::int[])", product_ids)
-            if pop_result:
-                for assoc_record in pop_result:
-                    assoc = dict(assoc_record)
-                    product_id = assoc.get("product_id")
-                    if product_id not in product_owner_associations:
-                        product_owner_associations[product_id] = []
-                    product_owner_associations[product_id].append(assoc.get("product_owner_id"))
-            
-            # Get all product owner details
-            product_owner_ids = []
-            for owners in product_owner_associations.values():
-                product_owner_ids.extend(owners)
-            
-            if product_owner_ids:
-                owners_result = await db.fetch("SELECT id, firstname, surname, known_as, status FROM product_owners WHERE id = ANY($1::int[])", list(set(product_owner_ids)))
-                if owners_result:
-                    product_owners_map = {owner.get("id"): dict(owner) for owner in owners_result}
-                    
-        except Exception as e:
-            logger.error(f"Error fetching product owners: {str(e)}")
-        
-        # Build the optimized response (only essential fields)
-        enhanced_products = []
-        
-        for product in products:
-            product_id = product.get("product_id")  # Use product_id alias from query
-            
-            # Create minimal response structure for Products page with proper type conversion
-            raw_irr = product.get("irr")
-            raw_total_value = product.get("total_value")
-            
-            # Convert IRR to number (frontend expects number type)
-            irr_value = None
-            if raw_irr is not None:
-                try:
-                    irr_value = float(raw_irr)
-                except (ValueError, TypeError):
-                    irr_value = None
-            
-            # Convert total_value to number
-            total_value = 0.0
-            if raw_total_value is not None:
-                try:
-                    total_value = float(raw_total_value)
-                except (ValueError, TypeError):
-                    total_value = 0.0
-            
-            enhanced_product = {
-                "product_id": product_id,
-                "product_name": product.get("product_name"),
-                "product_type": product.get("product_type"),
-                "plan_number": product.get("plan_number"),
-                "status": product.get("status"),
-                "client_id": product.get("client_id"),
-                "client_name": product.get("client_name"),
-                "provider_id": product.get("provider_id"),
-                "provider_name": product.get("provider_name"),
-                "provider_theme_color": product.get("provider_theme_color"),
-                "theme_color": product.get("provider_theme_color"),  # Add for StandardTable compatibility
-                "portfolio_id": product.get("portfolio_id"),
-                "total_value": total_value,
-                "irr": irr_value,
-                "irr_date": product.get("irr_date"),
-                "portfolio_type_display": product.get("portfolio_type_display")
-            }
-            
-            # Add product owners with computed names
-            product_owners = []
-            product_owner_name = None
-            if product_id in product_owner_associations:
-                owner_ids = product_owner_associations[product_id]
-                owner_names = []
-                for owner_id in owner_ids:
-                    if owner_id in product_owners_map:
-                        owner = product_owners_map[owner_id]
-                        # Create display name from firstname and surname, falling back to known_as
-                        display_name = f"{owner.get('firstname', '')} {owner.get('surname', '')}".strip()
-                        if not display_name and owner.get('known_as'):
-                            display_name = owner['known_as']
-                        
-                        enhanced_owner = {
-                            **owner,
-                            "name": display_name
-                        }
-                        product_owners.append(enhanced_owner)
-                        owner_names.append(display_name)
-                
-                # Create combined owner name string for display
-                if owner_names:
-                    product_owner_name = ", ".join(owner_names)
-            
-            enhanced_product["product_owners"] = product_owners
-            enhanced_product["product_owner_name"] = product_owner_name
-            
-            enhanced_products.append(enhanced_product)
+        enhanced_products = await _build_products_display(db, products)
         
         return enhanced_products
         
@@ -533,12 +557,15 @@ async def get_portfolio_types(db = Depends(get_db)):
 
 @router.get("/client_products", response_model=List[Clientproduct])
 async def get_client_products(
+    response: Response,
     skip: int = Query(0, ge=0, description="Number of records to skip for pagination"),
     limit: int = Query(100000, ge=1, le=100000, description="Max number of records to return"),
     client_id: Optional[int] = None,
     provider_id: Optional[int] = None,
     status: Optional[str] = None,
-    db = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="Opaque keyset cursor from the X-Next-Cursor header of the previous page"),
+    stream: Optional[str] = Depends(stream_param),
+    db = Depends(get_db_unless_streaming)
 ):
     """
     What it does: Retrieves a paginated list of client products with optional filtering.
@@ -550,7 +577,11 @@ async def get_client_products(
         4. Combines the data in Python 
         5. Returns the data as a list of Clientproduct objects
     Expected output: A JSON array of client product objects with all their details including provider theme colors and template info
+        With stream=ndjson or stream=json the rows are streamed from a server-side cursor in chunks
+        Pages are ordered by (created_at, id); pass the X-Next-Cursor header back as `cursor` for the next page
     """
+    after = decode_cursor(cursor, "created_at") if cursor else None
+
     try:
         # Build comprehensive query with JOINs to get all data in one query
         base_query = """
@@ -602,37 +633,32 @@ async def get_client_products(
             where_conditions.append(f"cp.status = ${param_count}")
             params.append(status)
             param_count += 1
+
+        # Keyset pagination: rows strictly after the cursor position
+        if after is not None:
+            where_conditions.append(keyset_condition("cp.created_at", "cp.id", param_count))
+            params.extend(after)
+            param_count += 2
             
         # Add WHERE clause if needed
         if where_conditions:
             base_query += " WHERE " + " AND ".join(where_conditions)
         
-        # Add ORDER BY, OFFSET, and LIMIT
-        base_query += f" ORDER BY cp.created_at DESC OFFSET ${param_count} LIMIT ${param_count + 1}"
+        # Add ORDER BY, OFFSET, and LIMIT (id breaks created_at ties so pages are stable)
+        base_query += f" ORDER BY cp.created_at DESC, cp.id DESC OFFSET ${param_count} LIMIT ${param_count + 1}"
         params.extend([skip, limit])
         
+        if stream:
+            return stream_query(base_query, params, stream, label="client_products")
+
         # Execute the query - all data comes from JOINs now
         result = await db.fetch(base_query, *params)
+        # irr and total_value are already floats (pool NUMERIC codec)
         client_products = [dict(record) for record in result]
+        set_next_cursor(response, client_products, "created_at", limit)
         
         logger.info(f"Retrieved {len(client_products)} client products with IRR data via direct JOIN query")
         
-        # Convert IRR result to proper format and handle NULLs
-        for product in client_products:
-            # Convert IRR to float if present
-            if product.get("irr") is not None:
-                try:
-                    product["irr"] = float(product["irr"])
-                except (ValueError, TypeError):
-                    product["irr"] = None
-            
-            # Convert total_value to float
-            if product.get("total_value") is not None:
-                try:
-                    product["total_value"] = float(product["total_value"])
-                except (ValueError, TypeError):
-                    product["total_value"] = 0.0
-        
         return client_products
         
         # Only fetch providers if we have provider IDs
@@ -921,9 +947,9 @@ async def create_client_product(client_product: ClientproductCreate, db = Depend
             "provider_id": client_product.provider_id,
             "product_type": client_product.product_type,
             "template_generation_id": client_product.template_generation_id,
-            "fixed_fee_direct": str(client_product.fixed_fee_direct) if client_product.fixed_fee_direct is not None else None,
-            "fixed_fee_facilitated": str(client_product.fixed_fee_facilitated) if client_product.fixed_fee_facilitated is not None else None,
-            "percentage_fee_facilitated": str(client_product.percentage_fee_facilitated) if client_product.percentage_fee_facilitated is not None else None
+            "fixed_fee_direct": _fee_text(client_product.fixed_fee_direct),
+            "fixed_fee_facilitated": _fee_text(client_product.fixed_fee_facilitated),
+            "percentage_fee_facilitated": _fee_text(client_product.percentage_fee_facilitated)
         }
         
         # Add portfolio_id if it exists
@@ -1158,16 +1184,12 @@ async def update_client_product(client_product_id: int, client_product_update: C
         
         for key, value in update_data.items():
             set_clauses.append(f"{key} = ${param_counter}")
-            # Ensure proper type conversion for numeric fields
-            if key in ['fixed_fee_direct', 'fixed_fee_facilitated', 'percentage_fee_facilitated']:
-                if value is not None:
-                    # Convert to string representation for PostgreSQL numeric type
-                    # asyncpg sometimes expects string input for numeric columns
-                    values.append(str(float(value)))
-                else:
+            # Fee columns are text, so fees are bound as strings
+            if key in FEE_FIELDS:
+                if value is None:
                     # Log when fee fields are being cleared (set to null)
                     logger.info(f"Setting {key} to NULL for product {client_product_id}")
-                    values.append(value)
+                values.append(_fee_text(value))
             else:
                 values.append(value)
             param_counter += 1
@@ -1421,7 +1443,7 @@ async def get_product_fum(product_id: int, db = Depends(get_db)):
                 valuation = dict(valuation_record)
                 value = valuation.get("valuation", 0)
                 if value:
-                    total_fum += float(value)
+                    total_fum += value
             logger.info(f"Total FUM calculated from {len(valuations_result)} fund valuations")
         else:
             logger.info(f"No valuations found for portfolio funds: {portfolio_fund_ids}")
@@ -1488,7 +1510,7 @@ async def get_product_irr(product_id: int, db = Depends(get_db)):
                     activity = dict(activity_record)
                     activity_date = activity.get("activity_timestamp")
                     activity_type = activity.get("activity_type", "").lower()
-                    amount = float(activity.get("amount", 0))
+                    amount = activity.get("amount") or 0.0
                     
                     if activity_date:
                         # Normalize activity date to START of month
@@ -1529,7 +1551,7 @@ async def get_product_irr(product_id: int, db = Depends(get_db)):
                 if valuations_result:
                     for valuation_record in valuations_result:
                         valuation = dict(valuation_record)
-                        current_value = float(valuation.get("valuation", 0))
+                        current_value = valuation.get("valuation") or 0.0
                         total_current_value += current_value
                         
                         # Track the latest valuation date across all funds
@@ -1865,7 +1887,7 @@ async def get_complete_product_details(client_product_id: int, db = Depends(get_
                             valuation = dict(valuation_record)
                             value = valuation.get("valuation", 0)
                             if value:
-                                summary_total_value += float(value)
+                                summary_total_value += value
             except Exception as e:
                 logger.error(f"Error calculating product summary: {str(e)}")
         
@@ -2060,157 +2082,68 @@ async def reactivate_product(product_id: int, db = Depends(get_db)):
         logger.error(f"Error reactivating product {product_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to reactivate product: {str(e)}")
 
+@router.post("/client_products/revenue/batch", response_model=ProductRevenueBatchResponse)
+async def calculate_products_revenue_batch(request: ProductRevenueBatchRequest, db = Depends(get_db)):
+    """
+    What it does: Calculates estimated annual revenue for many products in a single request.
+    Why it's needed: Revenue pages need the breakdown for every product they show; calling the
+                     per-product endpoint once per product repeats the same queries N times.
+    How it works:
+        1. Loads fee columns and portfolio FUM for all requested products in one query
+        2. Computes every fee component and total with NumPy in one pass (RevenueSnapshot)
+        3. Returns the per-product breakdown, ids that were not found, and batch totals
+    Expected output: JSON object with products, missing_product_ids and totals
+    """
+    try:
+        product_ids = list(dict.fromkeys(request.product_ids))
+        if not product_ids:
+            return ProductRevenueBatchResponse(products=[], totals=ProductRevenueTotals())
+
+        snapshot = await load_product_revenue(db, product_ids)
+        found_ids = set(snapshot.product_ids.tolist())
+        missing_product_ids = [product_id for product_id in product_ids if product_id not in found_ids]
+        if missing_product_ids:
+            logger.warning(f"Products not found for revenue batch: {missing_product_ids}")
+
+        totals = snapshot.totals()
+        logger.info(f"Revenue batch for {len(snapshot)} products: £{totals['total_estimated_annual_revenue']:.2f} total estimated annual revenue")
+
+        return ProductRevenueBatchResponse(
+            products=snapshot.products(),
+            missing_product_ids=missing_product_ids,
+            totals=totals
+        )
+
+    except Exception as e:
+        logger.error(f"Error calculating batch revenue: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to calculate revenue: {str(e)}")
+
 @router.get("/client_products/{product_id}/revenue", response_model=ProductRevenueCalculation)
 async def calculate_product_revenue(product_id: int, db = Depends(get_db)):
     """
     What it does: Calculates estimated annual revenue for a product based on all three fee types.
     Why it's needed: Allows advisors to estimate how much revenue they're making from each product.
     How it works:
-        1. Retrieves the product with its fixed_fee_direct, fixed_fee_facilitated and percentage_fee_facilitated
-        2. Gets the latest portfolio valuation for the product
-        3. Calculates: fixed_fee_direct + fixed_fee_facilitated + (latest_valuation × percentage_fee_facilitated/100) = total revenue
-        4. Returns detailed breakdown of the calculation
+        1. Loads the product's fixed_fee_direct, fixed_fee_facilitated and percentage_fee_facilitated
+           together with the summed latest valuations of its active portfolio funds
+        2. Calculates: fixed_fee_direct + fixed_fee_facilitated + (latest_valuation × percentage_fee_facilitated/100) = total revenue
+           using the same RevenueSnapshot as the batch endpoint
+        3. Returns detailed breakdown of the calculation
     Expected output: JSON object with revenue calculation breakdown
     """
     try:
-        # Get the product details including revenue fields
-        product_result = await db.fetchrow("SELECT * FROM client_products WHERE id = $1", product_id)
-        if not product_result:
+        snapshot = await load_product_revenue(db, [product_id])
+        if not len(snapshot):
             raise HTTPException(status_code=404, detail="Product not found")
-        
-        product = dict(product_result)
-        logger.info(f"Calculating revenue for product {product_id}: {product.get('product_name')}")
-        
-        # Initialize response data
-        response = ProductRevenueCalculation(
-            product_id=product_id,
-            product_name=product.get("product_name"),
-            fixed_fee_direct=product.get("fixed_fee_direct"),
-            fixed_fee_facilitated=product.get("fixed_fee_facilitated"),
-            percentage_fee_facilitated=product.get("percentage_fee_facilitated"),
-            latest_portfolio_valuation=None,
-            valuation_date=None,
-            calculated_percentage_fee_facilitated=None,
-            total_estimated_annual_revenue=None,
-            has_revenue_data=False
-        )
-        
-        # Check if product has any revenue data
-        has_fixed_fee_direct = product.get("fixed_fee_direct") is not None
-        has_fixed_fee_facilitated = product.get("fixed_fee_facilitated") is not None
-        has_percentage_fee_facilitated = product.get("percentage_fee_facilitated") is not None
 
-        if not has_fixed_fee_direct and not has_fixed_fee_facilitated and not has_percentage_fee_facilitated:
+        response = ProductRevenueCalculation(**snapshot.products()[0])
+
+        if not response.has_revenue_data:
             logger.info(f"Product {product_id} has no revenue data configured")
-            return response
-        
-        response.has_revenue_data = True
-        
-        # Get portfolio valuation if percentage fee is configured
-        portfolio_id = product.get("portfolio_id")
-        latest_valuation = 0
-        valuation_date = None
-        
-        if has_percentage_fee_facilitated and portfolio_id:
-            try:
-                # Get all active portfolio funds for this portfolio
-                portfolio_funds_result = await db.fetch("SELECT id FROM portfolio_funds WHERE portfolio_id = $1 AND status = $2", portfolio_id, "active")
-                
-                if portfolio_funds_result:
-                    fund_ids = [pf["id"] for pf in portfolio_funds_result]
-                    
-                    # Get latest valuations for all active funds
-                    valuations_result = await db.fetch("SELECT valuation, valuation_date FROM latest_portfolio_fund_valuations WHERE portfolio_fund_id = ANY($1::int[])", fund_ids)
-                    
-                    if valuations_result:
-                        # Sum all fund valuations to get total portfolio value
-                        total_value = 0
-                        latest_date = None
-                        
-                        for valuation_record in valuations_result:
-                            valuation = dict(valuation_record)
-                            value = valuation.get("valuation", 0)
-                            date_str = valuation.get("valuation_date")
-                            
-                            if value:
-                                total_value += float(value)
-                            
-                            # Track the most recent valuation date
-                            if date_str:
-                                try:
-                                    val_date = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-                                    if latest_date is None or val_date > latest_date:
-                                        latest_date = val_date
-                                except Exception as e:
-                                    logger.warning(f"Error parsing valuation date {date_str}: {str(e)}")
-                        
-                        latest_valuation = total_value
-                        valuation_date = latest_date
-                        
-                        logger.info(f"Portfolio {portfolio_id} latest valuation: £{latest_valuation:.2f}")
-                    else:
-                        logger.info(f"No valuations found for portfolio {portfolio_id}")
-                else:
-                    logger.info(f"No active portfolio funds found for portfolio {portfolio_id}")
-                    
-            except Exception as e:
-                logger.error(f"Error getting portfolio valuation: {str(e)}")
-        
-        # Calculate revenue components with proper null handling
-        raw_fixed_fee_direct = product.get("fixed_fee_direct")
-        raw_fixed_fee_facilitated = product.get("fixed_fee_facilitated")
-        raw_percentage_fee_facilitated = product.get("percentage_fee_facilitated")
+        else:
+            logger.info(f"Revenue calculation for product {product_id} ({response.product_name}): "
+                        f"£{response.total_estimated_annual_revenue or 0:.2f} estimated annual revenue")
 
-        # Safe conversion to float with explicit null checks
-        try:
-            fixed_fee_direct_amount = float(raw_fixed_fee_direct) if raw_fixed_fee_direct is not None else 0.0
-        except (ValueError, TypeError):
-            fixed_fee_direct_amount = 0.0
-            
-        try:
-            fixed_fee_facilitated_amount = float(raw_fixed_fee_facilitated) if raw_fixed_fee_facilitated is not None else 0.0
-        except (ValueError, TypeError):
-            fixed_fee_facilitated_amount = 0.0
-            
-        try:
-            percentage_fee_facilitated_rate = float(raw_percentage_fee_facilitated) if raw_percentage_fee_facilitated is not None else 0.0
-        except (ValueError, TypeError):
-            percentage_fee_facilitated_rate = 0.0
-        
-        # Calculate percentage-based fee with safety checks
-        calculated_percentage_fee_facilitated = 0.0
-        if has_percentage_fee_facilitated and latest_valuation > 0 and percentage_fee_facilitated_rate > 0:
-            try:
-                calculated_percentage_fee_facilitated = latest_valuation * (percentage_fee_facilitated_rate / 100.0)
-            except Exception:
-                calculated_percentage_fee_facilitated = 0.0
-        
-        # Calculate total estimated annual revenue with safety checks
-        try:
-            total_revenue = fixed_fee_direct_amount + fixed_fee_facilitated_amount + calculated_percentage_fee_facilitated
-            
-            # Additional NaN/Infinity checks
-            import math
-            if math.isnan(total_revenue) or math.isinf(total_revenue):
-                total_revenue = 0.0
-                
-        except Exception:
-            total_revenue = 0.0
-        
-        # Update response with calculated values
-        response.latest_portfolio_valuation = latest_valuation if latest_valuation > 0 else None
-        response.valuation_date = valuation_date
-        response.calculated_percentage_fee_facilitated = calculated_percentage_fee_facilitated if calculated_percentage_fee_facilitated > 0 else None
-        response.total_estimated_annual_revenue = total_revenue if total_revenue > 0 else None
-        
-        logger.info(f"Revenue calculation for product {product_id}:")
-        logger.info(f"  Fixed direct fee: £{fixed_fee_direct_amount:.2f}")
-        logger.info(f"  Fixed facilitated fee: £{fixed_fee_facilitated_amount:.2f}")
-        logger.info(f"  Portfolio value: £{latest_valuation:.2f}")
-        logger.info(f"  Percentage fee rate: {percentage_fee_facilitated_rate}%")
-        logger.info(f"  Calculated percentage fee: £{calculated_percentage_fee_facilitated:.2f}")
-        logger.info(f"  Total estimated annual revenue: £{total_revenue:.2f}")
-        
         return response
         
     except HTTPException:
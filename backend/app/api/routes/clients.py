@@ -1,4 +1,5 @@
 from fastapi import APIRouter, HTTPException, Depends, Query
+from app.api.route_classes import CRUDRoute
 from typing import List, Optional
 import logging
 
@@ -10,7 +11,7 @@ from app.api.routes.auth import get_current_user
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-router = APIRouter()
+router = APIRouter(route_class=CRUDRoute)
 
 @router.get("/client_groups", response_model=List[ClientGroup])
 async def get_client_groups(
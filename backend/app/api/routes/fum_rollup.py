@@ -0,0 +1,145 @@
+from fastapi import APIRouter, HTTPException, Query, Depends
+from app.api.route_classes import AnalyticsRoute, BatchRoute
+from typing import Literal, Optional
+import logging
+from datetime import date, timedelta
+from app.db.database import get_db, get_read_db
+from app.services.fum_rollup import backfill_fum_rollup
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+router = APIRouter(route_class=AnalyticsRoute)
+batch_router = APIRouter(route_class=BatchRoute)
+
+Dimension = Literal["total", "client_group", "provider", "fund", "template"]
+
+# Display name of each rollup key, per dimension (the total has a single key, 0)
+KEY_NAME_SQL = {
+    "client_group": "SELECT id AS key, name FROM client_groups WHERE id = ANY($1::bigint[])",
+    "provider": "SELECT id AS key, name FROM available_providers WHERE id = ANY($1::bigint[])",
+    "fund": "SELECT id AS key, fund_name AS name FROM available_funds WHERE id = ANY($1::bigint[])",
+    "template": "SELECT id AS key, generation_name AS name FROM template_portfolio_generations WHERE id = ANY($1::bigint[])",
+}
+
+@router.get("/analytics/fum_rollup/current")
+async def get_current_fum_rollup(
+    dimension: Dimension = "total",
+    limit: int = Query(100000, ge=1, le=100000, description="Maximum number of keys to return"),
+    db = Depends(get_read_db)
+):
+    """
+    What it does: Returns the latest FUM and amount invested per key of one dimension from fum_daily_rollup.
+    Why it's needed: Dashboards show current FUM by client group, provider, fund and template without re-aggregating live valuations.
+    How it works:
+        1. Finds the most recent rollup date for the dimension (index lookup)
+        2. Reads that date's rows, largest FUM first, and attaches display names
+    Expected output: {"date", "dimension", "total_fum", "total_invested", "items": [{key, name, fum, invested}]}
+    """
+    try:
+        latest_date = await db.fetchval("SELECT max(date) FROM fum_daily_rollup WHERE dimension = $1", dimension)
+        if latest_date is None:
+            return {"date": None, "dimension": dimension, "total_fum": 0, "total_invested": 0, "items": []}
+
+        rows = await db.fetch("""
+            SELECT key, fum, invested
+            FROM fum_daily_rollup
+            WHERE dimension = $1 AND date = $2
+            ORDER BY fum DESC, key
+        """, dimension, latest_date)
+
+        items = rows[:limit]
+        if dimension == "total":
+            names = {0: "All FUM"}
+        else:
+            names = {row["key"]: row["name"] for row in await db.fetch(KEY_NAME_SQL[dimension], [row["key"] for row in items])}
+            if dimension == "template":
+                names.setdefault(0, "Bespoke")
+
+        return {
+            "date": latest_date,
+            "dimension": dimension,
+            "total_fum": sum(row["fum"] for row in rows),
+            "total_invested": sum(row["invested"] for row in rows),
+            "items": [
+                {
+                    "key": row["key"],
+                    "name": names.get(row["key"], "Unknown"),
+                    "fum": row["fum"],
+                    "invested": row["invested"]
+                }
+                for row in items
+            ]
+        }
+
+    except Exception as e:
+        logger.error(f"Error fetching current FUM rollup: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@router.get("/analytics/fum_rollup/series")
+async def get_fum_rollup_series(
+    dimension: Dimension = "total",
+    key: int = Query(0, description="Client group, provider, fund or template generation id (0 for total or bespoke)"),
+    start_date: Optional[date] = Query(None, description="First date (default: one year before end_date)"),
+    end_date: Optional[date] = Query(None, description="Last date (default: today)"),
+    db = Depends(get_read_db)
+):
+    """
+    What it does: Returns the daily FUM and amount invested of one key over a date range.
+    Why it's needed: Feeds FUM history charts from stored snapshots instead of replaying valuations.
+    How it works: Range scan of the fum_daily_rollup primary key (dimension, key, date)
+    Expected output: {"dimension", "key", "series": [{date, fum, invested}]}
+    """
+    try:
+        end_date = end_date or date.today()
+        start_date = start_date or end_date - timedelta(days=365)
+        if start_date > end_date:
+            raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+
+        rows = await db.fetch("""
+            SELECT date, fum, invested
+            FROM fum_daily_rollup
+            WHERE dimension = $1 AND key = $2 AND date BETWEEN $3 AND $4
+            ORDER BY date
+        """, dimension, key, start_date, end_date)
+
+        return {
+            "dimension": dimension,
+            "key": key,
+            "series": [{"date": row["date"], "fum": row["fum"], "invested": row["invested"]} for row in rows]
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching FUM rollup series: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@batch_router.post("/analytics/fum_rollup/refresh")
+async def refresh_fum_rollup_range(
+    start_date: date = Query(..., description="First date to recompute"),
+    end_date: Optional[date] = Query(None, description="Last date to recompute (default: today)"),
+    db = Depends(get_db)
+):
+    """
+    What it does: Recomputes fum_daily_rollup for a date range, including historical dates.
+    Why it's needed: Backfills history and repairs ranges after bulk imports or back-dated corrections.
+    How it works: Rewrites the range in chunks of FUM_ROLLUP_CHUNK_DAYS days (see app/services/fum_rollup.py)
+    Expected output: {"start_date", "end_date", "rows_written"}
+    """
+    try:
+        end_date = end_date or date.today()
+        if start_date > end_date:
+            raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+
+        rows_written = await backfill_fum_rollup(db, start_date, end_date)
+        logger.info(f"✅ FUM rollup refreshed from {start_date} to {end_date}: {rows_written} rows")
+        return {"start_date": start_date, "end_date": end_date, "rows_written": rows_written}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error refreshing FUM rollup: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+router.include_router(batch_router)
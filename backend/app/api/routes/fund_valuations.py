@@ -1,18 +1,43 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from app.api.route_classes import CRUDRoute
 from typing import List, Optional
 from datetime import datetime
 from app.db.database import get_db
+from app.api.streaming import get_db_unless_streaming, stream_param, stream_query
 from app.models.fund_valuation import FundValuationCreate, FundValuationUpdate, FundValuation, LatestFundValuationViewItem
 import logging
 
 # Import the IRR cascade service for comprehensive IRR management
 from app.services.irr_cascade_service import IRRCascadeService
+# IRR cascades for saved valuations run on the background job queue
+from app.services.irr_job_queue import enqueue_irr_job, VALUATION_SAVED, VALUATION_DELETED, IRR_JOB_HEADER
 # Import the legacy IRR recalculation function (will be deprecated)
 from app.api.routes.holding_activity_logs import recalculate_irr_after_activity_change
 
-router = APIRouter()
+router = APIRouter(route_class=CRUDRoute)
 logger = logging.getLogger(__name__)
 
+async def queue_valuation_irr(db, response: Response, job_type: str, portfolio_fund_id: int, valuation_date) -> Optional[int]:
+    """
+    Queue the IRR cascade for a saved or deleted fund valuation instead of running it in the request.
+    The job id is returned in the X-IRR-Job-Id header; poll /api/irr_jobs/{id} for completion.
+    Call it inside the transaction that writes the valuation: the job commits with the write,
+    and a queueing failure rolls the write back and fails the request.
+    """
+    job_id = await enqueue_irr_job(db, job_type, portfolio_fund_id, [valuation_date])
+    if job_id is not None:
+        response.headers[IRR_JOB_HEADER] = str(job_id)
+    return job_id
+
+async def delete_valuation_and_queue_irr(db, response: Response, existing_valuation) -> Optional[int]:
+    """Delete a fund valuation and queue the IRR cascade deletion for its fund and date in one transaction"""
+    async with db.transaction():
+        await db.execute("DELETE FROM portfolio_fund_valuations WHERE id = $1", existing_valuation["id"])
+        job_id = await enqueue_irr_job(db, VALUATION_DELETED, existing_valuation["portfolio_fund_id"], [existing_valuation["valuation_date"]])
+    if job_id is not None:
+        response.headers[IRR_JOB_HEADER] = str(job_id)
+    return job_id
+
 async def should_recalculate_portfolio_irr(portfolio_id: int, valuation_date: str, db) -> bool:
     """
     Check if portfolio IRR should be recalculated for a given date.
@@ -94,11 +119,13 @@ async def should_recalculate_portfolio_irr(portfolio_id: int, valuation_date: st
 @router.post("/fund_valuations", response_model=FundValuation)
 async def create_fund_valuation(
     fund_valuation: FundValuationCreate,
+    response: Response,
     db = Depends(get_db)
 ):
     """
     Create a new fund valuation.
     Zero-value valuations are now allowed and will be saved.
+    The IRR recalculation is queued (X-IRR-Job-Id header) and runs after the response.
     """
     try:
         logger.info(f"🔍 VALUATION ENTRY: ===== FUND VALUATION CREATE ENDPOINT HIT =====")
@@ -139,41 +166,18 @@ async def create_fund_valuation(
             # Update existing valuation
             existing_id = existing_valuation["id"]
             
-            updated_valuation = await db.fetchrow(
-                "UPDATE portfolio_fund_valuations SET valuation = $1 WHERE id = $2 RETURNING *",
-                valuation_amount, existing_id
-            )
+            # Update and queue the IRR cascade (runs after the response) in one transaction
+            async with db.transaction():
+                updated_valuation = await db.fetchrow(
+                    "UPDATE portfolio_fund_valuations SET valuation = $1 WHERE id = $2 RETURNING *",
+                    valuation_amount, existing_id
+                )
+                if updated_valuation:
+                    await queue_valuation_irr(db, response, VALUATION_SAVED, fund_valuation.portfolio_fund_id, fund_valuation.valuation_date)
             
             if updated_valuation:
                 logger.info(f"🔍 VALUATION ENTRY (UPDATE): Updated existing fund valuation with ID {existing_id} for fund {fund_valuation.portfolio_fund_id}, date {fund_valuation.valuation_date}, value {fund_valuation.valuation}")
                 
-                # ========================================================================
-                # ENHANCED: Use comprehensive IRR cascade service for valuation updates
-                # ========================================================================
-                logger.info(f"📈 [IRR CASCADE INTEGRATION] Triggering IRR calculation for existing valuation update")
-                
-                try:
-                    # Get the valuation date for IRR recalculation
-                    valuation_date = fund_valuation.valuation_date.isoformat().split('T')[0]
-                    
-                    logger.info(f"📈 [IRR CASCADE] Using cascade service for fund {fund_valuation.portfolio_fund_id}, date {valuation_date}")
-                    
-                    # Use the comprehensive cascade service for IRR calculation
-                    irr_service = IRRCascadeService(db)
-                    irr_result = await irr_service.handle_fund_valuation_creation_edit(
-                        fund_valuation.portfolio_fund_id, valuation_date
-                    )
-                    
-                    if irr_result.get("success"):
-                        logger.info(f"📈 [IRR CASCADE] ✅ IRR calculation completed: {irr_result}")
-                    else:
-                        logger.warning(f"📈 [IRR CASCADE] ⚠️ IRR calculation had issues: {irr_result}")
-                        
-                except Exception as e:
-                    # Don't fail the valuation update if IRR calculation fails
-                    logger.error(f"📈 [IRR CASCADE] ❌ IRR calculation failed for existing valuation update: {str(e)}")
-                # ========================================================================
-                
                 logger.info(f"🔍 VALUATION EXIT (UPDATE): ===== UPDATE PATH COMPLETE =====")
                 logger.info(f"🔍 VALUATION EXIT (UPDATE): Updated valuation data: {dict(updated_valuation)}")
                 return dict(updated_valuation)
@@ -186,43 +190,20 @@ async def create_fund_valuation(
         logger.info(f"🔍 VALUATION ENTRY: Creating new valuation for fund {fund_valuation.portfolio_fund_id}, date {fund_valuation.valuation_date.isoformat()}, value {valuation_amount}")
         
         logger.info(f"🔍 VALUATION ENTRY: Fund valuation data to insert: portfolio_fund_id={fund_valuation.portfolio_fund_id}, valuation_date={fund_valuation.valuation_date.isoformat()}, valuation={valuation_amount}")
-        created_valuation = await db.fetchrow(
-            "INSERT INTO portfolio_fund_valuations (portfolio_fund_id, valuation_date, valuation) VALUES ($1, $2, $3) RETURNING *",
-            fund_valuation.portfolio_fund_id, fund_valuation.valuation_date, valuation_amount
-        )
-        
-        if not created_valuation:
-            logger.error(f"🔍 VALUATION ENTRY: Failed to create fund valuation - no data returned")
-            raise HTTPException(status_code=500, detail="Failed to create fund valuation")
+        # Insert and queue the IRR cascade (runs after the response) in one transaction
+        async with db.transaction():
+            created_valuation = await db.fetchrow(
+                "INSERT INTO portfolio_fund_valuations (portfolio_fund_id, valuation_date, valuation) VALUES ($1, $2, $3) RETURNING *",
+                fund_valuation.portfolio_fund_id, fund_valuation.valuation_date, valuation_amount
+            )
             
-        logger.info(f"🔍 VALUATION ENTRY: Successfully created fund valuation with ID {created_valuation['id']}")
-        
-        # ========================================================================
-        # ENHANCED: Use comprehensive IRR cascade service for new valuation creation
-        # ========================================================================
-        logger.info(f"📈 [IRR CASCADE INTEGRATION] Triggering IRR calculation for new valuation creation")
-        
-        try:
-            # Get the valuation date for IRR calculation
-            valuation_date = fund_valuation.valuation_date.isoformat().split('T')[0]
+            if not created_valuation:
+                logger.error(f"🔍 VALUATION ENTRY: Failed to create fund valuation - no data returned")
+                raise HTTPException(status_code=500, detail="Failed to create fund valuation")
             
-            logger.info(f"📈 [IRR CASCADE] Using cascade service for fund {fund_valuation.portfolio_fund_id}, date {valuation_date}")
+            await queue_valuation_irr(db, response, VALUATION_SAVED, fund_valuation.portfolio_fund_id, fund_valuation.valuation_date)
             
-            # Use the comprehensive cascade service for IRR calculation
-            irr_service = IRRCascadeService(db)
-            irr_result = await irr_service.handle_fund_valuation_creation_edit(
-                fund_valuation.portfolio_fund_id, valuation_date
-            )
-            
-            if irr_result.get("success"):
-                logger.info(f"📈 [IRR CASCADE] ✅ IRR calculation completed: {irr_result}")
-            else:
-                logger.warning(f"📈 [IRR CASCADE] ⚠️ IRR calculation had issues: {irr_result}")
-                
-        except Exception as e:
-            # Don't fail the valuation creation if IRR calculation fails
-            logger.error(f"📈 [IRR CASCADE] ❌ IRR calculation failed for new valuation creation: {str(e)}")
-        # ========================================================================
+        logger.info(f"🔍 VALUATION ENTRY: Successfully created fund valuation with ID {created_valuation['id']}")
             
         logger.info(f"🔍 VALUATION EXIT: ===== CREATE PATH COMPLETE =====")
         logger.info(f"🔍 VALUATION EXIT: create_fund_valuation completed successfully for fund {fund_valuation.portfolio_fund_id}")
@@ -241,20 +222,25 @@ async def create_fund_valuation(
 @router.get("/fund_valuations", response_model=List[FundValuation])
 async def get_fund_valuations(
     portfolio_fund_id: Optional[int] = Query(None),
-    db = Depends(get_db)
+    stream: Optional[str] = Depends(stream_param),
+    db = Depends(get_db_unless_streaming)
 ):
     """
     Get all fund valuations, optionally filtered by portfolio_fund_id.
+    Pass stream=ndjson or stream=json to stream the rows instead of returning one list.
     """
     try:
         if portfolio_fund_id is not None:
-            result = await db.fetch(
-                "SELECT * FROM portfolio_fund_valuations WHERE portfolio_fund_id = $1 ORDER BY valuation_date DESC",
-                portfolio_fund_id
-            )
+            query = "SELECT * FROM portfolio_fund_valuations WHERE portfolio_fund_id = $1 ORDER BY valuation_date DESC"
+            params = [portfolio_fund_id]
         else:
-            result = await db.fetch("SELECT * FROM portfolio_fund_valuations ORDER BY valuation_date DESC")
-        
+            query = "SELECT * FROM portfolio_fund_valuations ORDER BY valuation_date DESC"
+            params = []
+
+        if stream:
+            return stream_query(query, params, stream, label="fund_valuations")
+
+        result = await db.fetch(query, *params)
         return [dict(row) for row in result]
     except Exception as e:
         logger.error(f"Error getting fund valuations: {str(e)}")
@@ -367,12 +353,14 @@ async def get_fund_valuation(
 async def update_fund_valuation(
     valuation_id: int,
     fund_valuation: FundValuationUpdate,
+    response: Response,
     db = Depends(get_db)
 ):
     """
     Update a fund valuation.
     Zero-value valuations are now allowed and will be saved.
     Empty string values will delete the valuation.
+    The IRR recalculation is queued (X-IRR-Job-Id header) and runs after the response.
     """
     try:
         # Check if fund valuation exists
@@ -384,40 +372,16 @@ async def update_fund_valuation(
         
         # Check if value is empty string and delete if so
         if hasattr(fund_valuation, 'valuation') and isinstance(fund_valuation.valuation, str) and fund_valuation.valuation.strip() == "":
-            logger.info(f"🗑️ [IRR CASCADE INTEGRATION] Deleting fund valuation {valuation_id} due to empty value")
+            logger.info(f"🗑️ [IRR QUEUE] Deleting fund valuation {valuation_id} due to empty value")
             
-            # ========================================================================
-            # ENHANCED: Use comprehensive IRR cascade service for deletion
-            # ========================================================================
-            try:
-                irr_service = IRRCascadeService(db)
-                
-                # Use the comprehensive cascade deletion
-                cascade_result = await irr_service.handle_fund_valuation_deletion(valuation_id)
-                
-                if not cascade_result.get("success"):
-                    error_msg = cascade_result.get("error", "Unknown cascade deletion error")
-                    logger.error(f"🗑️ [IRR CASCADE] Cascade deletion failed: {error_msg}")
-                    raise HTTPException(status_code=500, detail=f"IRR cascade deletion failed: {error_msg}")
-                
-                logger.info(f"🗑️ [IRR CASCADE] ✅ Deletion cascade completed successfully: {cascade_result}")
-                
-                # Return the deleted record information
-                return {
-                    "message": f"Fund valuation {valuation_id} deleted successfully with IRR cascade",
-                    "valuation_deleted": cascade_result.get("valuation_deleted", False),
-                    "fund_irr_deleted": cascade_result.get("fund_irr_deleted", False), 
-                    "portfolio_irr_deleted": cascade_result.get("portfolio_irr_deleted", False),
-                    "portfolio_valuation_deleted": cascade_result.get("portfolio_valuation_deleted", False),
-                    "completeness_maintained": cascade_result.get("completeness_maintained", False)
-                }
-                
-            except HTTPException:
-                raise  # Re-raise HTTP exceptions as-is
-            except Exception as e:
-                logger.error(f"🗑️ [IRR CASCADE] ❌ Unexpected error in cascade deletion: {str(e)}")
-                raise HTTPException(status_code=500, detail=f"Unexpected error during cascade deletion: {str(e)}")
-            # ========================================================================
+            job_id = await delete_valuation_and_queue_irr(db, response, existing_result)
+            
+            # Return the deleted record information; the IRR cascade deletion runs as job irr_job_id
+            return {
+                "message": f"Fund valuation {valuation_id} deleted successfully; IRR cascade queued",
+                "valuation_deleted": True,
+                "irr_job_id": job_id
+            }
             
         # Prepare update data (only include fields that are provided)
         update_data = {}  # Removed updated_at as it doesn't exist in the schema
@@ -453,45 +417,23 @@ async def update_fund_valuation(
         param_count += 1
         update_params.append(valuation_id)
         
-        # Update the fund valuation
-        updated_valuation = await db.fetchrow(
-            f"UPDATE portfolio_fund_valuations SET {set_clause} WHERE id = ${param_count} RETURNING *",
-            *update_params
-        )
-        
-        if not updated_valuation:
-            raise HTTPException(status_code=500, detail="Failed to update fund valuation")
-        
-        # ========================================================================
-        # ENHANCED: Use comprehensive IRR cascade service for valuation updates
-        # ========================================================================
-        try:
-            # Get portfolio_fund_id from the updated record or existing record
-            portfolio_fund_id = updated_valuation["portfolio_fund_id"] or existing_result["portfolio_fund_id"]
-            
-            # Get the valuation date (use updated date if provided, otherwise existing)
-            valuation_date = updated_valuation["valuation_date"] or existing_result["valuation_date"]
-            if isinstance(valuation_date, str):
-                valuation_date = valuation_date.split('T')[0]
-            
-            logger.info(f"📈 [IRR CASCADE INTEGRATION] Triggering IRR calculation for fund {portfolio_fund_id}, date {valuation_date}")
-            
-            # Use the comprehensive cascade service for IRR calculation
-            irr_service = IRRCascadeService(db)
-            irr_result = await irr_service.handle_fund_valuation_creation_edit(
-                portfolio_fund_id, valuation_date
+        # Update the fund valuation and queue the IRR cascade (runs after the response) in one transaction
+        async with db.transaction():
+            updated_valuation = await db.fetchrow(
+                f"UPDATE portfolio_fund_valuations SET {set_clause} WHERE id = ${param_count} RETURNING *",
+                *update_params
             )
             
-            if irr_result.get("success"):
-                logger.info(f"📈 [IRR CASCADE] ✅ IRR calculation completed: {irr_result}")
-            else:
-                logger.warning(f"📈 [IRR CASCADE] ⚠️ IRR calculation had issues: {irr_result}")
-                    
-        except Exception as e:
-            # Don't fail the valuation update if IRR update fails
-            logger.error(f"📈 [IRR CASCADE] ❌ IRR calculation failed after valuation update: {str(e)}")
-        # ========================================================================
+            if not updated_valuation:
+                raise HTTPException(status_code=500, detail="Failed to update fund valuation")
             
+            portfolio_fund_id = updated_valuation["portfolio_fund_id"] or existing_result["portfolio_fund_id"]
+            valuation_date = updated_valuation["valuation_date"] or existing_result["valuation_date"]
+            if (portfolio_fund_id, valuation_date) != (existing_result["portfolio_fund_id"], existing_result["valuation_date"]):
+                # Moved to another fund or date: the IRRs of the old fund and date go as for a deletion
+                await queue_valuation_irr(db, response, VALUATION_DELETED, existing_result["portfolio_fund_id"], existing_result["valuation_date"])
+            await queue_valuation_irr(db, response, VALUATION_SAVED, portfolio_fund_id, valuation_date)
+
         return dict(updated_valuation)
     except HTTPException:
         raise
@@ -502,16 +444,17 @@ async def update_fund_valuation(
 @router.delete("/fund_valuations/{valuation_id}", response_model=dict)
 async def delete_fund_valuation(
     valuation_id: int,
+    response: Response,
     db = Depends(get_db)
 ):
     """
-    Delete a fund valuation with comprehensive IRR cascade deletion logic.
+    Delete a fund valuation and queue its IRR cascade deletion.
     
-    Uses the IRR cascade service to handle:
+    The valuation is deleted in the request; a background IRR job (X-IRR-Job-Id header,
+    irr_job_id in the body) then uses the IRR cascade service to handle:
     1. Deleting the fund-level IRR that was based on that valuation
     2. Checking if this deletion breaks common valuation dates across the portfolio
     3. If so, deleting the portfolio-level IRR and valuation for that date
-    4. Deleting the original fund valuation
     """
     try:
         logger.info(f"🗑️ [IRR CASCADE INTEGRATION] Attempting to delete fund valuation with ID: {valuation_id}")
@@ -523,53 +466,17 @@ async def delete_fund_valuation(
             logger.warning(f"🗑️ [IRR CASCADE] Fund valuation with ID {valuation_id} not found, but treating as success")
             return {"message": f"Fund valuation with ID {valuation_id} doesn't exist", "status": "success"}
         
-        # ========================================================================
-        # ENHANCED: Use comprehensive IRR cascade service for deletion
-        # ========================================================================
-        try:
-            irr_service = IRRCascadeService(db)
-            
-            # Use the comprehensive cascade deletion
-            cascade_result = await irr_service.handle_fund_valuation_deletion(valuation_id)
-            
-            if not cascade_result.get("success"):
-                error_msg = cascade_result.get("error", "Unknown cascade deletion error")
-                logger.error(f"🗑️ [IRR CASCADE] Cascade deletion failed: {error_msg}")
-                raise HTTPException(status_code=500, detail=f"IRR cascade deletion failed: {error_msg}")
-            
-            logger.info(f"🗑️ [IRR CASCADE] ✅ Deletion cascade completed successfully: {cascade_result}")
-            
-            # Format cascade deletion details for response
-            cascade_details = []
-            if cascade_result.get("fund_irr_deleted"):
-                cascade_details.append("Fund IRR deleted")
-            if cascade_result.get("portfolio_irr_deleted"):
-                cascade_details.append("Portfolio IRR deleted") 
-            if cascade_result.get("portfolio_valuation_deleted"):
-                cascade_details.append("Portfolio valuation deleted")
-            
-            response_message = f"Fund valuation with ID {valuation_id} deleted successfully with IRR cascade"
-            if cascade_details:
-                response_message += f". Cascade actions: {'; '.join(cascade_details)}"
-            
-            return {
-                "message": response_message,
-                "status": "success",
-                "valuation_deleted": cascade_result.get("valuation_deleted", False),
-                "fund_irr_deleted": cascade_result.get("fund_irr_deleted", False),
-                "portfolio_irr_deleted": cascade_result.get("portfolio_irr_deleted", False),
-                "portfolio_valuation_deleted": cascade_result.get("portfolio_valuation_deleted", False),
-                "completeness_maintained": cascade_result.get("completeness_maintained", False),
-                "affected_date": cascade_result.get("date"),
-                "cascade_details": cascade_details
-            }
-            
-        except HTTPException:
-            raise  # Re-raise HTTP exceptions as-is
-        except Exception as e:
-            logger.error(f"🗑️ [IRR CASCADE] ❌ Unexpected error in cascade deletion: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Unexpected error during cascade deletion: {str(e)}")
-        # ========================================================================
+        job_id = await delete_valuation_and_queue_irr(db, response, existing_result)
+        
+        logger.info(f"🗑️ [IRR QUEUE] Deleted fund valuation {valuation_id}; IRR cascade queued as job {job_id}")
+        
+        return {
+            "message": f"Fund valuation with ID {valuation_id} deleted successfully; IRR cascade queued",
+            "status": "success",
+            "valuation_deleted": True,
+            "affected_date": existing_result["valuation_date"],
+            "irr_job_id": job_id
+        }
         
     except HTTPException:
         raise
@@ -1,15 +1,16 @@
 from fastapi import APIRouter, HTTPException, Query, Depends
+from app.api.route_classes import AnalyticsRoute
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel
 import logging
 from datetime import datetime, date, timedelta
-from app.db.database import get_db
-from app.api.routes.portfolio_funds import calculate_multiple_portfolio_funds_irr
+from app.db.database import get_read_db
+from app.services.irr_cascade_planner import load_combined_irr_state, solve_portfolio_irrs
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-router = APIRouter()
+router = APIRouter(route_class=AnalyticsRoute)
 
 # Request deduplication cache to prevent multiple simultaneous identical requests
 _active_requests = {}
@@ -29,7 +30,7 @@ def _generate_request_key(request: IRRHistorySummaryRequest) -> str:
 async def get_portfolio_historical_irr(
     product_id: int,
     limit: Optional[int] = Query(default=12, description="Maximum number of historical IRR records to return"),
-    db = Depends(get_db)
+    db = Depends(get_read_db)
 ):
     """
     Get historical IRR values for a specific product/portfolio.
@@ -90,7 +91,7 @@ async def get_portfolio_historical_irr(
 @router.get("/portfolio-irr-values/{portfolio_id}")
 async def get_portfolio_irr_values(
     portfolio_id: int,
-    db = Depends(get_db)
+    db = Depends(get_read_db)
 ):
     """
     Get stored portfolio IRR values directly from portfolio_irr_values table.
@@ -137,7 +138,7 @@ async def get_portfolio_irr_values(
 async def get_funds_historical_irr(
     product_id: int,
     limit: Optional[int] = Query(default=12, description="Maximum number of historical IRR records per fund"),
-    db = Depends(get_db)
+    db = Depends(get_read_db)
 ):
     """
     Get historical IRR values for all funds within a specific product/portfolio.
@@ -212,14 +213,35 @@ async def get_funds_historical_irr(
         logger.error(f"Error fetching funds historical IRR for product {product_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch funds historical IRR: {str(e)}")
 
+def _profit_components(activity_totals) -> tuple:
+    """(investments, withdrawals) from (activity_type, total_amount) pairs; other types don't count towards profit."""
+    investments = 0.0
+    withdrawals = 0.0
+    for activity_type, amount in activity_totals:
+        if not isinstance(activity_type, str) or amount is None:
+            continue
+        activity_type = activity_type.lower()
+        # Money IN (subtract from profit)
+        if any(keyword in activity_type for keyword in ["investment", "taxuplift", "fundswitchin", "productswitchin"]):
+            investments += float(amount)
+        # Money OUT (subtract from profit)
+        elif any(keyword in activity_type for keyword in ["withdrawal", "fundswitchout", "productswitchout"]):
+            withdrawals += float(amount)
+    return investments, withdrawals
+
 @router.post("/summary")
 async def get_irr_history_summary(
     request: IRRHistorySummaryRequest,
-    db = Depends(get_db)
+    db = Depends(get_read_db)
 ):
     """
     Get IRR history summary table data for multiple products across selected dates.
     Returns product-level IRR values for each date plus portfolio totals.
+
+    The whole grid comes from three set-based queries (stored IRRs, valuations and cumulative
+    activity totals, each for every portfolio and date at once, with the cross-portfolio totals
+    as extra grouping sets) and the totals' IRRs from one multi-date pass of the batch IRR solver,
+    instead of three queries per product and date plus one IRR calculation per date.
     """
     try:
         # Generate request key for deduplication
@@ -260,7 +282,7 @@ async def get_irr_history_summary(
             
             # Since available_providers join doesn't exist, we'll do separate queries
             products = await db.fetch(
-                "SELECT id, product_name, provider_id, status FROM client_products WHERE id = ANY($1::int[])",
+                "SELECT id, product_name, provider_id, status, portfolio_id FROM client_products WHERE id = ANY($1::int[])",
                 request.product_ids
             )
             
@@ -329,286 +351,146 @@ async def get_irr_history_summary(
                 }
                 future.set_result(result)
                 return result
-            
-            # For each product, get stored IRR values for each selected date
-            for product_id in request.product_ids:
-                if product_id not in product_info_map:
-                    continue
-                    
-                product_info = product_info_map[product_id]
-                
-                # Get portfolio ID for this product
-                portfolio_id_result = await db.fetchrow(
-                    "SELECT portfolio_id FROM client_products WHERE id = $1",
-                    product_id
-                )
-                
-                if not portfolio_id_result or not portfolio_id_result["portfolio_id"]:
-                    # Create null entries for consistency
-                    for date_str in request.selected_dates:
-                        product_irr_history.append({
-                            "product_id": product_id,
-                            "product_name": product_info["product_name"],
-                            "provider_name": product_info["provider_name"],
-                            "provider_theme_color": product_info["provider_theme_color"],
-                            "status": product_info["status"],
-                            "irr_date": date_str,
-                            "irr_result": None,
-                            "valuation": None,
-                            "profit": None,
-                            "investments": None,
-                            "withdrawals": None
-                        })
-                    continue
-                
-                portfolio_id = portfolio_id_result["portfolio_id"]
-                
-                # For each selected date, fetch stored IRR from portfolio_irr_values table
-                for date_str in request.selected_dates:
-                    try:
-                        # Normalize date format to YYYY-MM-DD
-                        normalized_date_str = date_str.split('T')[0] if 'T' in date_str else date_str
-                        normalized_date = datetime.strptime(normalized_date_str, "%Y-%m-%d").date()
-                        
-                        # Fetch stored IRR from portfolio_historical_irr (same source as individual product cards)
-                        stored_irr_result = await db.fetchrow(
-                            """
-                            SELECT irr_result, date
-                            FROM portfolio_historical_irr
-                            WHERE portfolio_id = $1 AND date = $2
-                            """,
-                            portfolio_id, normalized_date
-                        )
-                        
-                        logger.info(f"🔍 [SUMMARY ENDPOINT DEBUG] Product {product_id} (portfolio {portfolio_id}) for date {normalized_date}: {stored_irr_result['irr_result'] if stored_irr_result else None}% (from portfolio_historical_irr table)")
-                        
-                        irr_value = None
-                        if stored_irr_result and stored_irr_result["irr_result"] is not None:
-                            irr_value = float(stored_irr_result["irr_result"])
-
-                        logger.info(f"🔍 [SUMMARY ENDPOINT RESULT] Product {product_id} for date {date_str}: storing irr_result = {irr_value}% in response")
-
-                        # Fetch valuation for this portfolio on this date
-                        valuation = 0.0
-                        valuation_result = await db.fetchrow(
-                            """
-                            SELECT SUM(fv.valuation) as total_valuation
-                            FROM portfolio_fund_valuations fv
-                            JOIN portfolio_funds pf ON pf.id = fv.portfolio_fund_id
-                            WHERE pf.portfolio_id = $1 AND fv.valuation_date = $2
-                            """,
-                            portfolio_id, normalized_date
-                        )
-                        if valuation_result and valuation_result["total_valuation"]:
-                            valuation = float(valuation_result["total_valuation"])
-
-                        # Fetch activities up to this date and sum by type for profit calculation
-                        activities = await db.fetch(
-                            """
-                            SELECT activity_type, SUM(amount) as total_amount
-                            FROM holding_activity_log
-                            WHERE portfolio_fund_id IN (
-                                SELECT id FROM portfolio_funds WHERE portfolio_id = $1
-                            )
-                            AND activity_timestamp <= $2
-                            GROUP BY activity_type
-                            """,
-                            portfolio_id, normalized_date
-                        )
-
-                        # Calculate profit components
-                        investments = 0.0
-                        withdrawals = 0.0
 
-                        for activity in activities:
-                            activity_type = activity["activity_type"].lower()
-                            amount = float(activity["total_amount"])
-
-                            # Money IN (subtract from profit)
-                            if any(keyword in activity_type for keyword in ["investment", "taxuplift", "fundswitchin", "productswitchin"]):
-                                investments += amount
-                            # Money OUT (subtract from profit)
-                            elif any(keyword in activity_type for keyword in ["withdrawal", "fundswitchout", "productswitchout"]):
-                                withdrawals += amount
-
-                        # Calculate profit: valuation - investments - withdrawals
-                        profit = valuation - investments - withdrawals
-
-                        # Add entry with stored IRR and calculated profit/valuation
-                        product_irr_history.append({
-                            "product_id": product_id,
-                            "product_name": product_info["product_name"],
-                            "provider_name": product_info["provider_name"],
-                            "provider_theme_color": product_info["provider_theme_color"],
-                            "status": product_info["status"],
-                            "irr_date": date_str,
-                            "irr_result": irr_value,
-                            "valuation": valuation,
-                            "profit": profit,
-                            "investments": investments,
-                            "withdrawals": withdrawals
-                        })
-                        
-                    except Exception as product_date_error:
-                        logger.error(f"Error fetching stored IRR for product {product_id} on date {date_str}: {str(product_date_error)}")
-                        # Still create a row with null values for consistency
-                        product_irr_history.append({
-                            "product_id": product_id,
-                            "product_name": product_info["product_name"],
-                            "provider_name": product_info["provider_name"],
-                            "provider_theme_color": product_info["provider_theme_color"],
-                            "status": product_info["status"],
-                            "irr_date": date_str,
-                            "irr_result": None,
-                            "valuation": None,
-                            "profit": None,
-                            "investments": None,
-                            "withdrawals": None
-                        })
-                
-            # Calculate portfolio totals for each date (aggregated across multiple portfolios)
+            # Normalize each requested date once (YYYY-MM-DD, time component dropped); dates that
+            # don't parse get rows of null values
+            parsed_dates = {}
             for date_str in request.selected_dates:
                 try:
-                    # Normalize date format to YYYY-MM-DD (remove time component if present)
                     normalized_date_str = date_str.split('T')[0] if 'T' in date_str else date_str
-                    logger.debug(f"📅 Processing portfolio total for date: {date_str} -> normalized: {normalized_date_str}")
-                    
-                    # Convert string to date object for database queries
-                    normalized_date = datetime.strptime(normalized_date_str, "%Y-%m-%d").date()
-                    
-                    # Get all portfolio fund IDs for the selected products (this needs to be calculated)
-                    # First get all portfolio IDs for the selected products
-                    portfolio_ids = await db.fetch(
-                        """
-                        SELECT portfolio_id FROM client_products
-                        WHERE id = ANY($1::int[]) AND portfolio_id IS NOT NULL
-                        """,
-                        request.product_ids
-                    )
-                    
-                    portfolio_id_list = [row["portfolio_id"] for row in portfolio_ids if row["portfolio_id"]]
-
-                    if not portfolio_id_list:
-                        logger.warning(f"No portfolio IDs found for products {request.product_ids}")
-                        portfolio_irr_history.append({
-                            "date": date_str,
-                            "portfolio_irr": None,
-                            "valuation": None,
-                            "profit": None,
-                            "investments": None,
-                            "withdrawals": None
-                        })
-                        continue
-
-                    # Calculate proper portfolio total IRR by aggregating all cash flows
-                    # This uses the same multi-portfolio IRR calculation logic as the IRR calculation page
-                    portfolio_irr = None
-
-                    # Get all portfolio fund IDs for all products in the report
-                    all_portfolio_fund_ids = await db.fetch(
-                        """
-                        SELECT pf.id
-                        FROM portfolio_funds pf
-                        WHERE pf.portfolio_id = ANY($1::int[])
-                        """,
-                        portfolio_id_list
+                    parsed_dates[date_str] = datetime.strptime(normalized_date_str, "%Y-%m-%d").date()
+                except (TypeError, ValueError) as date_error:
+                    logger.error(f"Invalid IRR history date {date_str}: {str(date_error)}")
+                    parsed_dates[date_str] = None
+            query_dates = sorted({day for day in parsed_dates.values() if day is not None})
+
+            product_portfolios = {product["id"]: product["portfolio_id"] for product in products}
+            portfolio_id_list = sorted({portfolio_id for portfolio_id in product_portfolios.values() if portfolio_id})
+
+            # (portfolio_id, date) -> value; portfolio_id None is the total across all the portfolios
+            stored_irrs = {}
+            valuations = {}
+            activity_totals = {}
+            portfolio_irrs = {}
+
+            if portfolio_id_list and query_dates:
+                # Stored IRRs from portfolio_historical_irr (same source as individual product cards)
+                stored_irr_rows = await db.fetch(
+                    """
+                    SELECT DISTINCT ON (portfolio_id, date) portfolio_id, date, irr_result
+                    FROM portfolio_historical_irr
+                    WHERE portfolio_id = ANY($1::int[]) AND date = ANY($2::date[])
+                    ORDER BY portfolio_id, date
+                    """,
+                    portfolio_id_list, query_dates
+                )
+                for row in stored_irr_rows:
+                    if row["irr_result"] is not None:
+                        stored_irrs[(row["portfolio_id"], row["date"])] = float(row["irr_result"])
+
+                # Valuations on each date, per portfolio and in total
+                valuation_rows = await db.fetch(
+                    """
+                    SELECT pf.portfolio_id, fv.valuation_date, SUM(fv.valuation) as total_valuation
+                    FROM portfolio_fund_valuations fv
+                    JOIN portfolio_funds pf ON pf.id = fv.portfolio_fund_id
+                    WHERE pf.portfolio_id = ANY($1::int[]) AND fv.valuation_date = ANY($2::date[])
+                    GROUP BY GROUPING SETS ((pf.portfolio_id, fv.valuation_date), (fv.valuation_date))
+                    """,
+                    portfolio_id_list, query_dates
+                )
+                for row in valuation_rows:
+                    if row["total_valuation"]:
+                        valuations[(row["portfolio_id"], row["valuation_date"])] = float(row["total_valuation"])
+
+                # Activity totals by type up to each date, per portfolio and in total
+                activity_rows = await db.fetch(
+                    """
+                    SELECT pf.portfolio_id, d.day, hal.activity_type, SUM(hal.amount) as total_amount
+                    FROM unnest($2::date[]) AS d(day)
+                    JOIN holding_activity_log hal ON hal.activity_timestamp <= d.day
+                    JOIN portfolio_funds pf ON pf.id = hal.portfolio_fund_id
+                    WHERE pf.portfolio_id = ANY($1::int[])
+                    GROUP BY GROUPING SETS ((pf.portfolio_id, d.day, hal.activity_type), (d.day, hal.activity_type))
+                    """,
+                    portfolio_id_list, query_dates
+                )
+                for row in activity_rows:
+                    activity_totals.setdefault((row["portfolio_id"], row["day"]), []).append(
+                        (row["activity_type"], row["total_amount"])
                     )
 
-                    if all_portfolio_fund_ids:
-                        fund_ids_list = [int(row["id"]) for row in all_portfolio_fund_ids]
-                        logger.debug(f"📊 Found {len(fund_ids_list)} portfolio funds across {len(portfolio_id_list)} portfolios for IRR calculation")
-
-                        try:
-                            # Import the multi-portfolio IRR calculation function
-                            from app.api.routes.portfolio_funds import calculate_multiple_portfolio_funds_irr
+                # Portfolio total IRR on every date in one pass: all cash flows of all the funds,
+                # as calculate_multiple_portfolio_funds_irr aggregates them for one date
+                try:
+                    combined_state = await load_combined_irr_state(db, portfolio_id_list)
+                    if len(combined_state.fund_ids):
+                        portfolio_irrs = dict(zip(query_dates, solve_portfolio_irrs(combined_state, query_dates)))
+                        logger.debug(f"📊 Calculated aggregated portfolio IRRs for {len(query_dates)} dates across {len(combined_state.fund_ids)} portfolio funds")
+                    else:
+                        logger.warning(f"No portfolio funds found for portfolios {portfolio_id_list}")
+                except Exception as calc_error:
+                    logger.error(f"Error calculating aggregated portfolio IRRs: {str(calc_error)}")
+            elif not portfolio_id_list:
+                logger.warning(f"No portfolio IDs found for products {request.product_ids}")
+
+            empty_values = {
+                "valuation": None,
+                "profit": None,
+                "investments": None,
+                "withdrawals": None
+            }
 
-                            # Calculate aggregated IRR for all funds on this specific date
-                            # This properly aggregates all cash flows and calculates the true portfolio IRR
-                            irr_result = await calculate_multiple_portfolio_funds_irr(
-                                portfolio_fund_ids=fund_ids_list,
-                                irr_date=normalized_date.strftime('%Y-%m-%d'),
-                                bypass_cache=True,  # Force fresh calculation
-                                db=db
-                            )
+            for product_id in request.product_ids:
+                if product_id not in product_info_map:
+                    continue
 
-                            if irr_result.get("success") and irr_result.get("irr_percentage") is not None:
-                                portfolio_irr = float(irr_result["irr_percentage"])
-                                logger.debug(f"📊 Calculated aggregated portfolio IRR for date {date_str}: {portfolio_irr}%")
-                                logger.debug(f"📊 IRR calculation details: {irr_result.get('message', 'N/A')}")
-                            else:
-                                logger.debug(f"📊 Portfolio IRR calculation returned no result for date {date_str}: {irr_result.get('message', 'N/A')}")
+                product_info = product_info_map[product_id]
+                portfolio_id = product_portfolios[product_id]
 
-                        except Exception as calc_error:
-                            logger.error(f"Error calculating aggregated portfolio IRR for date {date_str}: {str(calc_error)}")
-                            portfolio_irr = None
+                for date_str in request.selected_dates:
+                    row = {
+                        "product_id": product_id,
+                        "product_name": product_info["product_name"],
+                        "provider_name": product_info["provider_name"],
+                        "provider_theme_color": product_info["provider_theme_color"],
+                        "status": product_info["status"],
+                        "irr_date": date_str
+                    }
+                    day = parsed_dates[date_str]
+                    if not portfolio_id or day is None:
+                        # Null entries for consistency
+                        row.update(irr_result=None, **empty_values)
                     else:
-                        logger.warning(f"No portfolio funds found for portfolios {portfolio_id_list} on date {date_str}")
-
-                    # Get total valuation for all portfolios on this date
-                    total_valuation = 0.0
-                    valuation_result = await db.fetchrow(
-                        """
-                        SELECT SUM(fv.valuation) as total_valuation
-                        FROM portfolio_fund_valuations fv
-                        JOIN portfolio_funds pf ON pf.id = fv.portfolio_fund_id
-                        WHERE pf.portfolio_id = ANY($1::int[]) AND fv.valuation_date = $2
-                        """,
-                        portfolio_id_list, normalized_date
-                    )
-                    if valuation_result and valuation_result["total_valuation"]:
-                        total_valuation = float(valuation_result["total_valuation"])
-
-                    # Get total activities for all portfolios up to this date
-                    activities = await db.fetch(
-                        """
-                        SELECT activity_type, SUM(amount) as total_amount
-                        FROM holding_activity_log
-                        WHERE portfolio_fund_id IN (
-                            SELECT id FROM portfolio_funds WHERE portfolio_id = ANY($1::int[])
+                        valuation = valuations.get((portfolio_id, day), 0.0)
+                        investments, withdrawals = _profit_components(activity_totals.get((portfolio_id, day), []))
+                        row.update(
+                            irr_result=stored_irrs.get((portfolio_id, day)),
+                            valuation=valuation,
+                            # Profit: valuation - investments - withdrawals
+                            profit=valuation - investments - withdrawals,
+                            investments=investments,
+                            withdrawals=withdrawals
                         )
-                        AND activity_timestamp <= $2
-                        GROUP BY activity_type
-                        """,
-                        portfolio_id_list, normalized_date
-                    )
-
-                    # Calculate total profit components
-                    total_investments = 0.0
-                    total_withdrawals = 0.0
-
-                    for activity in activities:
-                        activity_type = activity["activity_type"].lower()
-                        amount = float(activity["total_amount"])
+                    product_irr_history.append(row)
 
-                        # Money IN (subtract from profit)
-                        if any(keyword in activity_type for keyword in ["investment", "taxuplift", "fundswitchin", "productswitchin"]):
-                            total_investments += amount
-                        # Money OUT (subtract from profit)
-                        elif any(keyword in activity_type for keyword in ["withdrawal", "fundswitchout", "productswitchout"]):
-                            total_withdrawals += amount
-
-                    # Calculate total profit: valuation - investments - withdrawals
-                    total_profit = total_valuation - total_investments - total_withdrawals
+            # Portfolio totals for each date (aggregated across multiple portfolios)
+            for date_str in request.selected_dates:
+                day = parsed_dates[date_str]
+                if not portfolio_id_list or day is None:
+                    portfolio_irr_history.append({"date": date_str, "portfolio_irr": None, **empty_values})
+                    continue
 
-                    portfolio_irr_history.append({
-                        "date": date_str,
-                        "portfolio_irr": portfolio_irr,
-                        "valuation": total_valuation,
-                        "profit": total_profit,
-                        "investments": total_investments,
-                        "withdrawals": total_withdrawals
-                    })
-                    
-                except Exception as date_error:
-                    logger.error(f"Error calculating aggregated portfolio IRR for date {date_str}: {str(date_error)}")
-                    portfolio_irr_history.append({
-                        "date": date_str,
-                        "portfolio_irr": None,
-                        "valuation": None,
-                        "profit": None,
-                        "investments": None,
-                        "withdrawals": None
-                    })
+                total_valuation = valuations.get((None, day), 0.0)
+                total_investments, total_withdrawals = _profit_components(activity_totals.get((None, day), []))
+                portfolio_irr_history.append({
+                    "date": date_str,
+                    "portfolio_irr": portfolio_irrs.get(day),
+                    "valuation": total_valuation,
+                    "profit": total_valuation - total_investments - total_withdrawals,
+                    "investments": total_investments,
+                    "withdrawals": total_withdrawals
+                })
             
             logger.info(f"Successfully fetched IRR history summary: {len(product_irr_history)} product rows, {len(portfolio_irr_history)} date totals")
             
@@ -640,7 +522,7 @@ async def get_irr_history_summary(
 async def get_combined_historical_irr(
     product_id: int,
     limit: Optional[int] = Query(default=12, description="Maximum number of historical IRR records"),
-    db = Depends(get_db)
+    db = Depends(get_read_db)
 ):
     """
     Get both portfolio-level and fund-level historical IRR data for a product.
@@ -1,17 +1,22 @@
-from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from app.api.route_classes import CRUDRoute, BatchRoute
 from typing import List, Optional
 import logging
-from datetime import datetime, date
+from datetime import datetime, date, timezone
 from decimal import Decimal
 
 from app.models.holding_activity_log import HoldingActivityLog, HoldingActivityLogCreate, HoldingActivityLogUpdate
-from app.db.database import get_db
+from app.db.database import get_db, exact_numeric
+from app.api.streaming import get_db_unless_streaming, stream_param, stream_query
+from app.api.pagination import decode_cursor, keyset_condition, set_next_cursor
 
 # Import standardized IRR calculation functions
 from app.api.routes.portfolio_funds import calculate_single_portfolio_fund_irr, calculate_multiple_portfolio_funds_irr
 
 # Import modern IRR cascade service
 from app.services.irr_cascade_service import IRRCascadeService
+# IRR cascades after activity writes run on the background job queue
+from app.services.irr_job_queue import enqueue_irr_job, ACTIVITY_CHANGED, IRR_JOB_HEADER
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -102,6 +107,19 @@ async def log_out_of_range_activity_warning(portfolio_fund_id: int, activity_dat
     except Exception as e:
         logger.error(f"Error checking out-of-range activity: {e}")
 
+async def queue_activity_irr(db, response: Optional[Response], portfolio_fund_id: int, activity_dates: List) -> Optional[int]:
+    """
+    Queue the IRR cascade for activities changed on a portfolio fund instead of running it in the request.
+    The background job recalculates every valuation date on or after the earliest activity date.
+    The job id is returned in the X-IRR-Job-Id header; poll /api/irr_jobs/{id} for completion.
+    Call it inside the transaction that writes the activity: the job commits with the write,
+    and a queueing failure rolls the write back and fails the request.
+    """
+    job_id = await enqueue_irr_job(db, ACTIVITY_CHANGED, portfolio_fund_id, activity_dates)
+    if job_id is not None and response is not None:
+        response.headers[IRR_JOB_HEADER] = str(job_id)
+    return job_id
+
 async def recalculate_irr_after_activity_change(portfolio_fund_id: int, db, activity_date: str = None):
     """
     OPTIMIZED: This function now uses targeted IRR recalculation for single activities.
@@ -458,10 +476,13 @@ async def recalculate_portfolio_irr_values_from_date(portfolio_id: int, start_da
         logger.error(f"Traceback: {traceback.format_exc()}")
         return 0
 
-router = APIRouter()
+router = APIRouter(route_class=CRUDRoute)
+# Bulk imports and full recalculations get the longer batch time budget; included into router at the end of the module
+batch_router = APIRouter(route_class=BatchRoute)
 
 @router.get("/holding_activity_logs", response_model=List[HoldingActivityLog])
 async def get_holding_activity_logs(
+    response: Response,
     skip: int = Query(0, ge=0, description="Number of records to skip for pagination"),
     limit: int = Query(100000, ge=1, le=100000, description="Max number of records to return"),
     product_id: Optional[int] = None,
@@ -470,11 +491,17 @@ async def get_holding_activity_logs(
     activity_type: Optional[str] = None,
     from_date: Optional[str] = None,
     to_date: Optional[str] = None,
-    db = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="Opaque keyset cursor from the X-Next-Cursor header of the previous page"),
+    stream: Optional[str] = Depends(stream_param),
+    db = Depends(get_db_unless_streaming)
 ):
     """
     Retrieves a paginated list of holding activity logs with optional filtering.
+    Pass stream=ndjson or stream=json to stream the rows instead of returning one list.
+    Pages are ordered by (activity_timestamp, id); pass the X-Next-Cursor header back as `cursor` for the next page.
     """
+    after = decode_cursor(cursor, "activity_timestamp") if cursor else None
+
     try:
         # Build base query with filters
         where_conditions = []
@@ -520,6 +547,12 @@ async def get_holding_activity_logs(
             param_count += 1
             where_conditions.append(f"activity_timestamp <= ${param_count}")
             params.append(to_date)
+
+        # Keyset pagination: rows strictly after the cursor position
+        if after is not None:
+            where_conditions.append(keyset_condition("activity_timestamp", "id", param_count + 1))
+            params.extend(after)
+            param_count += 2
         
         # Build the complete query
         where_clause = " WHERE " + " AND ".join(where_conditions) if where_conditions else ""
@@ -534,12 +567,17 @@ async def get_holding_activity_logs(
         query = f"""
             SELECT * FROM holding_activity_log
             {where_clause}
-            ORDER BY activity_timestamp DESC
+            ORDER BY activity_timestamp DESC, id DESC
             OFFSET ${offset_param} LIMIT ${limit_param}
         """
         
+        if stream:
+            return stream_query(query, params, stream, label="holding_activity_logs")
+
         result = await db.fetch(query, *params)
-        return [dict(row) for row in result]
+        activity_logs = [dict(row) for row in result]
+        set_next_cursor(response, activity_logs, "activity_timestamp", limit)
+        return activity_logs
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
@@ -547,6 +585,7 @@ async def get_holding_activity_logs(
 async def create_holding_activity_log(
     log: HoldingActivityLogCreate,
     request: Request,
+    response: Response,
     db = Depends(get_db),
     skip_irr_calculation: bool = False  # New parameter to skip IRR when part of transaction
 ):
@@ -576,44 +615,32 @@ async def create_holding_activity_log(
         else:
             activity_datetime = log.activity_timestamp
             
-        # Insert the new activity log - pass timezone-aware datetime to avoid conversion issues
-        created_activity = await db.fetchrow(
-            "INSERT INTO holding_activity_log (portfolio_fund_id, product_id, activity_type, activity_timestamp, amount) VALUES ($1, $2, $3, $4, $5) RETURNING *",
-            log.portfolio_fund_id, log.product_id, log.activity_type, activity_datetime, float(log.amount) if log.amount is not None else None
-        )
-        
-        if not created_activity:
-            raise HTTPException(status_code=500, detail="Failed to create holding activity log")
-        
-        portfolio_fund_id = created_activity['portfolio_fund_id']
-        
-        logger.info(f"Created new holding activity log for portfolio fund {portfolio_fund_id}")
-        logger.info(f"🔍 ACTIVITY CREATED: Database returned - ID={created_activity['id']}, Timestamp={created_activity['activity_timestamp']}, Type={type(created_activity['activity_timestamp'])}")
-        
-        # ========================================================================
-        # NEW: Conditional IRR recalculation for transaction coordination
-        # ========================================================================
-        if skip_irr_calculation:
-            logger.info(f"⏭️ TRANSACTION COORDINATOR: Skipping IRR calculation for activity on fund {portfolio_fund_id} (will be calculated after valuation)")
-        else:
-            logger.info(f"🔄 STANDALONE: Calculating IRR for activity on fund {portfolio_fund_id} (not part of transaction)")
-            try:
-                # Extract the activity date for sophisticated recalculation
+        # The insert and its IRR job commit together
+        async with db.transaction():
+            # Insert the new activity log - pass timezone-aware datetime to avoid conversion issues
+            created_activity = await db.fetchrow(
+                "INSERT INTO holding_activity_log (portfolio_fund_id, product_id, activity_type, activity_timestamp, amount) VALUES ($1, $2, $3, $4, $5) RETURNING *",
+                log.portfolio_fund_id, log.product_id, log.activity_type, activity_datetime, float(log.amount) if log.amount is not None else None
+            )
+            
+            if not created_activity:
+                raise HTTPException(status_code=500, detail="Failed to create holding activity log")
+            
+            portfolio_fund_id = created_activity['portfolio_fund_id']
+            
+            logger.info(f"Created new holding activity log for portfolio fund {portfolio_fund_id}")
+            logger.info(f"🔍 ACTIVITY CREATED: Database returned - ID={created_activity['id']}, Timestamp={created_activity['activity_timestamp']}, Type={type(created_activity['activity_timestamp'])}")
+            
+            # ========================================================================
+            # NEW: Conditional IRR recalculation for transaction coordination
+            # ========================================================================
+            if skip_irr_calculation:
+                logger.info(f"⏭️ TRANSACTION COORDINATOR: Skipping IRR calculation for activity on fund {portfolio_fund_id} (will be calculated after valuation)")
+            else:
+                logger.info(f"🔄 STANDALONE: Queueing IRR recalculation for activity on fund {portfolio_fund_id} (not part of transaction)")
                 # log.activity_timestamp is already a date object after Pydantic validation
-                if hasattr(log.activity_timestamp, 'isoformat'):
-                    activity_date = log.activity_timestamp.isoformat()  # date.isoformat() gives YYYY-MM-DD
-                else:
-                    activity_date = str(log.activity_timestamp)
-                
-                logger.info(f"🔍 ACTIVITY DATE EXTRACTION: Original={log.activity_timestamp}, Type={type(log.activity_timestamp)}, Extracted={activity_date}")
-                
-                irr_recalc_result = await recalculate_irr_after_activity_change(portfolio_fund_id, db, activity_date)
-            except Exception as e:
-                # Don't fail the activity creation if IRR recalculation fails
-                logger.error(f"IRR recalculation failed after activity creation: {str(e)}")
-                import traceback
-                logger.error(f"Traceback: {traceback.format_exc()}")
-        # ========================================================================
+                await queue_activity_irr(db, response, portfolio_fund_id, [log.activity_timestamp])
+            # ========================================================================
         
         return dict(created_activity)
         
@@ -688,6 +715,7 @@ async def get_holding_activity_log(holding_activity_log_id: int, db = Depends(ge
 async def update_holding_activity_log(
     activity_id: int,
     holding_activity_log: HoldingActivityLogUpdate,
+    response: Response,
     db = Depends(get_db)
 ):
     """
@@ -725,68 +753,66 @@ async def update_holding_activity_log(
 
         logger.info(f"Updating activity {activity_id} with data: {update_data}")
 
-        # Build dynamic UPDATE query
-        if update_data:
-            set_clauses = []
-            params = []
-            param_count = 0
-            
-            for key, value in update_data.items():
+        # Use the updated activity date if provided, otherwise use the existing one
+        activity_date = None
+        if 'activity_timestamp' in update_data:
+            # update_data['activity_timestamp'] is already a date object after Pydantic validation
+            if hasattr(update_data['activity_timestamp'], 'isoformat'):
+                activity_date = update_data['activity_timestamp'].isoformat()
+            else:
+                activity_date = str(update_data['activity_timestamp'])
+        else:
+            # existing_result["activity_timestamp"] could be a date or datetime from database
+            existing_timestamp = existing_result["activity_timestamp"]
+            if hasattr(existing_timestamp, 'date'):
+                # It's a datetime, get the date part
+                activity_date = existing_timestamp.date().isoformat()
+            elif hasattr(existing_timestamp, 'isoformat'):
+                # It's already a date
+                activity_date = existing_timestamp.isoformat()
+            else:
+                # Fallback to string conversion
+                activity_date = str(existing_timestamp).split('T')[0]
+                
+        logger.info(f"🔍 ACTIVITY DATE EXTRACTION (UPDATE): Extracted={activity_date}, UpdateData={update_data.get('activity_timestamp')}, ExistingType={type(existing_result['activity_timestamp'])}")
+
+        # The update and its IRR jobs commit together
+        async with db.transaction():
+            # Build dynamic UPDATE query
+            if update_data:
+                set_clauses = []
+                params = []
+                param_count = 0
+                
+                for key, value in update_data.items():
+                    param_count += 1
+                    set_clauses.append(f"{key} = ${param_count}")
+                    params.append(value)
+                
                 param_count += 1
-                set_clauses.append(f"{key} = ${param_count}")
-                params.append(value)
+                params.append(activity_id)
+                
+                query = f"UPDATE holding_activity_log SET {', '.join(set_clauses)} WHERE id = ${param_count} RETURNING *"
+                updated_activity = await db.fetchrow(query, *params)
+            else:
+                updated_activity = existing_result
             
-            param_count += 1
-            params.append(activity_id)
+            if not updated_activity:
+                raise HTTPException(status_code=400, detail="Failed to update holding activity log")
             
-            query = f"UPDATE holding_activity_log SET {', '.join(set_clauses)} WHERE id = ${param_count} RETURNING *"
-            updated_activity = await db.fetchrow(query, *params)
-        else:
-            updated_activity = existing_result
-        
-        if not updated_activity:
-            raise HTTPException(status_code=400, detail="Failed to update holding activity log")
-        
-        # ========================================================================
-        # NEW: Automatically recalculate IRR after updating activity
-        # ========================================================================
-        try:
-            # Get the portfolio_fund_id from the existing record
+            # ====================================================================
+            # Queue IRR recalculation after updating activity (runs after the response)
+            # ====================================================================
             portfolio_fund_id = existing_result["portfolio_fund_id"]
-            
-            # Use the updated activity date if provided, otherwise use the existing one
-            activity_date = None
-            if 'activity_timestamp' in update_data:
-                # update_data['activity_timestamp'] is already a date object after Pydantic validation
-                if hasattr(update_data['activity_timestamp'], 'isoformat'):
-                    activity_date = update_data['activity_timestamp'].isoformat()
-                else:
-                    activity_date = str(update_data['activity_timestamp'])
-            else:
-                # existing_result["activity_timestamp"] could be a date or datetime from database
-                existing_timestamp = existing_result["activity_timestamp"]
-                if hasattr(existing_timestamp, 'date'):
-                    # It's a datetime, get the date part
-                    activity_date = existing_timestamp.date().isoformat()
-                elif hasattr(existing_timestamp, 'isoformat'):
-                    # It's already a date
-                    activity_date = existing_timestamp.isoformat()
-                else:
-                    # Fallback to string conversion
-                    activity_date = str(existing_timestamp).split('T')[0]
-                    
-            logger.info(f"🔍 ACTIVITY DATE EXTRACTION (UPDATE): Extracted={activity_date}, UpdateData={update_data.get('activity_timestamp')}, ExistingType={type(existing_result['activity_timestamp'])}")
-            
             if portfolio_fund_id:
-                logger.info(f"Triggering sophisticated IRR recalculation after updating activity for portfolio fund {portfolio_fund_id} on date {activity_date}")
-                irr_recalc_result = await recalculate_irr_after_activity_change(portfolio_fund_id, db, activity_date)
-                logger.info(f"Sophisticated IRR recalculation result: {irr_recalc_result}")
+                # A moved activity affects valuations from the earlier of its old and new dates
+                logger.info(f"Queueing IRR recalculation after updating activity for portfolio fund {portfolio_fund_id} on date {activity_date}")
+                await queue_activity_irr(db, response, portfolio_fund_id, [activity_date, existing_result["activity_timestamp"]])
+                if update_data.get('portfolio_fund_id', portfolio_fund_id) != portfolio_fund_id:
+                    await queue_activity_irr(db, response, update_data['portfolio_fund_id'], [activity_date])
             else:
                 logger.warning("No portfolio_fund_id found for IRR recalculation")
-        except Exception as e:
-            # Don't fail the activity update if IRR recalculation fails
-            logger.error(f"IRR recalculation failed after activity update: {str(e)}")
-        # ========================================================================
+            # ====================================================================
         
         return dict(updated_activity)
         
@@ -797,7 +823,7 @@ async def update_holding_activity_log(
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @router.delete("/holding_activity_logs/{holding_activity_log_id}")
-async def delete_holding_activity_log(holding_activity_log_id: int, db = Depends(get_db)):
+async def delete_holding_activity_log(holding_activity_log_id: int, response: Response, db = Depends(get_db)):
     """
     Deletes a holding activity log.
     Simple version that just deletes the record.
@@ -826,25 +852,17 @@ async def delete_holding_activity_log(holding_activity_log_id: int, db = Depends
             
         logger.info(f"🔍 ACTIVITY DATE EXTRACTION (DELETE): Extracted={activity_date}, ExistingType={type(existing_timestamp)}")
         
-        # Delete the activity log
-        await db.execute("DELETE FROM holding_activity_log WHERE id = $1", holding_activity_log_id)
-        
-        logger.info(f"Successfully deleted activity log with ID: {holding_activity_log_id}")
-        
-        # ========================================================================
-        # NEW: Automatically recalculate IRR after deleting activity
-        # ========================================================================
-        try:
+        # Delete the activity log and queue IRR recalculation (runs after the response) in one transaction
+        async with db.transaction():
+            await db.execute("DELETE FROM holding_activity_log WHERE id = $1", holding_activity_log_id)
+            
             if portfolio_fund_id:
-                logger.info(f"Triggering sophisticated IRR recalculation after deleting activity for portfolio fund {portfolio_fund_id} on date {activity_date}")
-                irr_recalc_result = await recalculate_irr_after_activity_change(portfolio_fund_id, db, activity_date)
-                logger.info(f"Sophisticated IRR recalculation result: {irr_recalc_result}")
+                logger.info(f"Queueing IRR recalculation after deleting activity for portfolio fund {portfolio_fund_id} on date {activity_date}")
+                await queue_activity_irr(db, response, portfolio_fund_id, [activity_date])
             else:
                 logger.warning("No portfolio_fund_id found for IRR recalculation")
-        except Exception as e:
-            # Don't fail the activity deletion if IRR recalculation fails
-            logger.error(f"IRR recalculation failed after activity deletion: {str(e)}")
-        # ========================================================================
+        
+        logger.info(f"Successfully deleted activity log with ID: {holding_activity_log_id}")
         
         return {"status": "success", "message": f"Activity log with ID {holding_activity_log_id} deleted successfully"}
         
@@ -1055,7 +1073,7 @@ async def compare_irr_performance(
         logger.error(f"Error in IRR performance comparison: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Performance test failed: {str(e)}")
 
-@router.post("/holding_activity_logs/recalculate_all_portfolio_irr")
+@batch_router.post("/holding_activity_logs/recalculate_all_portfolio_irr")
 async def recalculate_all_portfolio_irr(
     portfolio_id: int = Query(..., description="Portfolio ID to recalculate IRR for all funds"),
     activity_date: Optional[str] = Query(None, description="Activity date to use for recalculation (YYYY-MM-DD format)"),
@@ -1137,27 +1155,83 @@ async def recalculate_all_portfolio_irr(
         return {"success": False, "error": str(e)}
 
 
-# ==================== BULK OPERATIONS WITH SEQUENCE RESERVATION ====================
+# ==================== BULK OPERATIONS (COPY-BASED INGEST) ====================
 
-from app.utils.sequence_manager import SequenceManager
+BULK_STAGING_COLUMNS = ['row_index', 'portfolio_fund_id', 'product_id', 'activity_type', 'amount', 'activity_timestamp']
 
-@router.post("/holding_activity_logs/bulk", response_model=List[dict])
+async def validate_bulk_activity_dates(activities: List[HoldingActivityLogCreate], db) -> List[dict]:
+    """
+    Set-based version of validate_activity_date_against_product for bulk imports.
+    
+    Checks every activity against its product start date in a single query instead of
+    one query per row.
+    
+    Args:
+        activities: Activities to validate
+        db: Database connection
+        
+    Returns:
+        List of per-row errors ({'index', 'portfolio_fund_id', 'activity_timestamp', 'error'}),
+        empty if every row is valid
+    """
+    rows = await db.fetch("""
+        SELECT a.row_index, a.portfolio_fund_id, a.activity_date,
+               pf.id AS found_portfolio_fund_id,
+               cp.id AS product_id, cp.product_name, cp.start_date
+        FROM unnest($1::int[], $2::bigint[], $3::date[]) AS a(row_index, portfolio_fund_id, activity_date)
+        LEFT JOIN portfolio_funds pf ON pf.id = a.portfolio_fund_id
+        -- One product per row: a portfolio shared by several products is checked against the earliest start
+        LEFT JOIN LATERAL (
+            SELECT id, product_name, start_date
+            FROM client_products
+            WHERE portfolio_id = pf.portfolio_id
+            ORDER BY start_date NULLS LAST, id
+            LIMIT 1
+        ) cp ON true
+        WHERE pf.id IS NULL
+           OR date_trunc('month', a.activity_date) < date_trunc('month', cp.start_date)
+        ORDER BY a.row_index
+    """,
+        list(range(len(activities))),
+        [a.portfolio_fund_id for a in activities],
+        [a.activity_timestamp for a in activities]
+    )
+    
+    errors = []
+    for row in rows:
+        if row['found_portfolio_fund_id'] is None:
+            error = f"Portfolio fund {row['portfolio_fund_id']} does not exist"
+        else:
+            # Same rule as validate_activity_date_against_product: same month as the start date is allowed
+            error = (
+                f"Activity date {row['activity_date']} is in a month before product start date {row['start_date']} "
+                f"for product '{row['product_name']}' (ID: {row['product_id']}). Activities are allowed in the same month or after."
+            )
+        errors.append({
+            'index': row['row_index'],
+            'portfolio_fund_id': row['portfolio_fund_id'],
+            'activity_timestamp': row['activity_date'].isoformat(),
+            'error': error
+        })
+    return errors
+
+@batch_router.post("/holding_activity_logs/bulk", response_model=List[dict])
 async def create_bulk_holding_activity_logs(
     activities: List[HoldingActivityLogCreate],
     skip_irr_calculation: bool = Query(False, description="Skip IRR recalculation for transaction coordination"),
     db = Depends(get_db)
 ):
     """
-    Bulk create holding activity logs with sequence reservation
+    Bulk create holding activity logs using COPY
     
-    This endpoint uses sequence reservation to prevent ID conflicts during bulk operations.
     Designed for high-volume activity imports and bulk monthly saves.
     
     Key Features:
-    - Atomic sequence reservation prevents race conditions
-    - Batch processing with individual error handling
+    - One set-based query validates every activity date against its product start date
+    - Rows are loaded with COPY (copy_records_to_table) into a temporary staging table
+    - A single INSERT ... SELECT merges the staging rows into holding_activity_log
+    - All-or-nothing: if any row is invalid nothing is written and every failing row is reported
     - Optional IRR recalculation coordination
-    - Comprehensive logging and error reporting
     
     Args:
         activities: List of activity log data to create
@@ -1168,112 +1242,96 @@ async def create_bulk_holding_activity_logs(
         List of created activity log records with assigned IDs
         
     Raises:
-        HTTPException: On validation errors or database failures
+        HTTPException: 400 with a per-row `errors` list on validation failures, 500 on database failures
     """
     try:
         if not activities:
             logger.info("🚀 BULK: No activities provided, returning empty list")
             return []
         
-        logger.info(f"🚀 BULK: Creating {len(activities)} activity logs with sequence reservation")
+        logger.info(f"🚀 BULK: Creating {len(activities)} activity logs via COPY staging")
         
-        # Convert Pydantic models to dict format for bulk insertion
-        activity_data = []
-        for log in activities:
-            # 🔒 VALIDATION: Check activity date against product start date
-            await validate_activity_date_against_product(log.portfolio_fund_id, log.activity_timestamp, db)
-            
-            # Handle timezone conversion - improved datetime parsing
-            if isinstance(log.activity_timestamp, date) and not isinstance(log.activity_timestamp, datetime):
-                from datetime import timezone
-                activity_datetime = datetime.combine(log.activity_timestamp, datetime.min.time()).replace(tzinfo=timezone.utc)
-                logger.debug(f"🔧 BULK: Converted date {log.activity_timestamp} to datetime {activity_datetime}")
-            elif isinstance(log.activity_timestamp, str):
-                # Handle ISO datetime strings (e.g., "2025-08-01T00:00:00Z")
-                try:
-                    from dateutil import parser
-                    activity_datetime = parser.parse(log.activity_timestamp)
-                    logger.debug(f"🔧 BULK: Parsed ISO string '{log.activity_timestamp}' to datetime {activity_datetime}")
-                except ImportError:
-                    # Fallback if dateutil is not available
-                    import re
-                    # Extract just the date part if it's an ISO string
-                    date_match = re.match(r'(\d{4}-\d{2}-\d{2})', log.activity_timestamp)
-                    if date_match:
-                        date_str = date_match.group(1)
-                        activity_datetime = datetime.strptime(date_str, '%Y-%m-%d').replace(tzinfo=timezone.utc)
-                        logger.debug(f"🔧 BULK: Extracted date '{date_str}' from '{log.activity_timestamp}' → {activity_datetime}")
-                    else:
-                        activity_datetime = log.activity_timestamp
-                except Exception as parse_error:
-                    logger.warning(f"⚠️ BULK: Failed to parse datetime string '{log.activity_timestamp}': {parse_error}, using as-is")
-                    activity_datetime = log.activity_timestamp
-            else:
-                activity_datetime = log.activity_timestamp
-            
-            # Prepare data dict (matching the structure from lines 492-495)
-            activity_record = {
-                'portfolio_fund_id': log.portfolio_fund_id,
-                'product_id': log.product_id,
-                'activity_type': log.activity_type,
-                'activity_timestamp': activity_datetime,
-                'amount': float(log.amount) if log.amount is not None else None,
-                'created_at': datetime.utcnow()
-            }
-            
-            activity_data.append(activity_record)
-            logger.debug(f"🔍 BULK: Prepared activity - Fund: {log.portfolio_fund_id}, Type: {log.activity_type}, Amount: {log.amount}")
-        
-        # Use sequence manager for bulk insert with reserved IDs
-        logger.info("🔒 BULK: Using SequenceManager for bulk insert with sequence reservation")
-        created_activities = await SequenceManager.bulk_insert_with_reserved_ids(
-            db=db,
-            table_name='holding_activity_log',
-            data=activity_data,
-            sequence_name='holding_activity_log_id_seq'
+        # 🔒 VALIDATION: Check all activity dates against product start dates in one query
+        validation_errors = await validate_bulk_activity_dates(activities, db)
+        if validation_errors:
+            logger.error(f"VALIDATION ERROR: {len(validation_errors)}/{len(activities)} bulk activities failed validation")
+            raise HTTPException(
+                status_code=400,
+                detail={
+                    'message': f"{len(validation_errors)} of {len(activities)} activities failed validation; nothing was saved",
+                    'errors': validation_errors
+                }
+            )
+        
+        # Activity dates are stored as midnight UTC (same as the single-create endpoint)
+        records = [
+            (
+                index,
+                log.portfolio_fund_id,
+                log.product_id,
+                log.activity_type,
+                log.amount,
+                datetime.combine(log.activity_timestamp, datetime.min.time()).replace(tzinfo=timezone.utc)
+            )
+            for index, log in enumerate(activities)
+        ]
+        
+        # COPY sends NUMERIC in binary, which needs the built-in codec
+        async with exact_numeric(db):
+            async with db.transaction():
+                await db.execute("""
+                    CREATE TEMP TABLE holding_activity_log_staging (
+                        row_index integer NOT NULL,
+                        portfolio_fund_id bigint,
+                        product_id bigint,
+                        activity_type text,
+                        amount numeric,
+                        activity_timestamp timestamp with time zone
+                    ) ON COMMIT DROP
+                """)
+                await db.copy_records_to_table(
+                    'holding_activity_log_staging',
+                    records=records,
+                    columns=BULK_STAGING_COLUMNS
+                )
+                result = await db.fetch("""
+                    INSERT INTO holding_activity_log
+                        (portfolio_fund_id, product_id, activity_type, amount, activity_timestamp, created_at)
+                    SELECT portfolio_fund_id, product_id, activity_type, amount, activity_timestamp, now()
+                    FROM holding_activity_log_staging
+                    ORDER BY row_index
+                    RETURNING *
+                """)
+                
+                # Queue IRR recalculation in the same transaction, one job per portfolio fund
+                # covering every date imported for it
+                recalc_results = []
+                if not skip_irr_calculation and result:
+                    logger.info("🔄 BULK: Queueing IRR recalculation for affected funds...")
+                    activity_dates = {}
+                    for row in result:
+                        activity_dates.setdefault(row['portfolio_fund_id'], []).append(row['activity_timestamp'])
+                    
+                    for portfolio_fund_id, fund_dates in activity_dates.items():
+                        job_id = await queue_activity_irr(db, None, portfolio_fund_id, fund_dates)
+                        recalc_results.append({
+                            'portfolio_fund_id': portfolio_fund_id,
+                            'success': job_id is not None,
+                            'irr_job_id': job_id
+                        })
+                    
+                    logger.info(f"🔄 BULK: IRR recalculation queued for {len(activity_dates)} funds")
+        
+        created_activities = sorted(
+            ({**dict(row), 'amount': float(row['amount']) if row['amount'] is not None else None} for row in result),
+            key=lambda activity: activity['id']
         )
         
         success_count = len(created_activities)
         logger.info(f"✅ BULK: Successfully created {success_count}/{len(activities)} activities")
         
-        # Handle IRR recalculation if not skipped
+        # Attach the queued IRR jobs if not skipped
         if not skip_irr_calculation and created_activities:
-            logger.info("🔄 BULK: Triggering IRR recalculation for affected funds...")
-            
-            # Group by portfolio fund for efficient recalculation
-            portfolio_funds = set(activity['portfolio_fund_id'] for activity in created_activities)
-            recalc_results = []
-            
-            for portfolio_fund_id in portfolio_funds:
-                try:
-                    logger.info(f"🔄 BULK: Recalculating IRR for portfolio fund {portfolio_fund_id}")
-                    
-                    # Use the existing IRR recalculation logic (from lines 20-85)
-                    irr_result = await recalculate_irr_after_activity_change(
-                        portfolio_fund_id, 
-                        db, 
-                        activity_date=None  # Will use latest activity date
-                    )
-                    
-                    recalc_results.append({
-                        'portfolio_fund_id': portfolio_fund_id,
-                        'success': irr_result.get('success', False),
-                        'irr_values_updated': irr_result.get('irr_values_updated', 0)
-                    })
-                    
-                    logger.info(f"✅ BULK: IRR recalculation completed for fund {portfolio_fund_id}")
-                    
-                except Exception as irr_error:
-                    logger.error(f"⚠️ BULK: IRR recalculation failed for fund {portfolio_fund_id}: {irr_error}")
-                    recalc_results.append({
-                        'portfolio_fund_id': portfolio_fund_id,
-                        'success': False,
-                        'error': str(irr_error)
-                    })
-                    # Don't fail the entire bulk operation for IRR issues
-            
-            logger.info(f"🔄 BULK: IRR recalculation completed for {len(portfolio_funds)} funds")
-            
             # Add recalculation summary to response
             for activity in created_activities:
                 fund_id = activity['portfolio_fund_id']
@@ -1290,14 +1348,15 @@ async def create_bulk_holding_activity_logs(
                 'total_requested': len(activities),
                 'total_created': success_count,
                 'success_rate': (success_count / len(activities)) * 100 if activities else 0,
-                'irr_recalculation_skipped': skip_irr_calculation,
-                'sequence_reservation_used': True
+                'irr_recalculation_skipped': skip_irr_calculation
             }
         }
         
         logger.info(f"🎉 BULK: Bulk activity creation completed - {success_count} activities created")
         return created_activities  # Return just the activities for compatibility
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"❌ BULK: Error creating bulk activity logs: {e}")
         import traceback
@@ -1343,3 +1402,6 @@ def validate_bulk_activities(activities: List[HoldingActivityLogCreate]) -> List
                 errors.append(f"Activity {activity_num}: Invalid amount value: {activity.amount}")
     
     return errors
+
+
+router.include_router(batch_router)
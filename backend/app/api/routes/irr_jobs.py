@@ -0,0 +1,192 @@
+from fastapi import APIRouter, HTTPException, Query, Depends
+from app.api.route_classes import CRUDRoute
+from typing import List, Literal, Optional
+import logging
+import orjson
+from app.db.database import get_db, get_db_sync
+from app.services.irr_job_queue import IRR_JOB_MAX_ATTEMPTS
+from app.services.irr_recompute import (
+    IRR_RECOMPUTE_CHUNK_SIZE, IRR_RECOMPUTE_WORKERS,
+    create_recompute_run, get_recompute_progress, start_irr_recompute
+)
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+router = APIRouter(route_class=CRUDRoute)
+
+JobStatus = Literal["queued", "running", "succeeded", "failed"]
+
+JOB_COLUMNS = """
+    id, job_type, portfolio_id, portfolio_fund_id, dates, status, attempts, max_attempts,
+    run_after, last_error, result::text AS result, created_at, started_at, finished_at
+"""
+
+def _job_dict(row) -> dict:
+    job = dict(row)
+    if job["result"] is not None:
+        job["result"] = orjson.loads(job["result"])
+    return job
+
+@router.get("/irr_jobs")
+async def list_irr_jobs(
+    portfolio_id: Optional[int] = Query(None, description="Only jobs for this portfolio"),
+    status: Optional[JobStatus] = Query(None, description="Only jobs with this status"),
+    limit: int = Query(50, ge=1, le=1000, description="Maximum number of jobs to return"),
+    db = Depends(get_db)
+):
+    """
+    What it does: Lists background IRR recalculation jobs, newest first, with the number still pending.
+    Why it's needed: Valuation and activity saves return before their IRRs are recalculated; screens
+                     poll this (usually per portfolio) to know when IRR figures are up to date again.
+    How it works:
+        1. Counts queued and running jobs matching the portfolio filter
+        2. Returns the newest jobs matching the filters
+    Expected output: {"pending": n, "jobs": [...]}
+    """
+    try:
+        conditions, params = [], []
+        if portfolio_id is not None:
+            params.append(portfolio_id)
+            conditions.append(f"portfolio_id = ${len(params)}")
+        portfolio_filter = " AND ".join(conditions) or "true"
+
+        pending = await db.fetchval(
+            f"SELECT count(*) FROM irr_cascade_jobs WHERE status IN ('queued', 'running') AND {portfolio_filter}",
+            *params
+        )
+
+        if status is not None:
+            params.append(status)
+            conditions.append(f"status = ${len(params)}")
+        params.append(limit)
+        rows = await db.fetch(f"""
+            SELECT {JOB_COLUMNS}
+            FROM irr_cascade_jobs
+            WHERE {" AND ".join(conditions) or "true"}
+            ORDER BY id DESC
+            LIMIT ${len(params)}
+        """, *params)
+
+        return {"pending": pending, "jobs": [_job_dict(row) for row in rows]}
+    except Exception as e:
+        logger.error(f"Error listing IRR jobs: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@router.get("/irr_jobs/{job_id}")
+async def get_irr_job(job_id: int, db = Depends(get_db)):
+    """
+    What it does: Returns one background IRR recalculation job.
+    Why it's needed: A valuation or activity save returns the id of the job it queued (X-IRR-Job-Id);
+                     the client polls this until the status is succeeded or failed.
+    Expected output: The job row, including attempts, last_error and the cascade result
+    """
+    try:
+        row = await db.fetchrow(f"SELECT {JOB_COLUMNS} FROM irr_cascade_jobs WHERE id = $1", job_id)
+        if not row:
+            raise HTTPException(status_code=404, detail=f"IRR job {job_id} not found")
+        return _job_dict(row)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting IRR job {job_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@router.post("/irr_jobs/{job_id}/retry")
+async def retry_irr_job(job_id: int, db = Depends(get_db)):
+    """
+    What it does: Re-queues a failed IRR job with a fresh set of attempts.
+    Why it's needed: Jobs that exhausted their retries (e.g. during a database outage) stay failed
+                     until someone decides to run them again.
+    Expected output: The re-queued job
+    """
+    try:
+        row = await db.fetchrow(f"""
+            UPDATE irr_cascade_jobs
+            SET status = 'queued', attempts = 0, max_attempts = $2, run_after = now(), finished_at = NULL
+            WHERE id = $1 AND status = 'failed'
+            RETURNING {JOB_COLUMNS}
+        """, job_id, IRR_JOB_MAX_ATTEMPTS)
+        if not row:
+            exists = await db.fetchval("SELECT EXISTS (SELECT 1 FROM irr_cascade_jobs WHERE id = $1)", job_id)
+            if not exists:
+                raise HTTPException(status_code=404, detail=f"IRR job {job_id} not found")
+            raise HTTPException(status_code=409, detail=f"IRR job {job_id} has not failed")
+        logger.info(f"🔁 IRR job {job_id} re-queued")
+        return _job_dict(row)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error retrying IRR job {job_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@router.post("/irr_jobs/recompute")
+async def start_irr_recompute_run(
+    chunk_size: int = Query(IRR_RECOMPUTE_CHUNK_SIZE, ge=1, le=10000, description="Portfolios per chunk"),
+    workers: int = Query(IRR_RECOMPUTE_WORKERS, ge=1, le=16, description="Parallel workers (one connection each)"),
+    portfolio_ids: Optional[List[int]] = Query(None, description="Only these portfolios (default: the whole book)"),
+    db = Depends(get_db)
+):
+    """
+    What it does: Starts a full recomputation of every fund and portfolio IRR in the background.
+    Why it's needed: After an IRR methodology change the whole book has to be recomputed; the
+                     per-portfolio endpoints do that one portfolio at a time inside a request.
+    How it works:
+        1. Partitions the portfolios into chunks of chunk_size (irr_recompute_chunks)
+        2. Starts `workers` workers that claim chunks and recompute one portfolio per transaction,
+           checkpointing after each so the run resumes after a crash
+    Expected output: The run's progress (poll GET /irr_jobs/recompute/{run_id})
+    """
+    try:
+        run_id = await create_recompute_run(db, chunk_size, portfolio_ids)
+        start_irr_recompute(get_db_sync(), run_id, workers)
+        return await get_recompute_progress(db, run_id)
+    except Exception as e:
+        logger.error(f"Error starting IRR recompute: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@router.get("/irr_jobs/recompute/{run_id}")
+async def get_irr_recompute_run(run_id: int, db = Depends(get_db)):
+    """
+    What it does: Returns the progress of a full IRR recomputation.
+    Expected output: Portfolios processed of total, chunks done, rows written, rows/sec and ETA
+                     (measured since the workers last started) and any failed portfolios
+    """
+    try:
+        progress = await get_recompute_progress(db, run_id)
+        if not progress:
+            raise HTTPException(status_code=404, detail=f"IRR recompute run {run_id} not found")
+        return progress
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting IRR recompute run {run_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@router.post("/irr_jobs/recompute/{run_id}/resume")
+async def resume_irr_recompute_run(
+    run_id: int,
+    workers: int = Query(IRR_RECOMPUTE_WORKERS, ge=1, le=16, description="Parallel workers (one connection each)"),
+    db = Depends(get_db)
+):
+    """
+    What it does: Resumes an unfinished IRR recomputation from its checkpoints.
+    Why it's needed: Runs left unfinished are resumed at startup; this restarts one by hand,
+                     e.g. with a different number of workers or after its workers stopped.
+    Expected output: The run's progress
+    """
+    try:
+        progress = await get_recompute_progress(db, run_id)
+        if not progress:
+            raise HTTPException(status_code=404, detail=f"IRR recompute run {run_id} not found")
+        if progress["status"] != "running":
+            raise HTTPException(status_code=409, detail=f"IRR recompute run {run_id} has already finished")
+        if not start_irr_recompute(get_db_sync(), run_id, workers):
+            raise HTTPException(status_code=409, detail=f"IRR recompute run {run_id} is already running")
+        logger.info(f"🔁 IRR recompute run {run_id} resumed with {workers} workers")
+        return await get_recompute_progress(db, run_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error resuming IRR recompute run {run_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
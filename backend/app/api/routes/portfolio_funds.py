@@ -1,4 +1,5 @@
 from fastapi import APIRouter, HTTPException, Depends, Query, Body
+from app.api.route_classes import CRUDRoute, BatchRoute
 from typing import List, Optional
 import logging
 from datetime import datetime, date, timedelta, time
@@ -476,7 +477,9 @@ def to_serializable(val):
         except Exception:
             return None
 
-router = APIRouter()
+router = APIRouter(route_class=CRUDRoute)
+# Bulk imports and full recalculations get the longer batch time budget; included into router at the end of the module
+batch_router = APIRouter(route_class=BatchRoute)
 
 @router.get("/portfolio_funds", response_model=List[PortfolioFund])
 async def get_portfolio_funds(
@@ -978,7 +981,7 @@ async def get_latest_irr(portfolio_fund_id: int, db = Depends(get_db)):
         logger.error(f"Error fetching IRR value: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error fetching IRR value: {str(e)}")
 
-@router.post("/portfolio_funds/{portfolio_fund_id}/recalculate-all-irr", response_model=dict)
+@batch_router.post("/portfolio_funds/{portfolio_fund_id}/recalculate-all-irr", response_model=dict)
 async def recalculate_all_irr_values(
     portfolio_fund_id: int,
     db = Depends(get_db)
@@ -1784,8 +1787,7 @@ async def create_irr_value(
     How it works:
         1. Validates the portfolio fund exists
         2. Validates the date format
-        3. Checks if an IRR value already exists for this fund and date
-        4. Creates or updates the IRR value record
+        3. Creates or updates the IRR value record for this fund and date in one upsert
     Expected output: A JSON object with the created/updated IRR value information
     """
     try:
@@ -1807,12 +1809,6 @@ async def create_irr_value(
             logger.warning(f"IRR value {irr_result} exceeds database limits, capping to 99999.99")
             irr_result = 99999.99 if irr_result > 0 else -99999.99
         
-        # Check if IRR value already exists for this fund and date
-        existing_irr = await db.fetchrow("""
-            SELECT * FROM portfolio_fund_irr_values 
-            WHERE fund_id = $1 AND date = $2
-        """, fund_id, date)
-        
         irr_value_data = {
             "fund_id": fund_id,
             "irr_result": float(round(irr_result, 2)),
@@ -1820,46 +1816,27 @@ async def create_irr_value(
             "fund_valuation_id": fund_valuation_id
         }
         
-        if existing_irr:
-            # Update existing record
-            irr_id = existing_irr["id"]
-            logger.info(f"Updating existing IRR record {irr_id}")
-            
-            result = await db.fetchrow("""
-                UPDATE portfolio_fund_irr_values 
-                SET irr_result = $1, fund_valuation_id = $2 
-                WHERE id = $3 
-                RETURNING *
-            """, float(round(irr_result, 2)), fund_valuation_id, irr_id)
-            
-            if result:
-                updated_record = dict(result)
-                logger.info(f"Successfully updated IRR record: {updated_record}")
-                return {
-                    "action": "updated",
-                    "irr_value": updated_record
-                }
-            else:
-                raise HTTPException(status_code=500, detail="Failed to update IRR value")
-        else:
-            # Create new record
-            logger.info(f"Creating new IRR record: {irr_value_data}")
-            
-            result = await db.fetchrow("""
-                INSERT INTO portfolio_fund_irr_values (fund_id, irr_result, date, fund_valuation_id) 
-                VALUES ($1, $2, $3, $4) 
-                RETURNING *
-            """, fund_id, float(round(irr_result, 2)), date, fund_valuation_id)
-            
-            if result:
-                created_record = dict(result)
-                logger.info(f"Successfully created IRR record: {created_record}")
-                return {
-                    "action": "created",
-                    "irr_value": created_record
-                }
-            else:
-                raise HTTPException(status_code=500, detail="Failed to create IRR value")
+        # Create or update in one upsert on the unique (fund_id, date) index
+        logger.info(f"Upserting IRR record: {irr_value_data}")
+        
+        result = await db.fetchrow("""
+            INSERT INTO portfolio_fund_irr_values (fund_id, irr_result, date, fund_valuation_id) 
+            VALUES ($1, $2, $3, $4) 
+            ON CONFLICT (fund_id, date) DO UPDATE
+            SET irr_result = EXCLUDED.irr_result, fund_valuation_id = EXCLUDED.fund_valuation_id
+            RETURNING *, (xmax = 0) AS inserted
+        """, fund_id, float(round(irr_result, 2)), date_obj, fund_valuation_id)
+        
+        if not result:
+            raise HTTPException(status_code=500, detail="Failed to save IRR value")
+        
+        record = dict(result)
+        action = "created" if record.pop("inserted") else "updated"
+        logger.info(f"Successfully {action} IRR record: {record}")
+        return {
+            "action": action,
+            "irr_value": record
+        }
         
     except HTTPException:
         raise
@@ -2104,28 +2081,17 @@ async def calculate_portfolio_fund_irr(
                     """, float(round(annual_irr_percent, 2)), irr_id)
                     logger.info(f"Updated existing IRR record {irr_id} with value {annual_irr_percent:.4f}%")
             else:
-                # Check if IRR already exists for this date
-                existing_irr = await db.fetchrow("""
-                    SELECT id FROM portfolio_fund_irr_values 
-                    WHERE fund_id = $1 AND date = $2
-                """, portfolio_fund_id, calculation_date)
-                
-                if existing_irr:
-                    # Update existing
-                    irr_id = dict(existing_irr)["id"]
-                    await db.execute("""
-                        UPDATE portfolio_fund_irr_values 
-                        SET irr_result = $1 
-                        WHERE id = $2
-                    """, float(round(annual_irr_percent, 2)), irr_id)
-                    logger.info(f"Updated existing IRR record {irr_id} with value {annual_irr_percent:.4f}%")
-                else:
-                    # Insert new
-                    await db.execute("""
-                        INSERT INTO portfolio_fund_irr_values (fund_id, irr_result, date, fund_valuation_id) 
-                        VALUES ($1, $2, $3, $4)
-                    """, irr_value_data["fund_id"], irr_value_data["irr_result"], irr_value_data["date"], irr_value_data["fund_valuation_id"])
+                # Upsert on the unique (fund_id, date) index; an existing IRR keeps its valuation link
+                inserted = await db.fetchval("""
+                    INSERT INTO portfolio_fund_irr_values (fund_id, irr_result, date, fund_valuation_id) 
+                    VALUES ($1, $2, $3, $4)
+                    ON CONFLICT (fund_id, date) DO UPDATE SET irr_result = EXCLUDED.irr_result
+                    RETURNING (xmax = 0) AS inserted
+                """, irr_value_data["fund_id"], irr_value_data["irr_result"], calculation_date, irr_value_data["fund_valuation_id"])
+                if inserted:
                     logger.info(f"Created new IRR record with value {annual_irr_percent:.4f}%")
+                else:
+                    logger.info(f"Updated existing IRR record with value {annual_irr_percent:.4f}%")
             
             # Convert IRR to float for JSON serialization
             logger.info(f"Converted IRR to float: {float(round(annual_irr_percent, 2))}")
@@ -2722,42 +2688,12 @@ async def calculate_multiple_portfolio_funds_irr(
                             # The cascade service will handle deletion if needed
                             raise ValueError("Portfolio incomplete - not all non-cash funds have valuations")
 
-                    # Check if portfolio IRR already exists for this date
-                    existing_portfolio_irr = await db.fetchrow("""
-                        SELECT id FROM portfolio_irr_values
-                        WHERE portfolio_id = $1 AND date = $2
-                    """, portfolio_id, irr_date_obj)
-
-                    if existing_portfolio_irr:
-                        # Update existing record
-                        await db.execute("""
-                            UPDATE portfolio_irr_values
-                            SET irr_result = $1
-                            WHERE id = $2
-                        """, result['irr_percentage'], existing_portfolio_irr["id"])
-                    else:
-                        # Insert new record (with duplicate handling)
-                        try:
-                            await db.execute("""
-                                INSERT INTO portfolio_irr_values (portfolio_id, irr_result, date)
-                                VALUES ($1, $2, $3)
-                            """, portfolio_id, result['irr_percentage'], irr_date_obj)
-                        except Exception as insert_error:
-                            # If duplicate key error (race condition), try to update instead
-                            if "duplicate key" in str(insert_error).lower() or "unique constraint" in str(insert_error).lower():
-                                logger.warning(f"Duplicate portfolio IRR detected (race condition), updating instead for portfolio {portfolio_id} on {irr_date_obj}")
-                                existing_portfolio_irr = await db.fetchrow("""
-                                    SELECT id FROM portfolio_irr_values
-                                    WHERE portfolio_id = $1 AND date = $2
-                                """, portfolio_id, irr_date_obj)
-                                if existing_portfolio_irr:
-                                    await db.execute("""
-                                        UPDATE portfolio_irr_values
-                                        SET irr_result = $1
-                                        WHERE id = $2
-                                    """, result['irr_percentage'], existing_portfolio_irr["id"])
-                            else:
-                                raise insert_error
+                    # Upsert on the unique (portfolio_id, date) index; an existing IRR keeps its valuation link
+                    await db.execute("""
+                        INSERT INTO portfolio_irr_values (portfolio_id, irr_result, date)
+                        VALUES ($1, $2, $3)
+                        ON CONFLICT (portfolio_id, date) DO UPDATE SET irr_result = EXCLUDED.irr_result
+                    """, portfolio_id, result['irr_percentage'], irr_date_obj)
                 else:
                     # len(unique_portfolio_ids) == 0, which shouldn't happen, but handle gracefully
                     logger.error(f"No portfolio found for any of the provided fund IDs: {portfolio_fund_ids}")
@@ -3890,4 +3826,7 @@ async def calculate_multiple_portfolio_funds_historical_irr(
         
     except Exception as e:
         logger.error(f"Error calculating historical IRR: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error calculating historical IRR: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error calculating historical IRR: {str(e)}")
+
+
+router.include_router(batch_router)
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, HTTPException, Depends, Query
+from app.api.route_classes import CRUDRoute
 from typing import List, Optional
 import logging
 from datetime import datetime, date
@@ -13,7 +14,7 @@ from app.db.database import get_db
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-router = APIRouter()
+router = APIRouter(route_class=CRUDRoute)
 
 @router.get("/portfolio_valuations", response_model=List[PortfolioValuation])
 async def get_portfolio_valuations(
@@ -113,18 +114,23 @@ async def create_portfolio_valuation(valuation: PortfolioValuationCreate, db = D
         # Prepare data for insertion
         data_dict = valuation.model_dump()
         
-        # Handle datetime serialization
+        # valuation_date is a DATE column (and part of the unique key); asyncpg binds date objects
         if isinstance(data_dict['valuation_date'], datetime):
-            data_dict['valuation_date'] = data_dict['valuation_date'].isoformat()
+            data_dict['valuation_date'] = data_dict['valuation_date'].date()
         
         # Create dynamic INSERT query
         columns = list(data_dict.keys())
         placeholders = [f"${i+1}" for i in range(len(columns))]
         values = list(data_dict.values())
         
+        # Upsert on the unique (portfolio_id, valuation_date) index: posting a date that already
+        # has a valuation replaces it instead of failing on a duplicate
+        update_columns = [column for column in columns if column not in ('portfolio_id', 'valuation_date')]
         query = f"""
             INSERT INTO portfolio_valuations ({', '.join(columns)}) 
             VALUES ({', '.join(placeholders)}) 
+            ON CONFLICT (portfolio_id, valuation_date) DO UPDATE
+            SET {', '.join(f'{column} = EXCLUDED.{column}' for column in update_columns)}
             RETURNING *
         """
         
@@ -485,47 +491,29 @@ async def calculate_and_store_portfolio_valuation(
         data_dict = portfolio_valuation.model_dump()
         data_dict['valuation_date'] = data_dict['valuation_date'].isoformat()
         
-        # Check if a valuation already exists for this date
-        existing_result = await db.fetchrow(
-            """
-            SELECT id 
-            FROM portfolio_valuations 
-            WHERE portfolio_id = $1 AND valuation_date = $2
-            """,
-            portfolio_id, data_dict['valuation_date']
-        )
+        # One upsert on the unique (portfolio_id, valuation_date) index, so a concurrent save of the
+        # same date updates the row instead of inserting a duplicate
+        columns = list(data_dict.keys())
+        placeholders = [f"${i+1}" for i in range(len(columns))]
+        values = list(data_dict.values())
+        update_columns = [column for column in columns if column not in ('portfolio_id', 'valuation_date')]
         
-        if existing_result:
-            # Update existing valuation
-            update_result = await db.fetchrow(
-                """
-                UPDATE portfolio_valuations 
-                SET value = $1 
-                WHERE id = $2 
-                RETURNING *
-                """,
-                data_dict['value'], existing_result["id"]
-            )
-            
-            if update_result:
-                logger.info(f"Updated existing portfolio valuation for {portfolio_id} on {valuation_date}")
-                return dict(update_result)
-        else:
-            # Create new valuation
-            columns = list(data_dict.keys())
-            placeholders = [f"${i+1}" for i in range(len(columns))]
-            values = list(data_dict.values())
-            
-            query = f"""
-                INSERT INTO portfolio_valuations ({', '.join(columns)}) 
-                VALUES ({', '.join(placeholders)}) 
-                RETURNING *
-            """
-            
-            result = await db.fetchrow(query, *values)
-            if result:
+        query = f"""
+            INSERT INTO portfolio_valuations ({', '.join(columns)}) 
+            VALUES ({', '.join(placeholders)}) 
+            ON CONFLICT (portfolio_id, valuation_date) DO UPDATE
+            SET {', '.join(f'{column} = EXCLUDED.{column}' for column in update_columns)}
+            RETURNING *, (xmax = 0) AS inserted
+        """
+        
+        result = await db.fetchrow(query, *values)
+        if result:
+            result = dict(result)
+            if result.pop("inserted"):
                 logger.info(f"Created new portfolio valuation for {portfolio_id} on {valuation_date}")
-                return dict(result)
+            else:
+                logger.info(f"Updated existing portfolio valuation for {portfolio_id} on {valuation_date}")
+            return result
         
         raise HTTPException(status_code=500, detail="Failed to create or update portfolio valuation")
         
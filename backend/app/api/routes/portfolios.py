@@ -1,4 +1,5 @@
 from fastapi import APIRouter, HTTPException, Depends, Query, Body
+from app.api.route_classes import CRUDRoute
 from typing import List, Optional, Dict, Union
 import logging
 from datetime import date, datetime
@@ -53,7 +54,7 @@ class PortfolioFromTemplate(BaseModel):
     status: str = "active"
     start_date: Optional[str] = None
 
-router = APIRouter()
+router = APIRouter(route_class=CRUDRoute)
 
 @router.get("/portfolios", response_model=Union[List[Portfolio], Dict[str, int]])
 async def get_portfolios(
@@ -900,31 +901,21 @@ async def calculate_portfolio_irr(
                     # Store the IRR value in the portfolio_fund_irr_values table
                     irr_value_data = {
                         "fund_id": portfolio_fund_id,
-                        "irr_result": float(irr_percentage),
+                        "irr_result": safe_irr_value(irr_percentage),
                         "date": common_date_iso,
                         "fund_valuation_id": fund_info.get("valuation_id")
                     }
                     
-                    # Check if IRR already exists and update or insert
-                    existing_irr = await db.fetchrow(
-                        "SELECT * FROM portfolio_fund_irr_values WHERE fund_id = $1 AND date = $2",
-                        portfolio_fund_id, common_date_iso
-                    )
+                    # Upsert on the unique (fund_id, date) index; an existing IRR keeps its valuation link
+                    columns = list(irr_value_data.keys())
+                    values = list(irr_value_data.values())
+                    placeholders = [f"${i+1}" for i in range(len(values))]
                     
-                    if existing_irr:
-                        # Update existing
-                        await db.execute(
-                            "UPDATE portfolio_fund_irr_values SET irr_result = $1 WHERE id = $2",
-                            safe_irr_value(irr_percentage), existing_irr["id"]
-                        )
-                    else:
-                        # Insert new - Build dynamic INSERT query
-                        columns = list(irr_value_data.keys())
-                        values = list(irr_value_data.values())
-                        placeholders = [f"${i+1}" for i in range(len(values))]
-                        
-                        query = f"INSERT INTO portfolio_fund_irr_values ({', '.join(columns)}) VALUES ({', '.join(placeholders)}) RETURNING *"
-                        await db.fetchrow(query, *values)
+                    query = (
+                        f"INSERT INTO portfolio_fund_irr_values ({', '.join(columns)}) VALUES ({', '.join(placeholders)}) "
+                        "ON CONFLICT (fund_id, date) DO UPDATE SET irr_result = EXCLUDED.irr_result RETURNING *"
+                    )
+                    await db.fetchrow(query, *values)
                     
                     calculation_results.append({
                         "portfolio_fund_id": portfolio_fund_id,
@@ -997,28 +988,20 @@ async def calculate_portfolio_irr(
                     "valuation": total_portfolio_value
                 }
                 
-                # Check if portfolio valuation already exists for this date
-                existing_portfolio_valuation = await db.fetchrow(
-                    "SELECT id FROM portfolio_valuations WHERE portfolio_id = $1 AND valuation_date = $2",
-                    portfolio_id, common_date_iso
+                # Upsert the portfolio valuation on the unique (portfolio_id, valuation_date) index
+                portfolio_valuation_result = await db.fetchrow(
+                    """
+                    INSERT INTO portfolio_valuations (portfolio_id, valuation_date, valuation) VALUES ($1, $2, $3)
+                    ON CONFLICT (portfolio_id, valuation_date) DO UPDATE SET valuation = EXCLUDED.valuation
+                    RETURNING id, (xmax = 0) AS inserted
+                    """,
+                    portfolio_id, common_date_iso, total_portfolio_value
                 )
-                
-                if existing_portfolio_valuation:
-                    # Update existing portfolio valuation
-                    await db.execute(
-                        "UPDATE portfolio_valuations SET valuation = $1 WHERE id = $2",
-                        total_portfolio_value, existing_portfolio_valuation["id"]
-                    )
-                    portfolio_valuation_id = existing_portfolio_valuation["id"]
-                    logger.info(f"Updated existing portfolio valuation for {portfolio_id}")
-                else:
-                    # Create new portfolio valuation
-                    portfolio_valuation_result = await db.fetchrow(
-                        "INSERT INTO portfolio_valuations (portfolio_id, valuation_date, valuation) VALUES ($1, $2, $3) RETURNING id",
-                        portfolio_id, common_date_iso, total_portfolio_value
-                    )
-                    portfolio_valuation_id = portfolio_valuation_result["id"] if portfolio_valuation_result else None
+                portfolio_valuation_id = portfolio_valuation_result["id"]
+                if portfolio_valuation_result["inserted"]:
                     logger.info(f"Created new portfolio valuation for {portfolio_id}")
+                else:
+                    logger.info(f"Updated existing portfolio valuation for {portfolio_id}")
 
                 # Step 3: Calculate portfolio-level IRR using ALL funds (active + inactive) for historical accuracy
                 portfolio_irr_response = await calculate_multiple_portfolio_funds_irr(
@@ -1039,28 +1022,21 @@ async def calculate_portfolio_irr(
                         "portfolio_valuation_id": portfolio_valuation_id
                     }
                     
-                    # Check if portfolio IRR already exists for this date
-                    existing_portfolio_irr = await db.fetchrow(
-                        "SELECT id FROM portfolio_irr_values WHERE portfolio_id = $1 AND date = $2",
-                        portfolio_id, common_date_iso
-                    )
+                    # Upsert on the unique (portfolio_id, date) index
+                    columns = list(portfolio_irr_data.keys())
+                    values = list(portfolio_irr_data.values())
+                    placeholders = [f"${i+1}" for i in range(len(values))]
                     
-                    if existing_portfolio_irr:
-                        # Update existing portfolio IRR
-                        await db.execute(
-                            "UPDATE portfolio_irr_values SET irr_result = $1, portfolio_valuation_id = $2 WHERE id = $3",
-                            portfolio_irr_percentage, portfolio_valuation_id, existing_portfolio_irr["id"]
-                        )
-                        logger.info(f"Updated existing portfolio IRR for {portfolio_id}")
-                    else:
-                        # Create new portfolio IRR - Build dynamic INSERT
-                        columns = list(portfolio_irr_data.keys())
-                        values = list(portfolio_irr_data.values())
-                        placeholders = [f"${i+1}" for i in range(len(values))]
-                        
-                        query = f"INSERT INTO portfolio_irr_values ({', '.join(columns)}) VALUES ({', '.join(placeholders)}) RETURNING *"
-                        await db.fetchrow(query, *values)
+                    query = (
+                        f"INSERT INTO portfolio_irr_values ({', '.join(columns)}) VALUES ({', '.join(placeholders)}) "
+                        "ON CONFLICT (portfolio_id, date) DO UPDATE "
+                        "SET irr_result = EXCLUDED.irr_result, portfolio_valuation_id = EXCLUDED.portfolio_valuation_id "
+                        "RETURNING (xmax = 0) AS inserted"
+                    )
+                    if await db.fetchval(query, *values):
                         logger.info(f"Created new portfolio IRR for {portfolio_id}")
+                    else:
+                        logger.info(f"Updated existing portfolio IRR for {portfolio_id}")
                 else:
                     logger.warning(f"Portfolio IRR calculation failed: {portfolio_irr_response}")
             else:
@@ -1234,31 +1210,21 @@ async def calculate_portfolio_irr_for_date(
                     # Store the IRR value in the portfolio_fund_irr_values table
                     irr_value_data = {
                         "fund_id": portfolio_fund_id,
-                        "irr_result": float(irr_percentage),
+                        "irr_result": safe_irr_value(irr_percentage),
                         "date": calculation_date.isoformat(),
                         "fund_valuation_id": fund_info.get("valuation_id")
                     }
                     
-                    # Check if IRR already exists and update or insert
-                    existing_irr = await db.fetchrow(
-                        "SELECT * FROM portfolio_fund_irr_values WHERE fund_id = $1 AND date = $2",
-                        portfolio_fund_id, calculation_date.isoformat()
-                    )
+                    # Upsert on the unique (fund_id, date) index; an existing IRR keeps its valuation link
+                    columns = list(irr_value_data.keys())
+                    values = list(irr_value_data.values())
+                    placeholders = [f"${i+1}" for i in range(len(values))]
                     
-                    if existing_irr:
-                        # Update existing
-                        await db.execute(
-                            "UPDATE portfolio_fund_irr_values SET irr_result = $1 WHERE id = $2",
-                            safe_irr_value(irr_percentage), existing_irr["id"]
-                        )
-                    else:
-                        # Insert new - Build dynamic INSERT query
-                        columns = list(irr_value_data.keys())
-                        values = list(irr_value_data.values())
-                        placeholders = [f"${i+1}" for i in range(len(values))]
-                        
-                        query = f"INSERT INTO portfolio_fund_irr_values ({', '.join(columns)}) VALUES ({', '.join(placeholders)}) RETURNING *"
-                        await db.fetchrow(query, *values)
+                    query = (
+                        f"INSERT INTO portfolio_fund_irr_values ({', '.join(columns)}) VALUES ({', '.join(placeholders)}) "
+                        "ON CONFLICT (fund_id, date) DO UPDATE SET irr_result = EXCLUDED.irr_result RETURNING *"
+                    )
+                    await db.fetchrow(query, *values)
                     
                     calculation_results.append({
                         "portfolio_fund_id": portfolio_fund_id,
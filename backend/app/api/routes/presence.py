@@ -1,4 +1,5 @@
 from fastapi import APIRouter, HTTPException, Depends, WebSocket, WebSocketDisconnect
+from app.api.route_classes import CRUDRoute
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 import json
@@ -7,7 +8,7 @@ from app.db.database import get_db
 from app.api.routes.auth import get_current_user
 
 logger = logging.getLogger(__name__)
-router = APIRouter()
+router = APIRouter(route_class=CRUDRoute)
 
 # WebSocket connection manager
 class ConnectionManager:
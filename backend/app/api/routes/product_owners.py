@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, Path, Response, status
+from app.api.route_classes import CRUDRoute
 from typing import List, Optional, Dict, Any
 import logging
 from pydantic import BaseModel
@@ -6,7 +7,7 @@ from pydantic import BaseModel
 from ...db.database import get_db
 from ...models.product_owner import ProductOwner, ProductOwnerCreate, ProductOwnerUpdate
 
-router = APIRouter()
+router = APIRouter(route_class=CRUDRoute)
 logger = logging.getLogger(__name__)
 
 @router.get("/product_owners", response_model=List[ProductOwner])
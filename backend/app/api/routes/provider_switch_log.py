@@ -1,4 +1,5 @@
 from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from app.api.route_classes import CRUDRoute
 from typing import List, Optional
 import logging
 from datetime import datetime
@@ -10,7 +11,7 @@ from app.db.database import get_db
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-router = APIRouter()
+router = APIRouter(route_class=CRUDRoute)
 
 @router.post("/provider_switch_log", response_model=ProviderSwitchLog)
 async def create_provider_switch_log(provider_switch: ProviderSwitchLogCreate, db = Depends(get_db)):
@@ -1,17 +1,18 @@
 from fastapi import APIRouter, Query, HTTPException, Depends
+from app.api.route_classes import AnalyticsRoute
 from typing import Optional, List, Dict, Any
 import logging
-from ...db.database import get_db
+from ...db.database import get_read_db
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter()
+router = APIRouter(route_class=AnalyticsRoute)
 
 @router.get("/search")
 async def global_search(
     query: str = Query(..., description="Search query string"),
     limit: int = Query(100000, description="Maximum number of results to return (function has built-in limit of 50)"),
-    db = Depends(get_db)
+    db = Depends(get_read_db)
 ):
     """
     Global search across all entities (client groups, products, funds, providers, portfolios)
@@ -7,14 +7,16 @@ and bulk operation performance.
 """
 
 from fastapi import APIRouter, Depends, HTTPException, Query
+from app.api.route_classes import BatchRoute
 from datetime import datetime
 from typing import List, Dict, Any
 from app.db.database import get_db
 from app.utils.sequence_manager import SequenceManager
+from app.db.query_stats import get_query_stats_collector
 import logging
 
 logger = logging.getLogger(__name__)
-router = APIRouter()
+router = APIRouter(route_class=BatchRoute)
 
 # Critical sequences to monitor
 CRITICAL_SEQUENCES = [
@@ -869,3 +871,39 @@ async def run_performance_test(
     except Exception as e:
         logger.error(f"❌ SYSTEM: Performance test failed: {e}")
         raise HTTPException(status_code=500, detail=f"Performance test failed: {str(e)}")
+
+
+@router.get("/system/query-stats")
+async def get_query_stats(
+    limit: int = Query(50, description="Maximum number of entries per list", ge=1, le=500),
+    route: str = Query(None, description="Only include routes containing this text"),
+):
+    """
+    Slow-query capture with route attribution
+
+    Returns the slowest individual query executions (normalized SQL, duration,
+    row count and issuing route) and the query shapes with the highest total
+    time since the collector was last reset. Does not touch the database.
+
+    Args:
+        limit: Maximum number of entries in each list (1-500)
+        route: Optional substring filter on 'METHOD /api/route'
+
+    Returns:
+        Dictionary with slowest_queries and top_query_shapes
+    """
+    return get_query_stats_collector().snapshot(limit=limit, route_filter=route)
+
+
+@router.delete("/system/query-stats")
+async def reset_query_stats():
+    """
+    Reset the query stats collector
+
+    Useful before a load test so that results only reflect the test window.
+    """
+    collector = get_query_stats_collector()
+    cleared_queries = collector.total_queries
+    collector.reset()
+    logger.info(f"🗑️ SYSTEM: Query stats reset ({cleared_queries} recorded queries cleared)")
+    return {'reset': True, 'cleared_queries': cleared_queries, 'reset_at': datetime.utcnow().isoformat()}
@@ -0,0 +1,144 @@
+"""
+Streamed list responses
+
+The large list endpoints accept limit up to 100000. Building those lists in
+memory and serializing them in one piece makes peak memory grow with the
+result and delays the first byte until the last row has been processed.
+
+stream_query() runs the endpoint's query through a server-side cursor inside
+a read-only transaction and writes the rows out chunk by chunk, either as
+NDJSON (one object per line) or as a chunked JSON array. Endpoints expose it
+through a `stream` query parameter:
+
+    GET /api/holding_activity_logs?stream=ndjson
+    GET /api/client_products?stream=json
+
+A stream reads through its own pool connection, which it holds until the last
+chunk is sent. Streaming endpoints take their request connection from
+get_db_unless_streaming() instead of get_db(), so a streamed request does not
+also pin a get_db connection for the lifetime of the response.
+"""
+
+import os
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional, Sequence
+
+from fastapi import Depends, Query
+from fastapi.responses import StreamingResponse
+
+from app.api.responses import dumps
+from app.db.database import apply_statement_timeout, get_db_sync, create_db_pool
+
+logger = logging.getLogger(__name__)
+
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", "1000"))
+
+STREAM_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "json": "application/json",
+}
+
+# Rows in, rows out - used for per-chunk enrichment such as product owner lookups
+ChunkTransform = Callable[[Any, List[dict]], Awaitable[List[dict]]]
+
+
+def stream_param(
+    stream: Optional[str] = Query(
+        None,
+        pattern="^(ndjson|json)$",
+        description="Stream the result instead of returning it in one piece: 'ndjson' (one object per line) or 'json' (chunked JSON array)",
+    )
+) -> Optional[str]:
+    """Shared `stream` query parameter for list endpoints."""
+    return stream
+
+
+async def get_db_unless_streaming(stream: Optional[str] = Depends(stream_param)) -> AsyncIterator[Optional[Any]]:
+    """
+    What it does: Provides a get_db connection for list requests, and None when the request is streamed.
+    Why it's needed: FastAPI keeps yield dependencies open until the response has been sent, so a
+        streamed request that also depended on get_db would hold two pool connections while it streams.
+    Expected output: An AsyncPG connection, or None when `stream` is set
+    """
+    if stream:
+        yield None
+        return
+    pool = get_db_sync() or await create_db_pool()
+    async with pool.acquire() as connection:
+        await apply_statement_timeout(connection)
+        yield connection
+
+
+async def _iter_chunks(query: str, params: Sequence[Any], chunk_size: int, transform: Optional[ChunkTransform]) -> AsyncIterator[List[dict]]:
+    """Yield lists of row dicts read through a server-side cursor."""
+    pool = get_db_sync() or await create_db_pool()
+
+    # The cursor needs a connection that lives as long as the response body
+    async with pool.acquire() as connection:
+        async with connection.transaction(readonly=True):
+            cursor = await connection.cursor(query, *params)
+            while True:
+                records = await cursor.fetch(chunk_size)
+                if not records:
+                    break
+                rows = [dict(record) for record in records]
+                if transform is not None:
+                    rows = await transform(connection, rows)
+                yield rows
+                if len(records) < chunk_size:
+                    break
+
+
+async def _ndjson_body(chunks: AsyncIterator[List[dict]]) -> AsyncIterator[bytes]:
+    async for rows in chunks:
+        if rows:
+            yield b"\n".join(dumps(row) for row in rows) + b"\n"
+
+
+async def _json_array_body(chunks: AsyncIterator[List[dict]]) -> AsyncIterator[bytes]:
+    yield b"["
+    first = True
+    async for rows in chunks:
+        if not rows:
+            continue
+        body = b",".join(dumps(row) for row in rows)
+        yield body if first else b"," + body
+        first = False
+    yield b"]"
+
+
+def stream_query(
+    query: str,
+    params: Sequence[Any],
+    stream_format: str,
+    transform: Optional[ChunkTransform] = None,
+    chunk_size: int = STREAM_CHUNK_SIZE,
+    label: str = "stream",
+) -> StreamingResponse:
+    """
+    What it does: Streams the rows of a query as NDJSON or a chunked JSON array.
+    Why it's needed: Keeps peak memory flat for 100k-row exports and sends the first rows
+        as soon as the first chunk has been read.
+    How it works:
+        1. Acquires a dedicated pool connection and opens a read-only transaction
+           (callers depend on get_db_unless_streaming so this is the request's only connection)
+        2. Reads `chunk_size` rows at a time from a server-side cursor
+        3. Optionally passes each chunk through `transform(connection, rows)`
+        4. Serializes each chunk with orjson and writes it to the response
+    Expected output: A StreamingResponse; errors after the first byte end the stream early
+    """
+    chunks = _iter_chunks(query, params, chunk_size, transform)
+    body = _ndjson_body(chunks) if stream_format == "ndjson" else _json_array_body(chunks)
+
+    async def logged_body() -> AsyncIterator[bytes]:
+        sent = 0
+        try:
+            async for part in body:
+                sent += len(part)
+                yield part
+        except Exception as e:
+            logger.error(f"Error while streaming {label} after {sent} bytes: {str(e)}")
+            raise
+        logger.info(f"Streamed {label} ({stream_format}, {sent} bytes)")
+
+    return StreamingResponse(logged_body(), media_type=STREAM_MEDIA_TYPES[stream_format])
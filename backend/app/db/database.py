@@ -1,9 +1,14 @@
 import os
 import sys
+import time
 import logging
 import asyncpg
 from typing import Optional
+from fastapi import Request
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 from dotenv import load_dotenv
+from app.db.query_stats import TimedConnection, QUERY_STATS_ENABLED
 
 # Configure logging
 logging.basicConfig(
@@ -20,7 +25,11 @@ logger.info("Environment variables loaded")
 # Get PostgreSQL connection details from environment variables
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+# Optional read replica for analytics and reporting reads (see get_read_db)
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
+
 logger.info(f"Database URL present: {bool(DATABASE_URL)}")
+logger.info(f"Read replica URL present: {bool(DATABASE_READ_URL)}")
 
 if not DATABASE_URL:
     logger.error("DATABASE_URL must be set in environment variables.")
@@ -28,8 +37,9 @@ if not DATABASE_URL:
     logger.error(f"Available environment variables: {[key for key in os.environ.keys() if 'KEY' not in key.upper() and 'SECRET' not in key.upper() and 'PASSWORD' not in key.upper()]}")
     raise ValueError("DATABASE_URL must be set in environment variables.")
 
-# Global connection pool
+# Global connection pools
 _pool: Optional[asyncpg.Pool] = None
+_read_pool: Optional[asyncpg.Pool] = None
 
 # Connection pool configuration
 POOL_MIN_SIZE = 5
@@ -37,6 +47,94 @@ POOL_MAX_SIZE = 20
 POOL_MAX_QUERIES = 50000
 POOL_MAX_INACTIVE_CONNECTION_LIFETIME = 300.0
 
+# Session default statement_timeout for pooled connections (CRUD routes and background work)
+DEFAULT_STATEMENT_TIMEOUT_MS = int(os.getenv("DEFAULT_STATEMENT_TIMEOUT_MS", "15000"))
+
+# statement_timeout requested by the current route class (see app/api/route_classes.py)
+statement_timeout_ms: ContextVar[Optional[int]] = ContextVar("statement_timeout_ms", default=None)
+
+# Read replica configuration
+READ_POOL_MIN_SIZE = int(os.getenv("READ_POOL_MIN_SIZE", "2"))
+READ_POOL_MAX_SIZE = int(os.getenv("READ_POOL_MAX_SIZE", "10"))
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "10"))
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("REPLICA_LAG_CHECK_INTERVAL", "5"))
+READ_YOUR_WRITES_SECONDS = int(os.getenv("READ_YOUR_WRITES_SECONDS", "15"))
+READ_YOUR_WRITES_COOKIE = "kp_recent_write"
+READ_PRIMARY_HEADER = "x-read-primary"
+
+# Last measured replica lag: (lag in seconds or None if unknown, monotonic time of the check)
+_replica_lag = (None, 0.0)
+
+# Seconds the replica is behind the primary; 0 when it has replayed everything it received
+REPLICA_LAG_QUERY = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END::float8
+"""
+
+async def register_float_numeric_codec(connection):
+    """
+    What it does: Makes the connection decode NUMERIC columns directly to float.
+    Why it's needed: asyncpg returns NUMERIC as Decimal by default, and nearly every handler
+        then converted valuations, amounts and IRRs back to float one row at a time.
+    How it works:
+        1. Uses the text wire format for NUMERIC, decoded with float() in one step
+        2. Encodes parameters with str(), so float, int, Decimal and numeric strings all bind exactly
+    Expected output: NUMERIC values come back as Python floats on this connection
+    """
+    await connection.set_type_codec(
+        'numeric',
+        schema='pg_catalog',
+        encoder=str,
+        decoder=float,
+        format='text'
+    )
+
+async def _init_connection(connection):
+    """
+    Pool init hook - runs once for every new connection in the pool.
+
+    The float NUMERIC codec is installed on every connection rather than opted into per query,
+    because it is safe for every caller:
+        - Writes are unchanged: parameters are encoded with str(), which binds float, int,
+          Decimal and numeric strings exactly
+        - No code does Decimal arithmetic on query results; handlers converted them with
+          float() anyway, and the hot loops now rely on receiving floats
+        - Money columns are numeric(16,2) and IRRs numeric(8,4); a float holds 15 significant
+          digits, so amounts are exact up to about 10 trillion
+        - Fee columns are text and are not affected
+        - The one caller that needs the built-in binary codec (COPY in the bulk activity import)
+          switches to it with exact_numeric()
+    """
+    await register_float_numeric_codec(connection)
+
+@asynccontextmanager
+async def exact_numeric(connection):
+    """
+    What it does: Switches a pooled connection to asyncpg's built-in Decimal NUMERIC codec for a block.
+    Why it's needed: COPY (copy_records_to_table) sends NUMERIC in the binary format, which the
+        text-format float codec cannot encode.
+    How it works:
+        1. Resets the NUMERIC codec to asyncpg's built-in Decimal codec
+        2. Yields the connection for the block
+        3. Restores the float codec before the connection goes back to the pool
+    Expected output: Inside the block NUMERIC values are read as Decimal and written in binary
+
+    Each switch re-runs type introspection and clears the connection's statement cache, so use it
+    only around bulk operations, not ordinary writes.
+
+    Usage:
+        async with exact_numeric(db):
+            await db.copy_records_to_table("staging", records=records, columns=columns)
+    """
+    await connection.reset_type_codec('numeric', schema='pg_catalog')
+    try:
+        yield connection
+    finally:
+        await register_float_numeric_codec(connection)
+
 async def create_db_pool():
     """
     What it does: Creates and initializes the PostgreSQL connection pool.
@@ -61,8 +159,13 @@ async def create_db_pool():
             max_size=POOL_MAX_SIZE,
             max_queries=POOL_MAX_QUERIES,
             max_inactive_connection_lifetime=POOL_MAX_INACTIVE_CONNECTION_LIFETIME,
+            # Record per-query timings for /api/system/query-stats
+            connection_class=TimedConnection if QUERY_STATS_ENABLED else asyncpg.Connection,
+            # Decode NUMERIC straight to float (see _init_connection)
+            init=_init_connection,
             server_settings={
-                'jit': 'off'  # Disable JIT for better connection performance
+                'jit': 'off',  # Disable JIT for better connection performance
+                'statement_timeout': str(DEFAULT_STATEMENT_TIMEOUT_MS)
             }
         )
         logger.info(f"PostgreSQL connection pool created successfully (min: {POOL_MIN_SIZE}, max: {POOL_MAX_SIZE})")
@@ -83,6 +186,50 @@ async def create_db_pool():
         logger.error(f"Connection string format: {DATABASE_URL.split('@')[0]}@[HIDDEN]")
         raise
 
+async def create_read_pool():
+    """
+    What it does: Creates the optional read replica connection pool.
+    Why it's needed: Heavy analytics, historical IRR and reporting reads should not compete
+        with CRUD writes for primary connections.
+    How it works:
+        1. Returns None when DATABASE_READ_URL is not set
+        2. Creates a pool with the same connection setup as the primary pool
+        3. Logs and returns None if the replica is unreachable, so reads fall back to the primary
+    Expected output: An AsyncPG pool connected to the replica, or None
+    """
+    global _read_pool
+    
+    if not DATABASE_READ_URL:
+        return None
+    
+    if _read_pool is not None:
+        return _read_pool
+    
+    try:
+        logger.info("Creating read replica connection pool...")
+        _read_pool = await asyncpg.create_pool(
+            DATABASE_READ_URL,
+            min_size=READ_POOL_MIN_SIZE,
+            max_size=READ_POOL_MAX_SIZE,
+            max_queries=POOL_MAX_QUERIES,
+            max_inactive_connection_lifetime=POOL_MAX_INACTIVE_CONNECTION_LIFETIME,
+            connection_class=TimedConnection if QUERY_STATS_ENABLED else asyncpg.Connection,
+            init=_init_connection,
+            server_settings={
+                'jit': 'off',
+                'statement_timeout': str(DEFAULT_STATEMENT_TIMEOUT_MS),
+                # Guards against accidental writes when the "replica" is another primary (e.g. local testing)
+                'default_transaction_read_only': 'on'
+            }
+        )
+        logger.info(f"Read replica connection pool created successfully (min: {READ_POOL_MIN_SIZE}, max: {READ_POOL_MAX_SIZE})")
+        return _read_pool
+        
+    except Exception as e:
+        logger.warning(f"Read replica unavailable, reads will use the primary: {str(e)}")
+        _read_pool = None
+        return None
+
 async def close_db_pool():
     """
     What it does: Closes the PostgreSQL connection pool gracefully.
@@ -92,7 +239,12 @@ async def close_db_pool():
         2. Sets the global pool variable to None
     Expected output: Clean shutdown of database connections
     """
-    global _pool
+    global _pool, _read_pool
+    
+    if _read_pool is not None:
+        logger.info("Closing read replica connection pool...")
+        await _read_pool.close()
+        _read_pool = None
     
     if _pool is not None:
         logger.info("Closing PostgreSQL connection pool...")
@@ -118,11 +270,115 @@ async def get_db():
     
     async with _pool.acquire() as connection:
         logger.debug("Database connection acquired from pool")
+        await apply_statement_timeout(connection)
         try:
             yield connection
         finally:
             logger.debug("Database connection returned to pool")
 
+async def get_replica_lag() -> Optional[float]:
+    """
+    Return the replica's replay lag in seconds, or None if it cannot be measured.
+
+    The value is cached for REPLICA_LAG_CHECK_INTERVAL seconds so routing does not
+    add a query to every request.
+    """
+    global _replica_lag
+    
+    lag, checked_at = _replica_lag
+    if time.monotonic() - checked_at < REPLICA_LAG_CHECK_INTERVAL:
+        return lag
+    
+    try:
+        async with _read_pool.acquire() as conn:
+            lag = await conn.fetchval(REPLICA_LAG_QUERY)
+    except Exception as e:
+        logger.warning(f"Replica lag check failed: {str(e)}")
+        lag = None
+    
+    _replica_lag = (lag, time.monotonic())
+    return lag
+
+def wants_primary(request: Request) -> bool:
+    """True if the client asked to read from the primary or wrote something moments ago."""
+    if request.headers.get(READ_PRIMARY_HEADER, "").lower() in ("1", "true"):
+        return True
+    return READ_YOUR_WRITES_COOKIE in request.cookies
+
+async def get_read_db(request: Request):
+    """
+    What it does: Provides a database connection for read-only analytics and reporting routes.
+    Why it's needed: Moves heavy reads onto the read replica so they do not compete with writes,
+        while never showing a user data older than their own last change.
+    How it works:
+        1. Uses the primary when no replica is configured or reachable
+        2. Uses the primary for READ_YOUR_WRITES_SECONDS after the client made a change
+           (kp_recent_write cookie) or when it sends "X-Read-Primary: true"
+        3. Uses the primary while replica lag exceeds REPLICA_MAX_LAG_SECONDS or cannot be measured
+        4. Otherwise yields a connection from the replica pool
+    Expected output: An AsyncPG connection; replica connections reject writes
+    """
+    if _pool is None:
+        await create_db_pool()
+    
+    pool = _pool
+    if _read_pool is not None and not wants_primary(request):
+        lag = await get_replica_lag()
+        if lag is not None and lag <= REPLICA_MAX_LAG_SECONDS:
+            pool = _read_pool
+        else:
+            logger.debug(f"Replica lag {lag} exceeds {REPLICA_MAX_LAG_SECONDS}s, reading from primary")
+    
+    async with pool.acquire() as connection:
+        logger.debug(f"Read connection acquired from {'replica' if pool is _read_pool else 'primary'} pool")
+        await apply_statement_timeout(connection)
+        yield connection
+
+class ReadYourWritesMiddleware:
+    """
+    Pure ASGI middleware that marks clients that just changed data.
+
+    Successful POST/PUT/PATCH/DELETE responses under /api set a short-lived
+    cookie; while it is present get_read_db routes that client to the primary,
+    so a replica that has not yet replayed the change is never read.
+    """
+
+    WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+    def __init__(self, app):
+        self.app = app
+        self.cookie = (
+            f"{READ_YOUR_WRITES_COOKIE}=1; Max-Age={READ_YOUR_WRITES_SECONDS}; Path=/; HttpOnly; SameSite=Lax"
+        ).encode("latin-1")
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or _read_pool is None
+            or scope["method"] not in self.WRITE_METHODS
+            or not scope["path"].startswith("/api")
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                message["headers"] = list(message.get("headers", [])) + [(b"set-cookie", self.cookie)]
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
+
+async def apply_statement_timeout(connection):
+    """
+    Apply the current route class's statement_timeout to a freshly acquired connection.
+
+    Only routes whose budget differs from the pool default pay for the SET; the pool's
+    RESET ALL on release restores the default before the connection is reused.
+    """
+    timeout_ms = statement_timeout_ms.get()
+    if timeout_ms is not None and timeout_ms != DEFAULT_STATEMENT_TIMEOUT_MS:
+        await connection.execute(f"SET statement_timeout = {int(timeout_ms)}")
+
 def get_db_sync():
     """
     What it does: Provides synchronous access to the database pool for non-async contexts.
@@ -154,12 +410,23 @@ async def check_database_health():
             pool_size = _pool.get_size()
             idle_size = _pool.get_idle_size()
             
-            return {
+            health = {
                 "status": "healthy",
                 "pool_size": pool_size,
                 "idle_connections": idle_size,
                 "active_connections": pool_size - idle_size
             }
+        
+        if _read_pool is not None:
+            lag = await get_replica_lag()
+            health["read_replica"] = {
+                "pool_size": _read_pool.get_size(),
+                "idle_connections": _read_pool.get_idle_size(),
+                "lag_seconds": lag,
+                "in_use": lag is not None and lag <= REPLICA_MAX_LAG_SECONDS
+            }
+        
+        return health
     except Exception as e:
         logger.error(f"Database health check failed: {str(e)}")
         return {"status": "unhealthy", "error": str(e)} 
\ No newline at end of file
@@ -1,10 +1,9 @@
-import os
 import sys
 import logging
-import asyncpg
-from typing import Optional, Dict, Any, List
+from functools import lru_cache
+from typing import Optional, Dict, Any, List, Tuple
 from contextlib import asynccontextmanager
-from dotenv import load_dotenv
+from app.db.database import create_db_pool, get_db_sync
 
 # Configure logging
 logging.basicConfig(
@@ -14,64 +13,97 @@ logging.basicConfig(
 )
 logger = logging.getLogger("postgresql")
 
-# Load environment variables
-load_dotenv()
-
-# PostgreSQL connection settings
-DATABASE_CONFIG = {
-    "host": os.getenv("POSTGRES_HOST", "localhost"),
-    "port": int(os.getenv("POSTGRES_PORT", "5432")),
-    "database": os.getenv("POSTGRES_DB", "kingstons_portal"),
-    "user": os.getenv("POSTGRES_USER", "kingstons_app"),
-    "password": os.getenv("POSTGRES_PASSWORD", "KingstonApp2024!"),
-    "min_size": 5,
-    "max_size": 20,
-    "command_timeout": 60,
-}
-
-# Global connection pool
-_connection_pool: Optional[asyncpg.Pool] = None
+# Size of the compiled SQL cache (one entry per distinct query shape)
+SQL_CACHE_SIZE = 1024
 
 async def init_db_pool():
-    """Initialize the PostgreSQL connection pool"""
-    global _connection_pool
-    
-    if _connection_pool is None:
-        try:
-            logger.info("Creating PostgreSQL connection pool...")
-            _connection_pool = await asyncpg.create_pool(**DATABASE_CONFIG)
-            logger.info("PostgreSQL connection pool created successfully")
-            
-            # Test the connection
-            async with _connection_pool.acquire() as conn:
-                result = await conn.fetchval("SELECT version()")
-                logger.info(f"PostgreSQL connection test successful: {result}")
-                
-        except Exception as e:
-            logger.error(f"Failed to create PostgreSQL connection pool: {str(e)}")
-            raise
-    
-    return _connection_pool
-
-async def close_db_pool():
-    """Close the PostgreSQL connection pool"""
-    global _connection_pool
-    
-    if _connection_pool:
-        logger.info("Closing PostgreSQL connection pool...")
-        await _connection_pool.close()
-        _connection_pool = None
-        logger.info("PostgreSQL connection pool closed")
+    """Return the shared application pool from app.db.database, creating it if needed"""
+    return get_db_sync() or await create_db_pool()
 
 @asynccontextmanager
 async def get_db_connection():
-    """Get a database connection from the pool"""
-    if _connection_pool is None:
-        await init_db_pool()
+    """Get a database connection from the shared pool"""
+    pool = await init_db_pool()
     
-    async with _connection_pool.acquire() as connection:
+    async with pool.acquire() as connection:
         yield connection
 
+def _is_null(value: Any) -> bool:
+    """Supabase style NULL check value: is_(column, None) or is_(column, "null")"""
+    return value is None or (isinstance(value, str) and value.lower() == "null")
+
+def _condition_shape(conditions: List[Tuple[str, str, Any]]) -> Tuple:
+    """
+    Reduce WHERE conditions to their shape (column, operator) so that queries differing
+    only in values share one compiled SQL string. NULL checks compile without a parameter.
+    """
+    return tuple(
+        (column, "IS NULL" if operator == "IS" and _is_null(value) else operator)
+        for column, operator, value in conditions
+    )
+
+def _condition_params(conditions: List[Tuple[str, str, Any]]) -> List[Any]:
+    """Parameter values matching _condition_shape; IN lists bind as a single array"""
+    return [
+        list(value) if operator == "IN" else value
+        for column, operator, value in conditions
+        if not (operator == "IS" and _is_null(value))
+    ]
+
+def _compile_where(shape: Tuple, first_param: int) -> Tuple[str, int]:
+    """Compile a condition shape to a WHERE clause; returns (sql, next parameter number)"""
+    clauses = []
+    param = first_param
+    for column, operator in shape:
+        if operator == "IS NULL":
+            clauses.append(f"{column} IS NULL")
+            continue
+        if operator == "IN":
+            # One array parameter for any list length, so every IN lookup shares a statement
+            clauses.append(f"{column} = ANY(${param})")
+        elif operator == "IS":
+            clauses.append(f"{column} IS NOT DISTINCT FROM ${param}")
+        else:
+            clauses.append(f"{column} {operator} ${param}")
+        param += 1
+    return " AND ".join(clauses), param
+
+@lru_cache(maxsize=SQL_CACHE_SIZE)
+def _compile_select(table_name: str, fields: str, shape: Tuple, order_by: Tuple[str, ...], has_limit: bool, has_offset: bool) -> str:
+    query_parts = [f"SELECT {fields} FROM {table_name}"]
+    where, param = _compile_where(shape, 1)
+    if where:
+        query_parts.append(f"WHERE {where}")
+    if order_by:
+        query_parts.append(f"ORDER BY {', '.join(order_by)}")
+    if has_limit:
+        query_parts.append(f"LIMIT ${param}")
+        param += 1
+    if has_offset:
+        query_parts.append(f"OFFSET ${param}")
+    return " ".join(query_parts)
+
+@lru_cache(maxsize=SQL_CACHE_SIZE)
+def _compile_insert(table_name: str, columns: Tuple[str, ...]) -> str:
+    placeholders = [f"${i+1}" for i in range(len(columns))]
+    return f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join(placeholders)}) RETURNING *"
+
+@lru_cache(maxsize=SQL_CACHE_SIZE)
+def _compile_update(table_name: str, columns: Tuple[str, ...], shape: Tuple) -> str:
+    set_clauses = [f"{column} = ${i+1}" for i, column in enumerate(columns)]
+    where, _ = _compile_where(shape, len(columns) + 1)
+    return f"UPDATE {table_name} SET {', '.join(set_clauses)} WHERE {where} RETURNING *"
+
+@lru_cache(maxsize=SQL_CACHE_SIZE)
+def _compile_delete(table_name: str, shape: Tuple) -> str:
+    where, _ = _compile_where(shape, 1)
+    return f"DELETE FROM {table_name} WHERE {where} RETURNING *"
+
+@lru_cache(maxsize=SQL_CACHE_SIZE)
+def _compile_rpc(function_name: str, param_count: int) -> str:
+    placeholders = [f"${i}" for i in range(1, param_count + 1)]
+    return f"SELECT * FROM {function_name}({', '.join(placeholders)})"
+
 class PostgreSQLClient:
     """
     PostgreSQL client that mimics Supabase client interface for easier migration
@@ -81,7 +113,7 @@ class PostgreSQLClient:
         self.pool = None
     
     async def ensure_pool(self):
-        """Ensure connection pool is initialized"""
+        """Ensure the shared connection pool is initialized"""
         if self.pool is None:
             self.pool = await init_db_pool()
         return self.pool
@@ -97,15 +129,8 @@ class PostgreSQLClient:
         if params is None:
             params = {}
         
-        # Convert params to PostgreSQL function call format
-        param_placeholders = []
-        param_values = []
-        
-        for i, (key, value) in enumerate(params.items(), 1):
-            param_placeholders.append(f"${i}")
-            param_values.append(value)
-        
-        query = f"SELECT * FROM {function_name}({', '.join(param_placeholders)})"
+        param_values = list(params.values())
+        query = _compile_rpc(function_name, len(param_values))
         
         async with get_db_connection() as conn:
             try:
@@ -175,12 +200,12 @@ class PostgreSQLTable:
         return self
     
     def is_(self, column: str, value: Any):
-        """Add IS condition (for NULL checks)"""
+        """Add IS condition (is_(column, None) compiles to IS NULL)"""
         self._where_conditions.append((column, "IS", value))
         return self
     
     def in_(self, column: str, values: List[Any]):
-        """Add IN condition"""
+        """Add IN condition (bound as one array parameter, so list length does not change the query)"""
         self._where_conditions.append((column, "IN", values))
         return self
     
@@ -201,46 +226,21 @@ class PostgreSQLTable:
         return self
     
     def _build_query(self) -> tuple:
-        """Build the SQL query and parameters"""
-        query_parts = [f"SELECT {self._select_fields} FROM {self.table_name}"]
-        params = []
-        param_counter = 1
-        
-        # WHERE conditions
-        if self._where_conditions:
-            where_clauses = []
-            for column, operator, value in self._where_conditions:
-                if operator == "IN":
-                    placeholders = []
-                    for v in value:
-                        placeholders.append(f"${param_counter}")
-                        params.append(v)
-                        param_counter += 1
-                    where_clauses.append(f"{column} IN ({', '.join(placeholders)})")
-                else:
-                    where_clauses.append(f"{column} {operator} ${param_counter}")
-                    params.append(value)
-                    param_counter += 1
-            
-            query_parts.append(f"WHERE {' AND '.join(where_clauses)}")
-        
-        # ORDER BY
-        if self._order_by:
-            query_parts.append(f"ORDER BY {', '.join(self._order_by)}")
-        
-        # LIMIT
+        """Build the SQL query and parameters (SQL is compiled once per query shape)"""
+        query = _compile_select(
+            self.table_name,
+            self._select_fields,
+            _condition_shape(self._where_conditions),
+            tuple(self._order_by),
+            self._limit_value is not None,
+            self._offset_value is not None
+        )
+        params = _condition_params(self._where_conditions)
         if self._limit_value is not None:
-            query_parts.append(f"LIMIT ${param_counter}")
             params.append(self._limit_value)
-            param_counter += 1
-        
-        # OFFSET
         if self._offset_value is not None:
-            query_parts.append(f"OFFSET ${param_counter}")
             params.append(self._offset_value)
-            param_counter += 1
-        
-        return " ".join(query_parts), params
+        return query, params
     
     async def execute(self):
         """Execute the query and return results in Supabase format"""
@@ -261,16 +261,9 @@ class PostgreSQLTable:
         """Insert data into the table"""
         await self.client.ensure_pool()
         
-        columns = list(data.keys())
-        placeholders = [f"${i+1}" for i in range(len(columns))]
+        query = _compile_insert(self.table_name, tuple(data.keys()))
         values = list(data.values())
         
-        query = f"""
-        INSERT INTO {self.table_name} ({', '.join(columns)})
-        VALUES ({', '.join(placeholders)})
-        RETURNING *
-        """
-        
         async with get_db_connection() as conn:
             try:
                 row = await conn.fetchrow(query, *values)
@@ -286,29 +279,8 @@ class PostgreSQLTable:
         if not self._where_conditions:
             return {"data": None, "error": "Update requires WHERE conditions"}
         
-        # Build SET clause
-        set_clauses = []
-        params = []
-        param_counter = 1
-        
-        for column, value in data.items():
-            set_clauses.append(f"{column} = ${param_counter}")
-            params.append(value)
-            param_counter += 1
-        
-        # Build WHERE clause
-        where_clauses = []
-        for column, operator, value in self._where_conditions:
-            where_clauses.append(f"{column} {operator} ${param_counter}")
-            params.append(value)
-            param_counter += 1
-        
-        query = f"""
-        UPDATE {self.table_name}
-        SET {', '.join(set_clauses)}
-        WHERE {' AND '.join(where_clauses)}
-        RETURNING *
-        """
+        query = _compile_update(self.table_name, tuple(data.keys()), _condition_shape(self._where_conditions))
+        params = list(data.values()) + _condition_params(self._where_conditions)
         
         async with get_db_connection() as conn:
             try:
@@ -325,21 +297,8 @@ class PostgreSQLTable:
         if not self._where_conditions:
             return {"data": None, "error": "Delete requires WHERE conditions"}
         
-        # Build WHERE clause
-        where_clauses = []
-        params = []
-        param_counter = 1
-        
-        for column, operator, value in self._where_conditions:
-            where_clauses.append(f"{column} {operator} ${param_counter}")
-            params.append(value)
-            param_counter += 1
-        
-        query = f"""
-        DELETE FROM {self.table_name}
-        WHERE {' AND '.join(where_clauses)}
-        RETURNING *
-        """
+        query = _compile_delete(self.table_name, _condition_shape(self._where_conditions))
+        params = _condition_params(self._where_conditions)
         
         async with get_db_connection() as conn:
             try:
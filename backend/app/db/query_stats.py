@@ -0,0 +1,317 @@
+"""
+Query timing and slow-query capture
+
+Every connection in the shared pool is created as a TimedConnection, which
+records the duration and row count of each statement together with the
+FastAPI route that issued it. Aggregates are kept per (normalized SQL, route)
+and the slowest individual executions are held in a bounded top-N heap, so
+memory use stays constant no matter how long the process runs.
+
+The stats are served from /api/system/query-stats.
+"""
+
+import os
+import re
+import time
+import heapq
+import logging
+import asyncpg
+from contextvars import ContextVar
+from datetime import datetime
+from functools import lru_cache
+from typing import Optional, Dict, Any, List, Tuple
+
+logger = logging.getLogger("query_stats")
+
+# Configuration
+QUERY_STATS_ENABLED = os.getenv("QUERY_STATS_ENABLED", "true").lower() == "true"
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "200"))
+QUERY_STATS_TOP_N = int(os.getenv("QUERY_STATS_TOP_N", "50"))
+QUERY_STATS_MAX_SHAPES = int(os.getenv("QUERY_STATS_MAX_SHAPES", "2000"))
+
+# ASGI scope of the request currently being handled (None outside requests)
+_request_scope: ContextVar[Optional[dict]] = ContextVar("query_stats_request_scope", default=None)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_STRING_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL_RE = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\(\s*(?:\?|\$\d+)(?:\s*,\s*(?:\?|\$\d+))+\s*\)")
+
+
+@lru_cache(maxsize=4096)
+def normalize_sql(query: str) -> str:
+    """
+    Collapse a SQL statement to its shape so that executions can be grouped.
+
+    Whitespace is collapsed, inline literals become '?' and expanded IN lists
+    become '(...)'. Bind parameters ($1, $2...) are left as they are.
+    """
+    normalized = _STRING_LITERAL_RE.sub("?", query)
+    normalized = _NUMBER_LITERAL_RE.sub("?", normalized)
+    normalized = _IN_LIST_RE.sub("(...)", normalized)
+    return _WHITESPACE_RE.sub(" ", normalized).strip()
+
+
+def current_route() -> str:
+    """Return 'METHOD /route/{template}' for the active request, or 'background'."""
+    scope = _request_scope.get()
+    if scope is None:
+        return "background"
+    route = scope.get("route")
+    path = getattr(route, "path", None) or scope.get("path", "")
+    return f"{scope.get('method', '')} {path}"
+
+
+def _rows_from_status(status: Optional[str]) -> int:
+    """Parse the affected row count from a command tag such as 'UPDATE 3'."""
+    if not status:
+        return 0
+    tail = status.rsplit(" ", 1)[-1]
+    return int(tail) if tail.isdigit() else 0
+
+
+class QueryStatsCollector:
+    """
+    In-process collector for query timings.
+
+    All methods run on the event loop thread, so no locking is needed.
+    """
+
+    def __init__(self, slow_threshold_ms: float, top_n: int, max_shapes: int):
+        self.slow_threshold_ms = slow_threshold_ms
+        self.top_n = top_n
+        self.max_shapes = max_shapes
+        self.reset()
+
+    def reset(self) -> None:
+        self._shapes: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._slowest: List[Tuple[float, int, Dict[str, Any]]] = []
+        self._sequence = 0
+        self.total_queries = 0
+        self.total_ms = 0.0
+        self.untracked_queries = 0
+        self._timeouts: Dict[str, Dict[str, int]] = {}
+        self.started_at = datetime.utcnow()
+
+    def record_timeout(self, route: str, kind: str) -> None:
+        """
+        Count a request or statement that ran out of time.
+
+        kind is 'statement_timeout' (Postgres cancelled the statement), 'deadline'
+        (the route's request deadline passed) or 'client_disconnect'.
+        """
+        counts = self._timeouts.get(route)
+        if counts is None:
+            if len(self._timeouts) >= self.max_shapes:
+                return
+            counts = self._timeouts[route] = {"statement_timeout": 0, "deadline": 0, "client_disconnect": 0}
+        counts[kind] = counts.get(kind, 0) + 1
+
+    def record(self, query: str, elapsed_ms: float, rows: int, failed: bool = False) -> None:
+        """Record one statement execution."""
+        self.total_queries += 1
+        self.total_ms += elapsed_ms
+
+        sql = normalize_sql(query)
+        route = current_route()
+        key = (sql, route)
+
+        shape = self._shapes.get(key)
+        if shape is None:
+            if len(self._shapes) >= self.max_shapes:
+                self.untracked_queries += 1
+                return
+            shape = self._shapes[key] = {
+                "sql": sql,
+                "route": route,
+                "calls": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "rows": 0,
+                "errors": 0,
+                "slow_calls": 0,
+            }
+
+        shape["calls"] += 1
+        shape["total_ms"] += elapsed_ms
+        shape["rows"] += rows
+        if elapsed_ms > shape["max_ms"]:
+            shape["max_ms"] = elapsed_ms
+        if failed:
+            shape["errors"] += 1
+
+        if elapsed_ms >= self.slow_threshold_ms:
+            shape["slow_calls"] += 1
+            self._push_slow(sql, route, elapsed_ms, rows)
+
+    def _push_slow(self, sql: str, route: str, elapsed_ms: float, rows: int) -> None:
+        """Keep the N slowest individual executions in a min-heap."""
+        if len(self._slowest) >= self.top_n and elapsed_ms <= self._slowest[0][0]:
+            return
+        self._sequence += 1
+        entry = (elapsed_ms, self._sequence, {
+            "sql": sql,
+            "route": route,
+            "duration_ms": round(elapsed_ms, 2),
+            "rows": rows,
+            "recorded_at": datetime.utcnow().isoformat(),
+        })
+        if len(self._slowest) < self.top_n:
+            heapq.heappush(self._slowest, entry)
+        else:
+            heapq.heapreplace(self._slowest, entry)
+
+    def snapshot(self, limit: int = 50, route_filter: Optional[str] = None) -> Dict[str, Any]:
+        """Return slowest executions and the most expensive query shapes."""
+        shapes = self._shapes.values()
+        if route_filter:
+            shapes = [s for s in shapes if route_filter in s["route"]]
+
+        by_total = sorted(shapes, key=lambda s: s["total_ms"], reverse=True)[:limit]
+        top_shapes = [
+            {
+                **shape,
+                "total_ms": round(shape["total_ms"], 2),
+                "max_ms": round(shape["max_ms"], 2),
+                "avg_ms": round(shape["total_ms"] / shape["calls"], 2) if shape["calls"] else 0.0,
+            }
+            for shape in by_total
+        ]
+
+        slowest = [entry for _, _, entry in sorted(self._slowest, key=lambda e: e[0], reverse=True)]
+        if route_filter:
+            slowest = [entry for entry in slowest if route_filter in entry["route"]]
+
+        return {
+            "enabled": QUERY_STATS_ENABLED,
+            "slow_threshold_ms": self.slow_threshold_ms,
+            "collecting_since": self.started_at.isoformat(),
+            "total_queries": self.total_queries,
+            "total_ms": round(self.total_ms, 2),
+            "tracked_shapes": len(self._shapes),
+            "untracked_queries": self.untracked_queries,
+            "slowest_queries": slowest[:limit],
+            "top_query_shapes": top_shapes,
+            "timeouts": {
+                route: dict(counts)
+                for route, counts in self._timeouts.items()
+                if not route_filter or route_filter in route
+            },
+        }
+
+
+_collector = QueryStatsCollector(
+    slow_threshold_ms=SLOW_QUERY_THRESHOLD_MS,
+    top_n=QUERY_STATS_TOP_N,
+    max_shapes=QUERY_STATS_MAX_SHAPES,
+)
+
+
+def get_query_stats_collector() -> QueryStatsCollector:
+    """Get the global query stats collector."""
+    return _collector
+
+
+def _record_if_statement_timeout(error: asyncpg.exceptions.QueryCanceledError) -> None:
+    """Count statements cancelled by statement_timeout (not by pg_cancel_backend or client cancels)."""
+    if "statement timeout" in str(error):
+        _collector.record_timeout(current_route(), "statement_timeout")
+
+
+class TimedConnection(asyncpg.Connection):
+    """
+    asyncpg connection that reports every statement to the query stats collector.
+
+    Passed to asyncpg.create_pool as connection_class; pooled proxies forward
+    to these methods so route handlers need no changes. Statements cancelled by
+    statement_timeout are also counted per route, even when the handler
+    catches the error.
+    """
+
+    async def execute(self, query: str, *args, timeout: float = None) -> str:
+        start = time.perf_counter()
+        status = None
+        try:
+            status = await super().execute(query, *args, timeout=timeout)
+            return status
+        except asyncpg.exceptions.QueryCanceledError as e:
+            _record_if_statement_timeout(e)
+            raise
+        finally:
+            _collector.record(query, (time.perf_counter() - start) * 1000, _rows_from_status(status), status is None)
+
+    async def executemany(self, command: str, args, *, timeout: float = None):
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = await super().executemany(command, args, timeout=timeout)
+            failed = False
+            return result
+        except asyncpg.exceptions.QueryCanceledError as e:
+            _record_if_statement_timeout(e)
+            raise
+        finally:
+            rows = len(args) if isinstance(args, (list, tuple)) else 0
+            _collector.record(command, (time.perf_counter() - start) * 1000, rows, failed)
+
+    async def fetch(self, query: str, *args, timeout=None, record_class=None) -> list:
+        start = time.perf_counter()
+        rows = None
+        try:
+            rows = await super().fetch(query, *args, timeout=timeout, record_class=record_class)
+            return rows
+        except asyncpg.exceptions.QueryCanceledError as e:
+            _record_if_statement_timeout(e)
+            raise
+        finally:
+            _collector.record(query, (time.perf_counter() - start) * 1000, len(rows) if rows is not None else 0, rows is None)
+
+    async def fetchrow(self, query: str, *args, timeout=None, record_class=None):
+        start = time.perf_counter()
+        failed = True
+        row = None
+        try:
+            row = await super().fetchrow(query, *args, timeout=timeout, record_class=record_class)
+            failed = False
+            return row
+        except asyncpg.exceptions.QueryCanceledError as e:
+            _record_if_statement_timeout(e)
+            raise
+        finally:
+            _collector.record(query, (time.perf_counter() - start) * 1000, 1 if row is not None else 0, failed)
+
+    async def fetchval(self, query: str, *args, column=0, timeout=None):
+        start = time.perf_counter()
+        failed = True
+        try:
+            value = await super().fetchval(query, *args, column=column, timeout=timeout)
+            failed = False
+            return value
+        except asyncpg.exceptions.QueryCanceledError as e:
+            _record_if_statement_timeout(e)
+            raise
+        finally:
+            _collector.record(query, (time.perf_counter() - start) * 1000, 0 if failed else 1, failed)
+
+
+class QueryStatsMiddleware:
+    """
+    Pure ASGI middleware that exposes the current request scope to the collector.
+
+    FastAPI stores the matched APIRoute in scope["route"] during routing, so the
+    route template is resolved lazily when a query is recorded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = _request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_scope.reset(token)
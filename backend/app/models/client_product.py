@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field, ConfigDict, validator
 from datetime import date, datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 
 class ClientproductBase(BaseModel):
     client_id: int
@@ -85,4 +85,23 @@ class ProductRevenueCalculation(BaseModel):
             datetime: lambda dt: dt.isoformat() if dt else None
         },
         from_attributes=True
-    )
\ No newline at end of file
+    )
+
+class ProductRevenueBatchRequest(BaseModel):
+    """Request model for calculating revenue for several products at once"""
+    product_ids: List[int] = Field(..., description="Client product IDs to calculate revenue for")
+
+class ProductRevenueTotals(BaseModel):
+    """Revenue totals across the products of a batch calculation"""
+    product_count: int = 0
+    products_with_revenue_data: int = 0
+    total_fixed_fee_direct: float = 0.0
+    total_fixed_fee_facilitated: float = 0.0
+    total_percentage_fee_facilitated: float = 0.0
+    total_estimated_annual_revenue: float = 0.0
+
+class ProductRevenueBatchResponse(BaseModel):
+    """Response model for batch product revenue calculation"""
+    products: List[ProductRevenueCalculation]
+    missing_product_ids: List[int] = []
+    totals: ProductRevenueTotals
@@ -0,0 +1,176 @@
+"""
+FUM Rollup Service
+
+Maintains fum_daily_rollup (migrations/003_fum_daily_rollup.sql): FUM and amount
+invested per day for the whole book and per client group, provider, fund and
+portfolio template, so dashboards and history charts read a handful of rows
+instead of re-aggregating live valuations.
+
+Core Principles:
+1. Set-based: one statement computes every dimension for a range of dates (GROUPING SETS)
+2. Replace, don't patch: a refresh deletes and rewrites the rows of its dates in one
+   transaction, so keys that no longer have FUM disappear
+3. Fresh enough: run_fum_rollup_job rewrites the trailing FUM_ROLLUP_NIGHTLY_DAYS once a
+   day (catching back-dated valuations) and today's rows whenever client, product,
+   portfolio fund or valuation data changed since its last run
+4. History on demand: backfill_fum_rollup walks any date range in chunks
+
+A portfolio fund counts on a date when it has started and not ended by then, and so has
+its product. Funds and products that are inactive without an end_date are left out, as
+are funds whose portfolio belongs to no such product, matching the live FUM figures,
+which only count active holdings. Every dimension sums the same set of holdings.
+"""
+
+import os
+import asyncio
+import logging
+from datetime import date, timedelta
+
+from app.utils.data_versions import CLIENTS, PRODUCTS, PORTFOLIO_FUNDS, VALUATIONS, get_data_version
+
+logger = logging.getLogger(__name__)
+
+FUM_ROLLUP_CHECK_SECONDS = float(os.getenv("FUM_ROLLUP_CHECK_SECONDS", "60"))
+FUM_ROLLUP_NIGHTLY_DAYS = int(os.getenv("FUM_ROLLUP_NIGHTLY_DAYS", "35"))
+FUM_ROLLUP_CHUNK_DAYS = int(os.getenv("FUM_ROLLUP_CHUNK_DAYS", "31"))
+FUM_ROLLUP_STATEMENT_TIMEOUT_MS = int(os.getenv("FUM_ROLLUP_STATEMENT_TIMEOUT_MS", "300000"))
+
+DIMENSIONS = ("total", "client_group", "provider", "fund", "template")
+ROLLUP_DATA_DOMAINS = (CLIENTS, PRODUCTS, PORTFOLIO_FUNDS, VALUATIONS)
+
+# Activity types that count towards the amount invested
+INVESTED_ACTIVITY_TYPES = ["Investment", "RegularInvestment", "TaxUplift"]
+
+# $1 = first date, $2 = last date, $3 = invested activity types
+ROLLUP_INSERT_SQL = """
+    WITH days AS (
+        SELECT day::date AS date
+        FROM generate_series($1::date, $2::date, interval '1 day') AS day
+    ),
+    fund_days AS (
+        SELECT
+            days.date,
+            pf.available_funds_id,
+            COALESCE(p.template_generation_id, 0) AS template_key,
+            cp.client_id,
+            cp.provider_id,
+            COALESCE(v.valuation, 0) AS fum,
+            COALESCE(inv.invested, 0) AS invested
+        FROM days
+        JOIN portfolio_funds pf
+          ON (pf.status = 'active' OR pf.end_date IS NOT NULL)
+         AND (pf.start_date IS NULL OR pf.start_date <= days.date)
+         AND (pf.end_date IS NULL OR pf.end_date >= days.date)
+        JOIN portfolios p ON p.id = pf.portfolio_id
+        JOIN client_products cp
+          ON cp.portfolio_id = pf.portfolio_id
+         AND (cp.status = 'active' OR cp.end_date IS NOT NULL)
+         AND (cp.end_date IS NULL OR cp.end_date >= days.date)
+        LEFT JOIN LATERAL (
+            SELECT valuation
+            FROM portfolio_fund_valuations
+            WHERE portfolio_fund_id = pf.id AND valuation_date <= days.date
+            ORDER BY valuation_date DESC, created_at DESC
+            LIMIT 1
+        ) v ON true
+        LEFT JOIN LATERAL (
+            SELECT SUM(amount) AS invested
+            FROM holding_activity_log
+            WHERE portfolio_fund_id = pf.id
+              AND activity_timestamp < days.date + 1
+              AND activity_type = ANY($3::text[])
+        ) inv ON true
+    )
+    INSERT INTO fum_daily_rollup (date, dimension, key, fum, invested)
+    SELECT
+        date,
+        CASE
+            WHEN GROUPING(client_id) = 0 THEN 'client_group'
+            WHEN GROUPING(provider_id) = 0 THEN 'provider'
+            WHEN GROUPING(available_funds_id) = 0 THEN 'fund'
+            WHEN GROUPING(template_key) = 0 THEN 'template'
+            ELSE 'total'
+        END,
+        CASE
+            WHEN GROUPING(client_id) = 0 THEN client_id
+            WHEN GROUPING(provider_id) = 0 THEN provider_id
+            WHEN GROUPING(available_funds_id) = 0 THEN available_funds_id
+            WHEN GROUPING(template_key) = 0 THEN template_key
+            ELSE 0
+        END,
+        SUM(fum),
+        SUM(invested)
+    FROM fund_days
+    GROUP BY GROUPING SETS (
+        (date),
+        (date, client_id),
+        (date, provider_id),
+        (date, available_funds_id),
+        (date, template_key)
+    )
+    HAVING (GROUPING(client_id) = 1 OR client_id IS NOT NULL)
+       AND (GROUPING(provider_id) = 1 OR provider_id IS NOT NULL)
+       AND (GROUPING(available_funds_id) = 1 OR available_funds_id IS NOT NULL)
+"""
+
+
+async def refresh_fum_rollup(db, start_date: date, end_date: date) -> int:
+    """
+    Recompute fum_daily_rollup for every date from start_date to end_date inclusive.
+
+    Runs in one transaction under an advisory lock, so concurrent refreshes (the job,
+    the refresh endpoint, a backfill) queue instead of colliding. Returns the number of
+    rows written.
+    """
+    async with db.transaction():
+        await db.execute(f"SET LOCAL statement_timeout = {FUM_ROLLUP_STATEMENT_TIMEOUT_MS}")
+        await db.execute("SELECT pg_advisory_xact_lock(hashtext('fum_daily_rollup'))")
+        await db.execute("DELETE FROM fum_daily_rollup WHERE date BETWEEN $1 AND $2", start_date, end_date)
+        status = await db.execute(ROLLUP_INSERT_SQL, start_date, end_date, INVESTED_ACTIVITY_TYPES)
+    return int(status.split()[-1])
+
+
+async def backfill_fum_rollup(db, start_date: date, end_date: date, chunk_days: int = FUM_ROLLUP_CHUNK_DAYS) -> int:
+    """Refresh a long date range chunk by chunk, oldest first, so each transaction stays short."""
+    rows_written = 0
+    chunk_start = start_date
+    while chunk_start <= end_date:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days - 1), end_date)
+        rows_written += await refresh_fum_rollup(db, chunk_start, chunk_end)
+        logger.info(f"📊 FUM rollup refreshed {chunk_start} to {chunk_end} ({rows_written} rows so far)")
+        chunk_start = chunk_end + timedelta(days=1)
+    return rows_written
+
+
+async def run_fum_rollup_job():
+    """
+    Background task started with the application.
+
+    Every FUM_ROLLUP_CHECK_SECONDS: on the first run of each day, rewrite the trailing
+    FUM_ROLLUP_NIGHTLY_DAYS; otherwise rewrite today only if FUM-relevant data changed.
+    """
+    from app.db.database import get_db_sync
+
+    last_full_refresh = None
+    last_version = None
+    while True:
+        try:
+            db_pool = get_db_sync()
+            if not db_pool:
+                logger.warning("Database pool not available for FUM rollup")
+            else:
+                today = date.today()
+                version = get_data_version(*ROLLUP_DATA_DOMAINS)
+                if last_full_refresh != today:
+                    async with db_pool.acquire() as db:
+                        rows = await backfill_fum_rollup(db, today - timedelta(days=FUM_ROLLUP_NIGHTLY_DAYS), today)
+                    last_full_refresh, last_version = today, version
+                    logger.info(f"✅ Nightly FUM rollup wrote {rows} rows for the last {FUM_ROLLUP_NIGHTLY_DAYS} days")
+                elif version != last_version:
+                    async with db_pool.acquire() as db:
+                        rows = await refresh_fum_rollup(db, today, today)
+                    last_version = version
+                    logger.debug(f"🔄 FUM rollup refreshed for {today} after data changes ({rows} rows)")
+        except Exception as e:
+            logger.error(f"❌ Error in FUM rollup job: {str(e)}")
+        await asyncio.sleep(FUM_ROLLUP_CHECK_SECONDS)
@@ -0,0 +1,543 @@
+"""
+IRR Cascade Planner
+
+Set-based engine behind IRRCascadeService's batch flows (activity changes and the coalesced
+background jobs). The per-date flow queried the database again for every date and every fund:
+valuations, completeness, activities and an existence check before each write.
+
+Core Principles:
+1. One load per portfolio: its funds, fund valuations, activities and stored fund/portfolio IRR
+   dates are read once (one query per table) into NumPy arrays (PortfolioIRRState)
+2. Exact recomputation set: plan_cascade works out from that state which fund IRRs to
+   recalculate or delete and which portfolio dates to recalculate or clear
+3. Batch solver: every cash-flow series is bucketed into one monthly matrix with np.add.at and
+   solved together (solve_monthly_irr), with the same cash-flow rules as
+   calculate_single_portfolio_fund_irr and calculate_multiple_portfolio_funds_irr
+4. Set-based writes: one multi-row INSERT ... SELECT FROM unnest ... ON CONFLICT upsert per table
+   and one DELETE per table
+"""
+
+import logging
+from datetime import date
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import numpy_financial as npf
+
+logger = logging.getLogger(__name__)
+
+# The batch solver searches x = 1 / (1 + monthly rate) from 1 / IRR_SOLVER_X_LIMIT to
+# IRR_SOLVER_X_LIMIT (monthly rates from -99.9999% to +99,999,900%)
+IRR_SOLVER_X_LIMIT = 1e6
+IRR_SOLVER_GRID_POINTS = 48
+IRR_SOLVER_ITERATIONS = 52
+
+# irr_result is numeric(8,4); larger IRRs cannot be stored and count as failed calculations
+IRR_STORAGE_LIMIT = 10 ** 4
+
+FUNDS_SQL = """
+    SELECT pf.id,
+           COALESCE(pf.status = 'active' AND NOT (af.fund_name = 'Cash' AND af.isin_number = 'N/A'), false) AS needs_valuation
+    FROM portfolio_funds pf
+    LEFT JOIN available_funds af ON af.id = pf.available_funds_id
+    WHERE pf.portfolio_id = ANY($1::bigint[])
+    ORDER BY pf.id
+"""
+
+VALUATIONS_SQL = """
+    SELECT pfv.id, pfv.portfolio_fund_id, pfv.valuation_date, pfv.valuation
+    FROM portfolio_fund_valuations pfv
+    JOIN portfolio_funds pf ON pf.id = pfv.portfolio_fund_id
+    WHERE pf.portfolio_id = ANY($1::bigint[])
+    ORDER BY pfv.portfolio_fund_id, pfv.valuation_date, pfv.id
+"""
+
+# Activity dates as the IRR functions see them (the UTC date of the timestamp)
+ACTIVITIES_SQL = """
+    SELECT hal.portfolio_fund_id, hal.activity_type, hal.amount,
+           (hal.activity_timestamp AT TIME ZONE 'UTC')::date AS activity_date
+    FROM holding_activity_log hal
+    JOIN portfolio_funds pf ON pf.id = hal.portfolio_fund_id
+    WHERE pf.portfolio_id = ANY($1::bigint[])
+"""
+
+STORED_SQL = """
+    SELECT 'fund_irr' AS kind, fiv.fund_id, fiv.date
+    FROM portfolio_fund_irr_values fiv
+    JOIN portfolio_funds pf ON pf.id = fiv.fund_id
+    WHERE pf.portfolio_id = $1
+    UNION ALL
+    SELECT 'portfolio_irr', NULL, date FROM portfolio_irr_values WHERE portfolio_id = $1
+    UNION ALL
+    SELECT 'portfolio_valuation', NULL, valuation_date FROM portfolio_valuations WHERE portfolio_id = $1
+"""
+
+# Upserts on the unique (fund_id, date) / (portfolio_id, date) indexes (migration 007)
+# $1 = fund ids, $2 = dates, $3 = IRRs, $4 = fund valuation ids
+FUND_IRR_UPSERT_SQL = """
+    INSERT INTO portfolio_fund_irr_values (fund_id, date, irr_result, fund_valuation_id)
+    SELECT * FROM unnest($1::bigint[], $2::date[], $3::numeric[], $4::bigint[])
+    ON CONFLICT (fund_id, date) DO UPDATE
+    SET irr_result = EXCLUDED.irr_result, fund_valuation_id = EXCLUDED.fund_valuation_id
+"""
+
+# $1 = portfolio, $2 = dates, $3 = valuations; returns the portfolio valuation id of each date
+PORTFOLIO_VALUATION_UPSERT_SQL = """
+    INSERT INTO portfolio_valuations (portfolio_id, valuation_date, valuation)
+    SELECT $1, * FROM unnest($2::date[], $3::numeric[])
+    ON CONFLICT (portfolio_id, valuation_date) DO UPDATE SET valuation = EXCLUDED.valuation
+    RETURNING id, valuation_date
+"""
+
+# $1 = portfolio, $2 = dates, $3 = IRRs, $4 = portfolio valuation ids
+PORTFOLIO_IRR_UPSERT_SQL = """
+    INSERT INTO portfolio_irr_values (portfolio_id, date, irr_result, portfolio_valuation_id)
+    SELECT $1, * FROM unnest($2::date[], $3::numeric[], $4::bigint[])
+    ON CONFLICT (portfolio_id, date) DO UPDATE
+    SET irr_result = EXCLUDED.irr_result, portfolio_valuation_id = EXCLUDED.portfolio_valuation_id
+"""
+
+
+def activity_sign(activity_type, single_fund: bool) -> float:
+    """
+    Cash-flow sign of an activity type: -1 money into the fund, +1 money out, 0 ignored.
+
+    Same rules as calculate_single_portfolio_fund_irr (single_fund=True, which also counts
+    taxuplift_tax) and calculate_multiple_portfolio_funds_irr.
+    """
+    if not isinstance(activity_type, str):
+        return 0.0
+    activity_type = activity_type.lower()
+    if "investment" in activity_type:
+        return -1.0
+    if activity_type in (("taxuplift", "taxuplift_tax") if single_fund else ("taxuplift",)):
+        return -1.0
+    if activity_type in ("productswitchin", "fundswitchin"):
+        return -1.0
+    if "withdrawal" in activity_type:
+        return 1.0
+    if activity_type in ("productswitchout", "fundswitchout"):
+        return 1.0
+    if any(keyword in activity_type for keyword in ("fee", "charge", "expense")):
+        return 1.0
+    if any(keyword in activity_type for keyword in ("dividend", "interest", "capital gain")):
+        return -1.0
+    return 0.0
+
+
+def _months(days: np.ndarray) -> np.ndarray:
+    """Months since 1970-01 of a datetime64[D] array."""
+    return days.astype("datetime64[M]").astype(np.int64)
+
+
+def _amounts(values: Iterable) -> np.ndarray:
+    # NULL amounts become NaN; the IRR functions fail on them (float(None)), so do we
+    return np.array([np.nan if value is None else float(value) for value in values], dtype=np.float64)
+
+
+class PortfolioIRRState:
+    """
+    Funds, fund valuations, activities and stored IRR dates of one portfolio.
+
+    Valuation arrays (val_*) follow VALUATIONS_SQL order (fund, date, id); activity arrays
+    (act_*) are one slot per activity. Dates are datetime64[D].
+    """
+
+    def __init__(self, portfolio_id: int, funds: List, valuations: List, activities: List, stored: List):
+        self.portfolio_id = portfolio_id
+        self.fund_ids = np.array([row["id"] for row in funds], dtype=np.int64)
+        self.required_fund_ids = np.array([row["id"] for row in funds if row["needs_valuation"]], dtype=np.int64)
+
+        self.val_ids = np.array([row["id"] for row in valuations], dtype=np.int64)
+        self.val_fund = np.array([row["portfolio_fund_id"] for row in valuations], dtype=np.int64)
+        self.val_date = np.array([row["valuation_date"] for row in valuations], dtype="datetime64[D]")
+        self.val_amount = _amounts(row["valuation"] for row in valuations)
+
+        self.act_fund = np.array([row["portfolio_fund_id"] for row in activities], dtype=np.int64)
+        self.act_date = np.array([row["activity_date"] for row in activities], dtype="datetime64[D]")
+        self.act_month = _months(self.act_date)
+        self.act_amount = _amounts(row["amount"] for row in activities)
+        signs = {}
+        for row in activities:
+            if row["activity_type"] not in signs:
+                signs[row["activity_type"]] = (activity_sign(row["activity_type"], True), activity_sign(row["activity_type"], False))
+        self.act_sign_fund = np.array([signs[row["activity_type"]][0] for row in activities], dtype=np.float64)
+        self.act_sign_portfolio = np.array([signs[row["activity_type"]][1] for row in activities], dtype=np.float64)
+
+        self.fund_irr_keys = {(int(row["fund_id"]), row["date"]) for row in stored if row["kind"] == "fund_irr"}
+        self.portfolio_irr_dates = {row["date"] for row in stored if row["kind"] == "portfolio_irr"}
+        self.portfolio_valuation_dates = {row["date"] for row in stored if row["kind"] == "portfolio_valuation"}
+
+        # (fund, date) -> first valuation id on that date (the row fund IRRs link to)
+        self.valuation_ids: Dict[Tuple[int, date], int] = {}
+        for valuation_id, fund_id, valuation_date in zip(self.val_ids.tolist(), self.val_fund.tolist(), self.val_date.astype(object)):
+            self.valuation_ids.setdefault((fund_id, valuation_date), valuation_id)
+
+    def valued_on(self, day: date) -> np.ndarray:
+        """Funds with a valuation on this exact date."""
+        return np.unique(self.val_fund[self.val_date == np.datetime64(day, "D")])
+
+    def valuation_dates_from(self, day: date) -> List[date]:
+        return sorted(set(self.val_date[self.val_date >= np.datetime64(day, "D")].astype(object)))
+
+    def is_complete(self, day: date) -> bool:
+        """Every active non-cash fund has a valuation on this date (False when there are none)."""
+        if not len(self.required_fund_ids):
+            return False
+        return bool(np.isin(self.required_fund_ids, self.valued_on(day)).all())
+
+    def latest_valuations(self, fund_ids: np.ndarray, day: date) -> Tuple[np.ndarray, np.ndarray]:
+        """Latest valuation on or before day per fund: (has a valuation, amount)."""
+        has_valuation = np.zeros(len(fund_ids), dtype=bool)
+        amounts = np.zeros(len(fund_ids), dtype=np.float64)
+        cutoff = np.datetime64(day, "D")
+        for i, fund_id in enumerate(fund_ids):
+            rows = np.flatnonzero((self.val_fund == fund_id) & (self.val_date <= cutoff))
+            if len(rows):
+                has_valuation[i] = True
+                amounts[i] = self.val_amount[rows[-1]]
+        return has_valuation, amounts
+
+
+async def load_portfolio_irr_state(db, portfolio_id: int) -> PortfolioIRRState:
+    funds = await db.fetch(FUNDS_SQL, [portfolio_id])
+    valuations = await db.fetch(VALUATIONS_SQL, [portfolio_id])
+    activities = await db.fetch(ACTIVITIES_SQL, [portfolio_id])
+    stored = await db.fetch(STORED_SQL, portfolio_id)
+    return PortfolioIRRState(portfolio_id, funds, valuations, activities, stored)
+
+
+async def load_combined_irr_state(db, portfolio_ids: List[int]) -> PortfolioIRRState:
+    """
+    Funds, valuations and activities of several portfolios as one state (no stored IRR dates),
+    so solve_portfolio_irrs gives the IRR of their combined holdings. Read-only.
+    """
+    funds = await db.fetch(FUNDS_SQL, portfolio_ids)
+    valuations = await db.fetch(VALUATIONS_SQL, portfolio_ids)
+    activities = await db.fetch(ACTIVITIES_SQL, portfolio_ids)
+    return PortfolioIRRState(None, funds, valuations, activities, [])
+
+
+class CascadePlan(NamedTuple):
+    fund_irrs: List[Tuple[int, date]]             # fund IRRs to recalculate
+    fund_irr_deletions: List[Tuple[int, date]]    # stored fund IRRs whose valuation was deleted
+    portfolio_dates: List[date]                   # complete dates: recalculate the portfolio IRR and valuation
+    cleared_dates: List[date]                     # incomplete dates with a stored portfolio IRR
+    cleared_valuation_dates: List[date]           # incomplete after a deleted valuation, with a stored portfolio valuation
+    processed_dates: List[date]
+
+
+def plan_cascade(state: PortfolioIRRState, valuation_changes: List[Tuple[int, date]], activity_dates: List[date]) -> CascadePlan:
+    """
+    Work out the minimal set of IRRs to refresh for these changes.
+
+    - A changed (fund, date) whose valuation still exists recalculates that fund IRR; one whose
+      valuation is gone deletes it
+    - Activity changes recalculate every fund valued on each valuation date on or after the
+      earliest activity date
+    - Each affected date then either recalculates the portfolio IRR (portfolio complete) or
+      clears it, plus the portfolio valuation on dates that lost a fund valuation
+    """
+    changes = sorted({(int(fund_id), change_date) for fund_id, change_date in valuation_changes})
+    saved = [change for change in changes if change in state.valuation_ids]
+    deleted = [change for change in changes if change not in state.valuation_ids]
+
+    fund_irrs = set(saved)
+    activity_valuation_dates = []
+    if activity_dates:
+        activity_valuation_dates = state.valuation_dates_from(min(activity_dates))
+        for valuation_date in activity_valuation_dates:
+            fund_irrs.update((int(fund_id), valuation_date) for fund_id in state.valued_on(valuation_date))
+
+    deleted_dates = {change_date for _, change_date in deleted}
+    processed_dates = sorted(set(activity_valuation_dates) | deleted_dates | {change_date for _, change_date in saved})
+    portfolio_dates = [day for day in processed_dates if state.is_complete(day)]
+    incomplete = [day for day in processed_dates if day not in set(portfolio_dates)]
+
+    return CascadePlan(
+        fund_irrs=sorted(fund_irrs),
+        fund_irr_deletions=[change for change in deleted if change in state.fund_irr_keys],
+        portfolio_dates=portfolio_dates,
+        cleared_dates=[day for day in incomplete if day in state.portfolio_irr_dates],
+        cleared_valuation_dates=[day for day in incomplete if day in deleted_dates and day in state.portfolio_valuation_dates],
+        processed_dates=processed_dates
+    )
+
+
+def plan_full_recalculation(state: PortfolioIRRState) -> CascadePlan:
+    """Every fund IRR on every valuation date, and the portfolio IRR on each of those dates."""
+    if not len(state.val_date):
+        return plan_cascade(state, [], [])
+    return plan_cascade(state, [], [state.val_date.min().astype(object)])
+
+
+def _polynomial_signs(coefficients: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Sign of each row's polynomial (coefficients highest power first) at y[row, k], by Horner's rule."""
+    value = np.zeros(y.shape)
+    for t in range(coefficients.shape[1]):
+        value *= y
+        value += coefficients[:, t, None]
+    return np.sign(value)
+
+
+def solve_monthly_irr(flows: np.ndarray) -> np.ndarray:
+    """
+    Monthly IRR of every row of a (series x months) cash-flow matrix; NaN where there is none.
+
+    Gives the root npf.irr gives: of the real roots, the one closest to zero. On each side of
+    rate = 0 the NPV sign is scanned on a grid of log(x), x = 1 / (1 + rate), that gets finer
+    towards zero; the sign change nearest to zero is bisected, and the smaller |rate| of the
+    two sides wins. Rows with no sign change (or a root exactly on the grid) go through npf.irr
+    one at a time.
+    """
+    rows, width = flows.shape
+    rates = np.full(rows, np.nan)
+    if rows == 0:
+        return rates
+
+    # Leading and trailing zero months only add roots at x = 0, which npf.irr drops too
+    nonzero = flows != 0
+    first = np.argmax(nonzero, axis=1)[:, None]
+    right_shift = np.argmax(nonzero[:, ::-1], axis=1)[:, None]
+    columns = np.arange(width)[None, :]
+    left_aligned = np.where(columns + first < width, np.take_along_axis(flows, np.minimum(columns + first, width - 1), axis=1), 0.0)
+    right_aligned = np.where(columns >= right_shift, np.take_along_axis(flows, np.maximum(columns - right_shift, 0), axis=1), 0.0)
+
+    # |log(x)| from 0 outwards. Positive rates (x < 1) use the NPV as a polynomial in x,
+    # negative rates (x > 1) the NPV / x^last as a polynomial in 1/x; both are evaluated at
+    # exp(-|log(x)|) <= 1, so nothing overflows and the outermost terms never underflow to 0
+    grid = np.concatenate([[0.0], np.geomspace(1e-6, np.log(IRR_SOLVER_X_LIMIT), IRR_SOLVER_GRID_POINTS)])
+    candidates = np.full((rows, 2), np.nan)
+    for side, (coefficients, direction) in enumerate(((left_aligned[:, ::-1], 1.0), (right_aligned, -1.0))):
+        signs = _polynomial_signs(coefficients, np.broadcast_to(np.exp(-grid), (rows, len(grid))))
+        brackets = signs[:, :-1] * signs[:, 1:] < 0
+        found = np.flatnonzero(brackets.any(axis=1))
+        cell = np.argmax(brackets[found], axis=1)
+        lo, hi = grid[cell], grid[cell + 1]
+        sign_lo = signs[found, cell]
+        for _ in range(IRR_SOLVER_ITERATIONS):
+            mid = (lo + hi) / 2
+            same = _polynomial_signs(coefficients[found], np.exp(-mid)[:, None])[:, 0] == sign_lo
+            lo = np.where(same, mid, lo)
+            hi = np.where(same, hi, mid)
+        candidates[found, side] = np.exp(direction * (lo + hi) / 2) - 1
+
+    closest = np.where(np.isnan(candidates[:, 0]) | (np.abs(candidates[:, 1]) < np.abs(candidates[:, 0])), 1, 0)
+    rates = candidates[np.arange(rows), closest]
+
+    for row in np.flatnonzero(np.isnan(rates)):
+        rates[row] = npf.irr(flows[row])
+    return rates
+
+
+def _irr_percentages(flows: np.ndarray, present: np.ndarray, activity_counts: np.ndarray, invalid: np.ndarray) -> List[Optional[float]]:
+    """
+    IRR percentage per row, following calculate_excel_style_irr and its callers; None where they
+    fail or the IRR is too large to store.
+
+    flows/present: monthly cash flows and which months have a cash-flow entry (an activity of any
+    type, or the valuation). Rows without activities, or whose entries add up to less than a
+    penny, are 0%. Otherwise the months from the first to the last entry are solved, after
+    zeroing sub-penny amounts.
+    """
+    n_rows, n_months = flows.shape
+    percentages: List[Optional[float]] = [None] * n_rows
+    entries = np.where(present, flows, 0.0)
+
+    zero = ~invalid & ((activity_counts == 0) | (np.abs(entries).sum(axis=1) < 0.01))
+    solvable = (
+        ~invalid & ~zero
+        & (present.sum(axis=1) >= 2)
+        & (present & (flows < 0)).any(axis=1)
+        & (present & (flows > 0)).any(axis=1)
+    )
+
+    rounded = np.where(np.abs(entries) < 0.01, 0.0, entries)
+    first = np.argmax(present, axis=1)
+    last = n_months - 1 - np.argmax(present[:, ::-1], axis=1)
+    final = rounded[np.arange(n_rows), last]
+    # A negative final month is only accepted when some month is positive
+    solvable &= ~((final < 0) & ~(rounded > 0).any(axis=1))
+
+    rows = np.flatnonzero(solvable)
+    if len(rows):
+        width = int((last[rows] - first[rows]).max()) + 1
+        columns = first[rows, None] + np.arange(width)[None, :]
+        series = np.where(
+            columns <= last[rows, None],
+            rounded[rows[:, None], np.minimum(columns, n_months - 1)],
+            0.0
+        )
+        monthly = solve_monthly_irr(series)
+        for row, rate in zip(rows.tolist(), monthly.tolist()):
+            if np.isfinite(rate) and abs(round(rate * 12 * 100, 1)) < IRR_STORAGE_LIMIT:
+                percentages[row] = round(rate * 12 * 100, 1)
+
+    for row in np.flatnonzero(zero).tolist():
+        percentages[row] = 0.0
+    return percentages
+
+
+def _cash_flows(state: PortfolioIRRState, days: np.ndarray, row_idx: np.ndarray, act_idx: np.ndarray, signs: np.ndarray, final_values: np.ndarray):
+    """
+    Monthly cash-flow matrix for len(days) series.
+
+    (row_idx, act_idx) pairs assign activities to series; final_values (NaN = none) is each
+    series' valuation, placed in the month after its date like the IRR functions do.
+    """
+    n_rows = len(days)
+    valuation_months = _months(days) + 1
+    first_month = int(min(valuation_months.min() - 1, state.act_month[act_idx].min() if len(act_idx) else valuation_months.min()))
+    n_months = int(valuation_months.max()) - first_month + 1
+
+    flows = np.zeros((n_rows, n_months))
+    present = np.zeros((n_rows, n_months), dtype=bool)
+    months = state.act_month[act_idx] - first_month
+    np.add.at(flows, (row_idx, months), state.act_amount[act_idx] * signs[act_idx])
+    present[row_idx, months] = True
+
+    activity_counts = np.bincount(row_idx, minlength=n_rows)
+    invalid = np.zeros(n_rows, dtype=bool)
+    invalid[row_idx[np.isnan(state.act_amount[act_idx])]] = True
+
+    valued = ~np.isnan(final_values)
+    flows[np.flatnonzero(valued), valuation_months[valued] - first_month] += final_values[valued]
+    present[np.flatnonzero(valued), valuation_months[valued] - first_month] = True
+    return flows, present, activity_counts, invalid
+
+
+def solve_fund_irrs(state: PortfolioIRRState, targets: List[Tuple[int, date]]) -> List[Optional[float]]:
+    """IRR percentage per (fund, date), as calculate_single_portfolio_fund_irr computes it; None on failure."""
+    if not targets:
+        return []
+    fund_ids = np.array([fund_id for fund_id, _ in targets], dtype=np.int64)
+    days = np.array([day for _, day in targets], dtype="datetime64[D]")
+
+    # The fund's own activities up to each date
+    row_parts, act_parts = [], []
+    for fund_id in np.unique(fund_ids):
+        target_rows = np.flatnonzero(fund_ids == fund_id)
+        fund_acts = np.flatnonzero(state.act_fund == fund_id)
+        pair_rows, pair_acts = np.nonzero(state.act_date[fund_acts][None, :] <= days[target_rows][:, None])
+        row_parts.append(target_rows[pair_rows])
+        act_parts.append(fund_acts[pair_acts])
+    row_idx = np.concatenate(row_parts)
+    act_idx = np.concatenate(act_parts)
+
+    # Latest valuation on or before the date; a zero valuation is left out of the cash flows
+    has_valuation = np.zeros(len(targets), dtype=bool)
+    valuations = np.zeros(len(targets))
+    for i, (fund_id, day) in enumerate(targets):
+        found, amount = state.latest_valuations(np.array([fund_id]), day)
+        has_valuation[i], valuations[i] = found[0], amount[0]
+    final_values = np.where(valuations != 0, valuations, np.nan)
+
+    flows, present, activity_counts, invalid = _cash_flows(state, days, row_idx, act_idx, state.act_sign_fund, final_values)
+    invalid |= ~has_valuation | np.isnan(valuations)
+    return _irr_percentages(flows, present, activity_counts, invalid)
+
+
+def solve_portfolio_irrs(state: PortfolioIRRState, days_list: List[date]) -> List[Optional[float]]:
+    """IRR percentage per date, as calculate_multiple_portfolio_funds_irr computes it for all the portfolio's funds."""
+    if not days_list:
+        return []
+    days = np.array(days_list, dtype="datetime64[D]")
+    fund_index = np.searchsorted(state.fund_ids, state.act_fund)
+
+    # Funds with a valuation on or before each date take part; their latest valuations are the final value
+    included = np.zeros((len(days_list), len(state.fund_ids)), dtype=bool)
+    totals = np.zeros(len(days_list))
+    for i, day in enumerate(days_list):
+        included[i], amounts = state.latest_valuations(state.fund_ids, day)
+        totals[i] = amounts[included[i]].sum()
+
+    pair_rows, act_idx = np.nonzero(included[:, fund_index] & (state.act_date[None, :] <= days[:, None]))
+    final_values = np.where(totals > 0, totals, np.nan)
+
+    flows, present, activity_counts, invalid = _cash_flows(state, days, pair_rows, act_idx, state.act_sign_portfolio, final_values)
+    invalid |= np.isnan(totals)
+    percentages = _irr_percentages(flows, present, activity_counts, invalid)
+    # No fund valued yet: 0%
+    for i in np.flatnonzero(~included.any(axis=1)).tolist():
+        percentages[i] = 0.0
+    return percentages
+
+
+async def run_cascade_plan(db, state: PortfolioIRRState, plan: CascadePlan) -> Dict:
+    """Solve the planned IRRs and write every table in one statement each; returns counts."""
+    from app.services.irr_cascade_service import safe_irr_value
+
+    fund_results = solve_fund_irrs(state, plan.fund_irrs)
+    fund_rows = [(target, value) for target, value in zip(plan.fund_irrs, fund_results) if value is not None]
+    for target, value in zip(plan.fund_irrs, fund_results):
+        if value is None:
+            logger.warning(f"📊 Failed to calculate fund IRR for fund {target[0]} on {target[1]}")
+
+    portfolio_results = solve_portfolio_irrs(state, plan.portfolio_dates)
+    portfolio_rows = [(day, value) for day, value in zip(plan.portfolio_dates, portfolio_results) if value is not None]
+    for day, value in zip(plan.portfolio_dates, portfolio_results):
+        if value is None:
+            logger.warning(f"📊 Failed to calculate portfolio IRR for portfolio {state.portfolio_id} on {day}")
+
+    if plan.fund_irr_deletions:
+        await db.execute(
+            "DELETE FROM portfolio_fund_irr_values WHERE (fund_id, date) IN (SELECT * FROM unnest($1::bigint[], $2::date[]))",
+            [fund_id for fund_id, _ in plan.fund_irr_deletions], [day for _, day in plan.fund_irr_deletions]
+        )
+
+    if fund_rows:
+        await db.execute(
+            FUND_IRR_UPSERT_SQL,
+            [fund_id for (fund_id, _), _ in fund_rows],
+            [day for (_, day), _ in fund_rows],
+            [safe_irr_value(value) for _, value in fund_rows],
+            [state.valuation_ids.get((fund_id, day)) for (fund_id, day), _ in fund_rows]
+        )
+
+    if portfolio_rows:
+        # Portfolio valuation = the fund valuations on that exact date
+        valuation_totals = [
+            float(np.nan_to_num(state.val_amount[state.val_date == np.datetime64(day, "D")]).sum())
+            for day, _ in portfolio_rows
+        ]
+        valuation_ids = {
+            row["valuation_date"]: row["id"]
+            for row in await db.fetch(
+                PORTFOLIO_VALUATION_UPSERT_SQL, state.portfolio_id, [day for day, _ in portfolio_rows], valuation_totals
+            )
+        }
+        await db.execute(
+            PORTFOLIO_IRR_UPSERT_SQL, state.portfolio_id,
+            [day for day, _ in portfolio_rows],
+            [safe_irr_value(value) for _, value in portfolio_rows],
+            [valuation_ids.get(day) for day, _ in portfolio_rows]
+        )
+
+    if plan.cleared_dates:
+        await db.execute(
+            "DELETE FROM portfolio_irr_values WHERE portfolio_id = $1 AND date = ANY($2::date[])",
+            state.portfolio_id, plan.cleared_dates
+        )
+    if plan.cleared_valuation_dates:
+        await db.execute(
+            "DELETE FROM portfolio_valuations WHERE portfolio_id = $1 AND valuation_date = ANY($2::date[])",
+            state.portfolio_id, plan.cleared_valuation_dates
+        )
+
+    touched_funds = sorted({fund_id for fund_id, _ in plan.fund_irrs} | {fund_id for fund_id, _ in plan.fund_irr_deletions})
+    if touched_funds:
+        try:
+            from app.utils.irr_cache import get_irr_cache
+            await get_irr_cache().invalidate_portfolio_funds(touched_funds)
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to invalidate IRR cache: {str(e)}")
+
+    return {
+        "dates_processed": len(plan.processed_dates),
+        "processed_dates": [day.isoformat() for day in plan.processed_dates],
+        "fund_irrs_recalculated": len(fund_rows),
+        "fund_irrs_deleted": len(plan.fund_irr_deletions),
+        "portfolio_irrs_recalculated": len(portfolio_rows),
+        "portfolio_irrs_deleted": len(plan.cleared_dates),
+        "portfolio_valuations_deleted": len(plan.cleared_valuation_dates)
+    }
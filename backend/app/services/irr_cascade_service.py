@@ -9,6 +9,9 @@ Core Principles:
 2. Activity changes trigger batch recalculation of all affected IRRs  
 3. Valuation creation/edit triggers IRR calculation with completeness validation
 4. Historical changes recalculate all future IRRs from change date onwards
+5. Coalesced changes (background IRR jobs) recalculate each affected fund and portfolio IRR once
+6. One recalculation per portfolio at a time (keyed async lock + advisory lock); identical queued
+   requests share one result (see irr_portfolio_lock)
 """
 
 import logging
@@ -16,6 +19,9 @@ import math
 from typing import List, Dict, Set, Optional, Tuple
 from datetime import datetime, date
 
+from app.services.irr_cascade_planner import load_portfolio_irr_state, plan_cascade, run_cascade_plan
+from app.services.irr_portfolio_lock import portfolio_irr_lock, portfolio_recalculation
+
 logger = logging.getLogger(__name__)
 
 def safe_irr_value(value, default=0.0):
@@ -83,36 +89,17 @@ class IRRCascadeService:
             
             logger.info(f"🗑️ [IRR CASCADE] Valuation details: fund_id={fund_id}, portfolio_id={portfolio_id}, date={valuation_date}")
             
-            # Step 2: Delete portfolio fund IRR for this date
-            fund_irr_deleted = await self._delete_fund_irr_by_date(fund_id, valuation_date)
-            
-            # Step 3: Check if portfolio still has complete valuations after this deletion
-            will_be_complete = await self._check_portfolio_completeness_after_deletion(
-                portfolio_id, valuation_date, fund_id
-            )
-            
-            portfolio_irr_deleted = False
-            portfolio_valuation_deleted = False
-            
-            # Step 4: If not complete, delete portfolio IRR and valuation
-            if not will_be_complete:
-                logger.warning(f"🗑️ [CASCADE] Portfolio {portfolio_id} will be incomplete on {valuation_date} after deleting fund {fund_id} valuation - cascading deletion")
-                portfolio_irr_deleted = await self._delete_portfolio_irr_by_date(portfolio_id, valuation_date)
-                portfolio_valuation_deleted = await self._delete_portfolio_valuation_by_date(portfolio_id, valuation_date)
-                logger.info(f"🗑️ [CASCADE] Cascade deletion completed: IRR deleted={portfolio_irr_deleted}, Valuation deleted={portfolio_valuation_deleted}")
-            else:
-                logger.info(f"✅ [CASCADE] Portfolio {portfolio_id} remains complete on {valuation_date} after deleting fund {fund_id} valuation - no cascade needed")
-            
-            # Step 5: Delete the original fund valuation
-            fund_valuation_deleted = await self._delete_fund_valuation(valuation_id)
+            async with portfolio_irr_lock(self.db, portfolio_id):
+                # Steps 2-4: Delete the fund IRR and, if the portfolio becomes incomplete, its portfolio IRR and valuation
+                cascade = await self._cascade_fund_valuation_removal(fund_id, portfolio_id, valuation_date)
+                
+                # Step 5: Delete the original fund valuation
+                fund_valuation_deleted = await self._delete_fund_valuation(valuation_id)
             
             result = {
                 "success": True,
                 "valuation_deleted": fund_valuation_deleted,
-                "fund_irr_deleted": fund_irr_deleted,
-                "portfolio_irr_deleted": portfolio_irr_deleted,
-                "portfolio_valuation_deleted": portfolio_valuation_deleted,
-                "completeness_maintained": will_be_complete,
+                **cascade,
                 "portfolio_id": portfolio_id,
                 "date": valuation_date
             }
@@ -128,6 +115,7 @@ class IRRCascadeService:
     # 2. ACTIVITY CHANGES IMPACT
     # ========================================================================
     
+    @portfolio_recalculation
     async def handle_activity_changes_batch(self, portfolio_id: int, affected_dates: List[str]) -> Dict:
         """
         Handle IRR recalculation after batch activity changes.
@@ -136,9 +124,10 @@ class IRRCascadeService:
         not just the activity date itself.
         
         Flow:
-        1. For each activity date, find all valuation dates on or after that date
-        2. Recalculate IRRs for all affected valuation dates
-        3. Process dates in chronological order for consistency
+        1. Find the earliest activity date
+        2. Load the portfolio once and plan every fund and portfolio IRR on the valuation
+           dates on or after it (see irr_cascade_planner)
+        3. Solve them in one batch and write them with one upsert per table
         
         Args:
             portfolio_id: The portfolio affected by activity changes
@@ -151,7 +140,7 @@ class IRRCascadeService:
         
         try:
             # Step 1: Find the earliest activity date
-            unique_activity_dates = sorted(list(set(affected_dates)))
+            unique_activity_dates = sorted(list(set(str(activity_date).split('T')[0] for activity_date in affected_dates)))
             earliest_activity_date = unique_activity_dates[0] if unique_activity_dates else None
             
             if not earliest_activity_date:
@@ -160,39 +149,21 @@ class IRRCascadeService:
             
             logger.info(f"🔄 [IRR CASCADE] Activity dates: {unique_activity_dates}, earliest: {earliest_activity_date}")
             
-            # Step 2: Find all valuation dates affected by these activity changes
-            # Activities affect all valuation dates on or after the earliest activity date
-            affected_valuation_dates = await self._find_valuation_dates_from_date(portfolio_id, earliest_activity_date)
+            # Step 2: Plan and run the recalculation of every valuation date on or after the
+            # earliest activity date from one load of the portfolio
+            summary = await self._run_planned_cascade(portfolio_id, [], unique_activity_dates)
             
-            if not affected_valuation_dates:
+            if not summary["dates_processed"]:
                 logger.info(f"🔄 [IRR CASCADE] No fund valuations found on or after {earliest_activity_date}")
                 return {"success": True, "dates_processed": 0, "fund_irrs_recalculated": 0, "portfolio_irrs_recalculated": 0, "message": "No valuations affected"}
             
-            logger.info(f"🔄 [IRR CASCADE] Found {len(affected_valuation_dates)} valuation dates to recalculate: {affected_valuation_dates}")
-            
-            fund_irrs_recalculated = 0
-            portfolio_irrs_recalculated = 0
-            
-            # Step 3: For each affected valuation date, recalculate IRRs
-            for valuation_date in affected_valuation_dates:
-                logger.info(f"🔄 [IRR CASCADE] Processing valuation date {valuation_date}")
-                
-                # Step 3a: Recalculate ALL portfolio fund IRRs for this valuation date
-                fund_count = await self._recalculate_all_fund_irrs_for_date(portfolio_id, valuation_date)
-                fund_irrs_recalculated += fund_count
-                
-                # Step 3b: Recalculate portfolio IRR for this valuation date (if complete)
-                portfolio_recalc = await self._recalculate_portfolio_irr_for_date(portfolio_id, valuation_date)
-                if portfolio_recalc:
-                    portfolio_irrs_recalculated += 1
-            
             result = {
                 "success": True,
                 "portfolio_id": portfolio_id,
-                "dates_processed": len(affected_valuation_dates),
-                "fund_irrs_recalculated": fund_irrs_recalculated,
-                "portfolio_irrs_recalculated": portfolio_irrs_recalculated,
-                "processed_dates": affected_valuation_dates,
+                "dates_processed": summary["dates_processed"],
+                "fund_irrs_recalculated": summary["fund_irrs_recalculated"],
+                "portfolio_irrs_recalculated": summary["portfolio_irrs_recalculated"],
+                "processed_dates": summary["processed_dates"],
                 "activity_dates": unique_activity_dates,
                 "earliest_activity_date": earliest_activity_date
             }
@@ -234,21 +205,23 @@ class IRRCascadeService:
             if not portfolio_id:
                 raise ValueError(f"Could not find portfolio for fund {portfolio_fund_id}")
             
-            # Step 2: Calculate/recalculate portfolio fund IRR
-            fund_irr_calculated = await self._calculate_and_store_fund_irr(portfolio_fund_id, valuation_date)
-            
-            # Step 3: Check portfolio completeness for this date
-            is_complete = await self._check_portfolio_completeness(portfolio_id, valuation_date)
-            
-            portfolio_irr_calculated = False
-            portfolio_irr_deleted = False
-            
-            if is_complete:
-                # Step 4a: Portfolio is complete - calculate/recalculate portfolio IRR
-                portfolio_irr_calculated = await self._calculate_and_store_portfolio_irr(portfolio_id, valuation_date)
-            else:
-                # Step 4b: Portfolio not complete - delete portfolio IRR if it exists
-                portfolio_irr_deleted = await self._delete_portfolio_irr_by_date(portfolio_id, valuation_date)
+            # Steps 2-4 run under the portfolio lock, so concurrent saves do not interleave
+            async with portfolio_irr_lock(self.db, portfolio_id):
+                # Step 2: Calculate/recalculate portfolio fund IRR
+                fund_irr_calculated = await self._calculate_and_store_fund_irr(portfolio_fund_id, valuation_date)
+                
+                # Step 3: Check portfolio completeness for this date
+                is_complete = await self._check_portfolio_completeness(portfolio_id, valuation_date)
+                
+                portfolio_irr_calculated = False
+                portfolio_irr_deleted = False
+                
+                if is_complete:
+                    # Step 4a: Portfolio is complete - calculate/recalculate portfolio IRR
+                    portfolio_irr_calculated = await self._calculate_and_store_portfolio_irr(portfolio_id, valuation_date)
+                else:
+                    # Step 4b: Portfolio not complete - delete portfolio IRR if it exists
+                    portfolio_irr_deleted = await self._delete_portfolio_irr_by_date(portfolio_id, valuation_date)
             
             result = {
                 "success": True,
@@ -272,6 +245,7 @@ class IRRCascadeService:
     # 4. HISTORICAL CHANGES IMPACT
     # ========================================================================
     
+    @portfolio_recalculation
     async def handle_historical_changes(self, portfolio_id: int, start_date: str) -> Dict:
         """
         Handle IRR recalculation for historical changes - recalculate all IRRs from date onwards.
@@ -313,10 +287,109 @@ class IRRCascadeService:
             logger.error(f"⏰ [IRR CASCADE] ❌ Error in historical recalculation: {str(e)}")
             return {"success": False, "error": str(e)}
     
+    # ========================================================================
+    # 5. COALESCED CHANGES (BACKGROUND IRR JOBS)
+    # ========================================================================
+    
+    @portfolio_recalculation
+    async def handle_coalesced_changes(self, portfolio_id: int, valuation_changes: List[Tuple[int, str]], activity_dates: List[str]) -> Dict:
+        """
+        Handle the IRR cascade for every valuation and activity change queued for a portfolio.
+        
+        Running the individual flows once per change recalculates the same portfolio IRRs over
+        and over (twenty funds saved for one month = twenty portfolio IRR recalculations for that
+        month). This collects the dirty (fund, date) and (portfolio, date) pairs first and
+        recalculates each of them once.
+        
+        Flow:
+        1. Deduplicate the changed (fund, date) pairs and split them by whether the fund
+           still has a valuation on that date (saved or re-entered) or not (deleted)
+        2. Delete the fund IRRs of deleted valuations
+        3. Activity changes: recalculate every fund IRR on each valuation date on or after
+           the earliest activity date
+        4. Recalculate the fund IRRs of saved valuations not already covered by step 3
+        5. Once per affected date: calculate the portfolio IRR if the portfolio is complete,
+           otherwise delete it (and, on dates with a deleted valuation, the portfolio valuation)
+        
+        The plan is made from one load of the portfolio and written with one statement per
+        table (see irr_cascade_planner).
+        
+        Args:
+            portfolio_id: The portfolio all changes belong to
+            valuation_changes: (portfolio_fund_id, YYYY-MM-DD) of created, edited and deleted valuations
+            activity_dates: Dates (YYYY-MM-DD) of created, edited and deleted activities
+            
+        Returns:
+            Dict with recalculation summary
+        """
+        logger.info(f"🧮 [IRR CASCADE] Starting coalesced recalculation for portfolio {portfolio_id}: {len(valuation_changes)} valuation changes, {len(activity_dates)} activity dates")
+        
+        try:
+            unique_changes = sorted({(int(fund_id), str(change_date).split('T')[0]) for fund_id, change_date in valuation_changes})
+            unique_activity_dates = sorted({str(activity_date).split('T')[0] for activity_date in activity_dates})
+            
+            summary = await self._run_planned_cascade(portfolio_id, unique_changes, unique_activity_dates)
+            
+            result = {
+                "success": True,
+                "portfolio_id": portfolio_id,
+                "valuation_changes": len(unique_changes),
+                "activity_dates": unique_activity_dates,
+                **summary
+            }
+            
+            logger.info(f"🧮 [IRR CASCADE] ✅ Coalesced recalculation completed: {result}")
+            return result
+            
+        except Exception as e:
+            logger.error(f"🧮 [IRR CASCADE] ❌ Error in coalesced recalculation: {str(e)}")
+            return {"success": False, "error": str(e)}
+    
+    async def _run_planned_cascade(self, portfolio_id: int, valuation_changes: List[Tuple[int, str]], activity_dates: List[str]) -> Dict:
+        """
+        Load the portfolio once, plan the minimal set of fund and portfolio IRRs to refresh,
+        solve them together and write them set-based (see irr_cascade_planner).
+        """
+        state = await load_portfolio_irr_state(self.db, portfolio_id)
+        plan = plan_cascade(
+            state,
+            [(fund_id, datetime.strptime(change_date, '%Y-%m-%d').date()) for fund_id, change_date in valuation_changes],
+            [datetime.strptime(activity_date, '%Y-%m-%d').date() for activity_date in activity_dates]
+        )
+        logger.info(f"🧮 [IRR CASCADE] Plan for portfolio {portfolio_id}: {len(plan.fund_irrs)} fund IRRs, {len(plan.fund_irr_deletions)} fund IRR deletions, {len(plan.portfolio_dates)} portfolio IRRs, {len(plan.cleared_dates)} portfolio IRR deletions")
+        return await run_cascade_plan(self.db, state, plan)
+    
     # ========================================================================
     # PRIVATE HELPER METHODS
     # ========================================================================
     
+    async def _cascade_fund_valuation_removal(self, fund_id: int, portfolio_id: int, valuation_date: str) -> Dict:
+        """Delete the fund IRR for the date and, if the portfolio is then incomplete, its portfolio IRR and valuation"""
+        fund_irr_deleted = await self._delete_fund_irr_by_date(fund_id, valuation_date)
+        
+        # Check if portfolio still has complete valuations after this deletion
+        will_be_complete = await self._check_portfolio_completeness_after_deletion(
+            portfolio_id, valuation_date, fund_id
+        )
+        
+        portfolio_irr_deleted = False
+        portfolio_valuation_deleted = False
+        
+        if not will_be_complete:
+            logger.warning(f"🗑️ [CASCADE] Portfolio {portfolio_id} will be incomplete on {valuation_date} after deleting fund {fund_id} valuation - cascading deletion")
+            portfolio_irr_deleted = await self._delete_portfolio_irr_by_date(portfolio_id, valuation_date)
+            portfolio_valuation_deleted = await self._delete_portfolio_valuation_by_date(portfolio_id, valuation_date)
+            logger.info(f"🗑️ [CASCADE] Cascade deletion completed: IRR deleted={portfolio_irr_deleted}, Valuation deleted={portfolio_valuation_deleted}")
+        else:
+            logger.info(f"✅ [CASCADE] Portfolio {portfolio_id} remains complete on {valuation_date} after deleting fund {fund_id} valuation - no cascade needed")
+        
+        return {
+            "fund_irr_deleted": fund_irr_deleted,
+            "portfolio_irr_deleted": portfolio_irr_deleted,
+            "portfolio_valuation_deleted": portfolio_valuation_deleted,
+            "completeness_maintained": will_be_complete
+        }
+    
     async def _get_fund_valuation_details(self, valuation_id: int) -> Optional[Dict]:
         """Get fund valuation details including portfolio_id"""
         try:
@@ -567,113 +640,6 @@ class IRRCascadeService:
             logger.error(f"Error deleting fund valuation: {str(e)}")
             return False
     
-    async def _recalculate_all_fund_irrs_for_date(self, portfolio_id: int, date: str) -> int:
-        """Recalculate all portfolio fund IRRs for a specific date"""
-        try:
-            logger.info(f"🔍 [BATCH IRR CALC] ========== RECALCULATING ALL FUND IRRs FOR DATE ==========")
-            logger.info(f"🔍 [BATCH IRR CALC] Portfolio ID: {portfolio_id}, Date: {date}")
-
-            # Convert string date to date object for PostgreSQL comparison
-            from datetime import datetime
-            if isinstance(date, str):
-                date_obj = datetime.strptime(date, '%Y-%m-%d').date()
-            else:
-                date_obj = date
-
-            logger.info(f"🔍 [BATCH IRR CALC] Converted date to date_obj: {date_obj}")
-
-            # Get all portfolio funds for this portfolio that have valuations on this date
-            funds_with_valuations = await self.db.fetch(
-                "SELECT portfolio_fund_id FROM portfolio_fund_valuations WHERE valuation_date = $1",
-                date_obj
-            )
-
-            logger.info(f"🔍 [BATCH IRR CALC] Found {len(funds_with_valuations)} funds with valuations on {date}")
-
-            if not funds_with_valuations:
-                logger.info(f"📊 No fund valuations found for portfolio {portfolio_id} on {date}")
-                return 0
-
-            # Get portfolio funds that belong to this portfolio
-            portfolio_funds = await self.db.fetch(
-                "SELECT id FROM portfolio_funds WHERE portfolio_id = $1",
-                portfolio_id
-            )
-
-            logger.info(f"🔍 [BATCH IRR CALC] Portfolio {portfolio_id} has {len(portfolio_funds)} total funds")
-
-            # Ensure all IDs are integers for consistent type comparison
-            portfolio_fund_ids = [int(pf["id"]) for pf in portfolio_funds] if portfolio_funds else []
-
-            # Filter to only funds that belong to this portfolio and have valuations
-            logger.info(f"🔍 [BATCH IRR CALC] Funds with valuations on {date}: {[int(v['portfolio_fund_id']) for v in funds_with_valuations]}")
-            logger.info(f"🔍 [BATCH IRR CALC] Portfolio fund IDs: {portfolio_fund_ids}")
-
-            relevant_fund_ids = [
-                int(v["portfolio_fund_id"]) for v in funds_with_valuations
-                if int(v["portfolio_fund_id"]) in portfolio_fund_ids
-            ]
-
-            logger.info(f"🔍 [BATCH IRR CALC] Relevant fund IDs for IRR calculation: {relevant_fund_ids}")
-            logger.info(f"🔍 [BATCH IRR CALC] Expected 8 funds, got {len(relevant_fund_ids)} funds")
-
-            if 1536 not in relevant_fund_ids:
-                logger.warning(f"🔍 [BATCH IRR CALC] ⚠️ Cash fund (1536) is MISSING from relevant_fund_ids!")
-                logger.warning(f"🔍 [BATCH IRR CALC] ⚠️ Checking if 1536 has valuation on {date}...")
-                cash_valuation_check = await self.db.fetch(
-                    "SELECT id, valuation FROM portfolio_fund_valuations WHERE portfolio_fund_id = 1536 AND valuation_date = $1",
-                    date_obj
-                )
-                logger.warning(f"🔍 [BATCH IRR CALC] ⚠️ Cash valuation check result: {cash_valuation_check}")
-
-            recalculated_count = 0
-
-            # Recalculate IRR for each relevant fund
-            for fund_id in relevant_fund_ids:
-                logger.info(f"🔍 [BATCH IRR CALC] Processing fund {fund_id} for date {date}")
-                success = await self._calculate_and_store_fund_irr(fund_id, date)
-                if success:
-                    recalculated_count += 1
-                    logger.info(f"🔍 [BATCH IRR CALC] ✅ Successfully calculated IRR for fund {fund_id}")
-                else:
-                    logger.warning(f"🔍 [BATCH IRR CALC] ❌ Failed to calculate IRR for fund {fund_id}")
-            
-            # FIXED: Invalidate IRR cache for recalculated funds to prevent stale cached results
-            if recalculated_count > 0:
-                try:
-                    from app.utils.irr_cache import get_irr_cache
-                    irr_cache = get_irr_cache()
-                    invalidated_count = await irr_cache.invalidate_portfolio_funds(relevant_fund_ids)
-                    logger.info(f"🗑️ Invalidated {invalidated_count} IRR cache entries for {recalculated_count} recalculated funds")
-                except Exception as e:
-                    logger.warning(f"⚠️ Failed to invalidate IRR cache: {str(e)}")
-            
-            logger.info(f"📊 Recalculated {recalculated_count} fund IRRs for portfolio {portfolio_id} on {date}")
-            return recalculated_count
-            
-        except Exception as e:
-            logger.error(f"Error recalculating fund IRRs: {str(e)}")
-            return 0
-    
-    async def _recalculate_portfolio_irr_for_date(self, portfolio_id: int, date: str) -> bool:
-        """Recalculate portfolio IRR for a specific date if portfolio is complete"""
-        try:
-            # Check if portfolio is complete for this date
-            is_complete = await self._check_portfolio_completeness(portfolio_id, date)
-
-            if is_complete:
-                # Portfolio is complete - calculate/update portfolio IRR
-                return await self._calculate_and_store_portfolio_irr(portfolio_id, date)
-            else:
-                # Portfolio not complete - delete portfolio IRR if it exists
-                await self._delete_portfolio_irr_by_date(portfolio_id, date)
-                logger.info(f"📊 Portfolio {portfolio_id} not complete on {date}, portfolio IRR deleted")
-                return False
-
-        except Exception as e:
-            logger.error(f"Error recalculating portfolio IRR: {str(e)}")
-            return False
-    
     async def _get_portfolio_id_by_fund(self, portfolio_fund_id: int) -> Optional[int]:
         """Get portfolio ID from portfolio fund ID"""
         try:
@@ -738,49 +704,18 @@ class IRRCascadeService:
             fund_valuation_id = valuation_result["id"] if valuation_result else None
             logger.info(f"🔍 [FUND IRR CALC] Fund valuation ID: {fund_valuation_id}")
 
-            # Check if IRR already exists for this fund and date
-            logger.info(f"🔍 [FUND IRR CALC] Checking for existing IRR record with fund_id={portfolio_fund_id}, date={date_obj}")
+            # One upsert on the unique (fund_id, date) index, so concurrent saves cannot insert duplicates
+            logger.info(f"🔍 [FUND IRR CALC] Upserting IRR record: fund_id={portfolio_fund_id}, irr={irr_percentage}%, date={date_obj}, valuation_id={fund_valuation_id}")
 
-            existing_irr = await self.db.fetchrow(
-                "SELECT id FROM portfolio_fund_irr_values WHERE fund_id = $1 AND date = $2",
-                portfolio_fund_id, date_obj
+            await self.db.execute(
+                """
+                INSERT INTO portfolio_fund_irr_values (fund_id, irr_result, date, fund_valuation_id) VALUES ($1, $2, $3, $4)
+                ON CONFLICT (fund_id, date) DO UPDATE
+                SET irr_result = EXCLUDED.irr_result, fund_valuation_id = EXCLUDED.fund_valuation_id
+                """,
+                portfolio_fund_id, irr_percentage, date_obj, fund_valuation_id
             )
-
-            if existing_irr:
-                logger.info(f"🔍 [FUND IRR CALC] Found existing IRR record with ID: {existing_irr['id']}")
-            else:
-                logger.info(f"🔍 [FUND IRR CALC] No existing IRR record found - will create new one")
-            
-            if existing_irr:
-                # Update existing IRR
-                logger.info(f"🔍 [FUND IRR CALC] Updating existing IRR ID {existing_irr['id']} with value {irr_percentage}%")
-
-                await self.db.execute(
-                    "UPDATE portfolio_fund_irr_values SET irr_result = $1, fund_valuation_id = $2 WHERE id = $3",
-                    irr_percentage, fund_valuation_id, existing_irr["id"]
-                )
-                logger.info(f"📊 ✅ Updated fund IRR for fund {portfolio_fund_id} on {date}: {irr_percentage}%")
-            else:
-                # Create new IRR record
-                logger.info(f"🔍 [FUND IRR CALC] Creating new IRR record: fund_id={portfolio_fund_id}, irr={irr_percentage}%, date={date_obj}, valuation_id={fund_valuation_id}")
-
-                try:
-                    await self.db.execute(
-                        "INSERT INTO portfolio_fund_irr_values (fund_id, irr_result, date, fund_valuation_id) VALUES ($1, $2, $3, $4)",
-                        portfolio_fund_id, irr_percentage, date_obj, fund_valuation_id
-                    )
-                    logger.info(f"📊 ✅ Created fund IRR for fund {portfolio_fund_id} on {date}: {irr_percentage}%")
-                except Exception as insert_error:
-                    if "duplicate key" in str(insert_error).lower():
-                        # Race condition - record was inserted by another process, try to update
-                        logger.warning(f"Race condition detected, attempting update for fund {portfolio_fund_id} on {date}")
-                        await self.db.execute(
-                            "UPDATE portfolio_fund_irr_values SET irr_result = $1, fund_valuation_id = $2 WHERE fund_id = $3 AND date = $4",
-                            irr_percentage, fund_valuation_id, portfolio_fund_id, date_obj
-                        )
-                        logger.info(f"📊 Updated fund IRR (race condition) for fund {portfolio_fund_id} on {date}: {irr_percentage}%")
-                    else:
-                        raise insert_error
+            logger.info(f"📊 ✅ Stored fund IRR for fund {portfolio_fund_id} on {date}: {irr_percentage}%")
             
             # FIXED: Invalidate IRR cache for this fund to prevent stale cached results
             try:
@@ -942,66 +877,26 @@ class IRRCascadeService:
                     for fv in fund_valuations:
                         logger.debug(f"  Fund {fv['portfolio_fund_id']}: £{float(fv['valuation']):,.2f} on {fv['valuation_date']}")
 
-            # Check if portfolio valuation already exists for the IRR date
-            valuation_result = await self.db.fetchrow(
-                "SELECT id FROM portfolio_valuations WHERE portfolio_id = $1 AND valuation_date = $2",
-                portfolio_id, date_obj
+            # Upsert the portfolio valuation and IRR on their unique (portfolio, date) indexes
+            portfolio_valuation_id = await self.db.fetchval(
+                """
+                INSERT INTO portfolio_valuations (portfolio_id, valuation_date, valuation) VALUES ($1, $2, $3)
+                ON CONFLICT (portfolio_id, valuation_date) DO UPDATE SET valuation = EXCLUDED.valuation
+                RETURNING id
+                """,
+                portfolio_id, date_obj, portfolio_total_valuation
             )
-
-            if valuation_result:
-                # Update existing portfolio valuation
-                await self.db.execute(
-                    "UPDATE portfolio_valuations SET valuation = $1 WHERE id = $2",
-                    portfolio_total_valuation, valuation_result["id"]
-                )
-                portfolio_valuation_id = valuation_result["id"]
-                logger.debug(f"📊 Updated portfolio valuation for portfolio {portfolio_id} on {date}: £{portfolio_total_valuation:,.2f}")
-            else:
-                # Insert new portfolio valuation with the IRR date
-                new_valuation = await self.db.fetchrow(
-                    "INSERT INTO portfolio_valuations (portfolio_id, valuation_date, valuation) VALUES ($1, $2, $3) RETURNING id",
-                    portfolio_id, date_obj, portfolio_total_valuation
-                )
-                portfolio_valuation_id = new_valuation["id"] if new_valuation else None
-                logger.debug(f"📊 Created portfolio valuation for portfolio {portfolio_id} on {date}: £{portfolio_total_valuation:,.2f}")
-            
-            # Check if portfolio IRR already exists for this date
-            existing_irr = await self.db.fetchrow(
-                "SELECT id FROM portfolio_irr_values WHERE portfolio_id = $1 AND date = $2",
-                portfolio_id, date_obj
+            logger.debug(f"📊 Stored portfolio valuation for portfolio {portfolio_id} on {date}: £{portfolio_total_valuation:,.2f}")
+            
+            await self.db.execute(
+                """
+                INSERT INTO portfolio_irr_values (portfolio_id, irr_result, date, portfolio_valuation_id) VALUES ($1, $2, $3, $4)
+                ON CONFLICT (portfolio_id, date) DO UPDATE
+                SET irr_result = EXCLUDED.irr_result, portfolio_valuation_id = EXCLUDED.portfolio_valuation_id
+                """,
+                portfolio_id, irr_percentage, date_obj, portfolio_valuation_id
             )
-
-            if existing_irr:
-                # Update existing record
-                await self.db.execute(
-                    "UPDATE portfolio_irr_values SET irr_result = $1, portfolio_valuation_id = $2 WHERE id = $3",
-                    irr_percentage, portfolio_valuation_id, existing_irr["id"]
-                )
-                logger.info(f"📊 Updated portfolio IRR for portfolio {portfolio_id} on {date}: {irr_percentage}%")
-            else:
-                # Insert new record (with duplicate handling)
-                try:
-                    await self.db.execute(
-                        "INSERT INTO portfolio_irr_values (portfolio_id, irr_result, date, portfolio_valuation_id) VALUES ($1, $2, $3, $4)",
-                        portfolio_id, irr_percentage, date_obj, portfolio_valuation_id
-                    )
-                    logger.info(f"📊 Inserted portfolio IRR for portfolio {portfolio_id} on {date}: {irr_percentage}%")
-                except Exception as insert_error:
-                    # If duplicate key error (race condition), try to update instead
-                    if "duplicate key" in str(insert_error).lower() or "unique constraint" in str(insert_error).lower():
-                        logger.warning(f"⚠️ Duplicate portfolio IRR detected (race condition), updating instead for portfolio {portfolio_id} on {date}")
-                        existing_irr = await self.db.fetchrow(
-                            "SELECT id FROM portfolio_irr_values WHERE portfolio_id = $1 AND date = $2",
-                            portfolio_id, date_obj
-                        )
-                        if existing_irr:
-                            await self.db.execute(
-                                "UPDATE portfolio_irr_values SET irr_result = $1, portfolio_valuation_id = $2 WHERE id = $3",
-                                irr_percentage, portfolio_valuation_id, existing_irr["id"]
-                            )
-                            logger.info(f"📊 Updated portfolio IRR after race condition for portfolio {portfolio_id} on {date}: {irr_percentage}%")
-                    else:
-                        raise insert_error
+            logger.info(f"📊 Stored portfolio IRR for portfolio {portfolio_id} on {date}: {irr_percentage}%")
             
             return True
             
@@ -1009,53 +904,6 @@ class IRRCascadeService:
             logger.error(f"Error calculating portfolio IRR: {str(e)}")
             return False
     
-    async def _find_valuation_dates_from_date(self, portfolio_id: int, start_date: str) -> List[str]:
-        """Find all fund valuation dates for this portfolio from start_date onwards"""
-        try:
-            # Get all portfolio funds for this portfolio
-            portfolio_funds = await self.db.fetch(
-                "SELECT id FROM portfolio_funds WHERE portfolio_id = $1",
-                portfolio_id
-            )
-            
-            if not portfolio_funds:
-                logger.info(f"🔍 No portfolio funds found for portfolio {portfolio_id}")
-                return []
-            
-            fund_ids = [int(pf["id"]) for pf in portfolio_funds]
-            
-            # Get all valuation dates for these funds from start_date onwards
-            # Convert string date to date object for PostgreSQL comparison
-            from datetime import datetime
-            if isinstance(start_date, str):
-                start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
-            else:
-                start_date_obj = start_date
-                
-            valuations = await self.db.fetch(
-                "SELECT valuation_date FROM portfolio_fund_valuations WHERE portfolio_fund_id = ANY($1::int[]) AND valuation_date >= $2",
-                fund_ids, start_date_obj
-            )
-            
-            if not valuations:
-                logger.info(f"🔍 No fund valuations found for portfolio {portfolio_id} from {start_date} onwards")
-                return []
-            
-            # Deduplicate and sort dates
-            unique_dates = set()
-            for record in valuations:
-                date_str = record["valuation_date"].split('T')[0] if 'T' in str(record["valuation_date"]) else str(record["valuation_date"])
-                unique_dates.add(date_str)
-            
-            sorted_dates = sorted(list(unique_dates))
-            logger.info(f"🔍 Found {len(sorted_dates)} unique valuation dates for portfolio {portfolio_id} from {start_date}: {sorted_dates}")
-            
-            return sorted_dates
-            
-        except Exception as e:
-            logger.error(f"Error finding valuation dates: {str(e)}")
-            return []
- 
     async def _find_irr_dates_from_date(self, portfolio_id: int, start_date: str) -> List[str]:
         """Find all dates with IRRs from start_date onwards"""
         try:
@@ -1066,11 +914,13 @@ class IRRCascadeService:
             else:
                 start_date_obj = start_date
                 
-            # Get fund IRR dates
-            fund_irr_dates = await self.db.fetch(
-                "SELECT date FROM portfolio_fund_irr_values WHERE date >= $1",
-                start_date_obj
-            )
+            # Get fund IRR dates of this portfolio's funds
+            fund_irr_dates = await self.db.fetch("""
+                SELECT fiv.date
+                FROM portfolio_fund_irr_values fiv
+                JOIN portfolio_funds pf ON pf.id = fiv.fund_id
+                WHERE pf.portfolio_id = $1 AND fiv.date >= $2
+            """, portfolio_id, start_date_obj)
             
             # Get portfolio IRR dates
             portfolio_irr_dates = await self.db.fetch(
@@ -0,0 +1,279 @@
+"""
+IRR Job Queue
+
+Durable background queue for IRR cascade recalculations (migrations/005_irr_cascade_jobs.sql).
+Valuation and activity routes save their data, enqueue a job and return; the worker runs
+IRRCascadeService outside the request, so a save no longer waits for the recalculation or
+holds a pooled connection while it runs.
+
+Core Principles:
+1. Durable: jobs are rows in irr_cascade_jobs, so a restart loses nothing. A job whose
+   worker died is reclaimed once its lease (IRR_JOB_LEASE_SECONDS) has expired
+2. Concurrent-safe claims: workers take the oldest due job with FOR UPDATE SKIP LOCKED,
+   so any number of workers (in any number of processes) never claim the same job
+3. One cascade per portfolio at a time: each job runs in a transaction holding the
+   per-portfolio lock (irr_portfolio_lock); a failed job rolls back as a whole
+4. Retries with backoff: a failed job is re-queued IRR_JOB_RETRY_BASE_SECONDS x 2^(attempt-1)
+   later, and marked failed after max_attempts
+5. Observable: status, attempts, last error and the cascade result stay on the row
+   (GET /api/irr_jobs) so clients can poll for completion
+6. Coalesced: a job waits IRR_JOB_COALESCE_SECONDS before it runs, and later writes to the same
+   portfolio merge into it until its first attempt (activity dates are unioned, repeated valuation
+   saves reuse the job).
+   A worker then claims every fresh queued job for the portfolio together and runs one
+   IRRCascadeService.handle_coalesced_changes, so each fund IRR and portfolio IRR is
+   recalculated once however many writes touched it. Retries run alone, so one failing
+   change cannot keep failing the others
+"""
+
+import os
+import asyncio
+import logging
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+import orjson
+
+from app.services.irr_cascade_service import IRRCascadeService
+from app.services.irr_portfolio_lock import portfolio_irr_lock
+from app.utils.data_versions import VALUATIONS, bump_data_version
+
+logger = logging.getLogger(__name__)
+
+IRR_JOB_WORKERS = int(os.getenv("IRR_JOB_WORKERS", "2"))
+IRR_JOB_POLL_SECONDS = float(os.getenv("IRR_JOB_POLL_SECONDS", "2"))
+IRR_JOB_MAX_ATTEMPTS = int(os.getenv("IRR_JOB_MAX_ATTEMPTS", "5"))
+IRR_JOB_RETRY_BASE_SECONDS = float(os.getenv("IRR_JOB_RETRY_BASE_SECONDS", "5"))
+IRR_JOB_RETRY_MAX_SECONDS = float(os.getenv("IRR_JOB_RETRY_MAX_SECONDS", "300"))
+IRR_JOB_LEASE_SECONDS = float(os.getenv("IRR_JOB_LEASE_SECONDS", "900"))
+IRR_JOB_STATEMENT_TIMEOUT_MS = int(os.getenv("IRR_JOB_STATEMENT_TIMEOUT_MS", "120000"))
+IRR_JOB_COALESCE_SECONDS = float(os.getenv("IRR_JOB_COALESCE_SECONDS", "2"))
+IRR_JOB_COALESCE_LIMIT = int(os.getenv("IRR_JOB_COALESCE_LIMIT", "500"))
+
+VALUATION_SAVED = "valuation_saved"
+VALUATION_DELETED = "valuation_deleted"
+ACTIVITY_CHANGED = "activity_changed"
+
+# Header carrying the id of the job a write enqueued
+IRR_JOB_HEADER = "X-IRR-Job-Id"
+
+# $1 = job type, $2 = portfolio fund, $3 = sorted dates, $4 = max attempts, $5 = coalescing window in seconds.
+# Merges into a fresh queued job of the same portfolio when one matches: any activity job (dates are
+# unioned), or a valuation job for the same fund and date. Jobs waiting to retry are never merged into,
+# so new changes do not wait on their backoff. No row when the fund does not exist.
+ENQUEUE_SQL = """
+    WITH target AS (
+        SELECT id, portfolio_id
+        FROM portfolio_funds
+        WHERE id = $2 AND portfolio_id IS NOT NULL
+    ),
+    merged AS (
+        UPDATE irr_cascade_jobs j
+        SET dates = ARRAY(SELECT DISTINCT d FROM unnest(j.dates || $3::date[]) AS d ORDER BY d)
+        WHERE j.id = (
+            SELECT q.id
+            FROM irr_cascade_jobs q
+            JOIN target t ON q.portfolio_id = t.portfolio_id
+            WHERE q.status = 'queued'
+              AND q.attempts = 0
+              AND q.job_type = $1
+              AND (q.job_type = 'activity_changed' OR (q.portfolio_fund_id = t.id AND q.dates = $3::date[]))
+            ORDER BY q.id
+            FOR UPDATE SKIP LOCKED
+            LIMIT 1
+        )
+        RETURNING j.id
+    ),
+    inserted AS (
+        INSERT INTO irr_cascade_jobs (job_type, portfolio_id, portfolio_fund_id, dates, max_attempts, run_after)
+        SELECT $1, t.portfolio_id, t.id, $3::date[], $4, now() + make_interval(secs => $5)
+        FROM target t
+        WHERE NOT EXISTS (SELECT 1 FROM merged)
+        RETURNING id
+    )
+    SELECT id FROM merged
+    UNION ALL
+    SELECT id FROM inserted
+"""
+
+# $1 = lease in seconds
+CLAIM_SQL = """
+    UPDATE irr_cascade_jobs j
+    SET status = 'running', attempts = j.attempts + 1, started_at = now(), finished_at = NULL
+    WHERE j.id = (
+        SELECT id
+        FROM irr_cascade_jobs
+        WHERE (status = 'queued' AND run_after <= now())
+           OR (status = 'running' AND started_at < now() - make_interval(secs => $1) AND attempts < max_attempts)
+        ORDER BY run_after, id
+        FOR UPDATE SKIP LOCKED
+        LIMIT 1
+    )
+    RETURNING j.*
+"""
+
+# The other fresh queued jobs of the claimed job's portfolio, due or still inside their window;
+# $1 = portfolio, $2 = claimed job, $3 = limit
+CLAIM_COALESCED_SQL = """
+    UPDATE irr_cascade_jobs j
+    SET status = 'running', attempts = j.attempts + 1, started_at = now(), finished_at = NULL
+    WHERE j.id IN (
+        SELECT id
+        FROM irr_cascade_jobs
+        WHERE portfolio_id = $1 AND status = 'queued' AND attempts = 0 AND id <> $2
+        ORDER BY id
+        FOR UPDATE SKIP LOCKED
+        LIMIT $3
+    )
+    RETURNING j.*
+"""
+
+# $1 = jobs, $2 = result
+SUCCEED_SQL = """
+    UPDATE irr_cascade_jobs
+    SET status = 'succeeded', result = $2::jsonb, last_error = NULL, finished_at = now()
+    WHERE id = ANY($1::bigint[])
+"""
+
+# $1 = jobs, $2 = error, $3 = retry base delay, $4 = maximum delay (seconds)
+FAIL_SQL = """
+    UPDATE irr_cascade_jobs
+    SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END,
+        run_after = now() + make_interval(secs => LEAST($3 * 2 ^ (attempts - 1), $4)),
+        finished_at = CASE WHEN attempts >= max_attempts THEN now() END,
+        last_error = $2
+    WHERE id = ANY($1::bigint[])
+    RETURNING id, status, attempts
+"""
+
+# Jobs whose worker died on their last attempt; $1 = lease in seconds
+EXPIRE_SQL = """
+    UPDATE irr_cascade_jobs
+    SET status = 'failed', finished_at = now(), last_error = 'Worker lease expired on the last attempt'
+    WHERE status = 'running' AND started_at < now() - make_interval(secs => $1) AND attempts >= max_attempts
+"""
+
+# Wakes the in-process workers as soon as a request enqueues a job
+_job_available = asyncio.Event()
+
+
+class IRRJobError(Exception):
+    """A cascade that reported failure or left its transaction unusable."""
+
+
+def _as_date(value: Any) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value).split('T')[0])
+
+
+async def enqueue_irr_job(db, job_type: str, portfolio_fund_id: int, dates: Iterable[Any]) -> Optional[int]:
+    """
+    Queue an IRR cascade for a portfolio fund; returns the job id (None if the fund has no portfolio).
+
+    dates: the valuation date for valuation jobs, the activity dates for activity jobs
+    (YYYY-MM-DD strings, dates or datetimes).
+    """
+    job_dates = sorted({_as_date(value) for value in dates})
+    job_id = await db.fetchval(
+        ENQUEUE_SQL, job_type, int(portfolio_fund_id), job_dates, IRR_JOB_MAX_ATTEMPTS, IRR_JOB_COALESCE_SECONDS
+    )
+    if job_id is None:
+        logger.warning(f"⚠️ No IRR job queued: portfolio fund {portfolio_fund_id} not found")
+        return None
+    _job_available.set()
+    logger.info(f"📥 Queued IRR job {job_id} ({job_type}) for fund {portfolio_fund_id} on {[d.isoformat() for d in job_dates]}")
+    return job_id
+
+
+async def _run_cascade(db, jobs: List) -> Dict:
+    """Merge the claimed jobs of one portfolio into a single cascade."""
+    valuation_changes = [
+        (job["portfolio_fund_id"], value.isoformat())
+        for job in jobs if job["job_type"] != ACTIVITY_CHANGED
+        for value in job["dates"]
+    ]
+    activity_dates = [
+        value.isoformat()
+        for job in jobs if job["job_type"] == ACTIVITY_CHANGED
+        for value in job["dates"]
+    ]
+    service = IRRCascadeService(db)
+    return await service.handle_coalesced_changes(jobs[0]["portfolio_id"], valuation_changes, activity_dates)
+
+
+async def run_irr_job(db, jobs: List) -> Dict:
+    """Run claimed jobs of one portfolio in a transaction under its advisory lock; raises IRRJobError on failure."""
+    async with db.transaction():
+        await db.execute(f"SET LOCAL statement_timeout = {IRR_JOB_STATEMENT_TIMEOUT_MS}")
+        async with portfolio_irr_lock(db, jobs[0]["portfolio_id"]):
+            result = await _run_cascade(db, jobs)
+        # The cascade logs and swallows SQL errors; make sure the transaction is still usable
+        await db.execute("SELECT 1")
+        if not result.get("success"):
+            raise IRRJobError(result.get("error", "Unknown cascade error"))
+    return result
+
+
+async def process_next_irr_job(db) -> bool:
+    """
+    Claim the oldest due job, plus the other fresh jobs queued for its portfolio, and run them
+    as one cascade; returns False when there was nothing to do.
+    """
+    job = await db.fetchrow(CLAIM_SQL, IRR_JOB_LEASE_SECONDS)
+    if not job:
+        return False
+
+    jobs = [job]
+    if job["attempts"] == 1:
+        jobs += await db.fetch(CLAIM_COALESCED_SQL, job["portfolio_id"], job["id"], IRR_JOB_COALESCE_LIMIT)
+    job_ids = sorted(row["id"] for row in jobs)
+
+    try:
+        result = await run_irr_job(db, jobs)
+    except Exception as e:
+        for row in await db.fetch(FAIL_SQL, job_ids, str(e), IRR_JOB_RETRY_BASE_SECONDS, IRR_JOB_RETRY_MAX_SECONDS):
+            if row["status"] == "failed":
+                logger.error(f"❌ IRR job {row['id']} failed after {row['attempts']} attempts: {str(e)}")
+            else:
+                logger.warning(f"⚠️ IRR job {row['id']} attempt {row['attempts']} failed, retrying: {str(e)}")
+        return True
+
+    result["coalesced_job_ids"] = job_ids
+    await db.execute(SUCCEED_SQL, job_ids, orjson.dumps(result, default=str).decode())
+    # IRRs and portfolio valuations changed after the request that queued the job returned
+    bump_data_version(VALUATIONS)
+    logger.info(f"✅ IRR jobs {job_ids} completed for portfolio {job['portfolio_id']}")
+    return True
+
+
+async def run_irr_job_worker(worker_id: int = 0):
+    """
+    Background task started with the application (IRR_JOB_WORKERS of them).
+
+    Runs due jobs back to back; when the queue is empty, waits until a request enqueues
+    one or IRR_JOB_POLL_SECONDS pass (retries and jobs queued by other processes).
+    """
+    from app.db.database import get_db_sync
+
+    while True:
+        # Cleared before draining, so a job queued meanwhile still wakes the next wait
+        _job_available.clear()
+        try:
+            db_pool = get_db_sync()
+            if not db_pool:
+                logger.warning("Database pool not available for IRR job worker")
+            else:
+                async with db_pool.acquire() as db:
+                    while await process_next_irr_job(db):
+                        pass
+                    await db.execute(EXPIRE_SQL, IRR_JOB_LEASE_SECONDS)
+        except Exception as e:
+            logger.error(f"❌ Error in IRR job worker {worker_id}: {str(e)}")
+
+        try:
+            await asyncio.wait_for(_job_available.wait(), timeout=IRR_JOB_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
@@ -0,0 +1,150 @@
+"""
+IRR Portfolio Lock
+
+Serialises IRR recalculation per portfolio. Two advisers editing the same portfolio, a bulk
+save racing a valuation save, or a background job racing a request would otherwise run
+overlapping cascades that read the same rows and write the same (portfolio, date) IRRs.
+
+Core Principles:
+1. Advisory lock: every recalculation takes the per-portfolio Postgres advisory lock shared with
+   the IRR job workers and the full-book recompute, which serialises across processes. Inside a
+   transaction it is the transaction-level lock, held until commit so nobody reads the portfolio
+   before the writes are visible
+2. Keyed async lock: outside a transaction, recalculations of one portfolio inside this process
+   first queue on an asyncio.Lock for that portfolio id (other portfolios are not blocked), then
+   hold a session advisory lock released when the recalculation returns. Transactions skip the
+   asyncio lock: their advisory lock outlives the block, so a transaction coming back to the same
+   portfolio could otherwise wait on an asyncio lock whose holder waits on it in Postgres
+3. Re-entrant: a recalculation already holding a portfolio's lock (e.g. handle_historical_changes
+   calling handle_activity_changes_batch) runs nested calls for it directly
+4. Single flight: outside a transaction, a request identical to one still waiting for the lock
+   joins it and receives its result instead of recomputing. Only a waiting request is joined:
+   once a recalculation holds the lock it has started reading, and a request arriving after
+   that (whose data it may have missed) runs after it instead. Callers inside a transaction
+   never join, because their uncommitted changes are invisible to another connection
+"""
+
+import asyncio
+import copy
+import functools
+import logging
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Hashable, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Same key as the IRR job queue and the full-book recompute
+ADVISORY_XACT_LOCK_SQL = "SELECT pg_advisory_xact_lock(hashtext('irr_cascade'), $1::int)"
+ADVISORY_LOCK_SQL = "SELECT pg_advisory_lock(hashtext('irr_cascade'), $1::int)"
+ADVISORY_UNLOCK_SQL = "SELECT pg_advisory_unlock(hashtext('irr_cascade'), $1::int)"
+
+# portfolio id -> [lock, number of tasks using or waiting for it]; entries are dropped when unused
+_portfolio_locks: Dict[int, list] = {}
+# Portfolios whose lock the current task holds
+_held_portfolios: ContextVar[FrozenSet[int]] = ContextVar("irr_held_portfolios", default=frozenset())
+# (portfolio id, request key) -> result future of a recalculation still waiting for the lock
+_waiting_flights: Dict[Tuple[int, Hashable], asyncio.Future] = {}
+
+
+@asynccontextmanager
+async def portfolio_irr_lock(db, portfolio_id: int):
+    """Hold the Postgres (and, outside a transaction, the in-process) lock of a portfolio; re-entrant within a task."""
+    portfolio_id = int(portfolio_id)
+    held = _held_portfolios.get()
+    if portfolio_id in held:
+        yield
+        return
+
+    if db.is_in_transaction():
+        await db.execute(ADVISORY_XACT_LOCK_SQL, portfolio_id)
+        token = _held_portfolios.set(held | {portfolio_id})
+        try:
+            yield
+        finally:
+            _held_portfolios.reset(token)
+        return
+
+    entry = _portfolio_locks.setdefault(portfolio_id, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            await db.execute(ADVISORY_LOCK_SQL, portfolio_id)
+            token = _held_portfolios.set(held | {portfolio_id})
+            try:
+                yield
+            finally:
+                _held_portfolios.reset(token)
+                await db.execute(ADVISORY_UNLOCK_SQL, portfolio_id)
+    finally:
+        entry[1] -= 1
+        if not entry[1] and _portfolio_locks.get(portfolio_id) is entry:
+            del _portfolio_locks[portfolio_id]
+
+
+async def run_portfolio_recalculation(db, portfolio_id: int, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Run compute() under the portfolio lock, or join an identical request (same portfolio and key)
+    that is still waiting for it and return a copy of its result.
+    """
+    portfolio_id = int(portfolio_id)
+    if db.is_in_transaction() or portfolio_id in _held_portfolios.get():
+        async with portfolio_irr_lock(db, portfolio_id):
+            return await compute()
+
+    flight_key = (portfolio_id, key)
+    waiting = _waiting_flights.get(flight_key)
+    if waiting is not None:
+        logger.info(f"🔒 [IRR LOCK] Portfolio {portfolio_id}: identical recalculation already queued, waiting for its result")
+        try:
+            return copy.copy(await asyncio.shield(waiting))
+        except asyncio.CancelledError:
+            if not waiting.cancelled():
+                raise
+            # The request we joined was cancelled; run our own below
+
+    future = asyncio.get_running_loop().create_future()
+    # Nobody may be waiting on a failed flight; mark its exception as retrieved
+    future.add_done_callback(lambda done: done.cancelled() or done.exception())
+    _waiting_flights.setdefault(flight_key, future)
+    try:
+        async with portfolio_irr_lock(db, portfolio_id):
+            # From here on this recalculation reads the portfolio; later requests must not join it
+            if _waiting_flights.get(flight_key) is future:
+                del _waiting_flights[flight_key]
+            result = await compute()
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        if _waiting_flights.get(flight_key) is future:
+            del _waiting_flights[flight_key]
+
+    future.set_result(result)
+    return result
+
+
+def _request_key(value: Any) -> Hashable:
+    """Hashable form of a recalculation's arguments (lists and sets become tuples)."""
+    if isinstance(value, (list, tuple)):
+        return tuple(_request_key(item) for item in value)
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(_request_key(item) for item in value))
+    return str(value)
+
+
+def portfolio_recalculation(method):
+    """
+    Decorate an IRRCascadeService method taking (self, portfolio_id, ...) so it runs under
+    run_portfolio_recalculation, keyed by the method name and its remaining arguments.
+    """
+    @functools.wraps(method)
+    async def wrapper(self, portfolio_id: int, *args, **kwargs):
+        key = (method.__name__, _request_key(args), _request_key(sorted(kwargs.items())))
+        return await run_portfolio_recalculation(
+            self.db, portfolio_id, key, lambda: method(self, portfolio_id, *args, **kwargs)
+        )
+    return wrapper
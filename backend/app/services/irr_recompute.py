@@ -0,0 +1,342 @@
+"""
+IRR Recompute
+
+Full-book IRR recomputation (migrations/006_irr_recompute_runs.sql). After a methodology
+change every fund and portfolio IRR has to be recomputed; the per-portfolio endpoints
+(/holding_activity_logs/recalculate_all_portfolio_irr, /portfolio_funds/{id}/recalculate-all-irr)
+do that one portfolio or fund at a time inside an HTTP request.
+
+Core Principles:
+1. Partitioned: a run splits every portfolio with fund valuations into chunks of chunk_size
+   portfolios (irr_recompute_chunks)
+2. Parallel: IRR_RECOMPUTE_WORKERS workers, each on its own pooled connection, claim chunks with
+   FOR UPDATE SKIP LOCKED; any number of processes can work on the same run
+3. Resumable: each portfolio is recomputed in its own transaction, which also advances the
+   chunk's next_index checkpoint. A crashed run resumes after the last committed portfolio;
+   chunks whose worker died are reclaimed once their heartbeat is older than the lease, and
+   workers keep polling until then instead of leaving the run without a worker
+4. Same locks and maths as the cascade: each portfolio runs under the per-portfolio advisory lock
+   the IRR job queue uses, through the cascade planner (one load, batch solve, set-based writes)
+5. Observable: progress, rows/sec and ETA (since the workers last started) are computed from the
+   chunk checkpoints (GET /api/irr_jobs/recompute/{run_id}) and logged after every chunk
+"""
+
+import os
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from app.services.irr_cascade_planner import load_portfolio_irr_state, plan_full_recalculation, run_cascade_plan
+from app.services.irr_job_queue import IRR_JOB_STATEMENT_TIMEOUT_MS
+from app.services.irr_portfolio_lock import portfolio_irr_lock
+from app.utils.data_versions import VALUATIONS, bump_data_version
+
+logger = logging.getLogger(__name__)
+
+IRR_RECOMPUTE_CHUNK_SIZE = int(os.getenv("IRR_RECOMPUTE_CHUNK_SIZE", "50"))
+IRR_RECOMPUTE_WORKERS = int(os.getenv("IRR_RECOMPUTE_WORKERS", "4"))
+IRR_RECOMPUTE_LEASE_SECONDS = float(os.getenv("IRR_RECOMPUTE_LEASE_SECONDS", "600"))
+IRR_RECOMPUTE_POLL_SECONDS = float(os.getenv("IRR_RECOMPUTE_POLL_SECONDS", "5"))
+
+# $1 = run, $2 = chunk size, $3 = portfolio ids (NULL = every portfolio with fund valuations)
+CREATE_CHUNKS_SQL = """
+    WITH portfolios AS (
+        SELECT DISTINCT pf.portfolio_id AS id
+        FROM portfolio_funds pf
+        JOIN portfolio_fund_valuations pfv ON pfv.portfolio_fund_id = pf.id
+        WHERE pf.portfolio_id IS NOT NULL
+          AND ($3::bigint[] IS NULL OR pf.portfolio_id = ANY($3::bigint[]))
+    ),
+    numbered AS (
+        SELECT id, (row_number() OVER (ORDER BY id) - 1) / $2 AS chunk_no
+        FROM portfolios
+    )
+    INSERT INTO irr_recompute_chunks (run_id, chunk_no, portfolio_ids)
+    SELECT $1, chunk_no, array_agg(id ORDER BY id)
+    FROM numbered
+    GROUP BY chunk_no
+    RETURNING cardinality(portfolio_ids) AS portfolios
+"""
+
+# $1 = run, $2 = lease in seconds
+CLAIM_CHUNK_SQL = """
+    UPDATE irr_recompute_chunks c
+    SET status = 'running', attempts = c.attempts + 1,
+        started_at = COALESCE(c.started_at, now()), heartbeat_at = now()
+    WHERE (c.run_id, c.chunk_no) = (
+        SELECT run_id, chunk_no
+        FROM irr_recompute_chunks
+        WHERE run_id = $1
+          AND (status = 'queued' OR (status = 'running' AND heartbeat_at < now() - make_interval(secs => $2)))
+        ORDER BY chunk_no
+        FOR UPDATE SKIP LOCKED
+        LIMIT 1
+    )
+    RETURNING c.*
+"""
+
+# Chunks left to finish and the seconds until the oldest running chunk's lease expires
+# (NULL when none is running); no row when the run is no longer running. $1 = run, $2 = lease in seconds
+PENDING_CHUNKS_SQL = """
+    SELECT count(c.chunk_no) FILTER (WHERE c.status IN ('queued', 'running')) AS pending,
+           EXTRACT(EPOCH FROM min(c.heartbeat_at) FILTER (WHERE c.status = 'running')
+                   + make_interval(secs => $2) - now()) AS lease_expires_in
+    FROM irr_recompute_runs r
+    LEFT JOIN irr_recompute_chunks c ON c.run_id = r.id
+    WHERE r.id = $1 AND r.status = 'running'
+    GROUP BY r.id
+"""
+
+# Advances the checkpoint; no row when another worker has since reclaimed the chunk.
+# $1 = run, $2 = chunk, $3 = claimed attempt, $4 = next index, $5 = fund IRRs, $6 = portfolio IRRs
+CHECKPOINT_SQL = """
+    UPDATE irr_recompute_chunks
+    SET next_index = $4, heartbeat_at = now(),
+        fund_irrs_written = fund_irrs_written + $5,
+        portfolio_irrs_written = portfolio_irrs_written + $6
+    WHERE run_id = $1 AND chunk_no = $2 AND attempts = $3
+    RETURNING next_index
+"""
+
+# $1 = run, $2 = chunk, $3 = claimed attempt, $4 = next index, $5 = failed portfolio, $6 = error
+CHECKPOINT_FAILED_SQL = """
+    UPDATE irr_recompute_chunks
+    SET next_index = $4, heartbeat_at = now(),
+        failed_portfolio_ids = failed_portfolio_ids || $5::bigint,
+        last_error = $6
+    WHERE run_id = $1 AND chunk_no = $2 AND attempts = $3
+    RETURNING next_index
+"""
+
+# $1 = run, $2 = chunk, $3 = claimed attempt
+FINISH_CHUNK_SQL = """
+    UPDATE irr_recompute_chunks
+    SET status = 'done', finished_at = now(), heartbeat_at = now()
+    WHERE run_id = $1 AND chunk_no = $2 AND attempts = $3
+"""
+
+# Marks the run finished once no chunk is left; $1 = run
+FINISH_RUN_SQL = """
+    UPDATE irr_recompute_runs
+    SET status = 'succeeded', finished_at = now()
+    WHERE id = $1 AND status = 'running'
+      AND NOT EXISTS (
+          SELECT 1 FROM irr_recompute_chunks WHERE run_id = $1 AND status IN ('queued', 'running')
+      )
+"""
+
+# Rate baseline for rows/sec and ETA; $1 = run
+RESUME_RUN_SQL = """
+    UPDATE irr_recompute_runs r
+    SET resumed_at = now(),
+        rows_at_resume = totals.rows_written,
+        portfolios_at_resume = totals.processed
+    FROM (
+        SELECT COALESCE(sum(fund_irrs_written + portfolio_irrs_written), 0) AS rows_written,
+               COALESCE(sum(next_index), 0) AS processed
+        FROM irr_recompute_chunks
+        WHERE run_id = $1
+    ) totals
+    WHERE r.id = $1 AND r.status = 'running'
+    RETURNING r.id
+"""
+
+PROGRESS_SQL = """
+    SELECT r.id, r.status, r.chunk_size, r.total_portfolios, r.resumed_at, r.rows_at_resume,
+           r.portfolios_at_resume, r.created_at, r.finished_at, now() AS checked_at,
+           count(c.chunk_no) AS total_chunks,
+           count(c.chunk_no) FILTER (WHERE c.status = 'done') AS chunks_done,
+           count(c.chunk_no) FILTER (WHERE c.status = 'running') AS chunks_running,
+           COALESCE(sum(c.next_index), 0) AS processed_portfolios,
+           COALESCE(sum(c.fund_irrs_written), 0) AS fund_irrs_written,
+           COALESCE(sum(c.portfolio_irrs_written), 0) AS portfolio_irrs_written,
+           COALESCE(array_agg(failed.portfolio_id) FILTER (WHERE failed.portfolio_id IS NOT NULL), '{}') AS failed_portfolio_ids
+    FROM irr_recompute_runs r
+    LEFT JOIN irr_recompute_chunks c ON c.run_id = r.id
+    LEFT JOIN LATERAL unnest(c.failed_portfolio_ids) AS failed(portfolio_id) ON true
+    WHERE r.id = $1
+    GROUP BY r.id
+"""
+
+# Runs being worked on by this process, so the same run is not started twice here
+_active_runs: Dict[int, asyncio.Task] = {}
+
+
+class IRRRecomputeLeaseLost(Exception):
+    """The chunk was reclaimed by another worker after this worker's lease expired."""
+
+
+async def create_recompute_run(db, chunk_size: int = IRR_RECOMPUTE_CHUNK_SIZE, portfolio_ids: Optional[List[int]] = None) -> int:
+    """Partition the portfolios (all of them, or portfolio_ids) into chunks; returns the run id."""
+    async with db.transaction():
+        run_id = await db.fetchval("INSERT INTO irr_recompute_runs (chunk_size) VALUES ($1) RETURNING id", chunk_size)
+        chunks = await db.fetch(CREATE_CHUNKS_SQL, run_id, chunk_size, portfolio_ids)
+        total = sum(row["portfolios"] for row in chunks)
+        await db.execute("UPDATE irr_recompute_runs SET total_portfolios = $2 WHERE id = $1", run_id, total)
+        await db.execute(FINISH_RUN_SQL, run_id)
+    logger.info(f"🧮 IRR recompute run {run_id} created: {total} portfolios in {len(chunks)} chunks of up to {chunk_size}")
+    return run_id
+
+
+async def recompute_portfolio_irrs(db, portfolio_id: int) -> Dict:
+    """Recompute every fund and portfolio IRR of one portfolio (call inside a transaction)."""
+    async with portfolio_irr_lock(db, portfolio_id):
+        state = await load_portfolio_irr_state(db, portfolio_id)
+        return await run_cascade_plan(db, state, plan_full_recalculation(state))
+
+
+async def process_next_recompute_chunk(db, run_id: int) -> bool:
+    """
+    Claim the next chunk of the run and recompute its portfolios from the checkpoint on;
+    returns False when no chunk is left to claim.
+    """
+    chunk = await db.fetchrow(CLAIM_CHUNK_SQL, run_id, IRR_RECOMPUTE_LEASE_SECONDS)
+    if not chunk:
+        return False
+
+    key = (run_id, chunk["chunk_no"], chunk["attempts"])
+    portfolio_ids = chunk["portfolio_ids"]
+    for index in range(chunk["next_index"], len(portfolio_ids)):
+        portfolio_id = portfolio_ids[index]
+        try:
+            async with db.transaction():
+                await db.execute(f"SET LOCAL statement_timeout = {IRR_JOB_STATEMENT_TIMEOUT_MS}")
+                summary = await recompute_portfolio_irrs(db, portfolio_id)
+                if await db.fetchval(CHECKPOINT_SQL, *key, index + 1, summary["fund_irrs_recalculated"], summary["portfolio_irrs_recalculated"]) is None:
+                    raise IRRRecomputeLeaseLost()
+        except IRRRecomputeLeaseLost:
+            logger.warning(f"⚠️ IRR recompute run {run_id} chunk {chunk['chunk_no']} was reclaimed by another worker")
+            return True
+        except Exception as e:
+            logger.error(f"❌ IRR recompute run {run_id}: portfolio {portfolio_id} failed: {str(e)}")
+            if await db.fetchval(CHECKPOINT_FAILED_SQL, *key, index + 1, portfolio_id, str(e)) is None:
+                return True
+
+    await db.execute(FINISH_CHUNK_SQL, *key)
+    return True
+
+
+async def seconds_until_next_recompute_chunk(db, run_id: int) -> Optional[float]:
+    """
+    How long a worker that found nothing to claim should wait before trying again; None when
+    the run has no chunk left to finish (or is no longer running) and the worker can stop.
+    """
+    row = await db.fetchrow(PENDING_CHUNKS_SQL, run_id, IRR_RECOMPUTE_LEASE_SECONDS)
+    if not row or not row["pending"]:
+        return None
+    # Queued chunks only: another worker is claiming them right now
+    lease_expires_in = float(row["lease_expires_in"]) if row["lease_expires_in"] is not None else 0.0
+    return min(max(lease_expires_in, 1.0), IRR_RECOMPUTE_POLL_SECONDS)
+
+
+async def get_recompute_progress(db, run_id: int) -> Optional[Dict]:
+    """Progress of a run with rows/sec and ETA since its workers last started; None if it does not exist."""
+    row = await db.fetchrow(PROGRESS_SQL, run_id)
+    if not row:
+        return None
+
+    rows_written = row["fund_irrs_written"] + row["portfolio_irrs_written"]
+    processed = row["processed_portfolios"]
+    elapsed = ((row["finished_at"] or row["checked_at"]) - row["resumed_at"]).total_seconds()
+    rows_per_second = (rows_written - row["rows_at_resume"]) / elapsed if elapsed > 0 else 0.0
+    portfolios_per_second = (processed - row["portfolios_at_resume"]) / elapsed if elapsed > 0 else 0.0
+    remaining = row["total_portfolios"] - processed
+    eta_seconds = 0.0 if remaining == 0 else (remaining / portfolios_per_second if portfolios_per_second > 0 else None)
+
+    return {
+        "run_id": row["id"],
+        "status": row["status"],
+        "chunk_size": row["chunk_size"],
+        "total_chunks": row["total_chunks"],
+        "chunks_done": row["chunks_done"],
+        "chunks_running": row["chunks_running"],
+        "total_portfolios": row["total_portfolios"],
+        "processed_portfolios": processed,
+        "failed_portfolio_ids": sorted(row["failed_portfolio_ids"]),
+        "fund_irrs_written": row["fund_irrs_written"],
+        "portfolio_irrs_written": row["portfolio_irrs_written"],
+        "rows_written": rows_written,
+        "rows_per_second": round(rows_per_second, 1),
+        "portfolios_per_second": round(portfolios_per_second, 2),
+        "eta_seconds": round(eta_seconds) if eta_seconds is not None else None,
+        "created_at": row["created_at"],
+        "resumed_at": row["resumed_at"],
+        "finished_at": row["finished_at"],
+        "active_in_this_process": run_id in _active_runs
+    }
+
+
+def _progress_line(progress: Dict) -> str:
+    eta = "-" if progress["eta_seconds"] is None else f"{progress['eta_seconds']}s"
+    return (
+        f"{progress['processed_portfolios']}/{progress['total_portfolios']} portfolios, "
+        f"{progress['rows_written']} rows, {progress['rows_per_second']} rows/s, ETA {eta}"
+    )
+
+
+async def run_irr_recompute(db_pool, run_id: int, workers: int = IRR_RECOMPUTE_WORKERS) -> Optional[Dict]:
+    """
+    Work on a run until every chunk is done, with `workers` workers on their own pooled
+    connections; returns the final progress.
+
+    Chunks still leased by a worker in another (or a crashed) process are left alone until their
+    lease expires. Workers that find nothing to claim while such chunks remain release their
+    connection and poll (at least every IRR_RECOMPUTE_POLL_SECONDS) until the chunks are finished
+    or their lease expires and they can be reclaimed; the run finishes when its last chunk is done.
+    """
+    async with db_pool.acquire() as db:
+        await db.execute(RESUME_RUN_SQL, run_id)
+
+    async def worker(worker_id: int):
+        while True:
+            async with db_pool.acquire() as db:
+                if await process_next_recompute_chunk(db, run_id):
+                    progress = await get_recompute_progress(db, run_id)
+                    logger.info(f"📈 IRR recompute run {run_id} (worker {worker_id}): {_progress_line(progress)}")
+                    continue
+                wait = await seconds_until_next_recompute_chunk(db, run_id)
+            if wait is None:
+                return
+            await asyncio.sleep(wait)
+
+    results = await asyncio.gather(*(worker(worker_id) for worker_id in range(workers)), return_exceptions=True)
+    for worker_id, result in enumerate(results):
+        if isinstance(result, Exception):
+            logger.error(f"❌ IRR recompute run {run_id} worker {worker_id} stopped: {str(result)}")
+
+    async with db_pool.acquire() as db:
+        await db.execute(FINISH_RUN_SQL, run_id)
+        progress = await get_recompute_progress(db, run_id)
+    # Fund IRRs, portfolio IRRs and portfolio valuations were rewritten
+    bump_data_version(VALUATIONS)
+    if progress and progress["status"] == "succeeded":
+        logger.info(f"✅ IRR recompute run {run_id} finished: {_progress_line(progress)}, {len(progress['failed_portfolio_ids'])} failed portfolios")
+    return progress
+
+
+def start_irr_recompute(db_pool, run_id: int, workers: int = IRR_RECOMPUTE_WORKERS) -> bool:
+    """Run (or resume) a run in the background of this process; False if it is already running here."""
+    if run_id in _active_runs:
+        return False
+    task = asyncio.create_task(run_irr_recompute(db_pool, run_id, workers))
+    _active_runs[run_id] = task
+    task.add_done_callback(lambda _: _active_runs.pop(run_id, None))
+    return True
+
+
+async def resume_irr_recompute_runs():
+    """Startup hook: resume the runs a previous process left unfinished."""
+    from app.db.database import get_db_sync
+
+    try:
+        db_pool = get_db_sync()
+        if not db_pool:
+            logger.warning("Database pool not available for IRR recompute")
+            return
+        async with db_pool.acquire() as db:
+            run_ids = [row["id"] for row in await db.fetch("SELECT id FROM irr_recompute_runs WHERE status = 'running' ORDER BY id")]
+        for run_id in run_ids:
+            logger.info(f"🔁 Resuming IRR recompute run {run_id}")
+            start_irr_recompute(db_pool, run_id)
+    except Exception as e:
+        logger.error(f"❌ Error resuming IRR recompute runs: {str(e)}")
@@ -0,0 +1,310 @@
+"""
+Revenue Service
+
+Shared revenue computation for the revenue routes.
+
+Core Principles:
+1. One definition of per-product revenue: revenue_inputs_query loads fee columns, valuation
+   completeness and FUM from latest valuations for any set of products, and RevenueSnapshot
+   computes every fee component as a NumPy array in one pass. The product, client group,
+   company and revenue-rate views are all built on it, so one product and the whole book
+   share the same arithmetic, and a fee that is not a number counts as 0 everywhere
+2. Incremental company revenue rate: client_group_revenue_state holds completeness,
+   FUM and revenue per client group (migrations/004_client_group_revenue_state.sql).
+   Database triggers flag the groups a write to client_products, portfolio_funds or
+   portfolio_fund_valuations touches; refresh_stale_revenue_state recomputes only those
+"""
+
+import logging
+from datetime import datetime, time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+# Rewrite the state rows of the client groups in $1 from the per-group arrays $2..$5
+UPDATE_REVENUE_STATE_SQL = """
+    UPDATE client_group_revenue_state s
+    SET has_fee_setup = r.has_fee_setup,
+        complete = r.complete,
+        fum = r.fum,
+        revenue = r.revenue,
+        updated_at = now()
+    FROM unnest($1::bigint[], $2::boolean[], $3::boolean[], $4::float8[], $5::float8[])
+        AS r(client_group_id, has_fee_setup, complete, fum, revenue)
+    WHERE s.client_group_id = r.client_group_id
+"""
+
+
+async def refresh_stale_revenue_state(db) -> List[int]:
+    """
+    Recompute the revenue state of every client group flagged stale; returns their ids.
+
+    The stale flags are cleared and the rows rewritten in one transaction. The cleared rows stay
+    locked until commit, so a write that touches one of these groups meanwhile waits and flags it
+    again afterwards, and the next refresh picks it up.
+    """
+    async with db.transaction():
+        stale_ids = [
+            row["client_group_id"]
+            for row in await db.fetch("UPDATE client_group_revenue_state SET stale = false WHERE stale RETURNING client_group_id")
+        ]
+        if not stale_ids:
+            return []
+
+        # Groups deleted since they were flagged
+        await db.execute("""
+            DELETE FROM client_group_revenue_state s
+            WHERE s.client_group_id = ANY($1::bigint[])
+              AND NOT EXISTS (SELECT 1 FROM client_groups cg WHERE cg.id = s.client_group_id)
+        """, stale_ids)
+
+        # A group is complete when it has at least one product with a fee setup and every product with a
+        # positive fee has complete valuations; its FUM counts fee-setup products with complete valuations
+        client_ids = np.unique(np.array(stale_ids, dtype=np.int64))
+        snapshot = await load_revenue_snapshot(db, "cp.client_id = ANY($1::bigint[])", client_ids.tolist())
+        totals = snapshot.client_totals(client_ids)
+        await db.execute(
+            UPDATE_REVENUE_STATE_SQL,
+            client_ids.tolist(),
+            totals["has_fee_setup"].tolist(),
+            (totals["has_fee_setup"] & ~totals["unvalued_positive_fees"]).tolist(),
+            totals["fee_setup_fum"].tolist(),
+            totals["total_revenue"].tolist()
+        )
+
+    logger.info(f"🔄 Refreshed revenue state for {len(stale_ids)} client groups")
+    return stale_ids
+
+
+async def mark_all_revenue_state_stale(db) -> int:
+    """Flag every client group for recomputation (full rebuild on the next refresh); returns the row count."""
+    status = await db.execute("""
+        INSERT INTO client_group_revenue_state (client_group_id, stale)
+        SELECT id, true FROM client_groups
+        ON CONFLICT (client_group_id) DO UPDATE SET stale = true
+    """)
+    return int(status.split()[-1])
+
+
+def _numeric_fee(column: str) -> str:
+    """Cast a text fee column to numeric, NULL when it does not hold a number (instead of failing the query)."""
+    return rf"CASE WHEN {column} ~ '^\s*[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?\s*$' THEN {column}::numeric END"
+
+
+def revenue_inputs_query(product_filter: str = "true") -> str:
+    """
+    One row per client product matching product_filter (a condition on client_products aliased cp),
+    ordered by id: the raw fee columns' presence, the fees as numbers, and the count, valued count,
+    summed latest valuation and most recent valuation date of the portfolio's active funds.
+    Fee text that is not a number reads as NULL instead of failing the query.
+    """
+    return f"""
+    WITH portfolio_valuation_totals AS (
+        SELECT
+            pf.portfolio_id,
+            COUNT(*) AS fund_count,
+            COUNT(lv.portfolio_fund_id) AS valued_fund_count,
+            COALESCE(SUM(lv.valuation), 0) AS fum,
+            MAX(lv.valuation_date) AS valuation_date
+        FROM portfolio_funds pf
+        LEFT JOIN latest_portfolio_fund_valuations lv ON lv.portfolio_fund_id = pf.id
+        WHERE pf.status = 'active'
+          AND pf.portfolio_id IN (SELECT cp.portfolio_id FROM client_products cp WHERE {product_filter})
+        GROUP BY pf.portfolio_id
+    )
+    SELECT
+        cp.id,
+        cp.client_id,
+        cp.product_name,
+        cp.status,
+        cp.provider_id,
+        cp.fixed_fee_direct IS NOT NULL AS has_fixed_fee_direct,
+        cp.fixed_fee_facilitated IS NOT NULL AS has_fixed_fee_facilitated,
+        cp.percentage_fee_facilitated IS NOT NULL AS has_percentage_fee_facilitated,
+        {_numeric_fee("cp.fixed_fee_direct")} AS fixed_fee_direct,
+        {_numeric_fee("cp.fixed_fee_facilitated")} AS fixed_fee_facilitated,
+        {_numeric_fee("cp.percentage_fee_facilitated")} AS percentage_fee_facilitated,
+        COALESCE(pvt.fund_count, 0) AS fund_count,
+        COALESCE(pvt.valued_fund_count, 0) AS valued_fund_count,
+        COALESCE(pvt.fum, 0) AS fum,
+        pvt.valuation_date
+    FROM client_products cp
+    LEFT JOIN portfolio_valuation_totals pvt ON pvt.portfolio_id = cp.portfolio_id
+    WHERE {product_filter}
+    ORDER BY cp.id
+"""
+
+
+class RevenueSnapshot:
+    """
+    Fee inputs and computed revenue for a set of client products, one array slot per product.
+
+    Per product (all arrays aligned with product_ids):
+    - fixed fees as given; percentage fee = FUM x rate / 100 when a rate is configured and both
+      FUM and rate are positive
+    - total = fixed_fee_direct + fixed_fee_facilitated + percentage fee (0 when not finite)
+    - has_revenue_data: any fee column is set; valuations_complete: the portfolio has active
+      funds and every one has a latest valuation
+    Fees that are not numbers count as 0, like the original per-product endpoint.
+    """
+
+    def __init__(self, rows: List[Any]):
+        self.product_ids = np.array([row["id"] for row in rows], dtype=np.int64)
+        self.client_ids = np.array([row["client_id"] if row["client_id"] is not None else -1 for row in rows], dtype=np.int64)
+        self.product_names = [row["product_name"] for row in rows]
+        self.active = np.array([row["status"] == "active" for row in rows], dtype=bool)
+        self.provider_ids = np.array([row["provider_id"] if row["provider_id"] is not None else -1 for row in rows], dtype=np.int64)
+        self.valuation_dates = [row["valuation_date"] for row in rows]
+
+        def flags(column):
+            return np.array([bool(row[column]) for row in rows], dtype=bool)
+
+        def amounts(column):
+            # None becomes NaN, kept apart from 0 so the response can echo "not set"
+            return np.array([row[column] for row in rows], dtype=np.float64) if rows else np.zeros(0)
+
+        self.has_fixed_fee_direct = flags("has_fixed_fee_direct")
+        self.has_fixed_fee_facilitated = flags("has_fixed_fee_facilitated")
+        self.has_percentage_fee_facilitated = flags("has_percentage_fee_facilitated")
+        self.fixed_fee_direct_raw = amounts("fixed_fee_direct")
+        self.fixed_fee_facilitated_raw = amounts("fixed_fee_facilitated")
+        self.percentage_fee_facilitated_raw = amounts("percentage_fee_facilitated")
+        self.fund_count = np.array([row["fund_count"] for row in rows], dtype=np.int64)
+        self.valued_fund_count = np.array([row["valued_fund_count"] for row in rows], dtype=np.int64)
+        self.fum = np.array([row["fum"] for row in rows], dtype=np.float64) if rows else np.zeros(0)
+
+        self._compute()
+
+    def _compute(self):
+        self.fixed_fee_direct = np.nan_to_num(self.fixed_fee_direct_raw, nan=0.0)
+        self.fixed_fee_facilitated = np.nan_to_num(self.fixed_fee_facilitated_raw, nan=0.0)
+        self.percentage_rate = np.nan_to_num(self.percentage_fee_facilitated_raw, nan=0.0)
+
+        self.has_revenue_data = self.has_fixed_fee_direct | self.has_fixed_fee_facilitated | self.has_percentage_fee_facilitated
+        self.valuations_complete = (self.fund_count > 0) & (self.valued_fund_count == self.fund_count)
+        self.has_positive_fee = (self.fixed_fee_direct > 0) | (self.fixed_fee_facilitated > 0) | (self.percentage_rate > 0)
+
+        # FUM only feeds the percentage fee, so it is reported for products that configure one
+        self.percentage_fum = np.where(self.has_percentage_fee_facilitated, self.fum, 0.0)
+        self.percentage_fee = np.where(
+            (self.percentage_fum > 0) & (self.percentage_rate > 0),
+            self.percentage_fum * self.percentage_rate / 100.0,
+            0.0
+        )
+        with np.errstate(invalid="ignore", over="ignore"):
+            total = self.fixed_fee_direct + self.fixed_fee_facilitated + self.percentage_fee
+        self.total = np.where(np.isfinite(total) & self.has_revenue_data, total, 0.0)
+
+    def __len__(self) -> int:
+        return len(self.product_ids)
+
+    def products(self) -> List[Dict[str, Any]]:
+        """Per-product breakdown in the ProductRevenueCalculation shape, in product id order."""
+
+        def optional(values: np.ndarray, i: int) -> Optional[float]:
+            return None if np.isnan(values[i]) else float(values[i])
+
+        def positive(values: np.ndarray, i: int) -> Optional[float]:
+            return float(values[i]) if values[i] > 0 else None
+
+        results = []
+        for i in range(len(self)):
+            has_revenue_data = bool(self.has_revenue_data[i])
+            valuation_date = self.valuation_dates[i]
+            results.append({
+                "product_id": int(self.product_ids[i]),
+                "product_name": self.product_names[i],
+                "fixed_fee_direct": optional(self.fixed_fee_direct_raw, i),
+                "fixed_fee_facilitated": optional(self.fixed_fee_facilitated_raw, i),
+                "percentage_fee_facilitated": optional(self.percentage_fee_facilitated_raw, i),
+                "latest_portfolio_valuation": positive(self.percentage_fum, i) if has_revenue_data else None,
+                "valuation_date": (
+                    datetime.combine(valuation_date, time.min)
+                    if has_revenue_data and valuation_date is not None and self.percentage_fum[i] > 0 else None
+                ),
+                "calculated_percentage_facilitated_fee": positive(self.percentage_fee, i),
+                "total_estimated_annual_revenue": positive(self.total, i),
+                "has_revenue_data": has_revenue_data
+            })
+        return results
+
+    def client_totals(self, client_ids: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Per-client sums aligned with client_ids (sorted, unique); products of other clients are ignored.
+        FUM and revenue only count products with complete valuations, revenue only those with a positive fee.
+        The fee-setup columns feed the revenue-rate state: whether any product has a fee setup, whether
+        a product with a positive fee is missing valuations, and the FUM of valued fee-setup products.
+        """
+        known = np.isin(self.client_ids, client_ids)
+        slots = np.searchsorted(client_ids, self.client_ids[known])
+        complete = self.valuations_complete[known]
+        earning = complete & self.has_positive_fee[known]
+        fee_setup = self.has_revenue_data[known]
+
+        def per_client(weights):
+            return np.bincount(slots, weights=weights, minlength=len(client_ids))
+
+        return {
+            "product_count": per_client(None).astype(np.int64),
+            "products_with_revenue": per_client(earning.astype(np.float64)).astype(np.int64),
+            "missing_valuations": per_client((~complete).astype(np.float64)) > 0,
+            "total_fum": per_client(np.where(complete, self.fum[known], 0.0)),
+            "total_revenue": per_client(np.where(earning, self.total[known], 0.0)),
+            "has_fee_setup": per_client(fee_setup.astype(np.float64)) > 0,
+            "unvalued_positive_fees": per_client((fee_setup & self.has_positive_fee[known] & ~complete).astype(np.float64)) > 0,
+            "fee_setup_fum": per_client(np.where(fee_setup & complete, self.fum[known], 0.0))
+        }
+
+    def company_totals(self) -> Dict[str, Any]:
+        """
+        Company-wide revenue over the active products in the snapshot, with the column names of the
+        company_revenue_analytics view. Fees count whether or not valuations are complete.
+        """
+        active = self.active
+
+        def average_positive(values: np.ndarray) -> Optional[float]:
+            positive = values[active & (values > 0)]
+            return float(positive.mean()) if len(positive) else None
+
+        total_annual_revenue = float(self.total[active].sum())
+        active_products = int(active.sum())
+        return {
+            "total_fixed_direct_revenue": float(self.fixed_fee_direct[active].sum()),
+            "total_fixed_facilitated_revenue": float(self.fixed_fee_facilitated[active].sum()),
+            "total_percentage_facilitated_revenue": float(self.percentage_fee[active].sum()),
+            "total_annual_revenue": total_annual_revenue,
+            "active_providers": len(np.unique(self.provider_ids[active & (self.provider_ids >= 0)])),
+            "active_clients": len(np.unique(self.client_ids[active & (self.client_ids >= 0)])),
+            "active_products": active_products,
+            "revenue_generating_products": int((active & (self.total > 0)).sum()),
+            "avg_revenue_per_product": total_annual_revenue / active_products if active_products else 0.0,
+            "total_fum": float(self.fum[active].sum()),
+            "avg_percentage_facilitated_fee": average_positive(self.percentage_rate),
+            "avg_fixed_facilitated_fee": average_positive(self.fixed_fee_facilitated),
+            "avg_fixed_direct_fee": average_positive(self.fixed_fee_direct)
+        }
+
+    def totals(self) -> Dict[str, Any]:
+        """Sums across every product in the snapshot."""
+        return {
+            "product_count": len(self),
+            "products_with_revenue_data": int(self.has_revenue_data.sum()),
+            "total_fixed_fee_direct": float(self.fixed_fee_direct.sum()),
+            "total_fixed_fee_facilitated": float(self.fixed_fee_facilitated.sum()),
+            "total_percentage_fee_facilitated": float(self.percentage_fee.sum()),
+            "total_estimated_annual_revenue": float(self.total.sum())
+        }
+
+
+async def load_revenue_snapshot(db, product_filter: str = "true", *args) -> RevenueSnapshot:
+    """Load the revenue inputs of every product matching product_filter ($n placeholders bound to args)."""
+    rows = await db.fetch(revenue_inputs_query(product_filter), *args)
+    return RevenueSnapshot(rows)
+
+
+async def load_product_revenue(db, product_ids: List[int]) -> RevenueSnapshot:
+    """Load the revenue inputs of the given client products (unknown ids are simply absent)."""
+    return await load_revenue_snapshot(db, "cp.id = ANY($1::bigint[])", list(product_ids))
@@ -0,0 +1,213 @@
+"""
+Risk Engine
+
+Shared computation behind /analytics/client_risks and /analytics/risk_differences.
+
+Core Principles:
+1. One load: active products and the portfolio funds behind them (with fund risk
+   factor, amount invested, target weighting and latest valuation) become NumPy arrays
+2. Grouped reductions: weighted sums per portfolio are np.bincount calls over a dense
+   portfolio index; products pick up their portfolio's sums by fancy indexing and
+   clients are reduced from products the same way
+3. Cached per data version: a snapshot and the results computed from it are reused
+   until a client, product, portfolio fund, fund or valuation write bumps the data
+   version (see app/utils/data_versions.py), or for at most RISK_CACHE_SECONDS. A snapshot
+   loaded within the replica lag of such a write is not cached (safe_to_cache)
+"""
+
+import os
+import time
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.utils.data_versions import CLIENTS, PRODUCTS, PORTFOLIO_FUNDS, FUNDS, VALUATIONS, get_data_version, safe_to_cache
+
+logger = logging.getLogger(__name__)
+
+RISK_CACHE_SECONDS = float(os.getenv("RISK_CACHE_SECONDS", "3600"))
+RISK_DATA_DOMAINS = (CLIENTS, PRODUCTS, PORTFOLIO_FUNDS, FUNDS, VALUATIONS)
+
+# Active products with a portfolio, and their client
+PRODUCTS_SQL = """
+    SELECT cp.id, cp.product_name, cp.client_id, cp.portfolio_id,
+           cg.name AS client_name, cg.status = 'active' AS client_active
+    FROM client_products cp
+    JOIN client_groups cg ON cg.id = cp.client_id
+    WHERE cp.status = 'active' AND cp.portfolio_id IS NOT NULL
+    ORDER BY cp.id
+"""
+
+# Portfolio funds behind those products whose fund has a risk factor
+PORTFOLIO_FUNDS_SQL = """
+    SELECT pf.portfolio_id, pf.status = 'active' AS active, af.risk_factor,
+           COALESCE(pf.amount_invested, 0) AS amount_invested,
+           COALESCE(pf.target_weighting, 0) AS target_weighting,
+           lv.valuation
+    FROM portfolio_funds pf
+    JOIN available_funds af ON af.id = pf.available_funds_id AND af.risk_factor IS NOT NULL
+    LEFT JOIN latest_portfolio_fund_valuations lv ON lv.portfolio_fund_id = pf.id
+    WHERE pf.portfolio_id IN (
+        SELECT portfolio_id FROM client_products WHERE status = 'active' AND portfolio_id IS NOT NULL
+    )
+"""
+
+
+class RiskSnapshot:
+    """
+    Column arrays for every active product and the risk-rated portfolio funds behind it.
+
+    Portfolios are numbered 0..n_portfolios-1; product_portfolio and fund_portfolio hold
+    those dense indices so per-portfolio sums are a single np.bincount.
+    """
+
+    def __init__(self, products, funds):
+        self.product_ids = np.array([row["id"] for row in products], dtype=np.int64)
+        self.product_names = [row["product_name"] for row in products]
+        self.client_ids = np.array([row["client_id"] for row in products], dtype=np.int64)
+        self.client_names = [row["client_name"] for row in products]
+        self.client_active = np.array([bool(row["client_active"]) for row in products], dtype=bool)
+
+        portfolio_ids, self.product_portfolio = np.unique(
+            np.array([row["portfolio_id"] for row in products], dtype=np.int64), return_inverse=True
+        )
+        self.n_portfolios = len(portfolio_ids)
+
+        fund_portfolio_ids = np.array([row["portfolio_id"] for row in funds], dtype=np.int64)
+        self.fund_portfolio = np.searchsorted(portfolio_ids, fund_portfolio_ids)
+        self.fund_active = np.array([bool(row["active"]) for row in funds], dtype=bool)
+        self.risk = np.array([row["risk_factor"] for row in funds], dtype=np.float64)
+        self.amount_invested = np.array([row["amount_invested"] for row in funds], dtype=np.float64)
+        self.target_weighting = np.array([row["target_weighting"] for row in funds], dtype=np.float64)
+        self.has_valuation = np.array([row["valuation"] is not None for row in funds], dtype=bool)
+        self.valuation = np.array(
+            [row["valuation"] if row["valuation"] is not None else 0.0 for row in funds], dtype=np.float64
+        )
+
+        self._client_risks: Optional[List[Dict]] = None
+        self._risk_differences: Optional[List[Dict]] = None
+
+    def portfolio_sums(self, weights: np.ndarray) -> np.ndarray:
+        """Sum a per-fund array into one value per portfolio."""
+        return np.bincount(self.fund_portfolio, weights=weights, minlength=self.n_portfolios)
+
+    def client_risks(self) -> List[Dict]:
+        """
+        Investment-weighted risk per active client, ordered by client id.
+
+        A portfolio's funds (any status) are weighted by amount_invested; portfolios whose
+        total investment is not positive are left out, and each product then contributes
+        its portfolio's risk weighted by that investment.
+        """
+        if self._client_risks is None:
+            invested = self.portfolio_sums(self.amount_invested)
+            risk_invested = self.portfolio_sums(self.risk * self.amount_invested)
+            counted = invested > 0
+
+            product_invested = np.where(counted, invested, 0.0)[self.product_portfolio]
+            product_risk_invested = np.where(counted, risk_invested, 0.0)[self.product_portfolio]
+
+            products = np.flatnonzero(self.client_active)
+            client_ids, client_index = np.unique(self.client_ids[products], return_inverse=True)
+            client_invested = np.bincount(client_index, weights=product_invested[products], minlength=len(client_ids))
+            client_risk_invested = np.bincount(client_index, weights=product_risk_invested[products], minlength=len(client_ids))
+
+            # Name of each client, taken from its first product row
+            first_product = np.full(len(client_ids), len(products), dtype=np.int64)
+            np.minimum.at(first_product, client_index, np.arange(len(products)))
+
+            self._client_risks = [
+                {
+                    "client_id": int(client_ids[i]),
+                    "client_name": self.client_names[products[first_product[i]]],
+                    "risk_score": round(float(client_risk_invested[i] / client_invested[i]), 2),
+                    "total_investment": float(client_invested[i])
+                }
+                for i in np.flatnonzero(client_invested > 0)
+            ]
+        return self._client_risks
+
+    def risk_differences(self) -> List[Dict]:
+        """
+        Target vs actual risk per active product, largest difference first.
+
+        Only active portfolio funds count. Target risk is weighted by target_weighting and
+        actual risk by latest valuation; products without both are left out.
+        """
+        if self._risk_differences is None:
+            active = self.fund_active.astype(np.float64)
+            valued = (self.fund_active & self.has_valuation).astype(np.float64)
+
+            fund_count = self.portfolio_sums(active)[self.product_portfolio]
+            valued_count = self.portfolio_sums(valued)[self.product_portfolio]
+            target_weight = self.portfolio_sums(self.target_weighting * active)[self.product_portfolio]
+            target_risk_weight = self.portfolio_sums(self.risk * self.target_weighting * active)[self.product_portfolio]
+            valuation = self.portfolio_sums(self.valuation * valued)[self.product_portfolio]
+            valuation_risk = self.portfolio_sums(self.risk * self.valuation * valued)[self.product_portfolio]
+
+            comparable = (fund_count > 0) & (target_weight > 0) & (valuation > 0)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                target_risk = np.round(target_risk_weight / target_weight, 2)
+                actual_risk = np.round(valuation_risk / valuation, 2)
+                difference = np.round(np.abs(valuation_risk / valuation - target_risk_weight / target_weight), 2)
+
+            products = np.flatnonzero(comparable)
+            products = products[np.argsort(-difference[products], kind="stable")]
+
+            self._risk_differences = [
+                {
+                    "product_id": int(self.product_ids[i]),
+                    "product_name": self.product_names[i],
+                    "client_name": self.client_names[i],
+                    "target_risk": float(target_risk[i]),
+                    "actual_risk": float(actual_risk[i]),
+                    "risk_difference": float(difference[i]),
+                    "fund_count": int(fund_count[i]),
+                    "funds_with_valuations": int(valued_count[i])
+                }
+                for i in products
+            ]
+        return self._risk_differences
+
+
+_risk_cache = {
+    'snapshot': None,
+    'version': None,
+    'timestamp': None
+}
+_risk_cache_lock = asyncio.Lock()
+
+
+async def load_risk_snapshot(db) -> RiskSnapshot:
+    """Fetch products and portfolio funds and build a fresh RiskSnapshot."""
+    start_time = time.time()
+    products = await db.fetch(PRODUCTS_SQL)
+    funds = await db.fetch(PORTFOLIO_FUNDS_SQL) if products else []
+    snapshot = RiskSnapshot(products, funds)
+    logger.info(f"📊 Risk snapshot loaded: {len(products)} products, {len(funds)} portfolio funds in {time.time() - start_time:.2f}s")
+    return snapshot
+
+
+async def get_risk_snapshot(db) -> RiskSnapshot:
+    """
+    Return the cached RiskSnapshot, reloading it when the data version changed or it expired.
+
+    A snapshot loaded through a replica right after a write is returned but not cached.
+    """
+    async with _risk_cache_lock:
+        version = get_data_version(*RISK_DATA_DOMAINS)
+        cacheable = safe_to_cache(*RISK_DATA_DOMAINS)
+        current_time = time.time()
+        if (_risk_cache['snapshot'] is not None and
+            _risk_cache['version'] == version and
+            (current_time - _risk_cache['timestamp']) < RISK_CACHE_SECONDS):
+            return _risk_cache['snapshot']
+
+        snapshot = await load_risk_snapshot(db)
+        if cacheable:
+            _risk_cache['snapshot'] = snapshot
+            _risk_cache['version'] = version
+            _risk_cache['timestamp'] = current_time
+        return snapshot
@@ -0,0 +1,108 @@
+"""
+In-process data versions for analytics caches
+
+Analytics endpoints that cache a computed result store it together with the
+version of every data domain it was built from. A successful write to a
+resource bumps the versions of the domains that resource changes, so the
+next read sees a different version and recomputes instead of serving a stale
+result. Versions live in this process, which matches the single Uvicorn
+worker main.py starts; caches keep a TTL as a backstop for changes made
+outside the API (scripts, SQL consoles).
+
+Reads that fill these caches may come from the read replica (get_read_db), which
+can lag the primary by up to REPLICA_MAX_LAG_SECONDS. A result read that soon
+after a write may not include it, so it must not be cached under the new
+version (safe_to_cache).
+"""
+
+import logging
+import time
+from typing import Dict, Tuple
+
+from app.db.database import DATABASE_READ_URL, REPLICA_MAX_LAG_SECONDS
+
+logger = logging.getLogger(__name__)
+
+CLIENTS = "clients"
+PRODUCTS = "products"
+PORTFOLIO_FUNDS = "portfolio_funds"
+FUNDS = "funds"
+VALUATIONS = "valuations"
+
+# API resource (first path segment after /api) -> data domains a successful write to it changes.
+# Deletes cascade, so a resource also lists the domains of the rows it removes with it.
+RESOURCE_DOMAINS: Dict[str, Tuple[str, ...]] = {
+    "client_groups": (CLIENTS, PRODUCTS, PORTFOLIO_FUNDS, VALUATIONS),  # includes DELETE /client_groups/{id}/products
+    "client_group_versions": (CLIENTS,),
+    "client_products": (PRODUCTS, PORTFOLIO_FUNDS, VALUATIONS),
+    "portfolios": (PORTFOLIO_FUNDS, VALUATIONS),
+    "available_portfolios": (PORTFOLIO_FUNDS,),
+    "portfolio_funds": (PORTFOLIO_FUNDS, VALUATIONS),
+    "funds": (FUNDS,),
+    "fund_valuations": (VALUATIONS,),
+    "holding_activity_logs": (VALUATIONS,),
+}
+
+_versions: Dict[str, int] = {}
+# Domain -> monotonic time of its last write
+_changed_at: Dict[str, float] = {}
+
+
+def bump_data_version(*domains: str) -> None:
+    """Mark the given data domains as changed."""
+    now = time.monotonic()
+    for domain in domains:
+        _versions[domain] = _versions.get(domain, 0) + 1
+        _changed_at[domain] = now
+
+
+def get_data_version(*domains: str) -> Tuple[int, ...]:
+    """Current version of each domain, in the order given; compare with == to detect changes."""
+    return tuple(_versions.get(domain, 0) for domain in domains)
+
+
+def safe_to_cache(*domains: str) -> bool:
+    """
+    True if a result read now from get_read_db may be cached under the current version.
+
+    False for REPLICA_MAX_LAG_SECONDS after a write to any of the domains when a replica is
+    configured: the replica may not have replayed the write yet. Check it together with
+    get_data_version, before the read.
+    """
+    if not DATABASE_READ_URL:
+        return True
+    changed_at = [_changed_at[domain] for domain in domains if domain in _changed_at]
+    return not changed_at or time.monotonic() - max(changed_at) >= REPLICA_MAX_LAG_SECONDS
+
+
+class DataVersionMiddleware:
+    """
+    Pure ASGI middleware that bumps data versions after successful writes.
+
+    POST/PUT/PATCH/DELETE requests under /api that finish with a status below
+    400 bump the domains RESOURCE_DOMAINS lists for their resource.
+    """
+
+    WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in self.WRITE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        segments = scope["path"].split("/")
+        domains = RESOURCE_DOMAINS.get(segments[2]) if len(segments) > 2 and segments[1] == "api" else None
+        if not domains:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_and_track(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                bump_data_version(*domains)
+                logger.debug(f"🔄 {scope['method']} {scope['path']} changed {', '.join(domains)} data")
+            await send(message)
+
+        await self.app(scope, receive, send_and_track)
@@ -1,16 +1,108 @@
 """
 Backend Transaction Coordinator
 Handles database transactions with proper ordering to prevent IRR calculation race conditions
+
+All writes for one save run as set-based batch phases inside a single transaction:
+    1. Activities      - one multi-row upsert into holding_activity_log
+    2. Valuations      - one multi-row upsert into portfolio_fund_valuations
+    3. Fund lookup     - one fund -> portfolio query for every affected fund
+    4. IRR recompute   - one cascade batch per affected portfolio, covering all affected dates
+Activities are always written before valuations, and IRRs are only recomputed once both are in place.
 """
 
 import logging
 from typing import List, Dict, Any, Optional, Tuple
-from datetime import datetime
-from app.db.database import get_db
-from app.api.routes.portfolio_funds import calculate_single_portfolio_fund_irr
+from datetime import datetime, date, timezone
+from app.services.irr_cascade_service import IRRCascadeService
 
 logger = logging.getLogger(__name__)
 
+# Columns accepted in activity and valuation dicts; other keys are ignored
+ACTIVITY_COLUMNS = ('portfolio_fund_id', 'product_id', 'activity_type', 'amount', 'activity_timestamp')
+VALUATION_COLUMNS = ('portfolio_fund_id', 'valuation_date', 'valuation')
+
+# Rows with an id update that activity (omitted keys keep their current value); rows without one are inserted
+UPSERT_ACTIVITIES_SQL = """
+    WITH input AS (
+        SELECT *
+        FROM unnest($1::bigint[], $2::bigint[], $3::bigint[], $4::text[], $5::text[], $6::timestamptz[])
+            WITH ORDINALITY AS i(id, portfolio_fund_id, product_id, activity_type, amount, activity_timestamp, ord)
+    ),
+    updated AS (
+        UPDATE holding_activity_log h
+        SET portfolio_fund_id = COALESCE(i.portfolio_fund_id, h.portfolio_fund_id),
+            product_id = COALESCE(i.product_id, h.product_id),
+            activity_type = COALESCE(i.activity_type, h.activity_type),
+            amount = COALESCE(i.amount::numeric, h.amount),
+            activity_timestamp = COALESCE(i.activity_timestamp, h.activity_timestamp)
+        FROM input i
+        WHERE i.id IS NOT NULL AND h.id = i.id
+        RETURNING h.id
+    ),
+    inserted AS (
+        INSERT INTO holding_activity_log (portfolio_fund_id, product_id, activity_type, amount, activity_timestamp)
+        SELECT portfolio_fund_id, product_id, activity_type, amount::numeric, activity_timestamp
+        FROM input
+        WHERE id IS NULL
+        ORDER BY ord
+        RETURNING id
+    )
+    SELECT (SELECT count(*) FROM updated) AS updated, (SELECT count(*) FROM inserted) AS inserted
+"""
+
+# portfolio_fund_valuations has no unique key on (portfolio_fund_id, valuation_date), so the
+# upsert updates matching rows and inserts the rest in one statement instead of using ON CONFLICT
+UPSERT_VALUATIONS_SQL = """
+    WITH input AS (
+        SELECT *
+        FROM unnest($1::bigint[], $2::date[], $3::text[])
+            WITH ORDINALITY AS i(portfolio_fund_id, valuation_date, valuation, ord)
+    ),
+    updated AS (
+        UPDATE portfolio_fund_valuations v
+        SET valuation = i.valuation::numeric
+        FROM input i
+        WHERE v.portfolio_fund_id = i.portfolio_fund_id
+          AND v.valuation_date = i.valuation_date
+        RETURNING v.portfolio_fund_id, v.valuation_date
+    ),
+    inserted AS (
+        INSERT INTO portfolio_fund_valuations (portfolio_fund_id, valuation_date, valuation)
+        SELECT i.portfolio_fund_id, i.valuation_date, i.valuation::numeric
+        FROM input i
+        WHERE NOT EXISTS (
+            SELECT 1 FROM updated u
+            WHERE u.portfolio_fund_id = i.portfolio_fund_id
+              AND u.valuation_date = i.valuation_date
+        )
+        ORDER BY i.ord
+        RETURNING id
+    )
+    SELECT (SELECT count(DISTINCT (portfolio_fund_id, valuation_date)) FROM updated) AS updated,
+           (SELECT count(*) FROM inserted) AS inserted
+"""
+
+def _date_key(value: Any) -> Optional[str]:
+    """Normalise a date, datetime or ISO string to 'YYYY-MM-DD'."""
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value).split('T')[0]
+
+def _activity_timestamp(value: Any) -> Optional[datetime]:
+    """Bind an activity date as midnight UTC, as the create endpoint stores it, whatever the session time zone."""
+    activity_date = _date_key(value)
+    if activity_date is None:
+        return None
+    return datetime.combine(date.fromisoformat(activity_date), datetime.min.time()).replace(tzinfo=timezone.utc)
+
+def _as_text(value: Any) -> Optional[str]:
+    """Bind numeric values as text so Postgres parses them exactly."""
+    return None if value is None else str(value)
+
 class TransactionCoordinator:
     """
     Coordinates database transactions to ensure proper ordering of activities and valuations
@@ -28,8 +120,8 @@ class TransactionCoordinator:
         Save activities and valuations in proper order with transaction safety
         
         Args:
-            activities: List of activity data to save
-            valuations: List of valuation data to save
+            activities: List of activity data to save (include 'id' to update an existing activity)
+            valuations: List of valuation data to save (upserted on portfolio_fund_id + valuation_date)
             
         Returns:
             Dictionary with transaction results
@@ -47,229 +139,131 @@ class TransactionCoordinator:
         try:
             logger.info(f"🔄 Backend Transaction: Starting ordered save of {len(activities)} activities and {len(valuations)} valuations")
             
-            # Phase 1: Save all activities first
-            if activities:
-                logger.info("📥 Phase 1: Saving activities...")
-                for activity in activities:
-                    await self._save_activity(activity)
-                    result["activities_saved"] += 1
-                logger.info(f"✅ Phase 1 Complete: {result['activities_saved']} activities saved")
-            
-            # Phase 2: Save valuations after activities
-            if valuations:
-                logger.info("💰 Phase 2: Saving valuations...")
-                for valuation in valuations:
-                    await self._save_valuation(valuation)
-                    result["valuations_saved"] += 1
-                logger.info(f"✅ Phase 2 Complete: {result['valuations_saved']} valuations saved")
-            
-            # Phase 3: Trigger IRR recalculation for affected funds (both fund-level and portfolio-level)
-            affected_funds = self._get_affected_funds(activities, valuations)
-            affected_portfolios = set()  # Track portfolios that need IRR recalculation
-            
-            if affected_funds:
-                logger.info("🧮 Phase 3: Triggering fund-level IRR recalculations...")
-                for fund_id, dates in affected_funds.items():
-                    # Get portfolio_id for this fund to track portfolio-level recalculation
-                    fund_info = await self.db.fetchrow(
-                        "SELECT portfolio_id FROM portfolio_funds WHERE id = $1", 
-                        fund_id
-                    )
-                    
-                    if fund_info:
-                        portfolio_id = fund_info["portfolio_id"]
-                        affected_portfolios.add(portfolio_id)
-                    
-                    for date in dates:
-                        await self._recalculate_fund_irr(fund_id, date)
-                        result["irr_calculations"] += 1
-                logger.info(f"✅ Phase 3 Complete: {result['irr_calculations']} fund IRR calculations triggered")
+            async with self.db.transaction():
+                # Phase 1: Save all activities first
+                if activities:
+                    logger.info("📥 Phase 1: Saving activities...")
+                    result["activities_saved"] = await self._upsert_activities(activities)
+                    logger.info(f"✅ Phase 1 Complete: {result['activities_saved']} activities saved")
                 
-                # Phase 4: Trigger portfolio-level IRR recalculation for affected portfolios
-                if affected_portfolios:
-                    logger.info("🏢 Phase 4: Triggering portfolio-level IRR recalculations...")
-                    for portfolio_id in affected_portfolios:
-                        # Find the earliest date affected for this portfolio
-                        earliest_date = await self._get_earliest_date_for_portfolio(portfolio_id, affected_funds)
-                        if earliest_date:
-                            portfolio_irr_count = await self._recalculate_portfolio_irr(portfolio_id, earliest_date)
-                            result["portfolio_irr_recalculations"] += portfolio_irr_count
-                    logger.info(f"✅ Phase 4 Complete: {result['portfolio_irr_recalculations']} portfolio IRR recalculations triggered")
+                # Phase 2: Save valuations after activities
+                if valuations:
+                    logger.info("💰 Phase 2: Saving valuations...")
+                    result["valuations_saved"] = await self._upsert_valuations(valuations)
+                    logger.info(f"✅ Phase 2 Complete: {result['valuations_saved']} valuations saved")
+                
+                # Phase 3: Resolve the portfolio of every affected fund in one query
+                affected_funds = self._get_affected_funds(activities, valuations)
+                if affected_funds:
+                    logger.info("🔎 Phase 3: Resolving affected portfolios...")
+                    affected_portfolios = await self._get_affected_portfolios(affected_funds)
+                    logger.info(f"✅ Phase 3 Complete: {len(affected_funds)} funds in {len(affected_portfolios)} portfolios")
+                    
+                    # Phase 4: One batched fund + portfolio IRR recompute per portfolio, oldest date first.
+                    # Each takes its portfolio's advisory lock until commit; ascending portfolio order keeps
+                    # two bulk saves sharing portfolios from locking them in opposite orders
+                    if affected_portfolios:
+                        logger.info("🧮 Phase 4: Recalculating fund and portfolio IRRs...")
+                        for portfolio_id, dates in sorted(affected_portfolios.items()):
+                            fund_count, portfolio_count = await self._recalculate_portfolio_irrs(portfolio_id, dates, result["errors"])
+                            result["irr_calculations"] += fund_count
+                            result["portfolio_irr_recalculations"] += portfolio_count
+                        logger.info(f"✅ Phase 4 Complete: {result['irr_calculations']} fund IRRs and {result['portfolio_irr_recalculations']} portfolio IRRs recalculated")
             
             logger.info("🎉 Backend Transaction: All phases completed successfully")
             
         except Exception as e:
             logger.error(f"❌ Backend Transaction Error: {str(e)}")
             result["success"] = False
+            result["activities_saved"] = 0
+            result["valuations_saved"] = 0
             result["errors"].append(str(e))
             
         return result
     
-    async def _save_activity(self, activity_data: Dict[str, Any]) -> None:
-        """Save a single activity to the database"""
-        try:
-            # Insert or update activity
-            if activity_data.get('id'):
-                # Update existing activity - Build dynamic update query
-                set_clauses = []
-                params = []
-                param_count = 1
-                
-                for key, value in activity_data.items():
-                    if key != 'id':  # Skip the id field for SET clause
-                        set_clauses.append(f"{key} = ${param_count}")
-                        params.append(value)
-                        param_count += 1
-                
-                params.append(activity_data['id'])  # Add id for WHERE clause
-                
-                query = f"UPDATE holding_activity_log SET {', '.join(set_clauses)} WHERE id = ${param_count} RETURNING *"
-                result = await self.db.fetchrow(query, *params)
-            else:
-                # Insert new activity - Build dynamic insert query
-                columns = list(activity_data.keys())
-                values = list(activity_data.values())
-                placeholders = [f"${i+1}" for i in range(len(values))]
-                
-                query = f"INSERT INTO holding_activity_log ({', '.join(columns)}) VALUES ({', '.join(placeholders)}) RETURNING *"
-                result = await self.db.fetchrow(query, *values)
-            
-            if not result:
-                raise Exception(f"Failed to save activity: {activity_data}")
-                
-            logger.info(f"📥 Activity saved: {activity_data['activity_type']} for fund {activity_data['portfolio_fund_id']}")
-            
-        except Exception as e:
-            logger.error(f"❌ Failed to save activity: {str(e)}")
-            raise
-    
-    async def _save_valuation(self, valuation_data: Dict[str, Any]) -> None:
-        """Save a single valuation to the database"""
-        try:
-            # Check for existing valuation
-            existing_valuation = await self.db.fetchrow(
-                "SELECT * FROM portfolio_fund_valuations WHERE portfolio_fund_id = $1 AND valuation_date = $2",
-                valuation_data['portfolio_fund_id'],
-                valuation_data['valuation_date']
-            )
-            
-            if existing_valuation:
-                # Update existing valuation - Build dynamic update query
-                set_clauses = []
-                params = []
-                param_count = 1
-                
-                for key, value in valuation_data.items():
-                    set_clauses.append(f"{key} = ${param_count}")
-                    params.append(value)
-                    param_count += 1
-                
-                params.append(existing_valuation['id'])  # Add id for WHERE clause
-                
-                query = f"UPDATE portfolio_fund_valuations SET {', '.join(set_clauses)} WHERE id = ${param_count} RETURNING *"
-                result = await self.db.fetchrow(query, *params)
-            else:
-                # Insert new valuation - Build dynamic insert query
-                columns = list(valuation_data.keys())
-                values = list(valuation_data.values())
-                placeholders = [f"${i+1}" for i in range(len(values))]
-                
-                query = f"INSERT INTO portfolio_fund_valuations ({', '.join(columns)}) VALUES ({', '.join(placeholders)}) RETURNING *"
-                result = await self.db.fetchrow(query, *values)
-            
-            if not result:
-                raise Exception(f"Failed to save valuation: {valuation_data}")
-                
-            logger.info(f"💰 Valuation saved: £{valuation_data['valuation']} for fund {valuation_data['portfolio_fund_id']} on {valuation_data['valuation_date']}")
-            
-        except Exception as e:
-            logger.error(f"❌ Failed to save valuation: {str(e)}")
-            raise
+    async def _upsert_activities(self, activities: List[Dict[str, Any]]) -> int:
+        """Insert new and update existing activities with a single statement"""
+        # A later entry for the same activity id replaces an earlier one, as sequential saves would
+        rows: Dict[Any, Dict[str, Any]] = {}
+        for index, activity in enumerate(activities):
+            rows[activity.get('id') or ('new', index)] = activity
+        
+        ids = [activity.get('id') for activity in rows.values()]
+        record = await self.db.fetchrow(
+            UPSERT_ACTIVITIES_SQL,
+            ids,
+            [activity.get('portfolio_fund_id') for activity in rows.values()],
+            [activity.get('product_id') for activity in rows.values()],
+            [activity.get('activity_type') for activity in rows.values()],
+            [_as_text(activity.get('amount')) for activity in rows.values()],
+            [_activity_timestamp(activity.get('activity_timestamp')) for activity in rows.values()]
+        )
+        
+        expected_updates = sum(1 for activity_id in ids if activity_id)
+        if record["updated"] != expected_updates:
+            raise Exception(f"Failed to save activities: {expected_updates - record['updated']} of {expected_updates} activities to update were not found")
+        
+        return record["updated"] + record["inserted"]
     
-    async def _recalculate_fund_irr(self, fund_id: int, date: str) -> None:
-        """Trigger IRR recalculation for a specific fund and date"""
-        try:
-            logger.info(f"🧮 Recalculating fund IRR for fund {fund_id} on {date}")
-            
-            # Use the existing IRR calculation function
-            irr_result = await calculate_single_portfolio_fund_irr(
-                portfolio_fund_id=fund_id,
-                irr_date=date,
-                db=self.db
-            )
-            
-            if irr_result.get("success"):
-                logger.info(f"✅ Fund IRR recalculated successfully for fund {fund_id}: {irr_result.get('irr_percentage', 0)}%")
-            else:
-                logger.warning(f"⚠️ Fund IRR recalculation failed for fund {fund_id}: {irr_result.get('error', 'Unknown error')}")
-                
-        except Exception as e:
-            logger.error(f"❌ Fund IRR recalculation failed for fund {fund_id}: {str(e)}")
-            # Don't raise - IRR calculation failure shouldn't fail the entire transaction
-
-    async def _recalculate_portfolio_irr(self, portfolio_id: int, start_date: str) -> int:
-        """
-        Trigger portfolio-level IRR recalculation from a start date onwards.
-        Uses the same logic as in holding_activity_logs.py
+    async def _upsert_valuations(self, valuations: List[Dict[str, Any]]) -> int:
+        """Insert new and update existing fund valuations with a single statement"""
+        # A later valuation for the same fund and date replaces an earlier one
+        rows: Dict[Tuple[int, str], Dict[str, Any]] = {}
+        for valuation in valuations:
+            rows[(valuation['portfolio_fund_id'], _date_key(valuation['valuation_date']))] = valuation
         
-        Args:
-            portfolio_id: The portfolio ID
-            start_date: Only recalculate portfolio IRR values from this date onwards (YYYY-MM-DD format)
-            
-        Returns:
-            The number of portfolio IRR values processed (recalculated + created)
-        """
-        try:
-            logger.info(f"🏢 Recalculating portfolio-level IRR values for portfolio {portfolio_id} from {start_date} onwards")
-            
-            # Import the function from holding_activity_logs to avoid code duplication
-            from app.api.routes.holding_activity_logs import recalculate_portfolio_irr_values_from_date
-            
-            # Call the existing portfolio IRR recalculation function
-            portfolio_irr_count = await recalculate_portfolio_irr_values_from_date(
-                portfolio_id, start_date, self.db
-            )
-            
-            logger.info(f"✅ Portfolio IRR recalculation completed for portfolio {portfolio_id}: {portfolio_irr_count} values processed")
-            return portfolio_irr_count
-            
-        except Exception as e:
-            logger.error(f"❌ Portfolio IRR recalculation failed for portfolio {portfolio_id}: {str(e)}")
-            # Don't raise - IRR calculation failure shouldn't fail the entire transaction
-            return 0
-
-    async def _get_earliest_date_for_portfolio(self, portfolio_id: int, affected_funds: Dict[int, List[str]]) -> Optional[str]:
+        record = await self.db.fetchrow(
+            UPSERT_VALUATIONS_SQL,
+            [fund_id for fund_id, _ in rows.keys()],
+            [date.fromisoformat(valuation_date) for _, valuation_date in rows.keys()],
+            [_as_text(valuation.get('valuation')) for valuation in rows.values()]
+        )
+        
+        return record["updated"] + record["inserted"]
+    
+    async def _get_affected_portfolios(self, affected_funds: Dict[int, List[str]]) -> Dict[int, List[str]]:
         """
-        Find the earliest date that affects a specific portfolio.
+        Map affected funds to their portfolios in one query.
         
-        Args:
-            portfolio_id: The portfolio ID to find dates for
-            affected_funds: Dictionary mapping fund_id to list of dates
-            
         Returns:
-            The earliest date string (YYYY-MM-DD format) or None if no dates found
+            Dictionary mapping portfolio_id to the sorted list of dates affected in that portfolio
         """
-        earliest_date = None
-        
-        # Get all funds for this portfolio
-        portfolio_funds = await self.db.fetch(
-            "SELECT id FROM portfolio_funds WHERE portfolio_id = $1",
-            portfolio_id
+        fund_rows = await self.db.fetch(
+            "SELECT id, portfolio_id FROM portfolio_funds WHERE id = ANY($1::int[])",
+            list(affected_funds.keys())
         )
         
-        if not portfolio_funds:
-            return None
+        affected_portfolios: Dict[int, set] = {}
+        for row in fund_rows:
+            affected_portfolios.setdefault(row["portfolio_id"], set()).update(affected_funds[row["id"]])
         
-        portfolio_fund_ids = [pf["id"] for pf in portfolio_funds]
+        return {portfolio_id: sorted(dates) for portfolio_id, dates in affected_portfolios.items()}
+    
+    async def _recalculate_portfolio_irrs(self, portfolio_id: int, dates: List[str], errors: List[str]) -> Tuple[int, int]:
+        """
+        Recalculate fund and portfolio IRRs for every valuation date from the earliest affected date.
         
-        # Find the earliest date from affected funds that belong to this portfolio
-        for fund_id, dates in affected_funds.items():
-            if fund_id in portfolio_fund_ids:
-                for date in dates:
-                    if earliest_date is None or date < earliest_date:
-                        earliest_date = date
+        Runs in a savepoint so an IRR failure is rolled back on its own and does not
+        fail the saved activities and valuations.
         
-        return earliest_date
+        Returns:
+            Tuple of (fund IRRs recalculated, portfolio IRRs recalculated)
+        """
+        try:
+            async with self.db.transaction():
+                cascade_result = await IRRCascadeService(self.db).handle_activity_changes_batch(portfolio_id, dates)
+                # The cascade logs and swallows SQL errors; make sure the savepoint is still usable
+                await self.db.execute("SELECT 1")
+                if not cascade_result.get("success"):
+                    raise Exception(cascade_result.get("error", "Unknown error"))
+            
+            return cascade_result.get("fund_irrs_recalculated", 0), cascade_result.get("portfolio_irrs_recalculated", 0)
+            
+        except Exception as e:
+            logger.error(f"❌ IRR recalculation failed for portfolio {portfolio_id}: {str(e)}")
+            errors.append(f"IRR recalculation failed for portfolio {portfolio_id}: {str(e)}")
+            # Don't raise - IRR calculation failure shouldn't fail the entire transaction
+            return 0, 0
     
     def _get_affected_funds(self, activities: List[Dict[str, Any]], valuations: List[Dict[str, Any]]) -> Dict[int, List[str]]:
         """
@@ -283,7 +277,7 @@ class TransactionCoordinator:
         # Process activities
         for activity in activities:
             fund_id = activity.get('portfolio_fund_id')
-            date = activity.get('activity_timestamp', '').split('T')[0]
+            date = _date_key(activity.get('activity_timestamp'))
             
             if fund_id and date:
                 if fund_id not in affected_funds:
@@ -294,7 +288,7 @@ class TransactionCoordinator:
         # Process valuations
         for valuation in valuations:
             fund_id = valuation.get('portfolio_fund_id')
-            date = valuation.get('valuation_date', '').split('T')[0]
+            date = _date_key(valuation.get('valuation_date'))
             
             if fund_id and date:
                 if fund_id not in affected_funds:
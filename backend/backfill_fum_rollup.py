@@ -0,0 +1,129 @@
+"""
+Backfill script to populate fum_daily_rollup for historical dates.
+
+This script:
+1. Works out the date range (default: earliest fund valuation to today)
+2. Recomputes the rollup for that range in chunks of --chunk-days days, oldest first
+3. Each chunk is one transaction, so an interrupted run can simply be restarted
+
+Usage:
+    python backfill_fum_rollup.py [--start-date YYYY-MM-DD] [--end-date YYYY-MM-DD] [--chunk-days N] [--dry-run]
+
+Options:
+    --start-date    First date to compute (default: earliest valuation_date)
+    --end-date      Last date to compute (default: today)
+    --chunk-days    Days per transaction (default: FUM_ROLLUP_CHUNK_DAYS, 31)
+    --dry-run       Show the range and chunk count without writing anything
+"""
+
+import asyncio
+import asyncpg
+import os
+import sys
+from datetime import date
+from typing import Optional
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.db.database import DATABASE_URL
+from app.services.fum_rollup import FUM_ROLLUP_CHUNK_DAYS, backfill_fum_rollup
+
+
+class FumRollupBackfill:
+    def __init__(self, start_date: Optional[date] = None, end_date: Optional[date] = None,
+                 chunk_days: int = FUM_ROLLUP_CHUNK_DAYS, dry_run: bool = False):
+        self.start_date = start_date
+        self.end_date = end_date or date.today()
+        self.chunk_days = chunk_days
+        self.dry_run = dry_run
+        self.db = None
+
+    async def connect(self):
+        """Connect to the database"""
+        self.db = await asyncpg.connect(DATABASE_URL)
+        print(f"[OK] Connected to database")
+
+    async def disconnect(self):
+        """Disconnect from the database"""
+        if self.db:
+            await self.db.close()
+            print(f"[OK] Disconnected from database")
+
+    async def run(self):
+        """Main backfill process"""
+        try:
+            await self.connect()
+
+            if self.start_date is None:
+                self.start_date = await self.db.fetchval("SELECT min(valuation_date) FROM portfolio_fund_valuations")
+                if self.start_date is None:
+                    print("[OK] No valuations found, nothing to backfill")
+                    return
+
+            if self.start_date > self.end_date:
+                print(f"[ERROR] Start date {self.start_date} is after end date {self.end_date}")
+                return
+
+            days = (self.end_date - self.start_date).days + 1
+            chunks = -(-days // self.chunk_days)
+            print(f"[DATA] Range: {self.start_date} to {self.end_date} ({days} days, {chunks} chunks of up to {self.chunk_days} days)")
+
+            if self.dry_run:
+                print("\n[DRY RUN] No changes made")
+                return
+
+            rows_written = await backfill_fum_rollup(self.db, self.start_date, self.end_date, self.chunk_days)
+            print(f"\n[OK] BACKFILL COMPLETE - {rows_written} rollup rows written")
+
+        except Exception as e:
+            print(f"\n[ERROR] Fatal error: {str(e)}")
+            import traceback
+            traceback.print_exc()
+        finally:
+            await self.disconnect()
+
+
+async def main():
+    """Parse arguments and run the backfill"""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Backfill fum_daily_rollup for historical dates'
+    )
+    parser.add_argument(
+        '--start-date',
+        type=date.fromisoformat,
+        help='First date to compute (default: earliest valuation_date)'
+    )
+    parser.add_argument(
+        '--end-date',
+        type=date.fromisoformat,
+        help='Last date to compute (default: today)'
+    )
+    parser.add_argument(
+        '--chunk-days',
+        type=int,
+        default=FUM_ROLLUP_CHUNK_DAYS,
+        help='Days recomputed per transaction'
+    )
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='Show what would be done without making changes'
+    )
+
+    args = parser.parse_args()
+
+    backfill = FumRollupBackfill(
+        start_date=args.start_date,
+        end_date=args.end_date,
+        chunk_days=args.chunk_days,
+        dry_run=args.dry_run
+    )
+
+    await backfill.run()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
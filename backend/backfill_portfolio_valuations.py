@@ -3,16 +3,26 @@ Backfill script to populate orphaned portfolio IRR records with portfolio valuat
 
 This script:
 1. Finds all portfolio_irr_values records with NULL portfolio_valuation_id
-2. For each record, calculates the portfolio valuation by summing fund valuations on that date
-3. Creates or updates the portfolio_valuation record
-4. Links the portfolio_irr_value to the portfolio_valuation
+2. Calculates each portfolio valuation by summing fund valuations on that date
+3. Creates or updates the portfolio_valuation records
+4. Links the portfolio_irr_values to the portfolio_valuations
+
+The default set mode does steps 2-4 with two statements per chunk of portfolios:
+one INSERT ... SELECT SUM(...) GROUP BY portfolio_id, valuation_date upsert and one
+UPDATE ... FROM that links every orphaned IRR record in the chunk. Chunks are
+disjoint by portfolio and run in parallel on --workers connections, one
+transaction per chunk. The record mode keeps the original one-record-at-a-time
+walk for debugging a single portfolio.
 
 Usage:
-    python backfill_portfolio_valuations.py [--dry-run] [--limit N]
+    python backfill_portfolio_valuations.py [--dry-run] [--limit N] [--mode set|record] [--chunk-size N] [--workers N]
 
 Options:
-    --dry-run    Show what would be done without making changes
-    --limit N    Only process N records (useful for testing)
+    --dry-run     Show what would be done without making changes (a per-date diff in set mode)
+    --limit N     Only process N records (useful for testing)
+    --mode        set (default) or record
+    --chunk-size  Portfolios per chunk in set mode (default: 500)
+    --workers     Parallel chunks / connections in set mode (default: 4)
 """
 
 import asyncio
@@ -20,18 +30,105 @@ import asyncpg
 import os
 import sys
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from app.db.database import DATABASE_URL
+from app.db.database import DATABASE_URL, _init_connection
+
+
+# Orphaned IRR records of one chunk ($1 = portfolio ids, $2 = optional IRR record ids for --limit)
+# and the summed fund valuations for each of their (portfolio, date) pairs. A date without fund
+# valuations totals 0, as in record mode.
+ORPHAN_TOTALS_CTE = """
+    orphans AS (
+        SELECT id, portfolio_id, date
+        FROM portfolio_irr_values
+        WHERE portfolio_valuation_id IS NULL
+          AND portfolio_id = ANY($1::bigint[])
+          AND ($2::bigint[] IS NULL OR id = ANY($2::bigint[]))
+    ),
+    totals AS (
+        SELECT o.portfolio_id, o.date AS valuation_date,
+               COALESCE(SUM(pfv.valuation), 0) AS valuation,
+               count(pfv.id) AS fund_valuations
+        FROM (SELECT DISTINCT portfolio_id, date FROM orphans) o
+        LEFT JOIN portfolio_funds pf ON pf.portfolio_id = o.portfolio_id
+        LEFT JOIN portfolio_fund_valuations pfv
+               ON pfv.portfolio_fund_id = pf.id AND pfv.valuation_date = o.date
+        GROUP BY o.portfolio_id, o.date
+    )
+"""
+
+ORPHAN_PORTFOLIOS_SQL = """
+    SELECT DISTINCT portfolio_id
+    FROM portfolio_irr_values
+    WHERE portfolio_valuation_id IS NULL AND portfolio_id IS NOT NULL
+    ORDER BY portfolio_id
+"""
+
+LIMITED_ORPHANS_SQL = """
+    SELECT id, portfolio_id
+    FROM portfolio_irr_values
+    WHERE portfolio_valuation_id IS NULL AND portfolio_id IS NOT NULL
+    ORDER BY portfolio_id, date
+    LIMIT $1
+"""
+
+# One row per (portfolio, date): the new total next to the valuation it would replace
+VALUATION_DIFF_SQL = f"""
+    WITH {ORPHAN_TOTALS_CTE}
+    SELECT t.portfolio_id, t.valuation_date, t.valuation, t.fund_valuations,
+           pv.id AS valuation_id, pv.valuation AS current_valuation,
+           (SELECT count(*) FROM orphans o
+            WHERE o.portfolio_id = t.portfolio_id AND o.date = t.valuation_date) AS irr_records
+    FROM totals t
+    LEFT JOIN portfolio_valuations pv
+           ON pv.portfolio_id = t.portfolio_id AND pv.valuation_date = t.valuation_date
+    ORDER BY t.portfolio_id, t.valuation_date
+"""
+
+# Upsert on the unique (portfolio_id, valuation_date) index; xmax = 0 marks the inserted rows
+UPSERT_VALUATIONS_SQL = f"""
+    WITH {ORPHAN_TOTALS_CTE},
+    upserted AS (
+        INSERT INTO portfolio_valuations (portfolio_id, valuation_date, valuation)
+        SELECT portfolio_id, valuation_date, valuation FROM totals
+        ON CONFLICT (portfolio_id, valuation_date) DO UPDATE SET valuation = EXCLUDED.valuation
+        RETURNING (xmax = 0) AS inserted
+    )
+    SELECT
+        (SELECT count(*) FROM orphans) AS orphaned_records,
+        (SELECT count(*) FROM orphans o
+         JOIN totals t ON t.portfolio_id = o.portfolio_id AND t.valuation_date = o.date
+         WHERE t.valuation = 0) AS zero_valuations,
+        (SELECT count(*) FROM upserted WHERE NOT inserted) AS valuations_updated,
+        (SELECT count(*) FROM upserted WHERE inserted) AS valuations_created
+"""
+
+# Links every orphaned IRR record of the chunk to the valuation on its date
+LINK_IRRS_SQL = """
+    UPDATE portfolio_irr_values irr
+    SET portfolio_valuation_id = pv.id
+    FROM portfolio_valuations pv
+    WHERE irr.portfolio_valuation_id IS NULL
+      AND irr.portfolio_id = ANY($1::bigint[])
+      AND pv.portfolio_id = irr.portfolio_id
+      AND pv.valuation_date = irr.date
+      AND ($2::bigint[] IS NULL OR irr.id = ANY($2::bigint[]))
+"""
 
 
 class PortfolioValuationBackfill:
-    def __init__(self, dry_run: bool = False, limit: Optional[int] = None):
+    def __init__(self, dry_run: bool = False, limit: Optional[int] = None, mode: str = 'set',
+                 chunk_size: int = 500, workers: int = 4):
         self.dry_run = dry_run
         self.limit = limit
+        self.mode = mode
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.pool = None
         self.db = None
         self.stats = {
             'orphaned_records': 0,
@@ -43,14 +140,16 @@ class PortfolioValuationBackfill:
         }
 
     async def connect(self):
-        """Connect to the database"""
-        self.db = await asyncpg.connect(DATABASE_URL)
+        """Open one connection per worker (record mode uses a single one)"""
+        self.pool = await asyncpg.create_pool(
+            DATABASE_URL, min_size=1, max_size=max(self.workers, 1), init=_init_connection
+        )
         print(f"[OK] Connected to database")
 
     async def disconnect(self):
-        """Disconnect from the database"""
-        if self.db:
-            await self.db.close()
+        """Close the connection pool"""
+        if self.pool:
+            await self.pool.close()
             print(f"[OK] Disconnected from database")
 
     async def find_orphaned_records(self):
@@ -131,7 +230,8 @@ class PortfolioValuationBackfill:
             # Create new record
             if not self.dry_run:
                 new_record = await self.db.fetchrow(
-                    "INSERT INTO portfolio_valuations (portfolio_id, valuation_date, valuation) VALUES ($1, $2, $3) RETURNING id",
+                    "INSERT INTO portfolio_valuations (portfolio_id, valuation_date, valuation) VALUES ($1, $2, $3) "
+                    "ON CONFLICT (portfolio_id, valuation_date) DO UPDATE SET valuation = EXCLUDED.valuation RETURNING id",
                     portfolio_id, date_obj, valuation
                 )
                 valuation_id = new_record['id']
@@ -183,6 +283,101 @@ class PortfolioValuationBackfill:
             print(f"  [ERROR] Error processing record: {str(e)}")
             self.stats['errors'] += 1
 
+    async def run_record_by_record(self) -> bool:
+        """Process the orphaned records one at a time on a single connection"""
+        async with self.pool.acquire() as db:
+            self.db = db
+
+            # Find orphaned records
+            orphaned_records = await self.find_orphaned_records()
+
+            # Process each record
+            for i, record in enumerate(orphaned_records, 1):
+                print(f"\n{'-' * 80}")
+                print(f"Processing record {i} of {len(orphaned_records)}")
+                await self.process_orphaned_record(record)
+
+        return bool(orphaned_records)
+
+    async def find_orphaned_chunks(self) -> List[tuple]:
+        """Split the portfolios with orphaned records into (portfolio_ids, irr_ids) chunks"""
+        async with self.pool.acquire() as db:
+            if self.limit:
+                # --limit picks the same first N records as record mode and restricts each chunk to them
+                records = await db.fetch(LIMITED_ORPHANS_SQL, self.limit)
+                irr_ids = [r['id'] for r in records]
+                portfolio_ids = sorted({r['portfolio_id'] for r in records})
+            else:
+                irr_ids = None
+                portfolio_ids = [r['portfolio_id'] for r in await db.fetch(ORPHAN_PORTFOLIOS_SQL)]
+
+        chunks = [
+            (portfolio_ids[i:i + self.chunk_size], irr_ids)
+            for i in range(0, len(portfolio_ids), self.chunk_size)
+        ]
+        print(f"\n[DATA] Found orphaned portfolio IRR records in {len(portfolio_ids)} portfolios ({len(chunks)} chunks of up to {self.chunk_size})")
+        return chunks
+
+    async def diff_chunk(self, db, portfolio_ids: List[int], irr_ids: Optional[List[int]]) -> List[str]:
+        """Describe the valuations a chunk would create or update, without writing"""
+        lines = []
+        for row in await db.fetch(VALUATION_DIFF_SQL, portfolio_ids, irr_ids):
+            links = f"links {row['irr_records']} IRR record(s)"
+            source = f"from {row['fund_valuations']} fund valuations"
+            if row['valuation_id'] is None:
+                lines.append(f"  [CREATE] Portfolio {row['portfolio_id']} {row['valuation_date']}: "
+                             f"£{row['valuation']:,.2f} {source}, {links}")
+                self.stats['valuations_created'] += 1
+            else:
+                change = ("unchanged" if row['current_valuation'] == row['valuation']
+                          else f"£{row['current_valuation'] or 0:,.2f} -> £{row['valuation']:,.2f}")
+                lines.append(f"  [UPDATE] Portfolio {row['portfolio_id']} {row['valuation_date']}: "
+                             f"portfolio_valuation ID {row['valuation_id']} {change} {source}, {links}")
+                self.stats['valuations_updated'] += 1
+            self.stats['orphaned_records'] += row['irr_records']
+            self.stats['links_updated'] += row['irr_records']
+            if row['valuation'] == 0:
+                self.stats['zero_valuations'] += row['irr_records']
+        return lines
+
+    async def backfill_chunk(self, db, portfolio_ids: List[int], irr_ids: Optional[List[int]]) -> str:
+        """Upsert the chunk's valuations and link its IRR records in one transaction"""
+        async with db.transaction():
+            counts = await db.fetchrow(UPSERT_VALUATIONS_SQL, portfolio_ids, irr_ids)
+            linked = int((await db.execute(LINK_IRRS_SQL, portfolio_ids, irr_ids)).split()[-1])
+
+        for key in ('orphaned_records', 'valuations_created', 'valuations_updated', 'zero_valuations'):
+            self.stats[key] += counts[key]
+        self.stats['links_updated'] += linked
+        return (f"{counts['orphaned_records']} records, {counts['valuations_created']} valuations created, "
+                f"{counts['valuations_updated']} updated, {linked} IRR links")
+
+    async def process_chunk(self, chunk_no: int, total_chunks: int, portfolio_ids: List[int],
+                            irr_ids: Optional[List[int]], semaphore: asyncio.Semaphore):
+        """Run one chunk on its own pooled connection"""
+        async with semaphore:
+            label = f"Chunk {chunk_no} of {total_chunks} (portfolios {portfolio_ids[0]}-{portfolio_ids[-1]})"
+            try:
+                async with self.pool.acquire() as db:
+                    if self.dry_run:
+                        lines = await self.diff_chunk(db, portfolio_ids, irr_ids)
+                        print("\n".join([f"\n[PROCESS] {label}"] + lines))
+                    else:
+                        print(f"[DONE] {label}: {await self.backfill_chunk(db, portfolio_ids, irr_ids)}")
+            except Exception as e:
+                print(f"[ERROR] {label} failed and was rolled back: {str(e)}")
+                self.stats['errors'] += 1
+
+    async def run_set_based(self) -> bool:
+        """Backfill every orphaned record with set-based statements, chunks in parallel"""
+        chunks = await self.find_orphaned_chunks()
+        semaphore = asyncio.Semaphore(self.workers)
+        await asyncio.gather(*(
+            self.process_chunk(chunk_no, len(chunks), portfolio_ids, irr_ids, semaphore)
+            for chunk_no, (portfolio_ids, irr_ids) in enumerate(chunks, 1)
+        ))
+        return bool(chunks)
+
     async def run(self):
         """Main execution function"""
         print("=" * 80)
@@ -195,22 +390,21 @@ class PortfolioValuationBackfill:
         if self.limit:
             print(f"[DATA] Processing limit: {self.limit} records")
 
+        if self.mode == 'set':
+            print(f"[DATA] Set-based mode: {self.chunk_size} portfolios per chunk, {self.workers} workers")
+
         try:
             await self.connect()
 
-            # Find orphaned records
-            orphaned_records = await self.find_orphaned_records()
+            if self.mode == 'record':
+                found = await self.run_record_by_record()
+            else:
+                found = await self.run_set_based()
 
-            if not orphaned_records:
+            if not found:
                 print("\n[OK] No orphaned records found!")
                 return
 
-            # Process each record
-            for i, record in enumerate(orphaned_records, 1):
-                print(f"\n{'-' * 80}")
-                print(f"Processing record {i} of {len(orphaned_records)}")
-                await self.process_orphaned_record(record)
-
             # Print summary
             print("\n" + "=" * 80)
             print("SUMMARY")
@@ -253,12 +447,33 @@ async def main():
         type=int,
         help='Only process N records (useful for testing)'
     )
+    parser.add_argument(
+        '--mode',
+        choices=['set', 'record'],
+        default='set',
+        help='set: chunked set-based statements (default); record: one record at a time'
+    )
+    parser.add_argument(
+        '--chunk-size',
+        type=int,
+        default=500,
+        help='Portfolios per chunk in set mode'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=4,
+        help='Chunks processed in parallel, each on its own connection'
+    )
 
     args = parser.parse_args()
 
     backfill = PortfolioValuationBackfill(
         dry_run=args.dry_run,
-        limit=args.limit
+        limit=args.limit,
+        mode=args.mode,
+        chunk_size=args.chunk_size,
+        workers=args.workers
     )
 
     await backfill.run()
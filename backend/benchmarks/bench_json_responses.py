@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Response serialization benchmark
+
+Compares the old FastAPI rendering path (jsonable_encoder + stdlib json, as
+done by JSONResponse) with the orjson pipeline in app/api/responses.py, using
+synthetic payloads shaped like our largest list endpoints:
+
+* /api/client_products     - rows from products_list_view
+* /api/holding_activity_logs - rows from holding_activity_log
+* /api/fund_valuations     - rows from portfolio_fund_valuations
+
+Both float-decoded rows (the pool default) and Decimal rows (exact_numeric)
+are measured. A second table covers the same endpoints as declared, with their
+response_model: FastAPI's serialize_response (validate, dump in JSON mode)
+followed by orjson rendering, against FastJSONRoute (validate, dump in Python
+mode, orjson). No database is needed.
+
+Usage:
+    python benchmarks/bench_json_responses.py [--rows 10000] [--repeat 5]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+from typing import List
+from decimal import Decimal
+from datetime import date, datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.routing import serialize_response
+from app.api.responses import FastJSONRoute, dumps
+from app.models.client_product import Clientproduct
+from app.models.fund_valuation import FundValuation
+from app.models.holding_activity_log import HoldingActivityLog
+
+
+def _stdlib_render(content):
+    """What fastapi.responses.JSONResponse does for a route without response_model."""
+    return json.dumps(
+        jsonable_encoder(content),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def _model_renderers(model):
+    """FastAPI's response_model path and FastJSONRoute's, for List[model]."""
+    route = FastJSONRoute("/bench", lambda: None, response_model=List[model])
+    loop = asyncio.new_event_loop()
+
+    def fastapi_render(content):
+        return dumps(loop.run_until_complete(serialize_response(field=route.response_field, response_content=content)))
+
+    def route_render(content):
+        return dumps(route._serialize(content))
+
+    return fastapi_render, route_render
+
+
+def _money(rng, exact):
+    value = round(rng.uniform(0, 250000), 2)
+    return Decimal(f"{value:.2f}") if exact else value
+
+
+def client_product_rows(count, exact, rng):
+    base = date(2015, 1, 1)
+    rows = []
+    for i in range(count):
+        start = base + timedelta(days=rng.randint(0, 3000))
+        rows.append({
+            "id": i + 1,
+            "client_id": rng.randint(1, 2000),
+            "product_name": f"Product {i + 1}",
+            "product_type": rng.choice(["ISA", "GIA", "Pension", "Bond"]),
+            "status": "active",
+            "start_date": start,
+            "end_date": None,
+            "provider_id": rng.randint(1, 60),
+            "portfolio_id": i + 1,
+            "plan_number": f"PLN{i:07d}",
+            "created_at": datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=i),
+            "client_name": f"Client Group {rng.randint(1, 2000)}",
+            "advisor": "Advisor",
+            "client_type": "Family",
+            "provider_name": f"Provider {rng.randint(1, 60)}",
+            "provider_color": "#4B5563",
+            "portfolio_name": f"Portfolio {i + 1}",
+            "portfolio_status": "active",
+            "current_value": _money(rng, exact),
+            "valuation_date": start + timedelta(days=365),
+            "current_irr": Decimal(f"{rng.uniform(-10, 20):.4f}") if exact else round(rng.uniform(-10, 20), 4),
+            "irr_date": start + timedelta(days=365),
+            "owner_count": 1,
+            "owners": "[]",
+            "fixed_fee_direct": None,
+            "fixed_fee_facilitated": None,
+            "percentage_fee_facilitated": "0.5",
+        })
+    return rows
+
+
+def activity_rows(count, exact, rng):
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    return [
+        {
+            "id": i + 1,
+            "product_id": rng.randint(1, 5000),
+            "portfolio_fund_id": rng.randint(1, 20000),
+            "activity_type": rng.choice(["Investment", "Withdrawal", "RegularInvestment", "FundSwitchIn"]),
+            "amount": _money(rng, exact),
+            "activity_timestamp": start + timedelta(days=i % 1500),
+            "created_at": start + timedelta(days=i % 1500, minutes=5),
+        }
+        for i in range(count)
+    ]
+
+
+def valuation_rows(count, exact, rng):
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    return [
+        {
+            "id": i + 1,
+            "portfolio_fund_id": rng.randint(1, 20000),
+            "valuation": _money(rng, exact),
+            "valuation_date": start + timedelta(days=30 * (i % 60)),
+            "created_at": start + timedelta(days=30 * (i % 60), minutes=5),
+        }
+        for i in range(count)
+    ]
+
+
+def _time(fn, payload, repeat):
+    best = float("inf")
+    size = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = fn(payload)
+        best = min(best, time.perf_counter() - started)
+        size = len(body)
+    return best * 1000, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark API response serialization")
+    parser.add_argument("--rows", type=int, default=10000, help="Rows per payload (default: 10000)")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement, best is reported (default: 5)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    payloads = [
+        ("client_products", client_product_rows, Clientproduct),
+        ("holding_activity_logs", activity_rows, HoldingActivityLog),
+        ("fund_valuations", valuation_rows, FundValuation),
+    ]
+
+    print(f"{'endpoint':<24}{'numeric':<9}{'stdlib ms':>11}{'orjson ms':>11}{'speedup':>9}{'bytes':>11}")
+    print("-" * 75)
+    for name, builder, _ in payloads:
+        for exact in (False, True):
+            payload = builder(args.rows, exact, rng)
+            stdlib_ms, size = _time(_stdlib_render, payload, args.repeat)
+            orjson_ms, _ = _time(dumps, payload, args.repeat)
+            label = "Decimal" if exact else "float"
+            print(f"{name:<24}{label:<9}{stdlib_ms:>11.1f}{orjson_ms:>11.1f}{stdlib_ms / orjson_ms:>8.1f}x{size:>11}")
+
+    print()
+    print(f"{'with response_model':<24}{'numeric':<9}{'fastapi ms':>11}{'route ms':>11}{'speedup':>9}{'bytes':>11}")
+    print("-" * 75)
+    for name, builder, model in payloads:
+        fastapi_render, route_render = _model_renderers(model)
+        for exact in (False, True):
+            payload = builder(args.rows, exact, rng)
+            fastapi_ms, size = _time(fastapi_render, payload, args.repeat)
+            route_ms, _ = _time(route_render, payload, args.repeat)
+            label = "Decimal" if exact else "float"
+            print(f"{name:<24}{label:<9}{fastapi_ms:>11.1f}{route_ms:>11.1f}{fastapi_ms / route_ms:>8.1f}x{size:>11}")
+
+
+if __name__ == "__main__":
+    main()
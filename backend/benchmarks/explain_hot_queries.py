@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+EXPLAIN regression check for hot queries
+
+Runs EXPLAIN for every query in HOT_QUERIES against a local Postgres and fails
+(exit code 1) when a plan does not use the index registered for that query, or
+reads one of the checked tables with a sequential scan.
+
+The check runs in a transaction that is always rolled back:
+    1. Seeds synthetic portfolios, products, funds, activities, valuations and IRRs (--seed)
+    2. ANALYZEs the checked tables so the planner sees the seeded row counts
+    3. EXPLAINs each query with representative parameters and the planner's default settings
+    4. Compares the indexes in each plan with the expected index name
+
+The expected names are the indexes the planner picks on the seeded data. A
+different name means the plan changed (an index was dropped, or a new one
+displaced it): review the plan and update the registry if the new one is better.
+
+Point DATABASE_URL at a scratch database with the current schema and
+migrations applied. Seeded ids start after the existing max(id), so the check
+also runs against a non-empty database. Never run --seed against production.
+tests/test_explain_hot_queries.py runs the same check under pytest.
+
+Usage:
+    python benchmarks/explain_hot_queries.py [--seed 2000] [--verbose]
+    python benchmarks/explain_hot_queries.py --seed 0   # check against the existing data only
+"""
+
+import os
+import sys
+import json
+import asyncio
+import argparse
+from datetime import date, datetime, timezone
+
+import asyncpg
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app.db.database import DATABASE_URL
+
+CHECKED_TABLES = {
+    "holding_activity_log",
+    "portfolio_fund_valuations",
+    "portfolio_fund_irr_values",
+    "portfolio_irr_values",
+    "portfolio_valuations",
+    "portfolio_funds",
+    "client_products",
+}
+
+SAMPLE_DATE = date(2024, 6, 30)
+SAMPLE_TIMESTAMP = datetime(2024, 6, 30, tzinfo=timezone.utc)
+# Last seeded month: a wider history window makes the fund_id-only index cost the same, and ANALYZE sampling picks either
+RECENT_DATE = date(2024, 12, 1)
+
+# name -> (query, params(keys), expected index); params are built from the first seeded ids, see seed()/existing_keys()
+HOT_QUERIES = {
+    "activities_for_funds_to_date": (
+        "SELECT * FROM holding_activity_log WHERE portfolio_fund_id = ANY($1::int[]) AND activity_timestamp <= $2 ORDER BY activity_timestamp",
+        lambda keys: (fund_ids(keys), SAMPLE_TIMESTAMP),
+        "idx_holding_activity_log_fund_timestamp",
+    ),
+    "latest_activity_for_fund": (
+        "SELECT * FROM holding_activity_log WHERE portfolio_fund_id = $1 ORDER BY activity_timestamp DESC LIMIT 1",
+        lambda keys: (keys["fund"],),
+        "idx_holding_activity_log_fund_timestamp",
+    ),
+    "activity_log_keyset_page": (
+        "SELECT * FROM holding_activity_log WHERE (activity_timestamp, id) < ($1, $2) ORDER BY activity_timestamp DESC, id DESC LIMIT 100",
+        lambda keys: (SAMPLE_TIMESTAMP, 1000000),
+        "idx_holding_activity_log_timestamp_id",
+    ),
+    "latest_fund_valuation": (
+        "SELECT * FROM portfolio_fund_valuations WHERE portfolio_fund_id = $1 ORDER BY valuation_date DESC LIMIT 1",
+        lambda keys: (keys["fund"],),
+        "idx_portfolio_fund_valuations_fund_date",
+    ),
+    "fund_valuations_on_date": (
+        "SELECT portfolio_fund_id, valuation FROM portfolio_fund_valuations WHERE portfolio_fund_id = ANY($1::int[]) AND valuation_date = $2",
+        lambda keys: (fund_ids(keys), SAMPLE_DATE),
+        "idx_portfolio_fund_valuations_fund_date",
+    ),
+    "latest_fund_valuations_view": (
+        "SELECT * FROM latest_portfolio_fund_valuations WHERE portfolio_fund_id = ANY($1::int[])",
+        lambda keys: (fund_ids(keys),),
+        "idx_portfolio_fund_valuations_fund_id",
+    ),
+    "fund_irr_on_date": (
+        "SELECT * FROM portfolio_fund_irr_values WHERE fund_id = $1 AND date = $2",
+        lambda keys: (keys["fund"], SAMPLE_DATE),
+        "idx_portfolio_fund_irr_values_fund_date_unique",
+    ),
+    "fund_irr_history": (
+        "SELECT * FROM portfolio_fund_irr_values WHERE fund_id = $1 AND date >= $2 ORDER BY date",
+        lambda keys: (keys["fund"], RECENT_DATE),
+        "idx_portfolio_fund_irr_values_fund_date_unique",
+    ),
+    "fund_irr_for_valuation": (
+        "SELECT id FROM portfolio_fund_irr_values WHERE fund_valuation_id = $1",
+        lambda keys: (keys["fund_valuation"],),
+        "idx_portfolio_fund_irr_values_fund_valuation_id",
+    ),
+    "portfolio_irr_on_date": (
+        "SELECT * FROM portfolio_irr_values WHERE portfolio_id = $1 AND date = $2",
+        lambda keys: (keys["portfolio"], SAMPLE_DATE),
+        "idx_portfolio_irr_values_portfolio_date_unique",
+    ),
+    "latest_portfolio_irr": (
+        "SELECT * FROM portfolio_irr_values WHERE portfolio_id = $1 ORDER BY date DESC LIMIT 1",
+        lambda keys: (keys["portfolio"],),
+        "idx_portfolio_irr_values_portfolio_date_unique",
+    ),
+    "portfolio_irr_for_valuation": (
+        "SELECT id FROM portfolio_irr_values WHERE portfolio_valuation_id = $1",
+        lambda keys: (keys["portfolio_valuation"],),
+        "idx_portfolio_irr_values_portfolio_valuation_id",
+    ),
+    "portfolio_valuation_on_date": (
+        "SELECT * FROM portfolio_valuations WHERE portfolio_id = $1 AND valuation_date = $2",
+        lambda keys: (keys["portfolio"], SAMPLE_DATE),
+        "idx_portfolio_valuations_portfolio_date_unique",
+    ),
+    "portfolio_funds_for_portfolio": (
+        "SELECT id FROM portfolio_funds WHERE portfolio_id = $1",
+        lambda keys: (keys["portfolio"],),
+        "idx_portfolio_funds_portfolio_id",
+    ),
+    "client_products_keyset_page": (
+        "SELECT * FROM client_products WHERE (created_at, id) < ($1, $2) ORDER BY created_at DESC, id DESC LIMIT 100",
+        lambda keys: (SAMPLE_TIMESTAMP, 1000000),
+        "idx_client_products_created_at_id",
+    ),
+}
+
+
+def fund_ids(keys):
+    """The first seeded portfolio's three funds."""
+    return [keys["fund"], keys["fund"] + 1, keys["fund"] + 2]
+
+
+async def seed(conn, portfolios):
+    """
+    Insert synthetic rows: a product and 3 funds per portfolio, monthly activity, valuations and IRRs for 2 years.
+
+    Portfolio and fund ids start after the current max(id), so the seed never collides with
+    existing rows or their (key, date) unique indexes. Returns the first seeded id of each kind.
+    """
+    first_portfolio = await conn.fetchval("SELECT COALESCE(max(id), 0) + 1 FROM portfolios")
+    first_fund = await conn.fetchval("SELECT COALESCE(max(id), 0) + 1 FROM portfolio_funds")
+    last_portfolio = first_portfolio + portfolios - 1
+    last_fund = first_fund + portfolios * 3 - 1
+
+    fund_id = await conn.fetchval("""
+        INSERT INTO available_funds (fund_name, status) VALUES ('Explain Check Fund', 'active') RETURNING id
+    """)
+    await conn.execute("""
+        INSERT INTO portfolios (id, portfolio_name, status, start_date)
+        SELECT g, 'Explain Check ' || g, 'active', DATE '2023-01-01'
+        FROM generate_series($1::int, $2::int) g
+    """, first_portfolio, last_portfolio)
+    await conn.execute("""
+        INSERT INTO client_products (product_name, status, start_date, portfolio_id, created_at)
+        SELECT 'Explain Check ' || g, 'active', DATE '2023-01-01', g, TIMESTAMPTZ '2023-01-01' + ((g - $1) || ' hours')::interval
+        FROM generate_series($1::int, $2::int) g
+    """, first_portfolio, last_portfolio)
+    await conn.execute("""
+        INSERT INTO portfolio_funds (id, portfolio_id, available_funds_id, status, start_date)
+        SELECT $3 + (p - $1) * 3 + f, p, $4, 'active', DATE '2023-01-01'
+        FROM generate_series($1::int, $2::int) p, generate_series(0, 2) f
+    """, first_portfolio, last_portfolio, first_fund, fund_id)
+    await conn.execute("""
+        INSERT INTO holding_activity_log (portfolio_fund_id, activity_type, amount, activity_timestamp)
+        SELECT pf, 'Investment', 100, TIMESTAMPTZ '2023-01-01' + (m || ' months')::interval
+        FROM generate_series($1::int, $2::int) pf, generate_series(0, 23) m
+    """, first_fund, last_fund)
+    await conn.execute("""
+        INSERT INTO portfolio_fund_valuations (portfolio_fund_id, valuation_date, valuation)
+        SELECT pf, (DATE '2023-01-31' + (m || ' months')::interval)::date, 100 * (m + 1)
+        FROM generate_series($1::int, $2::int) pf, generate_series(0, 23) m
+    """, first_fund, last_fund)
+    await conn.execute("""
+        INSERT INTO portfolio_fund_irr_values (fund_id, date, irr_result, fund_valuation_id)
+        SELECT portfolio_fund_id, valuation_date, 5, id FROM portfolio_fund_valuations
+        WHERE portfolio_fund_id BETWEEN $1 AND $2
+    """, first_fund, last_fund)
+    await conn.execute("""
+        INSERT INTO portfolio_valuations (portfolio_id, valuation_date, valuation)
+        SELECT p, (DATE '2023-01-31' + (m || ' months')::interval)::date, 300 * (m + 1)
+        FROM generate_series($1::int, $2::int) p, generate_series(0, 23) m
+    """, first_portfolio, last_portfolio)
+    await conn.execute("""
+        INSERT INTO portfolio_irr_values (portfolio_id, date, irr_result, portfolio_valuation_id)
+        SELECT portfolio_id, valuation_date, 5, id FROM portfolio_valuations
+        WHERE portfolio_id BETWEEN $1 AND $2
+    """, first_portfolio, last_portfolio)
+
+    return {
+        "portfolio": first_portfolio,
+        "fund": first_fund,
+        "fund_valuation": await conn.fetchval(
+            "SELECT min(id) FROM portfolio_fund_valuations WHERE portfolio_fund_id = $1", first_fund
+        ),
+        "portfolio_valuation": await conn.fetchval(
+            "SELECT min(id) FROM portfolio_valuations WHERE portfolio_id = $1", first_portfolio
+        ),
+    }
+
+
+async def existing_keys(conn):
+    """Parameters for --seed 0: the lowest existing id of each kind (0 on an empty table)."""
+    row = await conn.fetchrow("""
+        SELECT (SELECT COALESCE(min(id), 0) FROM portfolios) AS portfolio,
+               (SELECT COALESCE(min(id), 0) FROM portfolio_funds) AS fund,
+               (SELECT COALESCE(min(id), 0) FROM portfolio_fund_valuations) AS fund_valuation,
+               (SELECT COALESCE(min(id), 0) FROM portfolio_valuations) AS portfolio_valuation
+    """)
+    return dict(row)
+
+
+def plan_nodes(plan):
+    """Yield every node of an EXPLAIN (FORMAT JSON) plan."""
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def seq_scans(plan):
+    """Yield the relation name of every Seq Scan node in an EXPLAIN (FORMAT JSON) plan."""
+    for node in plan_nodes(plan):
+        if node.get("Node Type") == "Seq Scan":
+            yield node.get("Relation Name")
+
+
+def index_names(plan):
+    """Yield the index of every Index, Index Only and Bitmap Index Scan node."""
+    for node in plan_nodes(plan):
+        if "Index Name" in node:
+            yield node["Index Name"]
+
+
+async def explain_hot_queries(conn, seed_portfolios, verbose=False):
+    """
+    Seed, ANALYZE and EXPLAIN every hot query in a transaction that is always rolled back.
+
+    Returns the names of the queries whose plan skipped the expected index or seq-scanned a checked table.
+    """
+    failures = []
+    transaction = conn.transaction()
+    await transaction.start()
+    try:
+        keys = await seed(conn, seed_portfolios) if seed_portfolios else await existing_keys(conn)
+        for table in sorted(CHECKED_TABLES):
+            await conn.execute(f"ANALYZE {table}")
+
+        for name, (query, build_params, expected_index) in HOT_QUERIES.items():
+            params = build_params(keys)
+            raw = await conn.fetchval(f"EXPLAIN (FORMAT JSON) {query}", *params)
+            plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+            scanned = sorted({table for table in seq_scans(plan) if table in CHECKED_TABLES})
+            used = sorted(set(index_names(plan)))
+            problems = []
+            if expected_index not in used:
+                problems.append(f"expected {expected_index}, plan uses {', '.join(used) or 'no index'}")
+            if scanned:
+                problems.append(f"seq scan on {', '.join(scanned)}")
+            print(f"[{'FAIL' if problems else 'OK'}] {name}" + (f" - {'; '.join(problems)}" if problems else ""))
+            if verbose or problems:
+                text_plan = await conn.fetch(f"EXPLAIN {query}", *params)
+                print("\n".join("    " + row[0] for row in text_plan))
+            if problems:
+                failures.append(name)
+    finally:
+        await transaction.rollback()
+    return failures
+
+
+async def check(seed_portfolios, verbose):
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        failures = await explain_hot_queries(conn, seed_portfolios, verbose)
+    finally:
+        await conn.close()
+
+    print(f"\n{len(HOT_QUERIES) - len(failures)}/{len(HOT_QUERIES)} hot queries use their expected index")
+    return 1 if failures else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail when a hot query stops using its expected index")
+    parser.add_argument("--seed", type=int, default=2000, metavar="PORTFOLIOS",
+                        help="Seed this many synthetic portfolios, rolled back afterwards (default: 2000, 0 to skip)")
+    parser.add_argument("--verbose", action="store_true", help="Print every plan, not only failing ones")
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(check(args.seed, args.verbose)))
+
+
+if __name__ == "__main__":
+    main()
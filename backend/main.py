@@ -36,9 +36,6 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.encoders import jsonable_encoder
-from typing import Any
-import json
-from datetime import date, datetime
 from dotenv import load_dotenv
 import asyncio
 from contextlib import asynccontextmanager
@@ -55,26 +52,21 @@ from app.api.routes import (
     client_products, holding_activity_logs,
     product_owners, client_group_product_owners,
     provider_switch_log, search, portfolio_valuations,
-    historical_irr, presence
+    historical_irr, presence, fum_rollup, irr_jobs
 )
 
 # Import database functions for connection management
-from app.db.database import create_db_pool, close_db_pool, check_database_health
+from app.db.database import create_db_pool, create_read_pool, close_db_pool, check_database_health, ReadYourWritesMiddleware
+from app.db.query_stats import QueryStatsMiddleware
+from app.utils.data_versions import DataVersionMiddleware
+from app.services.fum_rollup import run_fum_rollup_job
+from app.services.irr_job_queue import run_irr_job_worker, IRR_JOB_WORKERS
+from app.services.irr_recompute import resume_irr_recompute_runs
+from app.api.responses import FastJSONResponse, FastJSONRoute
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Custom JSON encoder class to handle date objects
-class CustomJSONEncoder(json.JSONEncoder):
-    """
-    Custom JSON encoder to properly format date and datetime objects in API responses.
-    Converts date/datetime objects to ISO format strings.
-    """
-    def default(self, obj: Any) -> Any:
-        if isinstance(obj, (date, datetime)):
-            return obj.isoformat()
-        return super().default(obj)
-
 # Create FastAPI application instance with comprehensive metadata
 app = FastAPI(
     title="Kingston's Portal - Wealth Management System API",
@@ -110,6 +102,8 @@ app = FastAPI(
     For technical support or questions about the API, please refer to the project documentation.
     """,
     version="1.0.0",
+    # orjson-backed rendering with native date, datetime and Decimal support
+    default_response_class=FastJSONResponse,
     terms_of_service="https://example.com/terms/",
     contact={
         "name": "Kingston's Portal Support",
@@ -168,8 +162,8 @@ app = FastAPI(
     ],
 )
 
-# Override default JSONResponse to use custom encoder for proper date handling
-app.json_encoder = CustomJSONEncoder
+# Routes added directly on the app also take the orjson fast path
+app.router.route_class = FastJSONRoute
 
 # Configure Cross-Origin Resource Sharing (CORS)
 # This allows the frontend application running on different origins to access the API
@@ -194,6 +188,15 @@ app.add_middleware(
     max_age=3600,
 )
 
+# Attribute database queries to the route that issued them (see /api/system/query-stats)
+app.add_middleware(QueryStatsMiddleware)
+
+# Send a client's reads to the primary for a short while after it changes data (see get_read_db)
+app.add_middleware(ReadYourWritesMiddleware)
+
+# Invalidate cached analytics after client and product writes (see app/utils/data_versions.py)
+app.add_middleware(DataVersionMiddleware)
+
 # API URL Structure Standard
 # All endpoints follow this pattern: /api/{resource}/{action}
 # Where:
@@ -223,6 +226,7 @@ app.include_router(analytics.router, prefix="/api", tags=["Analytics"])
 app.include_router(revenue.router, prefix="/api", tags=["Revenue"])
 
 app.include_router(fund_valuations.router, prefix="/api", tags=["Holdings"])
+app.include_router(irr_jobs.router, prefix="/api", tags=["Holdings"])
 app.include_router(product_owners.router, prefix="/api", tags=["Client Groups"])
 app.include_router(client_group_product_owners.router, prefix="/api", tags=["Client Groups"])
 app.include_router(provider_switch_log.router, prefix="/api", tags=["Providers"])
@@ -230,6 +234,7 @@ app.include_router(search.router, prefix="/api", tags=["Search"])
 app.include_router(portfolio_valuations.router, prefix="/api", tags=["Holdings"])
 app.include_router(historical_irr.router, prefix="/api/historical-irr", tags=["Analytics"])
 app.include_router(presence.router, prefix="/api", tags=["Presence"])
+app.include_router(fum_rollup.router, prefix="/api", tags=["Analytics"])
 
 # Add system monitoring routes
 from app.api.routes import system
@@ -255,10 +260,25 @@ async def startup_event():
         await create_db_pool()
         logger.info("Database connection pool initialized successfully")
         
+        # Optional read replica for analytics and reporting (DATABASE_READ_URL)
+        await create_read_pool()
+        
         # Start background tasks
         asyncio.create_task(periodic_cleanup())
         logger.info("Started periodic presence cleanup task")
         
+        # Keep fum_daily_rollup current (nightly window + after data changes)
+        asyncio.create_task(run_fum_rollup_job())
+        logger.info("Started FUM rollup task")
+        
+        # IRR cascades queued by valuation and activity writes
+        for worker_id in range(IRR_JOB_WORKERS):
+            asyncio.create_task(run_irr_job_worker(worker_id))
+        logger.info(f"Started {IRR_JOB_WORKERS} IRR job workers")
+        
+        # Full-book IRR recomputations interrupted by a restart
+        await resume_irr_recompute_runs()
+        
         logger.info("Application startup completed successfully")
     except Exception as e:
         logger.error(f"Failed to initialize application: {str(e)}")
@@ -0,0 +1,17 @@
+-- ============================================================================
+-- 001: Keyset pagination indexes
+-- ============================================================================
+-- Supports cursor pagination on the client product and activity log listings:
+--   GET /api/client_products         ORDER BY created_at DESC, id DESC
+--   GET /api/holding_activity_logs   ORDER BY activity_timestamp DESC, id DESC
+-- The (sort column, id) pair lets Postgres seek straight to the cursor position
+-- with an index scan instead of reading and discarding OFFSET rows.
+--
+-- CONCURRENTLY cannot run inside a transaction block; run this file with
+-- autocommit (psql default).
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_client_products_created_at_id
+    ON public.client_products USING btree (created_at DESC, id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_holding_activity_log_timestamp_id
+    ON public.holding_activity_log USING btree (activity_timestamp DESC, id DESC);
@@ -0,0 +1,41 @@
+-- ============================================================================
+-- 002: Composite indexes for hot IRR / valuation / activity lookups
+-- ============================================================================
+-- The single-column fund_id / portfolio_id / date indexes force Postgres to
+-- combine two indexes (or filter and sort a large fund slice) for the lookups
+-- the IRR cascade and product pages run on every request:
+--   holding_activity_log       WHERE portfolio_fund_id = ANY($1) ORDER BY activity_timestamp
+--   portfolio_fund_valuations  WHERE portfolio_fund_id = $1 ORDER BY valuation_date DESC LIMIT 1
+--   portfolio_fund_irr_values  WHERE fund_id = $1 AND date = $2
+--   portfolio_irr_values       WHERE portfolio_id = $1 AND date = $2
+--   portfolio_valuations       WHERE portfolio_id = $1 AND valuation_date = $2
+-- The (key, date DESC, created_at DESC) order also matches the DISTINCT ON
+-- ordering of the latest_* views, so they read one index range per key.
+-- The *_valuation_id indexes cover the IRR <-> valuation link lookups done
+-- when a valuation is updated or deleted.
+--
+-- Checked by benchmarks/explain_hot_queries.py.
+--
+-- CONCURRENTLY cannot run inside a transaction block; run this file with
+-- autocommit (psql default) or migrations/run_migrations.py.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_holding_activity_log_fund_timestamp
+    ON public.holding_activity_log USING btree (portfolio_fund_id, activity_timestamp);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_portfolio_fund_valuations_fund_date
+    ON public.portfolio_fund_valuations USING btree (portfolio_fund_id, valuation_date DESC, created_at DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_portfolio_fund_irr_values_fund_date
+    ON public.portfolio_fund_irr_values USING btree (fund_id, date DESC, created_at DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_portfolio_fund_irr_values_fund_valuation_id
+    ON public.portfolio_fund_irr_values USING btree (fund_valuation_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_portfolio_irr_values_portfolio_date
+    ON public.portfolio_irr_values USING btree (portfolio_id, date DESC, created_at DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_portfolio_irr_values_portfolio_valuation_id
+    ON public.portfolio_irr_values USING btree (portfolio_valuation_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_portfolio_valuations_portfolio_date
+    ON public.portfolio_valuations USING btree (portfolio_id, valuation_date DESC, created_at DESC);
@@ -0,0 +1,30 @@
+-- ============================================================================
+-- 003: Daily FUM rollup by client group, provider, fund and template
+-- ============================================================================
+-- One row per (date, dimension, key) holding the FUM (sum of each portfolio
+-- fund's latest valuation on or before that date) and the amount invested
+-- (Investment, RegularInvestment and TaxUplift activity up to that date).
+--
+--   dimension      key
+--   total          0
+--   client_group   client_groups.id
+--   provider       available_providers.id
+--   fund           available_funds.id
+--   template       template_portfolio_generations.id (0 = bespoke)
+--
+-- Written by app/services/fum_rollup.py (nightly, after writes, and by
+-- backfill_fum_rollup.py for historical dates); read by /api/analytics/fum_rollup.
+
+CREATE TABLE IF NOT EXISTS public.fum_daily_rollup (
+    date date NOT NULL,
+    dimension text NOT NULL CHECK (dimension IN ('total', 'client_group', 'provider', 'fund', 'template')),
+    key bigint NOT NULL,
+    fum numeric(16,2) NOT NULL DEFAULT 0,
+    invested numeric(16,2) NOT NULL DEFAULT 0,
+    computed_at timestamp with time zone NOT NULL DEFAULT now(),
+    PRIMARY KEY (dimension, key, date)
+);
+
+-- Current totals: every key of a dimension on one date
+CREATE INDEX IF NOT EXISTS idx_fum_daily_rollup_dimension_date
+    ON public.fum_daily_rollup USING btree (dimension, date);
@@ -0,0 +1,119 @@
+-- ============================================================================
+-- 004: Incremental revenue-rate state per client group
+-- ============================================================================
+-- /api/revenue/rate used to recompute completeness, FUM and revenue for every
+-- client group whenever any product or valuation changed. This table keeps
+-- that state per group; triggers on client_products, portfolio_funds and
+-- portfolio_fund_valuations flag only the groups a write touches as stale, and
+-- app/services/revenue_service.py recomputes just those rows before the
+-- company-wide rate is summed from the table.
+--
+-- No foreign key to client_groups: deleting a group cascades to its products,
+-- whose trigger flags the (disappearing) group; the refresh drops such rows.
+
+CREATE TABLE IF NOT EXISTS public.client_group_revenue_state (
+    client_group_id bigint PRIMARY KEY,
+    has_fee_setup boolean NOT NULL DEFAULT false,
+    complete boolean NOT NULL DEFAULT false,
+    fum numeric NOT NULL DEFAULT 0,
+    revenue numeric NOT NULL DEFAULT 0,
+    stale boolean NOT NULL DEFAULT true,
+    updated_at timestamp with time zone NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_client_group_revenue_state_stale
+    ON public.client_group_revenue_state USING btree (client_group_id) WHERE stale;
+
+-- Existing groups start stale, so the first request computes them all once
+INSERT INTO public.client_group_revenue_state (client_group_id)
+SELECT id FROM public.client_groups
+ON CONFLICT (client_group_id) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION public.mark_client_group_revenue_stale(group_ids bigint[])
+RETURNS void
+LANGUAGE sql
+AS $$
+    INSERT INTO public.client_group_revenue_state (client_group_id, stale)
+    SELECT DISTINCT id, true FROM unnest(group_ids) AS id WHERE id IS NOT NULL
+    ON CONFLICT (client_group_id) DO UPDATE SET stale = true
+    WHERE NOT public.client_group_revenue_state.stale
+$$;
+
+CREATE OR REPLACE FUNCTION public.client_products_revenue_stale()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM public.mark_client_group_revenue_stale(ARRAY[NEW.client_id]);
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM public.mark_client_group_revenue_stale(ARRAY[OLD.client_id]);
+    ELSE
+        PERFORM public.mark_client_group_revenue_stale(ARRAY[OLD.client_id, NEW.client_id]);
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION public.portfolio_funds_revenue_stale()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    portfolio_ids bigint[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        portfolio_ids := ARRAY[NEW.portfolio_id];
+    ELSIF TG_OP = 'DELETE' THEN
+        portfolio_ids := ARRAY[OLD.portfolio_id];
+    ELSE
+        portfolio_ids := ARRAY[OLD.portfolio_id, NEW.portfolio_id];
+    END IF;
+    PERFORM public.mark_client_group_revenue_stale(ARRAY(
+        SELECT client_id FROM public.client_products WHERE portfolio_id = ANY(portfolio_ids)
+    ));
+    RETURN NULL;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION public.portfolio_fund_valuations_revenue_stale()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    fund_ids bigint[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        fund_ids := ARRAY[NEW.portfolio_fund_id];
+    ELSIF TG_OP = 'DELETE' THEN
+        fund_ids := ARRAY[OLD.portfolio_fund_id];
+    ELSE
+        fund_ids := ARRAY[OLD.portfolio_fund_id, NEW.portfolio_fund_id];
+    END IF;
+    PERFORM public.mark_client_group_revenue_stale(ARRAY(
+        SELECT cp.client_id
+        FROM public.portfolio_funds pf
+        JOIN public.client_products cp ON cp.portfolio_id = pf.portfolio_id
+        WHERE pf.id = ANY(fund_ids)
+    ));
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS trg_client_products_revenue_stale ON public.client_products;
+CREATE TRIGGER trg_client_products_revenue_stale
+    AFTER INSERT OR DELETE OR UPDATE OF client_id, portfolio_id, fixed_fee_direct, fixed_fee_facilitated, percentage_fee_facilitated
+    ON public.client_products
+    FOR EACH ROW EXECUTE FUNCTION public.client_products_revenue_stale();
+
+DROP TRIGGER IF EXISTS trg_portfolio_funds_revenue_stale ON public.portfolio_funds;
+CREATE TRIGGER trg_portfolio_funds_revenue_stale
+    AFTER INSERT OR DELETE OR UPDATE OF portfolio_id, status
+    ON public.portfolio_funds
+    FOR EACH ROW EXECUTE FUNCTION public.portfolio_funds_revenue_stale();
+
+DROP TRIGGER IF EXISTS trg_portfolio_fund_valuations_revenue_stale ON public.portfolio_fund_valuations;
+CREATE TRIGGER trg_portfolio_fund_valuations_revenue_stale
+    AFTER INSERT OR DELETE OR UPDATE OF portfolio_fund_id, valuation, valuation_date
+    ON public.portfolio_fund_valuations
+    FOR EACH ROW EXECUTE FUNCTION public.portfolio_fund_valuations_revenue_stale();
@@ -0,0 +1,39 @@
+-- ============================================================================
+-- 005: Durable queue for IRR cascade recalculations
+-- ============================================================================
+-- Valuation and activity writes used to run IRRCascadeService inside the HTTP
+-- request, holding a pooled connection for as long as the recalculation took.
+-- The routes now save the data, insert a row here and return; the worker in
+-- app/services/irr_job_queue.py claims queued rows with FOR UPDATE SKIP LOCKED,
+-- runs the cascade, and records the outcome. Failed jobs are retried with a
+-- backoff until max_attempts, then kept as 'failed' for inspection.
+--
+-- job_type:
+--   valuation_saved   - a fund valuation was created or edited on dates[1]
+--   valuation_deleted - a fund valuation on dates[1] was deleted
+--   activity_changed  - activities on dates were created, edited or deleted
+
+CREATE TABLE IF NOT EXISTS public.irr_cascade_jobs (
+    id bigserial PRIMARY KEY,
+    job_type text NOT NULL CHECK (job_type IN ('valuation_saved', 'valuation_deleted', 'activity_changed')),
+    portfolio_id bigint NOT NULL,
+    portfolio_fund_id bigint,
+    dates date[] NOT NULL,
+    status text NOT NULL DEFAULT 'queued' CHECK (status IN ('queued', 'running', 'succeeded', 'failed')),
+    attempts integer NOT NULL DEFAULT 0,
+    max_attempts integer NOT NULL DEFAULT 5,
+    run_after timestamp with time zone NOT NULL DEFAULT now(),
+    last_error text,
+    result jsonb,
+    created_at timestamp with time zone NOT NULL DEFAULT now(),
+    started_at timestamp with time zone,
+    finished_at timestamp with time zone
+);
+
+-- Claim order for the worker; only unfinished jobs are indexed
+CREATE INDEX IF NOT EXISTS idx_irr_cascade_jobs_pending
+    ON public.irr_cascade_jobs USING btree (run_after, id) WHERE status IN ('queued', 'running');
+
+-- Status polling per portfolio
+CREATE INDEX IF NOT EXISTS idx_irr_cascade_jobs_portfolio
+    ON public.irr_cascade_jobs USING btree (portfolio_id, id DESC);
@@ -0,0 +1,48 @@
+-- ============================================================================
+-- 006: Checkpointed full-book IRR recomputation
+-- ============================================================================
+-- After a methodology change every fund and portfolio IRR has to be recomputed.
+-- A run partitions the portfolios into chunks (irr_recompute_chunks); workers
+-- in app/services/irr_recompute.py claim chunks with FOR UPDATE SKIP LOCKED on
+-- their own connections and recompute one portfolio per transaction. Each
+-- portfolio commit also advances its chunk's next_index, so a run interrupted
+-- by a crash or deploy resumes after the last committed portfolio.
+--
+-- Chunk status:
+--   queued  - not started, or released
+--   running - claimed; reclaimable once heartbeat_at is older than the lease
+--   done    - every portfolio processed (failures are listed, not retried)
+
+CREATE TABLE IF NOT EXISTS public.irr_recompute_runs (
+    id bigserial PRIMARY KEY,
+    status text NOT NULL DEFAULT 'running' CHECK (status IN ('running', 'succeeded')),
+    chunk_size integer NOT NULL,
+    total_portfolios integer NOT NULL DEFAULT 0,
+    -- Progress when the workers were last (re)started, for rows/sec and ETA
+    resumed_at timestamp with time zone NOT NULL DEFAULT now(),
+    rows_at_resume bigint NOT NULL DEFAULT 0,
+    portfolios_at_resume integer NOT NULL DEFAULT 0,
+    created_at timestamp with time zone NOT NULL DEFAULT now(),
+    finished_at timestamp with time zone
+);
+
+CREATE TABLE IF NOT EXISTS public.irr_recompute_chunks (
+    run_id bigint NOT NULL REFERENCES public.irr_recompute_runs (id) ON DELETE CASCADE,
+    chunk_no integer NOT NULL,
+    portfolio_ids bigint[] NOT NULL,
+    next_index integer NOT NULL DEFAULT 0,
+    status text NOT NULL DEFAULT 'queued' CHECK (status IN ('queued', 'running', 'done')),
+    attempts integer NOT NULL DEFAULT 0,
+    fund_irrs_written integer NOT NULL DEFAULT 0,
+    portfolio_irrs_written integer NOT NULL DEFAULT 0,
+    failed_portfolio_ids bigint[] NOT NULL DEFAULT '{}',
+    last_error text,
+    started_at timestamp with time zone,
+    heartbeat_at timestamp with time zone,
+    finished_at timestamp with time zone,
+    PRIMARY KEY (run_id, chunk_no)
+);
+
+-- Claim order within a run; only unfinished chunks are indexed
+CREATE INDEX IF NOT EXISTS idx_irr_recompute_chunks_pending
+    ON public.irr_recompute_chunks USING btree (run_id, chunk_no) WHERE status IN ('queued', 'running');
@@ -0,0 +1,73 @@
+-- ============================================================================
+-- 007: One fund IRR, portfolio IRR and portfolio valuation per date
+-- ============================================================================
+-- The IRR writers used check-then-insert, so two cascades over the same
+-- portfolio (two advisers, or a bulk save racing a valuation save) could both
+-- see no row and both insert one. The latest_* views hid the duplicates by
+-- picking the newest row. These unique indexes let the writers use
+-- INSERT ... ON CONFLICT (key, date) DO UPDATE instead, which cannot duplicate.
+--
+-- Existing duplicates are removed first, keeping the row the latest_* views
+-- already show (newest created_at, then highest id). IRRs linked to a removed
+-- portfolio valuation are re-pointed to the kept one.
+--
+-- If a CREATE UNIQUE INDEX fails because old code inserted a duplicate while
+-- this file ran, DROP the INVALID index and re-run the file; every statement
+-- is idempotent. Deploy this before the code that relies on ON CONFLICT.
+
+WITH ranked AS (
+    SELECT id, first_value(id) OVER (
+        PARTITION BY portfolio_id, valuation_date ORDER BY created_at DESC, id DESC
+    ) AS keep_id
+    FROM public.portfolio_valuations
+    WHERE portfolio_id IS NOT NULL AND valuation_date IS NOT NULL
+)
+UPDATE public.portfolio_irr_values irr
+SET portfolio_valuation_id = ranked.keep_id
+FROM ranked
+WHERE irr.portfolio_valuation_id = ranked.id AND ranked.id <> ranked.keep_id;
+
+DELETE FROM public.portfolio_valuations
+WHERE id IN (
+    SELECT id FROM (
+        SELECT id, row_number() OVER (
+            PARTITION BY portfolio_id, valuation_date ORDER BY created_at DESC, id DESC
+        ) AS position
+        FROM public.portfolio_valuations
+        WHERE portfolio_id IS NOT NULL AND valuation_date IS NOT NULL
+    ) ranked
+    WHERE position > 1
+);
+
+DELETE FROM public.portfolio_irr_values
+WHERE id IN (
+    SELECT id FROM (
+        SELECT id, row_number() OVER (
+            PARTITION BY portfolio_id, date ORDER BY created_at DESC, id DESC
+        ) AS position
+        FROM public.portfolio_irr_values
+        WHERE portfolio_id IS NOT NULL AND date IS NOT NULL
+    ) ranked
+    WHERE position > 1
+);
+
+DELETE FROM public.portfolio_fund_irr_values
+WHERE id IN (
+    SELECT id FROM (
+        SELECT id, row_number() OVER (
+            PARTITION BY fund_id, date ORDER BY created_at DESC, id DESC
+        ) AS position
+        FROM public.portfolio_fund_irr_values
+        WHERE fund_id IS NOT NULL AND date IS NOT NULL
+    ) ranked
+    WHERE position > 1
+);
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_portfolio_valuations_portfolio_date_unique
+    ON public.portfolio_valuations USING btree (portfolio_id, valuation_date);
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_portfolio_irr_values_portfolio_date_unique
+    ON public.portfolio_irr_values USING btree (portfolio_id, date);
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_portfolio_fund_irr_values_fund_date_unique
+    ON public.portfolio_fund_irr_values USING btree (fund_id, date);
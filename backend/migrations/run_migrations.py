@@ -0,0 +1,120 @@
+"""
+Apply versioned SQL migrations from this directory.
+
+Migrations are the NNN_name.sql files next to this script. Each applied version
+is recorded in a schema_migrations table, so running the script again only
+applies new files. Statements run one at a time in autocommit mode because
+CREATE INDEX CONCURRENTLY cannot run inside a transaction block; every
+migration must therefore be idempotent (IF NOT EXISTS) so a partly applied
+file can simply be re-run.
+
+Usage:
+    python migrations/run_migrations.py [--dry-run]
+
+Options:
+    --dry-run    List pending migrations without applying them
+"""
+
+import asyncio
+import asyncpg
+import os
+import re
+import sys
+from typing import List, Tuple
+
+# Add backend directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.database import DATABASE_URL
+
+MIGRATIONS_DIR = os.path.dirname(os.path.abspath(__file__))
+MIGRATION_FILE = re.compile(r"^(\d{3})_[\w-]+\.sql$")
+DOLLAR_QUOTE = re.compile(r"\$([A-Za-z_]\w*|)\$.*?\$\1\$", re.DOTALL)
+
+
+def discover_migrations() -> List[Tuple[str, str]]:
+    """Return (version, filename) pairs for every migration file, in version order."""
+    migrations = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = MIGRATION_FILE.match(filename)
+        if match:
+            migrations.append((match.group(1), filename))
+    return migrations
+
+
+def split_statements(sql: str) -> List[str]:
+    """Split a migration file into individual statements."""
+    # Comments are stripped first so a ';' inside one does not split a statement
+    lines = [line for line in sql.splitlines() if not line.strip().startswith("--")]
+    # Dollar-quoted bodies ($$ ... $$) are kept whole; their ';' belong to the function
+    sql = "\n".join(lines)
+    statements, current, position = [], "", 0
+    for body in list(DOLLAR_QUOTE.finditer(sql)) + [None]:
+        end = body.start() if body else len(sql)
+        pieces = sql[position:end].split(";")
+        current += pieces[0]
+        for piece in pieces[1:]:
+            statements.append(current)
+            current = piece
+        if body:
+            current += body.group(0)
+            position = body.end()
+    statements.append(current)
+    return [statement.strip() for statement in statements if statement.strip()]
+
+
+async def run(dry_run: bool = False) -> int:
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version text PRIMARY KEY,
+                filename text NOT NULL,
+                applied_at timestamptz NOT NULL DEFAULT now()
+            )
+        """)
+        applied = {row["version"] for row in await conn.fetch("SELECT version FROM schema_migrations")}
+        pending = [(version, filename) for version, filename in discover_migrations() if version not in applied]
+
+        if not pending:
+            print("[OK] Schema is up to date")
+            return 0
+
+        for version, filename in pending:
+            if dry_run:
+                print(f"[PENDING] {filename}")
+                continue
+
+            with open(os.path.join(MIGRATIONS_DIR, filename), encoding="utf-8") as f:
+                statements = split_statements(f.read())
+
+            print(f"[APPLY] {filename} ({len(statements)} statements)")
+            for statement in statements:
+                await conn.execute(statement)
+
+            await conn.execute(
+                "INSERT INTO schema_migrations (version, filename) VALUES ($1, $2)",
+                version, filename
+            )
+            print(f"[DONE] {filename}")
+
+        return 0
+    except Exception as e:
+        print(f"[ERROR] Migration failed: {str(e)}")
+        return 1
+    finally:
+        await conn.close()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Apply pending SQL migrations")
+    parser.add_argument("--dry-run", action="store_true", help="List pending migrations without applying them")
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(run(dry_run=args.dry_run)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Recompute every fund and portfolio IRR in the book (e.g. after an IRR methodology change).
+
+This script:
+1. Creates a recompute run that partitions the portfolios into chunks (or resumes --resume RUN_ID)
+2. Processes the chunks with --workers workers, each on its own connection
+3. Checkpoints after every portfolio, so an interrupted run continues where it stopped
+   with --resume (the API also resumes unfinished runs when it starts)
+4. Prints progress, rows/sec and ETA every --report-seconds seconds
+
+Usage:
+    python recompute_all_irrs.py [--chunk-size N] [--workers N] [--portfolio-ids 1,2,3] [--resume RUN_ID] [--dry-run]
+
+Options:
+    --chunk-size      Portfolios per chunk (default: IRR_RECOMPUTE_CHUNK_SIZE, 50)
+    --workers         Parallel workers / connections (default: IRR_RECOMPUTE_WORKERS, 4)
+    --portfolio-ids   Only recompute these portfolios (default: the whole book)
+    --resume          Continue an unfinished run instead of starting a new one
+    --report-seconds  Seconds between progress lines (default: 10)
+    --dry-run         Show how many portfolios and chunks a run would have without writing anything
+"""
+
+import asyncio
+import asyncpg
+import os
+import sys
+from typing import List, Optional
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.db.database import DATABASE_URL, _init_connection
+from app.services.irr_recompute import (
+    IRR_RECOMPUTE_CHUNK_SIZE, IRR_RECOMPUTE_WORKERS,
+    create_recompute_run, get_recompute_progress, run_irr_recompute
+)
+
+
+def format_progress(progress: dict) -> str:
+    eta = "-" if progress["eta_seconds"] is None else f"{progress['eta_seconds'] // 60}m{progress['eta_seconds'] % 60:02d}s"
+    return (
+        f"{progress['processed_portfolios']}/{progress['total_portfolios']} portfolios, "
+        f"{progress['chunks_done']}/{progress['total_chunks']} chunks, "
+        f"{progress['rows_written']} rows, {progress['rows_per_second']} rows/s, ETA {eta}"
+    )
+
+
+class IRRRecompute:
+    def __init__(self, chunk_size: int = IRR_RECOMPUTE_CHUNK_SIZE, workers: int = IRR_RECOMPUTE_WORKERS,
+                 portfolio_ids: Optional[List[int]] = None, resume_run_id: Optional[int] = None,
+                 report_seconds: float = 10, dry_run: bool = False):
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.portfolio_ids = portfolio_ids
+        self.resume_run_id = resume_run_id
+        self.report_seconds = report_seconds
+        self.dry_run = dry_run
+        self.pool = None
+
+    async def connect(self):
+        """Open one connection per worker plus one for progress reporting"""
+        self.pool = await asyncpg.create_pool(
+            DATABASE_URL, min_size=1, max_size=self.workers + 1, init=_init_connection
+        )
+        print(f"[OK] Connected to database ({self.workers + 1} connections)")
+
+    async def disconnect(self):
+        """Close the connection pool"""
+        if self.pool:
+            await self.pool.close()
+            print(f"[OK] Disconnected from database")
+
+    async def report(self, run_id: int):
+        """Print progress until cancelled"""
+        while True:
+            await asyncio.sleep(self.report_seconds)
+            async with self.pool.acquire() as db:
+                progress = await get_recompute_progress(db, run_id)
+            print(f"[PROGRESS] Run {run_id}: {format_progress(progress)}")
+
+    async def run(self):
+        """Main recompute process"""
+        try:
+            await self.connect()
+
+            async with self.pool.acquire() as db:
+                if self.dry_run:
+                    portfolios = await db.fetchval("""
+                        SELECT count(DISTINCT pf.portfolio_id)
+                        FROM portfolio_funds pf
+                        JOIN portfolio_fund_valuations pfv ON pfv.portfolio_fund_id = pf.id
+                        WHERE pf.portfolio_id IS NOT NULL
+                          AND ($1::bigint[] IS NULL OR pf.portfolio_id = ANY($1::bigint[]))
+                    """, self.portfolio_ids)
+                    chunks = -(-portfolios // self.chunk_size)
+                    print(f"[DATA] {portfolios} portfolios with fund valuations, {chunks} chunks of up to {self.chunk_size}")
+                    print("\n[DRY RUN] No changes made")
+                    return
+
+                if self.resume_run_id is not None:
+                    run_id = self.resume_run_id
+                    progress = await get_recompute_progress(db, run_id)
+                    if not progress:
+                        print(f"[ERROR] Recompute run {run_id} not found")
+                        return
+                    if progress["status"] != "running":
+                        print(f"[OK] Recompute run {run_id} has already finished: {format_progress(progress)}")
+                        return
+                    print(f"[DATA] Resuming run {run_id}: {format_progress(progress)}")
+                else:
+                    run_id = await create_recompute_run(db, self.chunk_size, self.portfolio_ids)
+                    progress = await get_recompute_progress(db, run_id)
+                    print(f"[DATA] Created run {run_id}: {progress['total_portfolios']} portfolios in {progress['total_chunks']} chunks")
+
+            reporter = asyncio.create_task(self.report(run_id))
+            try:
+                progress = await run_irr_recompute(self.pool, run_id, self.workers)
+            finally:
+                reporter.cancel()
+
+            if progress["status"] != "succeeded":
+                print(f"\n[WARN] Run {run_id} not finished (chunks still leased by another worker): {format_progress(progress)}")
+                print(f"       Resume with: python recompute_all_irrs.py --resume {run_id}")
+                return
+
+            print(f"\n[OK] RECOMPUTE COMPLETE - run {run_id}: {format_progress(progress)}")
+            if progress["failed_portfolio_ids"]:
+                print(f"[WARN] {len(progress['failed_portfolio_ids'])} portfolios failed: {progress['failed_portfolio_ids']}")
+
+        except Exception as e:
+            print(f"\n[ERROR] Fatal error: {str(e)}")
+            import traceback
+            traceback.print_exc()
+        finally:
+            await self.disconnect()
+
+
+async def main():
+    """Parse arguments and run the recompute"""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Recompute every fund and portfolio IRR, resumably and in parallel'
+    )
+    parser.add_argument(
+        '--chunk-size',
+        type=int,
+        default=IRR_RECOMPUTE_CHUNK_SIZE,
+        help='Portfolios per chunk'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=IRR_RECOMPUTE_WORKERS,
+        help='Parallel workers, each on its own connection'
+    )
+    parser.add_argument(
+        '--portfolio-ids',
+        type=lambda value: [int(part) for part in value.split(',') if part.strip()],
+        help='Comma-separated portfolio ids (default: the whole book)'
+    )
+    parser.add_argument(
+        '--resume',
+        type=int,
+        metavar='RUN_ID',
+        help='Continue an unfinished run'
+    )
+    parser.add_argument(
+        '--report-seconds',
+        type=float,
+        default=10,
+        help='Seconds between progress lines'
+    )
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='Show what would be done without making changes'
+    )
+
+    args = parser.parse_args()
+
+    recompute = IRRRecompute(
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+        portfolio_ids=args.portfolio_ids,
+        resume_run_id=args.resume,
+        report_seconds=args.report_seconds,
+        dry_run=args.dry_run
+    )
+
+    await recompute.run()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,36 @@
+"""
+Plan regression check for the hot queries registered in benchmarks/explain_hot_queries.py.
+
+Needs a scratch Postgres with the migrations applied: the test is skipped when DATABASE_URL
+is unset or the database cannot be reached. Everything it seeds is rolled back.
+"""
+import asyncio
+import os
+import sys
+
+import asyncpg
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "benchmarks"))
+
+from explain_hot_queries import HOT_QUERIES, explain_hot_queries
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+SEED_PORTFOLIOS = 500
+
+
+@pytest.mark.asyncio
+async def test_hot_queries_use_expected_indexes():
+    if not DATABASE_URL:
+        pytest.skip("DATABASE_URL is not set")
+    try:
+        conn = await asyncpg.connect(DATABASE_URL, timeout=5)
+    except (OSError, asyncio.TimeoutError, asyncpg.PostgresError) as e:
+        pytest.skip(f"database not reachable: {e}")
+
+    try:
+        failures = await explain_hot_queries(conn, SEED_PORTFOLIOS)
+    finally:
+        await conn.close()
+
+    assert failures == [], f"{len(failures)}/{len(HOT_QUERIES)} hot queries lost their expected index: {failures}"
@@ -0,0 +1,116 @@
+"""
+Tests for the batch IRR solver in app.services.irr_cascade_planner.
+
+The planner must give the same IRRs as the per-date functions it replaces: solve_monthly_irr
+is checked against npf.irr, and solve_fund_irrs against calculate_single_portfolio_fund_irr.
+"""
+import random
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import numpy_financial as npf
+import pytest
+
+from app.api.routes.portfolio_funds import calculate_single_portfolio_fund_irr
+from app.services.irr_cascade_planner import PortfolioIRRState, solve_fund_irrs, solve_monthly_irr
+
+FUND_ID = 7
+ACTIVITY_TYPES = ["Investment", "RegularInvestment", "Withdrawal", "Fee", "TaxUplift", "FundSwitchIn", "FundSwitchOut", "Dividend"]
+
+
+class FakeFundDB:
+    """Answers the queries calculate_single_portfolio_fund_irr makes from in-memory rows."""
+
+    def __init__(self, valuations, activities):
+        self.valuations = valuations
+        self.activities = activities
+
+    async def fetchrow(self, query, *args):
+        if "FROM portfolio_funds" in query:
+            return {"id": FUND_ID, "portfolio_id": 1, "available_funds_id": None}
+        if "FROM portfolio_fund_valuations" in query:
+            rows = [v for v in self.valuations if len(args) < 2 or v["valuation_date"] <= args[1]]
+            return max(rows, key=lambda v: v["valuation_date"]) if rows else None
+        return None
+
+    async def fetch(self, query, *args):
+        if "FROM holding_activity_log" in query:
+            rows = [a for a in self.activities if a["activity_timestamp"] <= args[1]]
+            return sorted(rows, key=lambda a: a["activity_timestamp"])
+        return []
+
+
+def _random_series(rng, count):
+    """Monthly cash flows: an investment, mixed flows with gaps, and a final valuation."""
+    series = []
+    for _ in range(count):
+        flows = rng.normal(0, 300, rng.integers(2, 60))
+        flows[rng.random(len(flows)) < 0.4] = 0
+        flows[0] = -abs(rng.normal(5000, 2000)) - 1
+        flows[-1] = abs(rng.normal(6000, 3000))
+        series.append(flows)
+    return series
+
+
+def test_solve_monthly_irr_matches_npf_irr():
+    series = _random_series(np.random.default_rng(46), 2000)
+    flows = np.zeros((len(series), max(len(s) for s in series)))
+    for row, values in enumerate(series):
+        flows[row, :len(values)] = values
+
+    rates = solve_monthly_irr(flows)
+    expected = np.array([npf.irr(values) for values in series])
+
+    assert np.array_equal(np.isnan(rates), np.isnan(expected))
+    assert np.allclose(rates[~np.isnan(expected)], expected[~np.isnan(expected)], rtol=0, atol=1e-9)
+
+
+def test_solve_monthly_irr_handles_no_rows_and_no_root():
+    assert solve_monthly_irr(np.zeros((0, 3))).shape == (0,)
+    # Only outflows: no IRR
+    assert np.isnan(solve_monthly_irr(np.array([[-100.0, -50.0, 0.0]]))[0])
+
+
+@pytest.mark.asyncio
+async def test_solve_fund_irrs_matches_calculate_single_portfolio_fund_irr():
+    rnd = random.Random(46)
+    valuation_dates = [date(2022 + month // 12, month % 12 + 1, 28) for month in range(24)]
+    valuations = [
+        {"id": i + 1, "portfolio_fund_id": FUND_ID, "valuation_date": day, "valuation": round(10000 + i * 150 + rnd.random() * 500, 2)}
+        for i, day in enumerate(valuation_dates)
+    ]
+    activities = [{"portfolio_fund_id": FUND_ID, "activity_type": "Investment", "amount": 10000.0, "activity_timestamp": datetime(2021, 12, 10, 12)}]
+    activities += [
+        {
+            "portfolio_fund_id": FUND_ID,
+            "activity_type": rnd.choice(ACTIVITY_TYPES),
+            "amount": round(rnd.random() * 400, 2),
+            "activity_timestamp": datetime(2022, 1, 3, 12) + timedelta(days=rnd.randint(0, 700))
+        }
+        for _ in range(40)
+    ]
+
+    state = PortfolioIRRState(
+        1,
+        [{"id": FUND_ID, "needs_valuation": True}],
+        valuations,
+        [
+            {
+                "portfolio_fund_id": a["portfolio_fund_id"],
+                "activity_type": a["activity_type"],
+                "amount": a["amount"],
+                "activity_date": a["activity_timestamp"].date()
+            }
+            for a in activities
+        ],
+        []
+    )
+    batch = solve_fund_irrs(state, [(FUND_ID, day) for day in valuation_dates])
+
+    db = FakeFundDB(valuations, activities)
+    for day, irr in zip(valuation_dates, batch):
+        result = await calculate_single_portfolio_fund_irr(
+            portfolio_fund_id=FUND_ID, irr_date=day.isoformat(), bypass_cache=True, db=db
+        )
+        assert result["success"]
+        assert irr == result["irr_percentage"], day
@@ -0,0 +1,132 @@
+"""
+Tests for the keyset pagination helpers in app.api.pagination.
+
+Cursors come back from clients, so anything that is not a cursor we issued must be
+rejected with a 400 before it reaches a query; a valid cursor must decode to the same
+value and type the row had, so the keyset condition compares like with like.
+"""
+import base64
+from datetime import date, datetime, timedelta, timezone
+
+import orjson
+import pytest
+from fastapi import HTTPException, Response
+
+from app.api.pagination import (
+    NEXT_CURSOR_HEADER,
+    decode_cursor,
+    encode_cursor,
+    keyset_condition,
+    set_next_cursor,
+)
+
+SORT_KEY = "activity_timestamp"
+
+
+def raw_cursor(payload: bytes) -> str:
+    """Encode arbitrary bytes the way encode_cursor does, to build tampered cursors."""
+    return base64.urlsafe_b64encode(payload).rstrip(b"=").decode("ascii")
+
+
+def assert_bad_cursor(cursor: str, sort_key: str = SORT_KEY):
+    with pytest.raises(HTTPException) as exc_info:
+        decode_cursor(cursor, sort_key)
+    assert exc_info.value.status_code == 400
+    assert exc_info.value.detail.startswith("Invalid pagination cursor")
+
+
+@pytest.mark.parametrize("value", [
+    # activity_timestamp is timestamptz: asyncpg returns aware datetimes in UTC
+    datetime(2024, 6, 30, tzinfo=timezone.utc),
+    datetime(2024, 6, 30, 13, 45, 12, 123456, tzinfo=timezone.utc),
+    datetime(2024, 6, 30, 23, 0, tzinfo=timezone(timedelta(hours=-5))),
+    # HoldingActivityLog.activity_timestamp is a date once it has been through the model
+    date(2024, 6, 30),
+])
+def test_round_trip_preserves_value_and_type(value):
+    cursor = encode_cursor(SORT_KEY, value, 42)
+
+    decoded, row_id = decode_cursor(cursor, SORT_KEY)
+
+    assert (decoded, row_id) == (value, 42)
+    assert type(decoded) is type(value)
+    if isinstance(value, datetime):
+        assert decoded.utcoffset() == value.utcoffset()
+
+
+def test_cursor_is_url_safe():
+    cursor = encode_cursor(SORT_KEY, datetime(2024, 6, 30, tzinfo=timezone.utc), 2**40)
+
+    assert not set(cursor) & {"+", "/", "=", "&", "?", "%"}
+
+
+def test_cursor_for_another_listing_is_rejected():
+    cursor = encode_cursor("created_at", datetime(2024, 6, 30, tzinfo=timezone.utc), 1)
+
+    assert_bad_cursor(cursor)
+
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "not a cursor",
+    "!!!!",
+    "é",
+    raw_cursor(b"not json"),
+    raw_cursor(b"[1, 2, 3]"),
+    raw_cursor(b'"a string"'),
+    encode_cursor(SORT_KEY, datetime(2024, 6, 30, tzinfo=timezone.utc), 1)[:-5],
+])
+def test_garbage_cursor_is_rejected(cursor):
+    assert_bad_cursor(cursor)
+
+
+@pytest.mark.parametrize("payload", [
+    {"k": SORT_KEY, "id": 1},
+    {"k": SORT_KEY, "v": "2024-06-30T00:00:00+00:00"},
+    {"k": SORT_KEY, "v": None, "id": 1},
+    {"k": SORT_KEY, "v": 1719705600, "id": 1},
+    {"k": SORT_KEY, "v": "yesterday", "id": 1},
+    {"k": SORT_KEY, "v": "2024-13-01", "id": 1},
+    {"k": SORT_KEY, "v": "2024-06-30T00:00:00+00:00", "id": "1; DROP TABLE holding_activity_log"},
+    {"k": SORT_KEY, "v": "2024-06-30T00:00:00+00:00", "id": None},
+    {"k": SORT_KEY, "v": "2024-06-30T00:00:00+00:00", "id": 1.5},
+    {"k": SORT_KEY, "v": "2024-06-30T00:00:00+00:00", "id": True},
+    {"k": SORT_KEY, "v": "2024-06-30T00:00:00+00:00", "id": -1},
+    # Postgres rejects these when binding: out of bigint range, or outside the timestamptz range once converted to UTC
+    {"k": SORT_KEY, "v": "2024-06-30T00:00:00+00:00", "id": 2**63},
+    {"k": SORT_KEY, "v": "9999-12-31T23:00:00-05:00", "id": 1},
+    {"k": SORT_KEY, "v": "0001-01-01T01:00:00+05:00", "id": 1},
+])
+def test_tampered_cursor_is_rejected(payload):
+    assert_bad_cursor(raw_cursor(orjson.dumps(payload)))
+
+
+def test_id_beyond_64_bits_is_rejected():
+    # orjson parses this as a float rather than failing
+    assert_bad_cursor(raw_cursor(b'{"k": "activity_timestamp", "v": "2024-06-30", "id": 18446744073709551616}'))
+
+
+def test_keyset_condition_numbers_both_parameters():
+    assert keyset_condition("activity_timestamp", "id", 1) == "(activity_timestamp, id) < ($1, $2)"
+    assert keyset_condition("cp.created_at", "cp.id", 4) == "(cp.created_at, cp.id) < ($4, $5)"
+
+
+def test_full_page_sets_cursor_for_last_row():
+    rows = [
+        {"id": 9, SORT_KEY: datetime(2024, 7, 1, tzinfo=timezone.utc)},
+        {"id": 7, SORT_KEY: datetime(2024, 6, 30, tzinfo=timezone.utc)},
+    ]
+    response = Response()
+
+    cursor = set_next_cursor(response, rows, SORT_KEY, limit=2)
+
+    assert response.headers[NEXT_CURSOR_HEADER] == cursor
+    assert decode_cursor(cursor, SORT_KEY) == (datetime(2024, 6, 30, tzinfo=timezone.utc), 7)
+
+
+@pytest.mark.parametrize("rows", [[], [{"id": 1, SORT_KEY: datetime(2024, 6, 30, tzinfo=timezone.utc)}]])
+def test_last_page_has_no_cursor(rows):
+    response = Response()
+
+    assert set_next_cursor(response, rows, SORT_KEY, limit=2) is None
+    assert NEXT_CURSOR_HEADER not in response.headers
@@ -1338,20 +1338,27 @@ CREATE INDEX idx_client_groups_status ON public.client_groups USING btree (statu
 -- Indexes for table: client_products
 CREATE UNIQUE INDEX client_products_pkey ON public.client_products USING btree (id);
 CREATE INDEX idx_client_products_client_id ON public.client_products USING btree (client_id);
+CREATE INDEX idx_client_products_created_at_id ON public.client_products USING btree (created_at DESC, id DESC);
 CREATE INDEX idx_client_products_portfolio_id ON public.client_products USING btree (portfolio_id);
 CREATE INDEX idx_client_products_provider_id ON public.client_products USING btree (provider_id);
 CREATE INDEX idx_client_products_status ON public.client_products USING btree (status);
 -- Indexes for table: holding_activity_log
 CREATE UNIQUE INDEX holding_activity_log_pkey ON public.holding_activity_log USING btree (id);
 CREATE INDEX idx_holding_activity_log_portfolio_fund_id ON public.holding_activity_log USING btree (portfolio_fund_id);
+CREATE INDEX idx_holding_activity_log_fund_timestamp ON public.holding_activity_log USING btree (portfolio_fund_id, activity_timestamp);
 CREATE INDEX idx_holding_activity_log_product_id ON public.holding_activity_log USING btree (product_id);
 CREATE INDEX idx_holding_activity_log_timestamp ON public.holding_activity_log USING btree (activity_timestamp);
+CREATE INDEX idx_holding_activity_log_timestamp_id ON public.holding_activity_log USING btree (activity_timestamp DESC, id DESC);
 -- Indexes for table: portfolio_fund_irr_values
 CREATE INDEX idx_portfolio_fund_irr_values_date ON public.portfolio_fund_irr_values USING btree (date);
+CREATE INDEX idx_portfolio_fund_irr_values_fund_date ON public.portfolio_fund_irr_values USING btree (fund_id, date DESC, created_at DESC);
+CREATE UNIQUE INDEX idx_portfolio_fund_irr_values_fund_date_unique ON public.portfolio_fund_irr_values USING btree (fund_id, date);
 CREATE INDEX idx_portfolio_fund_irr_values_fund_id ON public.portfolio_fund_irr_values USING btree (fund_id);
+CREATE INDEX idx_portfolio_fund_irr_values_fund_valuation_id ON public.portfolio_fund_irr_values USING btree (fund_valuation_id);
 CREATE UNIQUE INDEX portfolio_fund_irr_values_pkey ON public.portfolio_fund_irr_values USING btree (id);
 -- Indexes for table: portfolio_fund_valuations
 CREATE INDEX idx_portfolio_fund_valuations_date ON public.portfolio_fund_valuations USING btree (valuation_date);
+CREATE INDEX idx_portfolio_fund_valuations_fund_date ON public.portfolio_fund_valuations USING btree (portfolio_fund_id, valuation_date DESC, created_at DESC);
 CREATE INDEX idx_portfolio_fund_valuations_fund_id ON public.portfolio_fund_valuations USING btree (portfolio_fund_id);
 CREATE UNIQUE INDEX portfolio_fund_valuations_pkey ON public.portfolio_fund_valuations USING btree (id);
 -- Indexes for table: portfolio_funds
@@ -1361,9 +1368,14 @@ CREATE UNIQUE INDEX portfolio_funds_pkey ON public.portfolio_funds USING btree (
 -- Indexes for table: portfolio_irr_values
 CREATE INDEX idx_portfolio_irr_values_date ON public.portfolio_irr_values USING btree (date);
 CREATE INDEX idx_portfolio_irr_values_portfolio_id ON public.portfolio_irr_values USING btree (portfolio_id);
+CREATE INDEX idx_portfolio_irr_values_portfolio_date ON public.portfolio_irr_values USING btree (portfolio_id, date DESC, created_at DESC);
+CREATE UNIQUE INDEX idx_portfolio_irr_values_portfolio_date_unique ON public.portfolio_irr_values USING btree (portfolio_id, date);
+CREATE INDEX idx_portfolio_irr_values_portfolio_valuation_id ON public.portfolio_irr_values USING btree (portfolio_valuation_id);
 CREATE UNIQUE INDEX portfolio_irr_values_pkey ON public.portfolio_irr_values USING btree (id);
 -- Indexes for table: portfolio_valuations
 CREATE INDEX idx_portfolio_valuations_date ON public.portfolio_valuations USING btree (valuation_date);
+CREATE INDEX idx_portfolio_valuations_portfolio_date ON public.portfolio_valuations USING btree (portfolio_id, valuation_date DESC, created_at DESC);
+CREATE UNIQUE INDEX idx_portfolio_valuations_portfolio_date_unique ON public.portfolio_valuations USING btree (portfolio_id, valuation_date);
 CREATE INDEX idx_portfolio_valuations_portfolio_id ON public.portfolio_valuations USING btree (portfolio_id);
 CREATE UNIQUE INDEX portfolio_valuations_pkey ON public.portfolio_valuations USING btree (id);
 -- Indexes for table: portfolios